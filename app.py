@@ -1,9 +1,27 @@
+import os
+
 import gradio as gr
 from detect import predict
+from backends import get_backend
+from metrics import start_http_server
+
+# Load and warm up the configured backend before accepting requests
+get_backend()
+
+# Optionally expose per-stage latency metrics (/metrics and /metrics.json)
+metrics_port = os.environ.get("PORTVISION_METRICS_PORT")
+if metrics_port:
+    start_http_server(int(metrics_port))
+
+
+def annotate(image):
+    # Gradio hands every request a fresh RGB array, so the boxes are drawn onto it in place
+    return predict(image, inplace=True)
+
 
 # Create the Gradio interface
 iface = gr.Interface(
-    fn=predict,
+    fn=annotate,
     inputs=gr.Image(type="numpy"),  # Gradio provides a numpy array
     outputs=[gr.Image(type="numpy"), gr.Textbox(label="JSON Output")],  # Output is the image and JSON
     title="PortVision",
@@ -11,4 +29,4 @@ iface = gr.Interface(
 )
 
 # Launch the Gradio app
-iface.launch(share=True)
\ No newline at end of file
+iface.launch(share=True)
@@ -0,0 +1,460 @@
+"""Tämä moduuli sisältää vaihdettavat inferenssitaustat detect.predict-funktiolle.
+
+Tausta valitaan asetustiedostosta inference.yaml:
+- torch: ultralytics/PyTorch (model_registry), oletus.
+- onnxruntime: port_vision.py:n viemä ONNX-malli ONNX Runtimella CPU:lla.
+- openvino: sama ONNX-malli (tai OpenVINO IR .xml) OpenVINOlla CPU:lla.
+
+ONNX Runtime ja OpenVINO ovat valinnaisia riippuvuuksia, jotka tuodaan vasta
+kun kyseinen tausta otetaan käyttöön. Näille taustoille tehdään oma
+letterbox-esikäsittely ja NMS, ja tulokset palautetaan samassa muodossa kuin
+ultralytics (result.boxes.xyxy/conf/cls), joten draw_bboxes toimii sellaisenaan.
+Myös OpenCV ja PyTorch tuodaan vasta käytettäessä.
+Kaikki taustat ottavat vastaan PIL-kuvia tai NumPy-taulukoita. Taulukoiden
+värijärjestys annetaan color_order-parametrilla (oletus RGB, kuten Gradio
+antaa; image_buffer.BGR esim. cv2.imread-kuville), eikä taulukkoa kopioida
+muuten kuin mallin niin vaatiessa.
+
+Sisältää:
+- load_inference_config: Lukee inferenssiasetukset YAML-tiedostosta.
+- letterbox: Skaalaa ja reunustaa kuvan mallin syötekokoon.
+- BackendResult: ultralytics-yhteensopiva tulosobjekti NumPy-taulukoille.
+- TorchBackend, OnnxRuntimeBackend, OpenVinoBackend: Inferenssitaustat.
+- get_backend: Palauttaa asetusten mukaisen, välimuistissa pidetyn taustan.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import yaml
+
+from image_buffer import BGR, RGB, as_array, count_copy
+
+from helpers import non_max_suppression
+
+DEFAULT_CONFIG_PATH = "inference.yaml"
+
+DEFAULT_CONFIG = {
+    "backend": "torch",
+    "weights": "best.pt",
+    "imgsz": 1216,
+    "iou": 0.4,
+    "conf": 0.4,
+    "intra_op_threads": 0,
+    "inter_op_threads": 0,
+    "sliced": False,
+    "tile_size": 1216,
+    "tile_overlap": 0.2,
+    "tile_batch": 4,
+    "merge_iou": 0.5,
+    "merge_mode": "nms",
+    "cascade": False,
+    "cascade_imgsz": 640,
+    "cascade_weights": "",
+    "cascade_margin": 0.1,
+    "cache": False,
+    "cache_dir": ".cache/results",
+    "cache_max_entries": 256,
+    "cache_max_disk_mb": 512,
+    "trace": False,
+    "trace_dir": "",
+}
+
+
+# Jäsennetyt asetukset (polku, muokkausaika) -avaimella
+_configs = {}
+
+
+def load_inference_config(path=DEFAULT_CONFIG_PATH):
+    """
+    Lukee inferenssiasetukset YAML-tiedostosta oletusarvojen päälle.
+
+    Jäsennetty tiedosto pidetään muistissa polun ja muokkausajan mukaan
+    (kuten model_registry painotiedostot), joten jokainen predict-kutsu ei
+    jäsennä YAML:ia uudelleen; muokattu tiedosto luetaan seuraavalla kutsulla.
+
+    Args:
+        path (str, optional): Asetustiedoston polku. Oletus 'inference.yaml'.
+
+    Returns:
+        dict: Asetukset (kutsujan oma kopio). Jos tiedostoa ei ole, palautetaan oletusasetukset.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return dict(DEFAULT_CONFIG)
+    key = (os.path.abspath(path), mtime)
+    config = _configs.get(key)
+    if config is None:
+        config = dict(DEFAULT_CONFIG)
+        with open(path, 'r') as file:
+            config.update(yaml.safe_load(file) or {})
+        # Vanhentuneet versiot samasta tiedostosta poistetaan
+        for stale in [k for k in _configs if k[0] == key[0]]:
+            _configs.pop(stale, None)
+        _configs[key] = config
+    return dict(config)
+
+
+def letterbox(image, new_shape, color=(114, 114, 114)):
+    """
+    Skaalaa kuvan kuvasuhteen säilyttäen ja reunustaa sen keskitetysti mallin syötekokoon.
+
+    Vastaa ultralyticsin LetterBox-muunnosta (auto=False), jota ONNX-vienti odottaa.
+
+    Args:
+        image (numpy.ndarray): Kuva muodossa (H, W, 3).
+        new_shape (int | tuple): Syötekoko (korkeus, leveys) tai yksi sivun pituus.
+        color (tuple, optional): Reunuksen väri. Oletus (114, 114, 114).
+
+    Returns:
+        tuple: (kuva, gain, (pad_x, pad_y))
+    """
+    import cv2
+
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)
+    height, width = image.shape[:2]
+    gain = min(new_shape[0] / height, new_shape[1] / width)
+    new_unpad = (int(round(width * gain)), int(round(height * gain)))
+    dw = (new_shape[1] - new_unpad[0]) / 2
+    dh = (new_shape[0] - new_unpad[1]) / 2
+
+    if (width, height) != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, gain, (left, top)
+
+
+class _HostArray(np.ndarray):
+    """NumPy-taulukko, jolla on torch-tensorin .cpu()- ja .numpy()-metodit."""
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.view(np.ndarray)
+
+
+class _Boxes:
+    """ultralytics Boxes -yhteensopivat xyxy-, conf- ja cls-taulukot."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4).view(_HostArray)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1).view(_HostArray)
+        self.cls = np.asarray(cls, dtype=np.float32).reshape(-1).view(_HostArray)
+
+
+class BackendResult:
+    """
+    Yhden kuvan tunnistustulos ultralyticsin Results-olion muodossa.
+
+    Args:
+        xyxy (numpy.ndarray): Laatikot muodossa (N, 4).
+        conf (numpy.ndarray): Luottamusarvot muodossa (N,).
+        cls (numpy.ndarray): Luokkien ID:t muodossa (N,).
+        orig_shape (tuple): Alkuperäisen kuvan (korkeus, leveys).
+        speed (dict, optional): Vaiheiden kesto kuvaa kohden millisekunteina
+            (preprocess, inference, postprocess) kuten ultralyticsissa.
+    """
+
+    def __init__(self, xyxy, conf, cls, orig_shape, speed=None):
+        self.boxes = _Boxes(xyxy, conf, cls)
+        self.orig_shape = orig_shape
+        self.speed = speed or {}
+
+
+class TorchBackend:
+    """
+    ultralytics/PyTorch-tausta. Malli haetaan model_registry-rekisteristä.
+
+    Args:
+        weights (str): .pt-painotiedosto.
+        imgsz (int, optional): Mallin syötekoko. Oletus mallin oma.
+        intra_op_threads (int, optional): torch.set_num_threads. 0 = oletus.
+        inter_op_threads (int, optional): torch.set_num_interop_threads. 0 = oletus.
+    """
+
+    name = "torch"
+
+    def __init__(self, weights, imgsz=None, intra_op_threads=0, inter_op_threads=0):
+        import torch
+        from model_registry import registry
+
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        if inter_op_threads:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+            except RuntimeError:
+                # Voidaan asettaa vain ennen ensimmäistä rinnakkaista ajoa
+                pass
+        self.weights = weights
+        self.imgsz = imgsz
+        self._registry = registry
+
+    def warmup(self):
+        """Lataa ja lämmittää mallin rekisterissä."""
+        self._registry.get(self.weights)
+
+    @staticmethod
+    def _to_model_input(image, color_order=RGB):
+        """ultralytics tulkitsee NumPy-taulukot BGR-muotoisiksi, joten vain RGB käännetään."""
+        if not isinstance(image, np.ndarray):
+            return image
+        image = as_array(image, color_order)
+        if color_order == BGR:
+            return image
+        count_copy("model_input")
+        return np.ascontiguousarray(image[..., ::-1])
+
+    def __call__(self, images, iou=0.4, conf=0.4, color_order=RGB):
+        model = self._registry.get(self.weights)
+        kwargs = {"iou": iou, "conf": conf, "verbose": False}
+        if self.imgsz:
+            kwargs["imgsz"] = self.imgsz
+        if isinstance(images, (list, tuple)):
+            images = [self._to_model_input(image, color_order) for image in images]
+        else:
+            images = self._to_model_input(images, color_order)
+        return model(images, **kwargs)
+
+
+class _ExportedModelBackend:
+    """
+    Yhteinen pohja vietyjen mallien taustoille: esikäsittely, dekoodaus ja NMS.
+
+    Aliluokat toteuttavat _run-metodin, joka ajaa mallin NCHW float32 -erälle ja
+    palauttaa raakatulosteen muodossa (B, 4 + nc, ankkurit).
+    """
+
+    name = None
+
+    def __init__(self, imgsz=1216, max_det=300):
+        self.imgsz = imgsz
+        self.max_det = max_det
+
+    def _run(self, batch):
+        raise NotImplementedError
+
+    def warmup(self):
+        """Ajaa yhden tyhjän ennusteen, jotta ensimmäinen pyyntö ei maksa alustusta."""
+        self(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8))
+
+    def preprocess(self, image, color_order=RGB):
+        """
+        Letterbox-esikäsittely yhdelle kuvalle.
+
+        BGR-kuvan kanavat käännetään vasta skaalatusta kuvasta float32-muunnoksen
+        yhteydessä, joten alkuperäistä kuvaa ei kopioida.
+
+        Returns:
+            tuple: (RGB CHW float32 -taulukko, gain, pad, alkuperäinen muoto)
+        """
+        image = as_array(image, color_order)
+        padded, gain, pad = letterbox(image, self.imgsz)
+        if color_order == BGR:
+            padded = padded[..., ::-1]
+        tensor = np.ascontiguousarray(padded.transpose(2, 0, 1), dtype=np.float32)
+        tensor *= 1.0 / 255.0
+        return tensor, gain, pad, image.shape[:2]
+
+    def postprocess(self, output, gain, pad, orig_shape, iou, conf):
+        """
+        Dekoodaa yhden kuvan raakatulosteen, ajaa NMS:n ja skaalaa laatikot takaisin.
+
+        Args:
+            output (numpy.ndarray): Raakatuloste muodossa (4 + nc, ankkurit).
+
+        Returns:
+            BackendResult: Tunnistukset alkuperäisen kuvan koordinaateissa.
+        """
+        predictions = output.T                      # (ankkurit, 4 + nc)
+        class_scores = predictions[:, 4:]
+        classes = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(classes)), classes]
+        mask = scores > conf
+        predictions, classes, scores = predictions[mask], classes[mask], scores[mask]
+
+        # cx, cy, w, h -> x1, y1, x2, y2
+        cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+        keep = non_max_suppression(boxes, scores, classes, iou, self.max_det)
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+
+        # Poista reunus ja skaalaa alkuperäiseen kokoon
+        boxes[:, [0, 2]] -= pad[0]
+        boxes[:, [1, 3]] -= pad[1]
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, orig_shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, orig_shape[0])
+        return BackendResult(boxes, scores, classes, orig_shape)
+
+    def __call__(self, images, iou=0.4, conf=0.4, color_order=RGB):
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        start = time.perf_counter()
+        prepared = [self.preprocess(image, color_order) for image in images]
+        batch = np.stack([tensor for tensor, _, _, _ in prepared])
+        preprocessed = time.perf_counter()
+        outputs = self._run(batch)
+        inferred = time.perf_counter()
+        results = [
+            self.postprocess(output, gain, pad, orig_shape, iou, conf)
+            for output, (_, gain, pad, orig_shape) in zip(outputs, prepared)
+        ]
+        # Kuvakohtaiset ajat millisekunteina kuten ultralyticsin Results.speed
+        scale = 1000.0 / len(images)
+        speed = {
+            "preprocess": (preprocessed - start) * scale,
+            "inference": (inferred - preprocessed) * scale,
+            "postprocess": (time.perf_counter() - inferred) * scale,
+        }
+        for result in results:
+            result.speed = speed
+        return results
+
+
+class OnnxRuntimeBackend(_ExportedModelBackend):
+    """
+    ONNX Runtime -tausta CPU:lle.
+
+    Args:
+        weights (str): .onnx-mallitiedosto.
+        imgsz (int, optional): Mallin syötekoko. Oletus 1216.
+        intra_op_threads (int, optional): Operaation sisäiset säikeet. 0 = oletus.
+        inter_op_threads (int, optional): Operaatioiden väliset säikeet. 0 = oletus.
+    """
+
+    name = "onnxruntime"
+
+    def __init__(self, weights, imgsz=1216, intra_op_threads=0, inter_op_threads=0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnxruntime-tausta vaatii paketin: pip install onnxruntime") from e
+        super().__init__(imgsz)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            weights, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self._batch_dim = self.session.get_inputs()[0].shape[0]
+
+    def _run(self, batch):
+        if isinstance(self._batch_dim, int) and self._batch_dim != len(batch):
+            # Staattinen eräkoko: ajetaan kuva kerrallaan
+            return np.concatenate([
+                self.session.run(None, {self.input_name: batch[i:i + 1]})[0]
+                for i in range(len(batch))
+            ])
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(_ExportedModelBackend):
+    """
+    OpenVINO-tausta CPU:lle.
+
+    Args:
+        weights (str): .onnx- tai OpenVINO IR (.xml) -mallitiedosto.
+        imgsz (int, optional): Mallin syötekoko. Oletus 1216.
+        intra_op_threads (int, optional): INFERENCE_NUM_THREADS. 0 = oletus.
+        inter_op_threads (int, optional): NUM_STREAMS (rinnakkaiset pyynnöt). 0 = oletus.
+    """
+
+    name = "openvino"
+
+    def __init__(self, weights, imgsz=1216, intra_op_threads=0, inter_op_threads=0):
+        try:
+            import openvino as ov
+        except ImportError as e:
+            raise ImportError("openvino-tausta vaatii paketin: pip install openvino") from e
+        super().__init__(imgsz)
+        core = ov.Core()
+        properties = {}
+        if intra_op_threads:
+            properties["INFERENCE_NUM_THREADS"] = str(intra_op_threads)
+        if inter_op_threads:
+            properties["NUM_STREAMS"] = str(inter_op_threads)
+        model = core.read_model(weights)
+        self._static_batch = not model.inputs[0].get_partial_shape()[0].is_dynamic
+        self.compiled = core.compile_model(model, "CPU", properties)
+        self.output = self.compiled.output(0)
+
+    def _run(self, batch):
+        if self._static_batch:
+            return np.concatenate([
+                self.compiled([batch[i:i + 1]])[self.output] for i in range(len(batch))
+            ])
+        return self.compiled([batch])[self.output]
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+    OpenVinoBackend.name: OpenVinoBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def create_backend(config):
+    """
+    Luo uuden taustan asetusten perusteella.
+
+    Args:
+        config (dict): Asetukset (ks. DEFAULT_CONFIG).
+
+    Returns:
+        Inferenssitausta, jota kutsutaan muodossa backend(images, iou=..., conf=...).
+
+    Raises:
+        ValueError: Jos taustan nimi on tuntematon.
+    """
+    name = config["backend"]
+    if name not in BACKENDS:
+        raise ValueError(f"Tuntematon tausta '{name}'. Vaihtoehdot: {', '.join(BACKENDS)}")
+    return BACKENDS[name](
+        config["weights"],
+        imgsz=config["imgsz"],
+        intra_op_threads=config["intra_op_threads"],
+        inter_op_threads=config["inter_op_threads"],
+    )
+
+
+def get_backend(config=None):
+    """
+    Palauttaa asetusten mukaisen taustan. Sama tausta luodaan vain kerran prosessia kohden.
+
+    Args:
+        config (dict, optional): Asetukset. Oletus load_inference_config().
+
+    Returns:
+        Inferenssitausta.
+    """
+    if config is None:
+        config = load_inference_config()
+    key = (
+        config["backend"], os.path.abspath(config["weights"]), config["imgsz"],
+        config["intra_op_threads"], config["inter_op_threads"],
+    )
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                backend = create_backend(config)
+                backend.warmup()
+                _backends[key] = backend
+    return backend
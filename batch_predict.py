@@ -0,0 +1,463 @@
+"""Tämä skripti ajaa tunnistuksen suurelle kuvajoukolle ja kirjoittaa tulokset JSONL-tiedostoon.
+
+Syötteenä voi olla hakemisto, glob-hahmo (esim. "kuvat/**/*.jpg") tai
+manifestitiedosto, jossa on yksi kuvapolku riviä kohden. Kuvat puretaan
+taustasäikeissä, ajetaan mallin läpi erissä ja jokaisesta kuvasta kirjoitetaan
+yksi JSONL-rivi generate_switch_json-rakenteella. Keskeytynyt ajo voidaan
+jatkaa --resume-valitsimella. Vaiheittaiset viivejakaumat voidaan tallentaa
+--metrics-output-valitsimella (JSON tai .prom-päätteisenä Prometheus-teksti)
+ja porttinumeroinnin päätösjäljet kuvakohtaisiksi tiedostoiksi --trace-dir-valitsimella.
+Tietueiden muoto valitaan --output-format-valitsimella (serializers.py):
+tiivis JSONL (oletus), orjson, sarakemuotoinen porttitaulukko tai MessagePack.
+
+Esimerkki:
+    python batch_predict.py kuvat/ -o tulokset.jsonl --batch-size 8 --save-images annotoidut/
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from bounding_boxes import draw_bboxes
+from dataset import IMAGE_EXTENSIONS
+from decision_trace import DecisionTrace
+from detections import Detections
+from image_buffer import BGR
+from json_generator import generate_switch_json
+from metrics import (
+    STAGE_METRIC,
+    increment,
+    metrics,
+    observe,
+    record_counts,
+    record_model_speed,
+    span,
+)
+from model_registry import get_model
+from serializers import RecordWriter, iter_records
+from survey_store import SurveyStore
+
+# Jonon lopetusmerkki
+_DONE = object()
+
+
+def iter_sources(source, recursive=False):
+    """
+    Käy läpi syötteen kuvapolut laiskasti, jotta muistinkäyttö pysyy vakiona.
+
+    Args:
+        source (str): Hakemisto, glob-hahmo tai manifestitiedosto.
+        recursive (bool, optional): Käydäänkö hakemiston alihakemistot läpi. Oletus False.
+
+    Yields:
+        str: Kuvatiedoston polku.
+    """
+    if os.path.isdir(source):
+        if recursive:
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        yield os.path.join(root, name)
+        else:
+            for name in sorted(os.listdir(source)):
+                path = os.path.join(source, name)
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and os.path.isfile(path):
+                    yield path
+    elif os.path.isfile(source):
+        # Manifesti: yksi polku riviä kohden, suhteessa manifestin hakemistoon
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                yield line if os.path.isabs(line) else os.path.join(base_dir, line)
+    else:
+        for path in glob.iglob(source, recursive=True):
+            if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+                yield path
+
+
+def iter_pending(source, recursive, done, counters):
+    """
+    Käy läpi syötteen kuvapolut, joita ei ole jo käsitelty.
+
+    Ohitetut polut lasketaan laskuriin counters["skipped"], joten aiemman
+    tulosteen muiden syötteiden kuvia ei lasketa ohitetuiksi.
+
+    Args:
+        source (str): Hakemisto, glob-hahmo tai manifestitiedosto.
+        recursive (bool): Käydäänkö hakemiston alihakemistot läpi.
+        done (set): Valmiiksi käsiteltyjen kuvien polut.
+        counters (dict): Laskurit, joihin lisätään "skipped".
+
+    Yields:
+        str: Käsittelemättömän kuvan polku.
+    """
+    for path in iter_sources(source, recursive):
+        if path in done:
+            counters["skipped"] += 1
+        else:
+            yield path
+
+
+def output_file(directory, path, source, suffix):
+    """
+    Palauttaa kuvakohtaisen tulostiedoston polun (annotoitu kuva tai päätösjälki).
+
+    Hakemistosyötteen kuvat nimetään polulla suhteessa syötteen juureen, ja
+    alihakemistot luodaan tulostehakemistoon, joten --recursive-ajon
+    samannimiset kuvat eivät korvaa toisiaan. Glob- ja manifestisyötteen
+    kuvat voivat olla missä tahansa, joten niiden nimeen lisätään polun
+    lyhyt tiiviste.
+
+    Args:
+        directory (str): Tulostehakemisto.
+        path (str): Kuvan polku.
+        source (str): Hakemisto, glob-hahmo tai manifestitiedosto.
+        suffix (str): Tiedostopääte, esim. ".jpg" tai ".trace.json".
+
+    Returns:
+        str: Tulostiedoston polku.
+    """
+    relative = os.path.relpath(path, source) if os.path.isdir(source) else os.pardir
+    if relative.startswith(os.pardir):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+        return os.path.join(directory, f"{stem}-{digest}{suffix}")
+    target = os.path.join(directory, os.path.splitext(relative)[0] + suffix)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    return target
+
+
+def load_done_paths(output_path, output_format="compact", errors=None):
+    """
+    Lukee jo käsiteltyjen kuvien polut aiemmasta tulostiedostosta.
+
+    Virheellisiä (esim. keskeytyksessä katkenneita) tietueita ei lasketa valmiiksi.
+
+    Args:
+        output_path (str): Tulostiedoston polku.
+        output_format (str, optional): Tiedoston muoto (serializers.py). Oletus 'compact'.
+        errors (set, optional): Jos annettu, siihen lisätään kuvat, joilla on
+            jo virhetietue, jotta uudelleen epäonnistuvista ei kirjoiteta toista.
+
+    Returns:
+        set: Valmiiksi käsiteltyjen kuvien polut.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    for record in iter_records(output_path, output_format):
+        if isinstance(record, dict) and "image" in record:
+            if "error" not in record:
+                done.add(record["image"])
+            elif errors is not None:
+                errors.add(record["image"])
+    return done
+
+
+class StageTimer:
+    """Kerää vaiheittaiset kokonaisajat ja suorituskerrat (säieturvallinen)."""
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, count=1):
+        with self._lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + count
+
+    def summary(self):
+        """Palauttaa vaiheiden kokonais- ja keskiajat kuvaa kohden."""
+        return {
+            stage: {
+                "total_seconds": total,
+                "per_image_ms": 1000.0 * total / max(self.counts[stage], 1),
+            }
+            for stage, total in self.totals.items()
+        }
+
+
+def _decode_worker(path_queue, image_queue, timer):
+    """Purkaa kuvia jonosta, kunnes vastaan tulee lopetusmerkki."""
+    while True:
+        path = path_queue.get()
+        if path is _DONE:
+            image_queue.put(_DONE)
+            return
+        start = time.perf_counter()
+        image = cv2.imread(path, cv2.IMREAD_COLOR)  # BGR
+        elapsed = time.perf_counter() - start
+        timer.add("decode", elapsed)
+        observe(STAGE_METRIC, elapsed, stage="decode")
+        image_queue.put((path, image))
+
+
+def _feed_paths(paths, path_queue, num_workers):
+    """Syöttää polut purkusäikeille ja lopuksi yhden lopetusmerkin kullekin."""
+    for path in paths:
+        path_queue.put(path)
+    for _ in range(num_workers):
+        path_queue.put(_DONE)
+
+
+def _iter_batches(image_queue, batch_size, num_workers):
+    """Kokoaa puretut kuvat eriksi, kunnes kaikki purkusäikeet ovat valmiita."""
+    batch = []
+    finished = 0
+    while finished < num_workers:
+        item = image_queue.get()
+        if item is _DONE:
+            finished += 1
+            continue
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_batch(
+    source,
+    output_path,
+    weights='best.pt',
+    device=None,
+    batch_size=8,
+    workers=4,
+    iou=0.4,
+    conf=0.4,
+    imgsz=None,
+    save_images=None,
+    resume=False,
+    recursive=False,
+    trace_dir=None,
+    store=None,
+    site=None,
+    location=None,
+    model=None,
+    output_format="compact",
+):
+    """
+    Ajaa tunnistuksen kaikille syötteen kuville ja kirjoittaa tulokset tietue kerrallaan.
+
+    Args:
+        source (str): Hakemisto, glob-hahmo tai manifestitiedosto.
+        output_path (str): Tulostetiedosto.
+        weights (str, optional): Mallin painotiedosto. Oletus 'best.pt'.
+        device (str, optional): Laite. Oletus valitaan automaattisesti.
+        batch_size (int, optional): Mallille kerralla annettavien kuvien määrä. Oletus 8.
+        workers (int, optional): Purkusäikeiden määrä. Oletus 4.
+        iou (float, optional): NMS:n IoU-kynnys. Oletus 0.4.
+        conf (float, optional): Luottamuskynnys. Oletus 0.4.
+        imgsz (int, optional): Mallin syötekoko. Oletus mallin oma.
+        save_images (str, optional): Hakemisto annotoiduille kuville. Oletus None.
+        resume (bool, optional): Ohitetaanko tulosteessa jo olevat kuvat. Kuvista,
+            joilla on jo virhetietue, ei kirjoiteta uutta virhetietuetta. Oletus False.
+        recursive (bool, optional): Käydäänkö alihakemistot läpi. Oletus False.
+        trace_dir (str, optional): Hakemisto kuvakohtaisille päätösjäljille. Oletus None.
+        store (str, optional): SQLite-kartoitusvarasto, johon tulokset lisätään erissä.
+            Oletus None.
+        site (str, optional): Varastoon tallennettava kohde. Oletus None.
+        location (str, optional): Varastoon tallennettava sijainti (esim. kerros). Oletus None.
+        model (callable, optional): Valmis inferenssitausta (esim. mittauksiin).
+            Oletus get_model(weights, device).
+        output_format (str, optional): Tietueiden muoto (compact, orjson, table
+            tai msgpack). Oletus 'compact'.
+
+    Returns:
+        dict: Ajon tilastot (kuvamäärät, kuvaa/s ja vaiheiden ajat).
+    """
+    model = model or get_model(weights, device)
+    timer = StageTimer()
+
+    errors = set()
+    done = load_done_paths(output_path, output_format, errors) if resume else set()
+    counters = {"skipped": 0}
+    paths = iter_pending(source, recursive, done, counters)
+
+    if save_images:
+        os.makedirs(save_images, exist_ok=True)
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+
+    # Rajatut jonot pitävät muistissa vain muutaman erän kuvat kerrallaan
+    path_queue = queue.Queue(maxsize=batch_size * 4)
+    image_queue = queue.Queue(maxsize=batch_size * 2)
+    decoders = [
+        threading.Thread(target=_decode_worker, args=(path_queue, image_queue, timer), daemon=True)
+        for _ in range(workers)
+    ]
+    feeder = threading.Thread(target=_feed_paths, args=(paths, path_queue, workers), daemon=True)
+    for thread in decoders:
+        thread.start()
+    feeder.start()
+
+    predict_kwargs = {"iou": iou, "conf": conf, "verbose": False}
+    if imgsz:
+        predict_kwargs["imgsz"] = imgsz
+
+    survey_store = SurveyStore(store) if store else None
+
+    processed = 0
+    failed = 0
+    run_start = time.perf_counter()
+
+    # Jatkettaessa edellisen ajon katkennut viimeinen tietue poistetaan
+    with RecordWriter(output_path, output_format, append=resume) as out:
+        for batch in _iter_batches(image_queue, batch_size, workers):
+            records = []
+            valid = [(path, image) for path, image in batch if image is not None]
+            for path, image in batch:
+                if image is None:
+                    failed += 1
+                    if path not in errors:
+                        records.append({"image": path, "error": "kuvan lukeminen epäonnistui"})
+
+            if valid:
+                start = time.perf_counter()
+                results = model([image for _, image in valid], **predict_kwargs)
+                timer.add("inference", time.perf_counter() - start, len(valid))
+                record_model_speed(results)
+
+                start = time.perf_counter()
+                for (path, image), result in zip(valid, results):
+                    trace = DecisionTrace(label=path) if trace_dir else None
+                    if save_images:
+                        # Purettu BGR-kuva on tämän silmukan oma, joten piirretään suoraan siihen
+                        annotated, output_dict = draw_bboxes(
+                            image, [result], trace=trace, color_order=BGR, inplace=True,
+                            output_format=None,
+                        )
+                        cv2.imwrite(output_file(save_images, path, source, ".jpg"), annotated)
+                    else:
+                        with span("extract_boxes"):
+                            detections = Detections.from_results([result])
+                            ports, stacks = detections.ports, detections.stacks
+                        record_counts(
+                            ports=len(ports), stacks=len(stacks),
+                            switches=len(detections.switches), image_shape=image.shape,
+                        )
+                        with span("generate_switch_json"):
+                            output_dict = generate_switch_json(
+                                stacks, ports, detections.switches, trace=trace
+                            )
+                    if trace is not None:
+                        trace.dump(output_file(trace_dir, path, source, ".trace.json"))
+                    increment("portvision_images_total", entry="batch")
+                    height, width = image.shape[:2]
+                    records.append({"image": path, "width": width, "height": height, **output_dict})
+                    processed += 1
+                timer.add("postprocess", time.perf_counter() - start, len(valid))
+
+            start = time.perf_counter()
+            with span("serialize"):
+                for record in records:
+                    out.write(record)
+            out.flush()
+            if survey_store is not None:
+                survey_store.ingest_many(records, site=site, location=location)
+            timer.add("write", time.perf_counter() - start, len(records))
+
+    if survey_store is not None:
+        survey_store.close()
+
+    elapsed = time.perf_counter() - run_start
+    return {
+        "processed": processed,
+        "failed": failed,
+        "skipped": counters["skipped"],
+        "elapsed_seconds": elapsed,
+        "images_per_second": processed / elapsed if elapsed > 0 else 0.0,
+        "stages": timer.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PortVision-eräajo kuvajoukolle.")
+    parser.add_argument("source", help="Hakemisto, glob-hahmo tai manifestitiedosto")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="Tulostetiedosto")
+    parser.add_argument(
+        "--output-format", default="compact", choices=["compact", "orjson", "table", "msgpack"],
+        help="Tietueiden muoto (msgpack vaatii paketin msgpack, orjson paketin orjson)",
+    )
+    parser.add_argument("--weights", default="best.pt", help="Mallin painotiedosto")
+    parser.add_argument("--device", default=None, help="Laite (esim. cpu tai cuda:0)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Eräkoko")
+    parser.add_argument("--workers", type=int, default=4, help="Purkusäikeiden määrä")
+    parser.add_argument("--iou", type=float, default=0.4, help="NMS:n IoU-kynnys")
+    parser.add_argument("--conf", type=float, default=0.4, help="Luottamuskynnys")
+    parser.add_argument("--imgsz", type=int, default=None, help="Mallin syötekoko")
+    parser.add_argument("--save-images", default=None, help="Hakemisto annotoiduille kuville")
+    parser.add_argument("--resume", action="store_true", help="Jatka keskeytynyttä ajoa")
+    parser.add_argument("--recursive", action="store_true", help="Käy alihakemistot läpi")
+
+    parser.add_argument("--trace-dir", default=None, help="Hakemisto porttinumeroinnin päätösjäljille")
+    parser.add_argument("--store", default=None, help="Lisää tulokset SQLite-kartoitusvarastoon")
+    parser.add_argument("--site", default=None, help="Varastoon tallennettava kohde")
+    parser.add_argument("--location", default=None, help="Varastoon tallennettava sijainti (esim. kerros)")
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Aja jälkikäsittely erillisissä prosesseissa inferenssin rinnalla",
+    )
+    parser.add_argument(
+        "--postprocess-workers", type=int, default=None,
+        help="Jälkikäsittelyprosessien määrä --pipeline-tilassa (oletus ytimet - 1)",
+    )
+    parser.add_argument(
+        "--metrics-output", default=None,
+        help="Tallenna vaiheiden viivejakaumat (JSON tai .prom)",
+    )
+    args = parser.parse_args()
+
+    common = dict(
+        weights=args.weights,
+        device=args.device,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        iou=args.iou,
+        conf=args.conf,
+        imgsz=args.imgsz,
+        save_images=args.save_images,
+        resume=args.resume,
+        recursive=args.recursive,
+        trace_dir=args.trace_dir,
+        output_format=args.output_format,
+    )
+    if args.pipeline:
+        if args.store:
+            parser.error("--store ei ole käytettävissä --pipeline-tilassa")
+        from pipeline import run_pipeline
+
+        stats = run_pipeline(
+            args.source, args.output, postprocess_workers=args.postprocess_workers, **common
+        )
+    else:
+        stats = run_batch(
+            args.source, args.output, store=args.store, site=args.site, location=args.location,
+            **common
+        )
+
+    print(
+        f"\nKäsitelty {stats['processed']} kuvaa ({stats['failed']} virhettä, "
+        f"{stats['skipped']} ohitettu) ajassa {stats['elapsed_seconds']:.1f} s "
+        f"= {stats['images_per_second']:.2f} kuvaa/s"
+    )
+    for stage, values in stats["stages"].items():
+        print(f"  {stage:<12} {values['total_seconds']:8.2f} s  {values['per_image_ms']:8.1f} ms/kuva")
+    if args.metrics_output:
+        metrics.write(args.metrics_output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+"""PortVisionin suorituskykymittaukset.
+
+Mittaukset ajetaan repositorion juuresta moduuleina, esim.:
+    python -m benchmarks.bench_assignment
+"""
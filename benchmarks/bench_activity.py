@@ -0,0 +1,111 @@
+"""Mittaa linkkivaloanalyysin keston, muistin ja tarkkuuden synteettisellä videolla.
+
+Telineen portit (benchmarks.synthetic) piirretään tummiksi laatikoiksi, ja
+kunkin portin yläkulmaan piirretään vihreä LED, joka vilkkuu satunnaisella
+taajuudella (--hz), palaa tasaisesti tai on sammunut. Osaan porteista
+lisätään valkoinen tarra LED-alueelle, jonka ei pidä näkyä aktiivisuutena.
+Ruudut syötetään LinkActivityMonitorille kuten video_stream.py tekee.
+
+Tulostetaan ruutukohtainen kesto (näytteistys ja analyysi erikseen),
+rengaspuskurien koko (vakio tallenteen pituudesta riippumatta), tilojen
+osuma nimiöitä vastaan sekä vilkkumistaajuuden keskimääräinen virhe.
+
+Ajo:
+    python -m benchmarks.bench_activity --scenario medium --frames 300 --fps 30
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import SCENARIOS, synthetic_detections
+from link_activity import LinkActivityMonitor
+
+LED_ON = (30, 210, 60)      # BGR
+LED_OFF = (25, 45, 30)
+STICKER = (235, 235, 235)
+
+
+def build_scene(width, height, scenario, hz_choices, seed=0):
+    """
+    Piirtää telineen pohjakuvan ja arpoo porttien LED-käyttäytymisen.
+
+    Returns:
+        tuple: (pohjakuva, porttien laatikot, LED-alueet, tilat, taajuudet, vaiheet)
+    """
+    rng = np.random.default_rng(seed)
+    xyxy, _, cls = synthetic_detections(width=width, height=height, seed=seed, **SCENARIOS[scenario])
+    ports = xyxy[np.isin(cls, (0, 1))]
+    frame = np.full((height, width, 3), 90, dtype=np.uint8)
+    for x1, y1, x2, y2 in ports.astype(int).tolist():
+        frame[y1:y2, x1:x2] = 30
+
+    sizes = ports[:, 2:] - ports[:, :2]
+    leds = np.concatenate((
+        ports[:, :2] + sizes * (0.1, 0.04), ports[:, :2] + sizes * (0.25, 0.15),
+    ), axis=1).astype(int)
+    # Tarra portin yläreunan oikeaan laitaan LED-alueelle
+    for (x1, y1, _, _), (w, h), sticker in zip(ports, sizes, rng.random(len(ports)) < 0.3):
+        if sticker:
+            frame[int(y1 + 0.02 * h):int(y1 + 0.16 * h), int(x1 + 0.55 * w):int(x1 + 0.9 * w)] = STICKER
+
+    states = rng.choice(["blinking", "on", "off"], size=len(ports), p=(0.5, 0.25, 0.25))
+    hz = np.where(states == "blinking", rng.choice(hz_choices, size=len(ports)), 0.0)
+    phases = rng.random(len(ports))
+    return frame, ports, leds, states, hz, phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution", default="1920x1080")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="medium")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--window", type=int, default=64)
+    parser.add_argument("--hz", type=float, nargs="+", default=[1.0, 2.0, 3.0, 5.0])
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    base, ports, leds, states, hz, phases = build_scene(width, height, args.scenario, args.hz)
+    monitor = LinkActivityMonitor(
+        capacity=len(ports), window=args.window, fps=args.fps, interval=10**9,
+    )
+    keys = list(range(len(ports)))
+    frame = base.copy()
+
+    update_ms, analyze_ms = [], []
+    for index in range(args.frames):
+        t = index / args.fps
+        lit = np.where(states == "blinking", (t * hz + phases) % 1.0 < 0.5, states == "on")
+        for (x1, y1, x2, y2), on in zip(leds.tolist(), lit.tolist()):
+            frame[y1:y2, x1:x2] = LED_ON if on else LED_OFF
+
+        start = time.perf_counter()
+        monitor.update(frame, ports, keys, t)
+        update_ms.append((time.perf_counter() - start) * 1000.0)
+        if (index + 1) % 8 == 0:
+            start = time.perf_counter()
+            activity = monitor.analyze()
+            analyze_ms.append((time.perf_counter() - start) * 1000.0)
+
+    estimated = np.array([activity[key]["state"] for key in keys])
+    estimated_hz = np.array([activity[key]["blink_hz"] for key in keys])
+    blinking = states == "blinking"
+    print(
+        f"{len(ports)} porttia, {args.frames} ruutua {args.resolution} @ {args.fps:g} fps, "
+        f"ikkuna {args.window} ruutua, puskurit {monitor.nbytes / 2**20:.2f} MB\n"
+    )
+    print(f"näytteistys   {np.median(update_ms):>7.3f} ms/ruutu (p95 {np.percentile(update_ms, 95):.3f})")
+    print(f"analyysi      {np.median(analyze_ms):>7.3f} ms/ajo   (p95 {np.percentile(analyze_ms, 95):.3f})")
+    print(f"\n{'tila':<9} {'portit':>7} {'osuma':>7}")
+    for state in ("blinking", "on", "off"):
+        mask = states == state
+        print(f"{state:<9} {int(mask.sum()):>7} {np.mean(estimated[mask] == state) if mask.any() else 0:>7.1%}")
+    if blinking.any():
+        error = np.abs(estimated_hz[blinking] - hz[blinking])
+        print(f"\nvilkkumistaajuuden virhe: keskiarvo {error.mean():.2f} Hz, suurin {error.max():.2f} Hz")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Mittaa porttien ja porttipinojen yhdistämisen nopeuden.
+
+Vertaa alkuperäistä sisäkkäistä is_inside-silmukkaa (portit × stackit
+Python-kutsua) helpers.containment_matrix-funktion broadcast-laskentaan.
+
+Ajo:
+    python -m benchmarks.bench_assignment
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from helpers import containment_matrix, is_inside
+
+
+def make_boxes(num_ports, ports_per_stack=48, seed=0):
+    """
+    Luo synteettiset portti- ja stack-laatikot (48 porttia kahdessa rivissä per stack).
+
+    Returns:
+        tuple: (port_boxes, stack_boxes) float32-taulukkoina.
+    """
+    rng = np.random.default_rng(seed)
+    num_stacks = max(1, -(-num_ports // ports_per_stack))
+    stack_boxes = []
+    port_boxes = []
+    for s in range(num_stacks):
+        y0 = 100.0 + s * 150.0
+        stack_boxes.append([50.0, y0, 50.0 + 24 * 50.0, y0 + 110.0])
+    for p in range(num_ports):
+        s, i = divmod(p, ports_per_stack)
+        col, row = divmod(i, 2)
+        x = 55.0 + col * 50.0 + rng.uniform(-2, 2)
+        y = 105.0 + s * 150.0 + row * 52.0 + rng.uniform(-2, 2)
+        port_boxes.append([x, y, x + 40.0, y + 45.0])
+    return np.asarray(port_boxes, np.float32), np.asarray(stack_boxes, np.float32)
+
+
+def loop_assignment(port_boxes, stack_boxes):
+    """Alkuperäinen toteutus: is_inside jokaiselle portti-stack-parille."""
+    return [
+        [is_inside(port_box, stack_box) for stack_box in stack_boxes]
+        for port_box in port_boxes
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'portit':>8} {'stackit':>8} {'silmukka ms':>12} {'numpy ms':>10} {'nopeutus':>9}")
+    for size in args.sizes:
+        port_boxes, stack_boxes = make_boxes(size)
+        # Varmista, että tulokset ovat täsmälleen samat
+        expected = np.array(loop_assignment(port_boxes, stack_boxes), dtype=bool)
+        assert (containment_matrix(port_boxes, stack_boxes) == expected).all()
+
+        number = max(1, 2000 // size)
+        loop_s = min(timeit.repeat(
+            lambda: loop_assignment(port_boxes, stack_boxes), number=number, repeat=args.repeat
+        )) / number
+        numpy_s = min(timeit.repeat(
+            lambda: containment_matrix(port_boxes, stack_boxes), number=number, repeat=args.repeat
+        )) / number
+        print(
+            f"{size:>8} {len(stack_boxes):>8} {loop_s * 1000:>12.3f} "
+            f"{numpy_s * 1000:>10.3f} {loop_s / numpy_s:>8.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
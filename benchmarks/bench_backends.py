@@ -0,0 +1,159 @@
+"""Vertaa inferenssitaustojen tuloksia ja viivettä CPU:lla.
+
+Jokainen tausta (torch, onnxruntime, openvino) ajetaan samoille kuville.
+Pariteettitarkistus vertaa taustojen tunnistuksia torch-taustan tuloksiin:
+laatikot yhdistetään luokittain IoU:n perusteella, ja tarkistus epäonnistuu,
+jos yhdistettyjen laatikoiden osuus jää alle kynnyksen. Lopuksi tulostetaan
+viivetaulukko (keskiarvo, p50, p95) kuvaa kohden.
+
+Ajo:
+    python -m benchmarks.bench_backends --images valid/images --pt best.pt --onnx best.onnx --threads 4
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from backends import create_backend, DEFAULT_CONFIG
+from tracking import greedy_match, iou_matrix
+
+
+def load_images(pattern, limit):
+    """Lataa kuvat RGB-muodossa glob-hahmosta tai hakemistosta."""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    images = []
+    for path in sorted(glob.glob(pattern))[:limit]:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    return images
+
+
+def to_arrays(result):
+    """Palauttaa tuloksen laatikot, luottamusarvot ja luokat NumPy-taulukkoina."""
+    return (
+        result.boxes.xyxy.cpu().numpy(),
+        result.boxes.conf.cpu().numpy(),
+        result.boxes.cls.cpu().numpy().astype(np.int64),
+    )
+
+
+def compare(reference, candidate, iou_threshold=0.9):
+    """
+    Vertaa kahden taustan tunnistuksia luokittain.
+
+    Returns:
+        dict: Yhdistettyjen laatikoiden määrä, molempien kokonaismäärät ja
+            suurin luottamusarvojen ero yhdistetyissä pareissa.
+    """
+    ref_boxes, ref_conf, ref_cls = reference
+    cand_boxes, cand_conf, cand_cls = candidate
+    matched = 0
+    max_conf_diff = 0.0
+    for class_id in np.union1d(ref_cls, cand_cls):
+        r = np.flatnonzero(ref_cls == class_id)
+        c = np.flatnonzero(cand_cls == class_id)
+        pairs = greedy_match(iou_matrix(ref_boxes[r], cand_boxes[c]), iou_threshold)
+        matched += len(pairs)
+        for i, j in pairs:
+            max_conf_diff = max(max_conf_diff, abs(float(ref_conf[r[i]]) - float(cand_conf[c[j]])))
+    return {
+        "matched": matched,
+        "reference": len(ref_boxes),
+        "candidate": len(cand_boxes),
+        "max_conf_diff": max_conf_diff,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", default=None, help="Kuvahakemisto tai glob (oletus: synteettinen kuva)")
+    parser.add_argument("--limit", type=int, default=20, help="Kuvien enimmäismäärä")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnxruntime", "openvino"])
+    parser.add_argument("--pt", default="best.pt", help="torch-taustan painot")
+    parser.add_argument("--onnx", default="best.onnx", help="onnxruntime/openvino-taustojen malli")
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_CONFIG["imgsz"])
+    parser.add_argument("--threads", type=int, default=0, help="intra_op_threads")
+    parser.add_argument("--inter-threads", type=int, default=0, help="inter_op_threads")
+    parser.add_argument("--iou", type=float, default=DEFAULT_CONFIG["iou"])
+    parser.add_argument("--conf", type=float, default=DEFAULT_CONFIG["conf"])
+    parser.add_argument("--repeat", type=int, default=3, help="Ajokerrat kuvaa kohden")
+    parser.add_argument("--min-match", type=float, default=0.95, help="Pariteetin vähimmäisosuus")
+    args = parser.parse_args()
+
+    if args.images:
+        images = load_images(args.images, args.limit)
+    else:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (3000, 4000, 3), dtype=np.uint8)]
+    if not images:
+        sys.exit(f"Kuvia ei löytynyt: {args.images}")
+
+    outputs = {}
+    latencies = {}
+    for name in args.backends:
+        config = dict(
+            DEFAULT_CONFIG,
+            backend=name,
+            weights=args.pt if name == "torch" else args.onnx,
+            imgsz=args.imgsz,
+            intra_op_threads=args.threads,
+            inter_op_threads=args.inter_threads,
+        )
+        try:
+            backend = create_backend(config)
+            backend.warmup()
+        except (ImportError, FileNotFoundError, OSError) as e:
+            print(f"{name}: ohitettu ({e})")
+            continue
+
+        times = []
+        results = []
+        for image in images:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = backend(image, iou=args.iou, conf=args.conf)[0]
+                times.append(1000.0 * (time.perf_counter() - start))
+            results.append(to_arrays(result))
+        outputs[name] = results
+        latencies[name] = np.asarray(times)
+
+    print(f"\n{'tausta':<12} {'ka ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, times in latencies.items():
+        print(
+            f"{name:<12} {times.mean():>8.1f} {np.percentile(times, 50):>8.1f} "
+            f"{np.percentile(times, 95):>8.1f}"
+        )
+
+    reference_name = "torch" if "torch" in outputs else next(iter(outputs), None)
+    failed = False
+    for name, results in outputs.items():
+        if name == reference_name:
+            continue
+        totals = {"matched": 0, "reference": 0, "candidate": 0, "max_conf_diff": 0.0}
+        for reference, candidate in zip(outputs[reference_name], results):
+            stats = compare(reference, candidate)
+            for key in ("matched", "reference", "candidate"):
+                totals[key] += stats[key]
+            totals["max_conf_diff"] = max(totals["max_conf_diff"], stats["max_conf_diff"])
+        denominator = max(totals["reference"], totals["candidate"], 1)
+        ratio = totals["matched"] / denominator
+        ok = ratio >= args.min_match
+        failed |= not ok
+        print(
+            f"\nPariteetti {name} vs {reference_name}: {totals['matched']}/{denominator} "
+            f"laatikkoa yhdistetty ({ratio:.1%}), suurin luottamusero "
+            f"{totals['max_conf_diff']:.3f} -> {'OK' if ok else 'EPÄONNISTUI'}"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Vertaa kaskadi-inferenssiä yhden ajon ja viipaloidun inferenssin kanssa.
+
+Mittaus ei tarvitse mallia: synteettinen teline piirretään värikoodattuna
+laitekaappikuvan osaan (kytkin, pino, kaapeloitu portti ja tyhjä portti
+omilla väreillään), ja RenderedRackBackend "tunnistaa" ne pikseleistä samalla
+tavalla kuin malli näkisi ne: syöte skaalataan mallin syötekokoon
+(backends.letterbox), kunkin luokan värialueet erotetaan yhtenäisiksi alueiksi ja
+alle --min-px pikselin kohteet jäävät löytymättä. Pienillä porteilla saanti
+siis putoaa syötekoon mukana kuten oikeallakin mallilla. Mallin laskenta-aika
+simuloidaan --model-ms-viiveellä syötekuvaa kohden (skaalattuna syötekoon
+neliöllä).
+
+Kullekin tavalle tulostetaan mediaaniviive, mallin syötekuvien määrä, porttien
+saanti nimiöitä vasten sekä yhden ajon porttien saanti (kuinka suuren osan
+yhden ajon löytämistä porteista tapa löytää myös; "-", jos yksi ajo ei
+löytänyt portteja).
+
+Ajo:
+    python -m benchmarks.bench_cascade --resolution 6000x4000 --rack-area 0.3 --scenario rack
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from backends import BackendResult, letterbox
+from benchmarks.synthetic import SCENARIOS, synthetic_detections, synthetic_image
+from cascade import cascade_predict
+from evaluation import box_recall
+from image_buffer import BGR
+from tiling import sliced_predict
+
+# Luokkien värit (RGB): Cable, LAN-portti, LAN-porttipino, kytkin
+CLASS_COLORS = {0: (40, 170, 40), 1: (240, 200, 30), 2: (210, 210, 210), 3: (70, 70, 160)}
+# Luokan maski sisältää myös sen sisällä olevien luokkien värit
+MASK_CLASSES = {0: (0,), 1: (1,), 2: (0, 1, 2), 3: (0, 1, 2, 3)}
+
+
+def render_rack(width, height, rack_area, seed=0, **layout):
+    """
+    Piirtää värikoodatun telineen laitekaappikuvan keskelle.
+
+    Args:
+        rack_area (float): Telineen osuus kuvan leveydestä ja korkeudesta.
+
+    Returns:
+        tuple: (RGB-kuva, nimiölaatikot (N, 4), nimiöluokat (N,))
+    """
+    rack_w, rack_h = int(width * rack_area), int(height * min(1.0, rack_area * 2.5))
+    x0, y0 = (width - rack_w) // 2, (height - rack_h) // 2
+    xyxy, _, cls = synthetic_detections(width=rack_w, height=rack_h, seed=seed, **layout)
+    xyxy = xyxy + np.array([x0, y0, x0, y0], dtype=np.float32)
+    image = synthetic_image(width, height, seed=seed)
+    for class_id in (3, 2, 1, 0):
+        for x1, y1, x2, y2 in xyxy[cls == class_id].astype(int).tolist():
+            image[y1:y2, x1:x2] = CLASS_COLORS[class_id]
+    return image, xyxy, cls
+
+
+class RenderedRackBackend:
+    """
+    Tynkätausta, joka tunnistaa render_rack-kuvan kohteet väreistä mallin syötekoossa.
+
+    Args:
+        imgsz (int): Mallin syötekoko.
+        model_ms (float): Simuloitu mallin kesto syötekuvaa kohden koolla 1216.
+        min_px (int): Pienin tunnistettava kohde syötekoossa pikseleinä.
+        tolerance (int): Värien sallittu poikkeama kanavaa kohden.
+    """
+
+    name = "rendered"
+
+    def __init__(self, imgsz=1216, model_ms=25.0, min_px=8, tolerance=40):
+        self.imgsz = imgsz
+        self.model_ms = model_ms
+        self.min_px = min_px
+        self.tolerance = tolerance
+        self.inputs = 0
+
+    def _detect(self, image):
+        padded, gain, (pad_x, pad_y) = letterbox(image, self.imgsz)
+        near = {
+            class_id: cv2.inRange(
+                padded,
+                tuple(max(0, c - self.tolerance) for c in color),
+                tuple(min(255, c + self.tolerance) for c in color),
+            )
+            for class_id, color in CLASS_COLORS.items()
+        }
+        boxes, classes = [], []
+        for class_id, members in MASK_CLASSES.items():
+            mask = near[members[0]].copy()
+            for member in members[1:]:
+                cv2.bitwise_or(mask, near[member], dst=mask)
+            if len(members) > 1:
+                # Skaalauksen sekoittamat reunapikselit eivät saa katkaista pinoa tai kytkintä
+                cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8), dst=mask)
+            count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=4)
+            for x, y, w, h, _ in stats[1:count].tolist():
+                if w >= self.min_px and h >= self.min_px:
+                    boxes.append([x, y, x + w, y + h])
+                    classes.append(class_id)
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad_x) / gain
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad_y) / gain
+        return BackendResult(boxes, np.full(len(boxes), 0.9, np.float32), classes, image.shape[:2])
+
+    def __call__(self, images, iou=0.4, conf=0.4, color_order="RGB"):
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        if color_order == BGR:
+            images = [np.ascontiguousarray(image[..., ::-1]) for image in images]
+        self.inputs += len(images)
+        time.sleep(self.model_ms / 1000.0 * (self.imgsz / 1216) ** 2 * len(images))
+        return [self._detect(np.asarray(image)) for image in images]
+
+
+def ports_of(result):
+    boxes = result.boxes.xyxy.cpu().numpy()
+    scores = result.boxes.conf.cpu().numpy()
+    ports = np.isin(result.boxes.cls.cpu().numpy(), (0, 1))
+    return boxes[ports], scores[ports]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution", default="6000x4000")
+    parser.add_argument("--rack-area", type=float, default=0.3, help="Telineen osuus kuvan leveydestä")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="rack")
+    parser.add_argument("--imgsz", type=int, default=1216)
+    parser.add_argument("--coarse-imgsz", type=int, default=640)
+    parser.add_argument("--model-ms", type=float, default=25.0)
+    parser.add_argument("--min-px", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    image, gt_boxes, gt_classes = render_rack(width, height, args.rack_area, **SCENARIOS[args.scenario])
+    gt_ports = gt_boxes[np.isin(gt_classes, (0, 1))]
+    fine = RenderedRackBackend(args.imgsz, args.model_ms, args.min_px)
+    coarse = RenderedRackBackend(args.coarse_imgsz, args.model_ms, args.min_px)
+
+    methods = {
+        "yksi ajo": lambda: fine(image)[0],
+        "viipaloitu": lambda: sliced_predict(fine, image, tile_size=args.imgsz),
+        "kaskadi": lambda: cascade_predict(fine, image, coarse_backend=coarse, tile_size=args.imgsz),
+    }
+    single_ports = None
+    print(
+        f"Kuva {args.resolution}, teline {args.rack_area:.0%} leveydestä, "
+        f"{len(gt_ports)} porttia, skenaario {args.scenario}\n"
+    )
+    print(
+        f"{'tapa':<12} {'ms':>8} {'syötteet':>9} {'portit':>7} {'saanti':>7} "
+        f"{'yhden ajon saanti':>18} {'pinot':>6} {'kytkimet':>9}"
+    )
+    for name, method in methods.items():
+        samples = []
+        for _ in range(args.repeat):
+            fine.inputs = coarse.inputs = 0
+            start = time.perf_counter()
+            result = method()
+            samples.append((time.perf_counter() - start) * 1000.0)
+        boxes, scores = ports_of(result)
+        if single_ports is None:
+            single_ports = boxes
+        agreement = (
+            f"{box_recall(boxes, scores, single_ports):>18.1%}" if len(single_ports) else f"{'-':>18}"
+        )
+        classes = result.boxes.cls.cpu().numpy()
+        print(
+            f"{name:<12} {np.median(samples):>8.1f} {fine.inputs + coarse.inputs:>9} {len(boxes):>7} "
+            f"{box_recall(boxes, scores, gt_ports):>7.1%} {agreement} "
+            f"{int((classes == 2).sum()):>6} {int((classes == 3).sum()):>9}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Vertaa kuvien lukunopeutta sirpalevälimuistista ja nykyisellä purkupolulla.
+
+Nykyinen polku vastaa ultralyticsin load_image-metodia ilman välimuistia
+(cv2.imread ja pidemmän sivun skaalaus imgsz:ään) ja sirpalepolku
+ShardCache.image-näkymää, josta tehdään yhtenäinen kopio kuten augmentointi
+tekisi. Kumpikin ajetaan yhdellä säikeellä ja --workers säikeellä; lisäksi
+tulostetaan välimuistin rakennusaika ja levykoko.
+
+Ilman --data-argumenttia mitataan synteettisillä JPEG-kuvilla.
+
+Ajo:
+    python -m benchmarks.bench_dataset --data data.yaml --split val --workers 8
+"""
+
+import argparse
+import math
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import synthetic_image
+from dataset import load_data_config, resolve_split_dir
+from shard_cache import build_cache
+
+
+def decode_resize(path, imgsz):
+    """Nykyinen polku: purku ja pidemmän sivun skaalaus (ultralytics load_image)."""
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    height, width = image.shape[:2]
+    ratio = imgsz / max(height, width)
+    if ratio != 1:
+        size = (min(math.ceil(width * ratio), imgsz), min(math.ceil(height * ratio), imgsz))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+    return image
+
+
+def throughput(function, count, workers):
+    """Palauttaa kuvaa/s, kun function(i) ajetaan kaikille kuville."""
+    start = time.perf_counter()
+    if workers <= 1:
+        for i in range(count):
+            function(i)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(function, range(count)))
+    return count / (time.perf_counter() - start)
+
+
+def synthetic_split(directory, count, width, height):
+    """Kirjoittaa synteettiset kuvat ja tyhjät nimiöt hakemistoon."""
+    images = os.path.join(directory, "images")
+    labels = os.path.join(directory, "labels")
+    os.makedirs(images)
+    os.makedirs(labels)
+    for i in range(count):
+        image = cv2.cvtColor(synthetic_image(width, height, seed=i), cv2.COLOR_RGB2BGR)
+        cv2.imwrite(os.path.join(images, f"{i:04d}.jpg"), image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        open(os.path.join(labels, f"{i:04d}.txt"), 'w').close()
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default=None, help="data.yaml (oletus: synteettiset kuvat)")
+    parser.add_argument("--split", default="val")
+    parser.add_argument("--imgsz", type=int, default=1216)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=None, help="Mitattavien kuvien enimmäismäärä")
+    parser.add_argument("--synthetic", type=int, default=48, help="Synteettisten kuvien määrä")
+    parser.add_argument("--size", default="4032x3024", help="Synteettisten kuvien koko")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="portvision-shards-")
+    try:
+        if args.data:
+            image_dir = resolve_split_dir(load_data_config(args.data), args.split)
+        else:
+            width, height = map(int, args.size.split("x"))
+            image_dir = synthetic_split(os.path.join(workdir, "split"), args.synthetic, width, height)
+
+        start = time.perf_counter()
+        cache = build_cache(image_dir, args.imgsz, os.path.join(workdir, "cache"), args.workers)
+        build_seconds = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(cache.directory, n)) for n in os.listdir(cache.directory))
+        count = min(len(cache), args.limit or len(cache))
+        print(f"{count} kuvaa, imgsz {args.imgsz}: rakennus {build_seconds:.1f} s, {size / 2**20:.0f} MB")
+
+        paths = cache.paths
+        rows = []
+        for workers in sorted({1, args.workers}):
+            current = throughput(lambda i: decode_resize(paths[i], args.imgsz), count, workers)
+            shards = throughput(lambda i: np.ascontiguousarray(cache.image(i)[0]), count, workers)
+            rows.append((workers, current, shards))
+
+        print(f"\n{'säikeet':>8} {'nykyinen kuvaa/s':>17} {'sirpaleet kuvaa/s':>18} {'nopeutus':>9}")
+        for workers, current, shards in rows:
+            print(f"{workers:>8} {current:>17.1f} {shards:>18.1f} {shards / current:>8.1f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Mittaa kytkin–stack–portti-hierarkian skaalautumisen telineen koon mukaan.
+
+Vertailukohtana on aiempi ryhmittely: stackit järjestetään y1:n mukaan, uusi
+kytkin alkaa 500 pikselin kynnyksellä ja portit yhdistetään stackeihin
+täydellä containment_matrix-vertailulla (portit × stackit). Kullekin
+kytkinmäärälle ja resoluutiolle tulostetaan molempien viive sekä
+tunnistettujen kytkinten määrä, josta näkyy kiinteän kynnyksen
+resoluutioriippuvuus.
+
+Ajo:
+    python -m benchmarks.bench_hierarchy --switches 1 5 10 20 40 --resolutions 1920x1080 3840x2160
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_detections
+from detections import Detections
+from helpers import containment_matrix
+from json_generator import generate_switch_json
+from spatial_index import SwitchHierarchy
+
+
+def threshold_grouping(stacks, ports, switch_threshold=500):
+    """Aiempi toteutus: y1-järjestys, kiinteä kynnys ja täysi containment-matriisi."""
+    containment = containment_matrix(ports.xyxy, stacks.xyxy)
+    order = stacks.order_by("y1")
+    switches, start = 1, int(stacks.xyxy[order[0], 1]) if len(order) else 0
+    for y1 in stacks.xyxy[order, 1].astype(int).tolist():
+        if y1 > start + switch_threshold:
+            switches += 1
+            start = y1
+    return switches, containment
+
+
+def median_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--switches", type=int, nargs="+", default=[1, 5, 10, 20, 40])
+    parser.add_argument("--stacks-per-switch", type=int, default=4)
+    parser.add_argument("--ports-per-stack", type=int, default=12)
+    parser.add_argument("--resolutions", nargs="+", default=["1920x1080", "3840x2160", "7680x4320"])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{'kytkimet':>8} {'resoluutio':>10} {'portit':>7} {'kynnys ms':>10} {'hierarkia ms':>13} "
+        f"{'JSON ms':>8} {'kytk. (kynnys)':>15} {'kytk. (hierarkia)':>18}"
+    )
+    for num_switches in args.switches:
+        for resolution in args.resolutions:
+            width, height = map(int, resolution.split("x"))
+            detections = Detections(*synthetic_detections(
+                num_switches=num_switches, stacks_per_switch=args.stacks_per_switch,
+                ports_per_stack=args.ports_per_stack, width=width, height=height,
+            ))
+            stacks, ports, switches = detections.stacks, detections.ports, detections.switches
+            baseline_switches = threshold_grouping(stacks, ports)[0]
+            hierarchy = SwitchHierarchy.build(stacks, ports, switches)
+            baseline_ms = median_ms(lambda: threshold_grouping(stacks, ports), args.repeat)
+            hierarchy_ms = median_ms(lambda: SwitchHierarchy.build(stacks, ports, switches), args.repeat)
+            json_ms = median_ms(lambda: generate_switch_json(stacks, ports, switches), args.repeat)
+            print(
+                f"{num_switches:>8} {resolution:>10} {len(ports):>7} {baseline_ms:>10.3f} "
+                f"{hierarchy_ms:>13.3f} {json_ms:>8.2f} {baseline_switches:>15} {len(hierarchy):>18}"
+            )
+
+
+if __name__ == '__main__':
+    main()
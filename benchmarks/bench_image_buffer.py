@@ -0,0 +1,151 @@
+"""Mittaa kuvapuskurien kopiot ja muistihuipun detect.predict-polussa.
+
+Jokainen kokoonpano ajetaan tuoreessa Python-prosessissa tynkätaustalla
+(StubBackend), jotta muistihuiput eivät sekoitu. Kustakin kokoonpanosta
+tulostetaan:
+- kokonaisen kuvan kopiot kuvaa kohden vaiheittain (laskuri
+  portvision_image_copies_total, image_buffer.py),
+- NumPy-varausten huippu tracemallocilla kuvan kokoon suhteutettuna,
+- prosessin RSS-huipun kasvu ensimmäisestä kutsusta alkaen (sisältää myös
+  PIL:n varaukset, joita tracemalloc ei näe, sekä ensimmäisen kutsun
+  laiskat tuonnit kuten OpenCV:n),
+- mediaaniviive.
+
+--compare-rev ajaa saman mittauksen annetun git-version työpuussa (esim.
+ennen kuvapuskurisopimusta, jolloin predict kääri kuvan PIL-kuvaksi ja
+draw_bboxes kopioi sen np.array-kutsulla). Vanhassa versiossa kopiolaskuria
+ei ole, joten kopioiden kohdalla näytetään "-".
+
+Ajo:
+    python -m benchmarks.bench_image_buffer --resolutions 1920x1080 3840x2160 --compare-rev HEAD~1
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.bench_startup import git_worktree
+
+# Kokoonpanot: (nimi, predict-parametrit, vain JSON, BGR-syöte)
+CONFIGURATIONS = [
+    ("predict RGB (kopio)", {}, False, False),
+    ("predict RGB inplace", {"inplace": True}, False, False),
+    ("predict BGR inplace", {"inplace": True, "color_order": "BGR"}, False, True),
+    ("predict_json", {}, True, False),
+]
+
+_PROBE = """
+import json, resource, sys, time, tracemalloc
+import numpy as np
+import detect
+from benchmarks.synthetic import SCENARIOS, StubBackend, synthetic_image
+from metrics import metrics
+
+stub = StubBackend(**SCENARIOS["medium"])
+detect.get_backend = lambda config=None: stub
+image = synthetic_image({width}, {height})
+if {bgr}:
+    image = np.ascontiguousarray(image[..., ::-1])
+kwargs = {kwargs!r}
+if {json_only}:
+    function = lambda frame: detect.predict_json(frame)
+else:
+    function = lambda frame: detect.predict(frame, **kwargs)
+
+def rss_bytes():
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * resource.getpagesize()
+
+# Jokainen kierros saa oman kuvan, koska inplace-piirto muuttaa syötettä
+frames = [image.copy() for _ in range({repeat} + 1)]
+start_rss = rss_bytes()
+function(frames.pop())
+metrics.reset()
+
+samples, peaks = [], []
+for frame in frames:
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(frame)
+    samples.append(time.perf_counter() - start)
+    peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+counters = metrics.snapshot()["counters"].get("portvision_image_copies_total")
+copies = None
+if "image_buffer" in sys.modules:
+    copies = {{entry["labels"]["stage"]: entry["value"] / len(frames) for entry in counters or []}}
+print(json.dumps({{
+    "median_ms": float(np.median(samples)) * 1000.0,
+    "traced_peak": max(peaks),
+    "rss_growth": max(peak_rss - start_rss, 0),
+    "image_bytes": image.nbytes,
+    "copies": copies,
+}}))
+"""
+
+
+def measure(cwd, width, height, kwargs, json_only, bgr, repeat):
+    """Ajaa yhden kokoonpanon tuoreessa prosessissa ja palauttaa mittaukset."""
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(
+            width=width, height=height, kwargs=kwargs, json_only=json_only, bgr=bgr, repeat=repeat,
+        )],
+        cwd=cwd, capture_output=True, text=True,
+        env={**os.environ, "PYTHONPATH": cwd, "PORTVISION_METRICS": "1"},
+    )
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"error": completed.stderr.strip().splitlines()[-1:] or ["tuntematon virhe"]}
+    return json.loads(lines[-1])
+
+
+def format_row(version, resolution, name, stats):
+    if "error" in stats:
+        return f"{version:<6} {resolution:>10} {name:<22} virhe: {stats['error'][0]}"
+    copies = stats["copies"]
+    if copies is None:
+        copy_text = "-"
+    else:
+        total = sum(copies.values())
+        detail = ", ".join(f"{stage} {value:g}" for stage, value in sorted(copies.items()))
+        copy_text = f"{total:g}" + (f" ({detail})" if detail else "")
+    image_mb = stats["image_bytes"] / 2**20
+    return (
+        f"{version:<6} {resolution:>10} {name:<22} {stats['median_ms']:>8.1f} "
+        f"{stats['traced_peak'] / 2**20:>9.1f} {stats['traced_peak'] / stats['image_bytes']:>7.2f} "
+        f"{stats['rss_growth'] / 2**20:>8.1f} {image_mb:>8.1f}  {copy_text}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolutions", nargs="+", default=["1920x1080", "3840x2160"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compare-rev", default=None, help="Vertailtava git-versio (esim. HEAD~1)")
+    args = parser.parse_args()
+
+    versions = [("nyt", os.getcwd(), CONFIGURATIONS)]
+    with contextlib.ExitStack() as stack:
+        if args.compare_rev:
+            # Vanha predict ei tunne inplace- eikä color_order-parametreja
+            legacy = [c for c in CONFIGURATIONS if not c[1]]
+            versions.append(("ennen", stack.enter_context(git_worktree(args.compare_rev)), legacy))
+
+        print(
+            f"{'versio':<6} {'resoluutio':>10} {'kokoonpano':<22} {'ms':>8} {'huippu MB':>9} "
+            f"{'× kuva':>7} {'RSS MB':>8} {'kuva MB':>8}  kopiot/kuva"
+        )
+        for resolution in args.resolutions:
+            width, height = map(int, resolution.split("x"))
+            for version, cwd, configurations in versions:
+                for name, kwargs, json_only, bgr in configurations:
+                    stats = measure(cwd, width, height, kwargs, json_only, bgr, args.repeat)
+                    print(format_row(version, resolution, name, stats))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Vertaa sarjallista eräajoa (run_batch) liukuhihnaan (run_pipeline).
+
+Synteettiset JPEG-kuvat kirjoitetaan väliaikaiseen hakemistoon ja malli
+korvataan viivästetyllä StubBackend-taustalla, joka nukkuu --inference-ms
+millisekuntia kuvaa kohden (kuten GPU:lla odottava inferenssi). Molemmat
+polut ajetaan samoilla kuvilla ilman kuvien tallennusta ja sen kanssa, ja
+liukuhihnasta mitataan useita jälkikäsittelyprosessimääriä. Hyöty riippuu
+ytimien määrästä, joten se tulostetaan taulukon yläpuolelle.
+
+Ajo:
+    python -m benchmarks.bench_pipeline --images 64 --inference-ms 20 --post-workers 1 2 4
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+
+from batch_predict import run_batch
+from benchmarks.synthetic import SCENARIOS, StubBackend, synthetic_image
+from pipeline import run_pipeline
+
+
+class DelayedBackend(StubBackend):
+    """StubBackend, joka simuloi inferenssin keston ja hyväksyy predict-parametrit."""
+
+    def __init__(self, inference_ms, **layout):
+        super().__init__(**layout)
+        self.inference_ms = inference_ms
+
+    def __call__(self, images, iou=0.4, conf=0.4, **kwargs):
+        time.sleep(self.inference_ms / 1000.0 * len(images))
+        return super().__call__(images, iou=iou, conf=conf)
+
+
+def write_images(directory, count, width, height):
+    """Kirjoittaa synteettiset kuvat JPEG-tiedostoiksi."""
+    for i in range(count):
+        image = synthetic_image(width=width, height=height, seed=i % 4)
+        cv2.imwrite(os.path.join(directory, f"img_{i:04d}.jpg"), cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--resolution", default="1920x1080")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="rack")
+    parser.add_argument("--inference-ms", type=float, default=20.0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--post-workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    workdir = tempfile.mkdtemp(prefix="portvision-pipeline-")
+    try:
+        source = os.path.join(workdir, "images")
+        os.makedirs(source)
+        write_images(source, args.images, width, height)
+        output = os.path.join(workdir, "results.jsonl")
+        annotated = os.path.join(workdir, "annotated")
+        model = DelayedBackend(args.inference_ms, **SCENARIOS[args.scenario])
+
+        print(f"CPU-ytimiä: {os.cpu_count()}, kuvia: {args.images}, inferenssi {args.inference_ms:.0f} ms/kuva\n")
+        print(f"{'polku':<22} {'kuvat tallennetaan':>18} {'kuvaa/s':>9} {'nopeutus':>9}")
+        for save_images in (None, annotated):
+            shutil.rmtree(annotated, ignore_errors=True)
+            serial = run_batch(
+                source, output, batch_size=args.batch_size, save_images=save_images, model=model,
+            )["images_per_second"]
+            saved = "kyllä" if save_images else "ei"
+            print(f"{'run_batch':<22} {saved:>18} {serial:>9.1f} {1.0:>9.2f}")
+            for post_workers in args.post_workers:
+                shutil.rmtree(annotated, ignore_errors=True)
+                rate = run_pipeline(
+                    source, output, batch_size=args.batch_size, postprocess_workers=post_workers,
+                    save_images=save_images, model=model,
+                )["images_per_second"]
+                name = f"run_pipeline ({post_workers} pr.)"
+                print(f"{name:<22} {saved:>18} {rate:>9.1f} {rate / serial:>9.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
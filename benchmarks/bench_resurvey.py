@@ -0,0 +1,152 @@
+"""Vertaa inkrementaalista uudelleenkartoitusta täyteen kartoitukseen synteettisellä telineellä.
+
+Teline piirretään värikoodattuna (benchmarks.bench_cascade.render_rack), ja
+taustalle lisätään satunnaisia laatikoita, jotta kuvat voidaan kohdistaa
+piirteistä. Uutta kuvaa varten --flips porttia vaihtaa tilaa (kaapeli
+kytketään tai irrotetaan), ja kuvaa siirretään, kierretään (--shift,
+--rotate) ja sen kirkkautta muutetaan kuin se olisi otettu uudelleen käsivaralta.
+
+Täysi kartoitus ajaa viipaloidun inferenssin koko kuvalle; uudelleenkartoitus
+ajaa mallin vain muuttuneille pinoille. Tulostetaan kesto, mallin
+syötekuvien määrä, uudelleen tunnistettujen pinojen osuus, porttitilojen
+yhtäpitävyys täyden kartoituksen kanssa sekä muutoslistan osumat
+(kytketyt ja irrotetut portit) todellisiin muutoksiin verrattuna.
+
+Ajo:
+    python -m benchmarks.bench_resurvey --resolution 4000x3000 --scenario rack --flips 6
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_cascade import CLASS_COLORS, RenderedRackBackend, render_rack
+from benchmarks.synthetic import SCENARIOS
+from evaluation import port_layout, port_statuses, status_agreement
+from image_buffer import RGB
+from resurvey import Survey, port_diff, resurvey
+from tiling import sliced_predict
+
+
+def add_clutter(image, count, seed=0):
+    """Piirtää kuvaan satunnaisia laatikoita (kaapin muut laitteet ja tarrat)."""
+    rng = np.random.default_rng(seed)
+    height, width = image.shape[:2]
+    clutter = image.copy()
+    for _ in range(count):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(8, width // 20)), int(rng.integers(8, height // 20))
+        # Tummat sävyt eivät sekoitu luokkien väreihin
+        color = tuple(int(c) for c in rng.integers(0, 90, 3))
+        cv2.rectangle(clutter, (x, y), (x + w, y + h), color, -1)
+    return clutter
+
+
+def flip_ports(image, boxes, classes, count, seed=0):
+    """Vaihtaa count portin tilan ja piirtää ne uudelleen."""
+    rng = np.random.default_rng(seed)
+    classes = classes.copy()
+    ports = np.flatnonzero(np.isin(classes, (0, 1)))
+    flipped = rng.choice(ports, size=min(count, len(ports)), replace=False)
+    image = image.copy()
+    for index in flipped:
+        classes[index] = 1 - classes[index]
+        x1, y1, x2, y2 = boxes[index].astype(int).tolist()
+        image[y1:y2, x1:x2] = CLASS_COLORS[int(classes[index])]
+    return image, classes, flipped
+
+
+def retake(image, shift, rotate, gain):
+    """Siirtää ja kiertää kuvaa ja muuttaa sen kirkkautta."""
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotate, 1.0)
+    matrix[:, 2] += (shift * width, shift * height)
+    moved = cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+    return cv2.convertScaleAbs(moved, alpha=gain, beta=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution", default="4000x3000")
+    parser.add_argument("--rack-area", type=float, default=0.5)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="rack")
+    parser.add_argument("--flips", type=int, default=6)
+    parser.add_argument("--shift", type=float, default=0.01, help="Siirtymä osuutena kuvan koosta")
+    parser.add_argument("--rotate", type=float, default=0.5, help="Kierto asteina")
+    parser.add_argument("--gain", type=float, default=1.1, help="Kirkkauskerroin")
+    parser.add_argument("--imgsz", type=int, default=1216)
+    parser.add_argument("--model-ms", type=float, default=25.0)
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    base, boxes, classes = render_rack(width, height, args.rack_area, **SCENARIOS[args.scenario])
+    clutter = add_clutter(np.zeros_like(base), 400)
+    outside = np.ones(base.shape[:2], dtype=bool)
+    for x1, y1, x2, y2 in boxes[classes == 3].astype(int).tolist():
+        outside[y1:y2, x1:x2] = False
+    base[outside] = np.maximum(base[outside], clutter[outside])
+
+    changed, new_classes, flipped = flip_ports(base, boxes, classes, args.flips)
+    current = retake(changed, args.shift, args.rotate, args.gain)
+    backend = RenderedRackBackend(args.imgsz, args.model_ms)
+
+    def full(image):
+        return sliced_predict(backend, image, tile_size=args.imgsz)
+
+    previous = Survey.from_result(base, full(base), RGB)
+    before = port_statuses(port_layout(previous.xyxy, previous.conf, previous.cls)["json"])
+
+    backend.inputs = 0
+    start = time.perf_counter()
+    reference = Survey.from_result(current, full(current), RGB)
+    full_ms = (time.perf_counter() - start) * 1000.0
+    full_inputs = backend.inputs
+    reference_json = port_layout(reference.xyxy, reference.conf, reference.cls)["json"]
+
+    backend.inputs = 0
+    start = time.perf_counter()
+    result = resurvey(backend, previous, current, color_order=RGB, full_predict=full, tile_size=args.imgsz)
+    incremental_ms = (time.perf_counter() - start) * 1000.0
+
+    # Todelliset muutokset: täydet kartoitukset ennen ja jälkeen avaimittain
+    after = port_statuses(reference_json)
+    expected = {
+        key for key in before.keys() & after.keys() if before[key] != after[key]
+    }
+    reported = {
+        (entry["switch_id"], entry["stack_id"], entry["port_number"])
+        for change in ("connected", "disconnected") for entry in result["diff"][change]
+    }
+    agreement = status_agreement(result["json"], reference_json)
+    by_key = port_diff(
+        port_layout(previous.xyxy, previous.conf, previous.cls),
+        port_layout(reference.xyxy, reference.conf, reference.cls), by_key=True,
+    )
+
+    print(
+        f"Kuva {args.resolution}, skenaario {args.scenario}, {int(np.isin(classes, (0, 1)).sum())} "
+        f"porttia, {len(flipped)} vaihtoi tilaa; siirtymä {args.shift:.0%}, kierto {args.rotate:g}°\n"
+    )
+    print(f"{'tapa':<18} {'ms':>8} {'syötteet':>9}")
+    print(f"{'täysi kartoitus':<18} {full_ms:>8.1f} {full_inputs:>9}")
+    print(f"{'uudelleenkartoitus':<18} {incremental_ms:>8.1f} {backend.inputs:>9}")
+    print(
+        f"\nkohdistettu: {'kyllä' if result['registered'] else 'ei'} ({result['inliers']} piirrettä), "
+        f"uudelleen tunnistetut pinot {result['changed_stacks']}/{result['stacks']}"
+    )
+    print(
+        f"porttitilat täyteen kartoitukseen verrattuna: {agreement['agreement']:.1%} "
+        f"({agreement['mismatched']} eri, {agreement['missing']} puuttuu, {agreement['extra']} ylimääräistä)"
+    )
+    hits = len(expected & reported)
+    print(
+        f"muutokset: {len(expected)} todellista, {len(reported)} raportoitua, {hits} osumaa; "
+        f"avaimittain verrattuna {sum(len(by_key[c]) for c in ('connected', 'disconnected'))}"
+    )
+    print(", ".join(f"{name}: {len(ports)}" for name, ports in result["diff"].items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Mittaa tulostemuotojen serialisoinnin keston ja koon sekä eräajon kirjoituksen läpäisyn.
+
+Kullekin skenaariolle (benchmarks.synthetic) rakennetaan generate_switch_json-
+tuloste ja serialisoidaan se kaikilla serializers.py:n muodoilla. Vertailukohta
+on nykyinen json.dumps(indent=4). Muodot, joiden valinnainen riippuvuus
+puuttuu, merkitään viivalla. Lisäksi kirjoitetaan --records eräajon tietuetta
+RecordWriterilla ja luetaan ne takaisin iter_records-funktiolla, ja
+porttitaulukon muunnos tarkistetaan edestakaisin.
+
+Ajo:
+    python -m benchmarks.bench_serialize --repeat 200 --records 2000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import SCENARIOS, synthetic_detections
+from detections import Detections
+from json_generator import generate_switch_json
+from serializers import FORMATS, RecordWriter, from_port_table, get_serializer, iter_records, port_table
+
+
+def scenario_output(scenario, seed=0):
+    xyxy, conf, cls = synthetic_detections(seed=seed, **SCENARIOS[scenario])
+    detections = Detections(xyxy, conf, cls)
+    return generate_switch_json(detections.stacks, detections.ports, detections.switches)
+
+
+def median_us(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return float(np.median(samples))
+
+
+def available_serializers():
+    serializers = {}
+    for name in FORMATS:
+        try:
+            serializers[name] = get_serializer(name)
+        except ImportError:
+            serializers[name] = None
+    return serializers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--records", type=int, default=2000)
+    args = parser.parse_args()
+
+    serializers = available_serializers()
+    print(f"{'skenaario':<9} {'muoto':<8} {'µs':>9} {'tavua':>9} {'nopeus':>7} {'koko':>6}")
+    for scenario in SCENARIOS:
+        output = scenario_output(scenario)
+        assert from_port_table(port_table(output)) == output
+        baseline_us = median_us(lambda: json.dumps(output, indent=4), args.repeat)
+        baseline_size = len(json.dumps(output, indent=4).encode('utf-8'))
+        print(f"{scenario:<9} {'nykyinen':<8} {baseline_us:>9.1f} {baseline_size:>9} {'1.0x':>7} {'100%':>6}")
+        for name, serializer in serializers.items():
+            if serializer is None:
+                print(f"{'':<9} {name:<8} {'-':>9} {'-':>9} {'-':>7} {'-':>6}")
+                continue
+            elapsed = median_us(lambda: serializer.dumps(output), args.repeat)
+            size = len(serializer.dumps(output))
+            print(
+                f"{'':<9} {name:<8} {elapsed:>9.1f} {size:>9} "
+                f"{baseline_us / elapsed:>6.1f}x {size / baseline_size:>6.0%}"
+            )
+
+    # Eräajon kirjoitus: tietue kerrallaan avoimeen tiedostoon
+    records = [
+        {"image": f"survey/img_{index:05d}.jpg", "width": 3840, "height": 2160,
+         **scenario_output("medium", seed=index % 16)}
+        for index in range(args.records)
+    ]
+    print(f"\n{args.records} tietuetta (medium)")
+    print(f"{'muoto':<8} {'kirjoitus/s':>12} {'luku/s':>10} {'MB':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, serializer in serializers.items():
+            if serializer is None or not serializer.streamable:
+                continue
+            path = os.path.join(tmp, f"out.{name}")
+            start = time.perf_counter()
+            with RecordWriter(path, name) as writer:
+                for record in records:
+                    writer.write(record)
+            write_s = time.perf_counter() - start
+            start = time.perf_counter()
+            count = sum(1 for _ in iter_records(path, name))
+            read_s = time.perf_counter() - start
+            assert count == len(records)
+            print(
+                f"{name:<8} {len(records) / write_s:>12.0f} {count / read_s:>10.0f} "
+                f"{os.path.getsize(path) / 2**20:>7.2f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
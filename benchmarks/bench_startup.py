@@ -0,0 +1,149 @@
+"""Käynnistysajan ja JSON-pikapolun mittaus.
+
+Mittaa erillisissä Python-prosesseissa kunkin sisääntulomoduulin tuontiajan
+ja sen, mitkä raskaat riippuvuudet (cv2, torch, ultralytics, PIL, gradio)
+tuonti lataa. --compare-rev mittaa samat moduulit annetusta git-versiosta
+tilapäisessä työpuussa vertailua varten.
+
+Lisäksi mitataan pyyntökohtainen viive detect.predict-funktiolle piirron
+kanssa ja ilman (predict_json) tynkätaustalla.
+
+Ajo:
+    python -m benchmarks.bench_startup --repeat 5 --compare-rev HEAD~1
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+MODULES = ["json_generator", "bounding_boxes", "backends", "detect", "batch_predict", "server"]
+HEAVY = ["cv2", "torch", "ultralytics", "PIL.Image", "gradio", "http.server"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+try:
+    import {module}
+    error = None
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "error": error,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module, cwd, repeat):
+    """
+    Mittaa moduulin tuontiajan tuoreissa prosesseissa.
+
+    Returns:
+        dict: Mediaaniaika millisekunteina, ladatut raskaat riippuvuudet ja mahdollinen virhe.
+    """
+    samples = []
+    probe = {}
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+            cwd=cwd, capture_output=True, text=True,
+            env={**os.environ, "PYTHONPATH": cwd},
+        )
+        lines = completed.stdout.strip().splitlines()
+        if not lines:
+            return {"median_ms": None, "heavy": [], "error": completed.stderr.strip()[-200:]}
+        probe = json.loads(lines[-1])
+        samples.append(probe["seconds"] * 1000.0)
+    return {"median_ms": float(np.median(samples)), "heavy": probe["heavy"], "error": probe["error"]}
+
+
+@contextlib.contextmanager
+def git_worktree(rev):
+    """Luo tilapäisen työpuun annetusta git-versiosta."""
+    directory = tempfile.mkdtemp(prefix="portvision-")
+    subprocess.run(["git", "worktree", "add", "--detach", directory, rev],
+                   check=True, capture_output=True)
+    try:
+        # data.yaml ja painot eivät välttämättä ole versionhallinnassa
+        for name in ("data.yaml", "inference.yaml"):
+            if os.path.exists(name) and not os.path.exists(os.path.join(directory, name)):
+                shutil.copy(name, directory)
+        yield directory
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", directory], capture_output=True)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def measure_requests(resolutions, repeat):
+    """Mittaa predict- ja predict_json-viiveen tynkätaustalla."""
+    import detect
+    from benchmarks.synthetic import SCENARIOS, StubBackend, synthetic_image
+
+    stub = StubBackend(**SCENARIOS["medium"])
+    original_get_backend = detect.get_backend
+    detect.get_backend = lambda config=None: stub
+    rows = []
+    try:
+        for resolution in resolutions:
+            width, height = map(int, resolution.split("x"))
+            image = synthetic_image(width, height)
+            for name, function in (
+                ("predict (piirto)", lambda: detect.predict(image)),
+                ("predict_json", lambda: detect.predict_json(image)),
+            ):
+                function()
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    function()
+                    samples.append((time.perf_counter() - start) * 1000.0)
+                rows.append((resolution, name, float(np.median(samples))))
+    finally:
+        detect.get_backend = original_get_backend
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Mittauskerrat")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--compare-rev", default=None, help="Vertailtava git-versio (esim. HEAD~1)")
+    parser.add_argument("--resolutions", nargs="+", default=["1920x1080", "3840x2160"])
+    args = parser.parse_args()
+
+    current = {m: measure_import(m, os.getcwd(), args.repeat) for m in args.modules}
+    baseline = {}
+    if args.compare_rev:
+        with git_worktree(args.compare_rev) as directory:
+            baseline = {m: measure_import(m, directory, args.repeat) for m in args.modules}
+
+    print(f"{'moduuli':<16} {'nyt ms':>8} {'ennen ms':>9}  raskaat riippuvuudet (nyt / ennen)")
+    for module, stats in current.items():
+        before = baseline.get(module, {})
+        now_ms = f"{stats['median_ms']:.0f}" if stats["median_ms"] is not None else "virhe"
+        before_ms = (
+            f"{before['median_ms']:.0f}" if before.get("median_ms") is not None
+            else ("virhe" if before else "-")
+        )
+        heavy = ",".join(stats["heavy"]) or "-"
+        if before:
+            heavy += " / " + (",".join(before.get("heavy", [])) or "-")
+        print(f"{module:<16} {now_ms:>8} {before_ms:>9}  {heavy}")
+        for label, entry in (("nyt", stats), ("ennen", before)):
+            if entry.get("error"):
+                print(f"  {label}: {entry['error']}")
+
+    print(f"\n{'resoluutio':<12} {'polku':<18} {'p50 ms':>8}")
+    for resolution, name, median in measure_requests(args.resolutions, args.repeat):
+        print(f"{resolution:<12} {name:<18} {median:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
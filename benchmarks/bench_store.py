@@ -0,0 +1,119 @@
+"""Mittaa kartoitusvaraston lisäysnopeuden ja kyselyviiveet suurella porttimäärällä.
+
+Synteettisiä telineitä (generate_switch_json-tulosteita) lisätään varastoon
+erissä, kunnes porttimäärä ylittää --ports-rajan. Sen jälkeen mitataan
+tyypillisten kyselyiden mediaaniviive ja verrataan sitä samojen tulosten
+suodattamiseen JSONL-tiedostosta (nykyinen tapa).
+
+Ajo:
+    python -m benchmarks.bench_store --ports 100000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import SCENARIOS, synthetic_detections
+from detections import Detections
+from json_generator import generate_switch_json
+from survey_store import SurveyStore
+
+
+def synthetic_records(target_ports, locations):
+    """Tuottaa batch_predict-muotoisia tietueita, kunnes porttimäärä saavuttaa rajan."""
+    records, ports, seed = [], 0, 0
+    while ports < target_ports:
+        layout = SCENARIOS["rack" if seed % 2 else "dense"]
+        xyxy, conf, cls = synthetic_detections(seed=seed, **layout)
+        detections = Detections(xyxy, conf, cls)
+        output = generate_switch_json(detections.stacks, detections.ports, detections.switches)
+        records.append({
+            "image": f"survey/img_{seed:05d}.jpg", "width": 3840, "height": 2160,
+            "location": locations[seed % len(locations)], "captured_at": 1.7e9 + seed * 60,
+            **output,
+        })
+        ports += len(detections.ports)
+        seed += 1
+    return records, ports
+
+
+def median_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(samples))
+
+
+def scan_jsonl(path, predicate):
+    """Nykyinen tapa: luetaan kaikki tulokset ja suodatetaan Pythonissa."""
+    found = 0
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            record = json.loads(line)
+            for switch in record["switches"]:
+                for stack in switch["lan_port_stacks"]:
+                    for row in stack["lan_ports"]:
+                        found += sum(1 for port in row if predicate(record, switch, port))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ports", type=int, default=100_000, help="Porttien vähimmäismäärä")
+    parser.add_argument("--batch-size", type=int, default=200, help="Kuvia lisäyserää kohden")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    locations = [f"floor {n}" for n in range(1, 9)]
+    records, total_ports = synthetic_records(args.ports, locations)
+    workdir = tempfile.mkdtemp(prefix="portvision-store-")
+    try:
+        jsonl = os.path.join(workdir, "results.jsonl")
+        with open(jsonl, 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+
+        with SurveyStore(os.path.join(workdir, "survey.db")) as store:
+            start = time.perf_counter()
+            for i in range(0, len(records), args.batch_size):
+                store.ingest_many(records[i:i + args.batch_size], site="HQ")
+            elapsed = time.perf_counter() - start
+            print(
+                f"Lisätty {len(records)} kuvaa / {total_ports} porttia ajassa {elapsed:.2f} s "
+                f"({total_ports / elapsed:,.0f} porttia/s)"
+            )
+
+            queries = {
+                "vapaat portit, floor 3": (
+                    lambda: store.free_ports(location="floor 3"),
+                    lambda r, s, p: r["location"] == "floor 3" and p["status"] == "empty",
+                ),
+                "Switch_2 historia, portti 5": (
+                    lambda: store.port_history("Switch_2", 5),
+                    lambda r, s, p: s["switch_id"] == "Switch_2" and p["port_number"] == 5,
+                ),
+                "kytkinkooste, floor 3": (
+                    lambda: store.switch_usage(location="floor 3"),
+                    lambda r, s, p: r["location"] == "floor 3",
+                ),
+                "sijaintikooste": (lambda: store.location_usage(), lambda r, s, p: True),
+            }
+            print(f"\n{'kysely':<30} {'rivit':>7} {'SQLite ms':>10} {'JSONL ms':>10}")
+            for name, (query, predicate) in queries.items():
+                rows = len(query())
+                store_ms = median_ms(query, args.repeat)
+                scan_ms = median_ms(lambda: scan_jsonl(jsonl, predicate), max(1, args.repeat // 10))
+                print(f"{name:<30} {rows:>7} {store_ms:>10.2f} {scan_ms:>10.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Mittaa viipaloidun inferenssin läpäisyn ja muistinkäytön palojen määrän funktiona.
+
+Jokaiselle palakoon ja limityksen yhdistelmälle tulostetaan palojen määrä,
+kuvakohtainen viive, palojen läpäisy (palaa/s), tunnistusten määrä sekä
+NumPy-varausten huippu (tracemalloc) ja prosessin muistihuippu (ru_maxrss).
+Vertailukohtana on tavallinen koko kuvan ajo. Taustalla stub
+(LayoutStubBackend) mittaus ei tarvitse painoja eikä PyTorchia, jolloin
+tuloksissa näkyy vain viipaloinnin ja yhdistämisen osuus: koko kuvalle
+tehdään yksi synteettinen asettelu, ja kukin pala saa vain omalle alueelleen
+osuvat laatikot, kuten malli näkisi ne.
+
+Ajo:
+    python -m benchmarks.bench_tiling --images kuvat/teline.jpg --tile-sizes 1216 960 --overlaps 0.1 0.2
+    python -m benchmarks.bench_tiling --backend stub --scenario rack
+"""
+
+import argparse
+import resource
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from backends import DEFAULT_CONFIG, BackendResult, create_backend
+from benchmarks.synthetic import SCENARIOS, synthetic_detections
+from tiling import make_tiles, sliced_predict
+
+
+class LayoutStubBackend:
+    """
+    Tynkätausta, joka palauttaa palalle koko kuvan synteettisen asettelun sen osan.
+
+    sliced_predict antaa palat näkyminä koko kuvaan, joten palan sijainti
+    saadaan sen muistiosoitteesta. Palan alueelle osuvat laatikot siirretään
+    palan koordinaatteihin ja rajataan sen reunoihin.
+
+    Args:
+        image (numpy.ndarray): Koko kuva (H, W, 3).
+        **layout: synthetic_detections-funktion asetteluparametrit.
+    """
+
+    name = "stub"
+
+    def __init__(self, image, **layout):
+        height, width = image.shape[:2]
+        self.image = image
+        self.xyxy, self.conf, self.cls = synthetic_detections(width=width, height=height, **layout)
+
+    def warmup(self):
+        pass
+
+    def _offset(self, crop):
+        """Palauttaa palan vasemman yläkulman (x, y) koko kuvassa."""
+        if not np.shares_memory(crop, self.image):
+            raise ValueError("LayoutStubBackend odottaa näkymää koko kuvaan.")
+        delta = crop.__array_interface__["data"][0] - self.image.__array_interface__["data"][0]
+        row_stride, pixel_stride = self.image.strides[:2]
+        return (delta % row_stride) // pixel_stride, delta // row_stride
+
+    def __call__(self, images, iou=0.4, conf=0.4, color_order="RGB"):
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        results = []
+        for crop in images:
+            height, width = crop.shape[:2]
+            x, y = self._offset(crop)
+            boxes = self.xyxy - np.array([x, y, x, y], dtype=self.xyxy.dtype)
+            np.clip(boxes[:, [0, 2]], 0, width, out=boxes[:, [0, 2]])
+            np.clip(boxes[:, [1, 3]], 0, height, out=boxes[:, [1, 3]])
+            inside = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+            results.append(BackendResult(
+                boxes[inside], self.conf[inside], self.cls[inside], (height, width)
+            ))
+        return results
+
+
+def measure(function, repeat):
+    """Ajaa funktion repeat kertaa ja palauttaa (viimeisin tulos, keskiviive s, NumPy-huippu t)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = (time.perf_counter() - start) / repeat
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", nargs="*", default=[], help="Kuvatiedostot (oletus: synteettinen 6000x4000)")
+    parser.add_argument("--backend", default=DEFAULT_CONFIG["backend"], help="Tausta tai 'stub'")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="rack", help="stub-taustan asettelu")
+    parser.add_argument("--weights", default=DEFAULT_CONFIG["weights"])
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_CONFIG["imgsz"])
+    parser.add_argument("--tile-sizes", type=int, nargs="+", default=[1216])
+    parser.add_argument("--overlaps", type=float, nargs="+", default=[0.1, 0.2, 0.3])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--merge-iou", type=float, default=DEFAULT_CONFIG["merge_iou"])
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.backend != "stub":
+        backend = create_backend(dict(
+            DEFAULT_CONFIG, backend=args.backend, weights=args.weights, imgsz=args.imgsz
+        ))
+        backend.warmup()
+
+    if args.images:
+        images = [cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB) for path in args.images]
+    else:
+        images = [np.random.default_rng(0).integers(0, 255, (4000, 6000, 3), dtype=np.uint8)]
+
+    header = (
+        f"{'kuva':>11} {'pala':>5} {'limitys':>7} {'erä':>4} {'paloja':>6} "
+        f"{'ms/kuva':>9} {'palaa/s':>8} {'tunnist.':>8} {'numpy MB':>9} {'maxrss MB':>10}"
+    )
+    print(header)
+    for image in images:
+        height, width = image.shape[:2]
+        if args.backend == "stub":
+            backend = LayoutStubBackend(image, **SCENARIOS[args.scenario])
+        size = f"{width}x{height}"
+
+        result, elapsed, peak = measure(lambda: backend(image)[0], args.repeat)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(
+            f"{size:>11} {'-':>5} {'-':>7} {'-':>4} {1:>6} {elapsed * 1000:>9.1f} "
+            f"{1 / elapsed:>8.2f} {len(result.boxes.xyxy):>8} {peak / 2**20:>9.1f} {rss:>10.1f}"
+        )
+
+        for tile_size in args.tile_sizes:
+            for overlap in args.overlaps:
+                num_tiles = len(make_tiles(width, height, tile_size, overlap))
+                for batch_size in args.batch_sizes:
+                    result, elapsed, peak = measure(
+                        lambda: sliced_predict(
+                            backend, image, tile_size=tile_size, overlap=overlap,
+                            batch_size=batch_size, merge_iou=args.merge_iou,
+                        ),
+                        args.repeat,
+                    )
+                    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                    print(
+                        f"{size:>11} {tile_size:>5} {overlap:>7.2f} {batch_size:>4} {num_tiles:>6} "
+                        f"{elapsed * 1000:>9.1f} {num_tiles / elapsed:>8.2f} "
+                        f"{len(result.boxes.xyxy):>8} {peak / 2**20:>9.1f} {rss:>10.1f}"
+                    )
+
+
+if __name__ == '__main__':
+    main()
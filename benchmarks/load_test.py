@@ -0,0 +1,106 @@
+"""Kuormitustesti server.py-palvelulle paikallisella asiakkaalla.
+
+Lähettää annetun määrän /predict-pyyntöjä rinnakkaisista säikeistä ja
+tulostaa läpäisyn, viivepersentiilit ja vastausten tilakoodit. Kuvana
+käytetään annettua tiedostoa tai synteettistä JPEG-kuvaa.
+
+Ajo (palvelu ensin käyntiin: python server.py):
+    python -m benchmarks.load_test --requests 200 --concurrency 16
+"""
+
+import argparse
+import http.client
+import threading
+import time
+import uuid
+from collections import Counter
+
+import cv2
+import numpy as np
+
+
+def make_multipart(image_bytes):
+    """Rakentaa multipart/form-data-rungon, jossa kuva on kentässä 'image'."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="image"; filename="image.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image_bytes + f"\r\n--{boundary}--\r\n".encode()
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--image", default=None, help="Lähetettävä kuva (oletus: synteettinen)")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--multipart", action="store_true", help="Lähetä multipart-lomakkeena")
+    parser.add_argument("--render", action="store_true", help="Pyydä myös annotoitu kuva")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as file:
+            image_bytes = file.read()
+    else:
+        image = np.random.default_rng(0).integers(0, 255, (1200, 1600, 3), dtype=np.uint8)
+        image_bytes = cv2.imencode(".jpg", image)[1].tobytes()
+
+    if args.multipart:
+        content_type, body = make_multipart(image_bytes)
+    else:
+        content_type, body = "image/jpeg", image_bytes
+    path = "/predict?render=1" if args.render else "/predict"
+
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker():
+        connection = http.client.HTTPConnection(args.host, args.port, timeout=120)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            start = time.perf_counter()
+            try:
+                connection.request("POST", path, body=body, headers={"Content-Type": content_type})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(args.host, args.port, timeout=120)
+                status = "yhteysvirhe"
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed * 1000.0)
+                statuses[status] += 1
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    values = np.asarray(latencies)
+    print(f"Pyyntöjä {len(values)} ajassa {elapsed:.2f} s = {len(values) / elapsed:.1f} pyyntöä/s")
+    print(
+        f"Viive: p50 {np.percentile(values, 50):.1f} ms, p95 {np.percentile(values, 95):.1f} ms, "
+        f"p99 {np.percentile(values, 99):.1f} ms, max {values.max():.1f} ms"
+    )
+    print("Tilakoodit:", dict(statuses))
+
+    connection = http.client.HTTPConnection(args.host, args.port, timeout=10)
+    connection.request("GET", "/health")
+    print("Palvelun tila:", connection.getresponse().read().decode())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""PortVisionin tunnistus→JSON-putken mittaussarja.
+
+Mittaa synteettisillä tunnistuksilla ja kuvilla (ks. benchmarks.synthetic):
+- generate_switch_json (myös päätösjäljen kanssa)
+- json.dumps
+- draw_bboxes
+- detect.predict kokonaisuutena tynkätaustalla (StubBackend)
+
+Jokaisesta mittauksesta raportoidaan p50/p95/p99-viive ja läpäisy.
+Tulokset tallennetaan JSON-tiedostoon, jota voidaan verrata aiemman commitin
+tuloksiin regressioiden havaitsemiseksi. Painoja tai GPU:ta ei tarvita.
+
+Ajo:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --output uusi.json --compare bench.json --threshold 0.1
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import SCENARIOS, StubBackend, synthetic_image, synthetic_result
+
+DEFAULT_RESOLUTIONS = ["1920x1080", "3840x2160"]
+
+
+def percentiles(samples_s):
+    """Laskee viivetilastot millisekunteina ja läpäisyn operaatioina sekunnissa."""
+    values = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    return {
+        "n": int(len(values)),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "throughput_per_s": float(1000.0 / values.mean()) if values.mean() > 0 else 0.0,
+    }
+
+
+def time_function(function, repeat, warmup):
+    """Ajaa funktion warmup + repeat kertaa ja palauttaa mitatut ajat sekunteina."""
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_commit():
+    """Palauttaa nykyisen commitin lyhyen tunnisteen, jos se on saatavilla."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scenarios, resolutions, repeat, warmup):
+    """
+    Ajaa kaikki mittaukset.
+
+    Returns:
+        dict: Mittauksen nimi -> viivetilastot.
+    """
+    import detect
+    from bounding_boxes import draw_bboxes
+    from decision_trace import DecisionTrace
+    from detections import Detections
+    from json_generator import generate_switch_json
+
+    results = {}
+    # Mahdolliset tulostukset ohjataan pois, mutta niiden muotoilu sisältyy mittaukseen
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for scenario in scenarios:
+            layout = SCENARIOS[scenario]
+            stub = StubBackend(**layout)
+            for resolution in resolutions:
+                width, height = map(int, resolution.split("x"))
+                name = f"{scenario}@{resolution}"
+                result = synthetic_result(width=width, height=height, **layout)
+                image = synthetic_image(width, height)
+                detections = Detections.from_results([result])
+                ports, stacks, switches = detections.ports, detections.stacks, detections.switches
+                output = generate_switch_json(stacks, ports, switches)
+
+                cases = {
+                    "generate_switch_json": lambda: generate_switch_json(stacks, ports, switches),
+                    "generate_switch_json_traced": lambda: generate_switch_json(
+                        stacks, ports, switches, trace=DecisionTrace()
+                    ),
+                    "serialize_json": lambda: json.dumps(output, indent=4),
+                    "draw_bboxes": lambda: draw_bboxes(
+                        image, [result], box_thickness=2, font_scale=0.6, alpha=0.6
+                    ),
+                    "predict": lambda: detect.predict(image),
+                }
+                # detect.predict käyttää tynkätaustaa oikean mallin sijaan
+                original_get_backend = detect.get_backend
+                detect.get_backend = lambda config=None: stub
+                try:
+                    for case, function in cases.items():
+                        stats = percentiles(time_function(function, repeat, warmup))
+                        stats["ports"] = len(ports)
+                        results[f"{case}/{name}"] = stats
+                finally:
+                    detect.get_backend = original_get_backend
+    return results
+
+
+def compare(current, baseline, threshold):
+    """
+    Vertaa tuloksia aiempaan ajoon p50-viiveen perusteella.
+
+    Returns:
+        list: Regressioiden nimet (p50 kasvanut yli kynnyksen).
+    """
+    regressions = []
+    print(f"\n{'mittaus':<45} {'ennen p50':>10} {'nyt p50':>10} {'muutos':>8}")
+    for name, stats in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["p50_ms"]
+        now = stats["p50_ms"]
+        change = (now - before) / before if before > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSIO"
+        print(f"{name:<45} {before:>10.3f} {now:>10.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS, help="LEVEYSxKORKEUS")
+    parser.add_argument("--repeat", type=int, default=20, help="Mittauskerrat")
+    parser.add_argument("--warmup", type=int, default=2, help="Lämmityskerrat")
+    parser.add_argument("--output", default=None, help="Tallenna tulokset JSON-tiedostoon")
+    parser.add_argument("--compare", default=None, help="Aiempi tulostiedosto vertailua varten")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Sallittu p50-kasvu (osuus)")
+    args = parser.parse_args()
+
+    results = run_suite(args.scenarios, args.resolutions, args.repeat, args.warmup)
+
+    print(f"{'mittaus':<45} {'portit':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'op/s':>9}")
+    for name, stats in results.items():
+        print(
+            f"{name:<45} {stats['ports']:>6} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} "
+            f"{stats['p99_ms']:>9.3f} {stats['throughput_per_s']:>9.1f}"
+        )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressiota yli {args.threshold:.0%} kynnyksen.")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
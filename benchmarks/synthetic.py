@@ -0,0 +1,155 @@
+"""Synteettiset tunnistukset ja kuvat mittauksia varten.
+
+Generaattori rakentaa telineen, jossa on annettu määrä kytkimiä pystysuunnassa
+päällekkäin, kussakin kytkimessä rinnakkaisia porttipinoja ja jokaisessa
+pinossa kaksi riviä portteja. Porttien tila (Cable/empty) arvotaan annetulla
+kaapelointiasteella. Koordinaatit skaalataan kuvan resoluution mukaan, joten
+samaa asettelua voidaan käyttää eri kuvakoilla.
+
+Sisältää:
+- SCENARIOS: Valmiit tiheysskenaariot.
+- synthetic_detections: Tuottaa xyxy-, conf- ja cls-taulukot.
+- synthetic_result: Tuottaa ultralytics-yhteensopivan tulosobjektin.
+- synthetic_image: Tuottaa annetun kokoisen RGB-kuvan.
+- StubBackend: Inferenssitausta, joka palauttaa synteettiset tunnistukset.
+"""
+
+import numpy as np
+
+from backends import BackendResult
+
+# Tiheysskenaariot: kytkimet, pinot per kytkin, portit per pino
+SCENARIOS = {
+    "small": {"num_switches": 1, "stacks_per_switch": 1, "ports_per_stack": 24},
+    "medium": {"num_switches": 4, "stacks_per_switch": 2, "ports_per_stack": 24},
+    "dense": {"num_switches": 10, "stacks_per_switch": 2, "ports_per_stack": 48},
+    "rack": {"num_switches": 20, "stacks_per_switch": 4, "ports_per_stack": 12},
+}
+
+
+def synthetic_detections(
+    num_switches=4,
+    stacks_per_switch=2,
+    ports_per_stack=24,
+    cable_ratio=0.6,
+    width=3840,
+    height=2160,
+    jitter=0.15,
+    seed=0,
+):
+    """
+    Tuottaa synteettisen telineen tunnistukset.
+
+    Args:
+        num_switches (int, optional): Kytkimien määrä. Oletus 4.
+        stacks_per_switch (int, optional): Porttipinot kytkintä kohden. Oletus 2.
+        ports_per_stack (int, optional): Portit pinoa kohden (kaksi riviä). Oletus 24.
+        cable_ratio (float, optional): Kaapeloitujen porttien osuus. Oletus 0.6.
+        width (int, optional): Kuvan leveys. Oletus 3840.
+        height (int, optional): Kuvan korkeus. Oletus 2160.
+        jitter (float, optional): Porttien sijainnin satunnaisvaihtelu porttikoon
+            osuutena. Oletus 0.15.
+        seed (int, optional): Satunnaislukusiemen. Oletus 0.
+
+    Returns:
+        tuple: (xyxy, conf, cls) NumPy-taulukkoina; cls 0 = Cable, 1 = LAN-portti,
+            2 = LAN-porttipino, 3 = kytkin.
+    """
+    rng = np.random.default_rng(seed)
+    columns = max(1, ports_per_stack // 2)
+
+    # Kytkimet ovat tasavälein pystysuunnassa; kytkimen korkeus on 60 % välistä
+    pitch_y = height / num_switches
+    switch_h = 0.6 * pitch_y
+    margin_x = 0.05 * width
+    switch_w = width - 2 * margin_x
+    stack_w = switch_w / stacks_per_switch * 0.9
+    stack_gap = switch_w / stacks_per_switch * 0.1
+    stack_h = 0.8 * switch_h
+    port_w = stack_w / columns * 0.8
+    port_h = stack_h / 2 * 0.8
+
+    boxes, classes = [], []
+    for s in range(num_switches):
+        sy = s * pitch_y + 0.2 * pitch_y
+        boxes.append([margin_x, sy, margin_x + switch_w, sy + switch_h])
+        classes.append(3)
+        for k in range(stacks_per_switch):
+            kx = margin_x + stack_gap / 2 + k * (stack_w + stack_gap)
+            ky = sy + 0.1 * switch_h
+            boxes.append([kx, ky, kx + stack_w, ky + stack_h])
+            classes.append(2)
+            for c in range(columns):
+                for row in range(2):
+                    px = kx + (c + 0.1) * stack_w / columns
+                    py = ky + (row + 0.1) * stack_h / 2
+                    dx, dy = rng.uniform(-jitter, jitter, 2) * (port_w * 0.1, port_h * 0.1)
+                    boxes.append([px + dx, py + dy, px + dx + port_w, py + dy + port_h])
+                    classes.append(0 if rng.random() < cable_ratio else 1)
+
+    xyxy = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    cls = np.asarray(classes, dtype=np.float32)
+    conf = rng.uniform(0.5, 0.99, len(cls)).astype(np.float32)
+    # Tunnistusjärjestys sekoitetaan kuten mallin tuloksissa
+    order = rng.permutation(len(cls))
+    return xyxy[order], conf[order], cls[order]
+
+
+def synthetic_result(width=3840, height=2160, seed=0, **layout):
+    """
+    Tuottaa synteettiset tunnistukset ultralytics-yhteensopivana tulosobjektina.
+
+    Returns:
+        backends.BackendResult: Tulosobjekti (result.boxes.xyxy/conf/cls).
+    """
+    xyxy, conf, cls = synthetic_detections(width=width, height=height, seed=seed, **layout)
+    return BackendResult(xyxy, conf, cls, (height, width))
+
+
+def synthetic_image(width=3840, height=2160, seed=0):
+    """
+    Tuottaa RGB-kuvan, jossa on tasainen tausta ja kohinaa.
+
+    Returns:
+        numpy.ndarray: Kuva muodossa (height, width, 3), uint8.
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 40, dtype=np.uint8)
+    noise = rng.integers(0, 30, (height, 1, 3), dtype=np.uint8)
+    image += noise
+    return image
+
+
+class StubBackend:
+    """
+    Inferenssitausta, joka palauttaa synteettiset tunnistukset ilman mallia.
+
+    Tunnistukset skaalataan jokaisen syötekuvan kokoon, joten taustaa voidaan
+    käyttää detect.predict-, batch_predict- ja server.py-polkujen mittaamiseen
+    ilman painoja tai GPU:ta.
+
+    Args:
+        **layout: synthetic_detections-funktion asetteluparametrit.
+    """
+
+    name = "stub"
+
+    def __init__(self, **layout):
+        self.layout = layout
+        self._cache = {}
+
+    def warmup(self):
+        pass
+
+    def __call__(self, images, iou=0.4, conf=0.4, color_order="RGB"):
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        results = []
+        for image in images:
+            height, width = np.asarray(image).shape[:2]
+            key = (width, height)
+            if key not in self._cache:
+                self._cache[key] = synthetic_detections(width=width, height=height, **self.layout)
+            xyxy, confs, cls = self._cache[key]
+            results.append(BackendResult(xyxy.copy(), confs.copy(), cls.copy(), (height, width)))
+        return results
@@ -1,194 +1,199 @@
-"""Tämä skripti sisältää funktioita LAN-porttien ja LAN-porttipinojen bounding boxien jälkikäsittelyyn."""
+"""Tämä skripti sisältää funktioita LAN-porttien ja LAN-porttipinojen bounding boxien jälkikäsittelyyn.
 
-import cv2
+Moduulin tuonti ei lue tiedostoja eikä tuo OpenCV:tä: luokkatiedot luetaan
+data.yaml-tiedostosta ensimmäisellä käyttökerralla ja piirtoon tarvittava
+renderer tuodaan vasta draw_bboxes-kutsussa, joten pelkkää JSON-tulostetta
+tuottava polku (results_to_json) käynnistyy nopeasti.
+
+Kuvat käsitellään image_buffer-moduulin sopimuksen mukaisesti: värijärjestys
+annetaan color_order-parametrilla ja inplace=True piirtää suoraan syötteeseen.
+Tulosteen muoto valitaan output_format-parametrilla (serializers.py); None
+palauttaa sanakirjan serialisoimatta.
+"""
+
+import functools
 import numpy as np
-import json
+from detections import Detections
 from json_generator import generate_switch_json
-from helpers import (
-    convert_numpy_types,
-    is_inside,
-    draw_transparent_box,
-    load_class_info
-)
-
-# Lue luokkien nimet ja luokkien määrä tiedostosta data.yaml
-class_names, nc = load_class_info("data.yaml")
-
-# Määritä kiinteä värikartta jokaiselle luokalle sen indeksin perusteella
-class_colors = {
-    0: (255, 0, 0),       # Kaapeli (Punainen)
-    1: (255, 255, 0),     # LAN-portti (Keltainen)
-    2: (255, 255, 255),   # LAN-porttipino (Valkoinen)
-    3: (0, 0, 255)        # Kytkin (Sininen)
-}
-
-
-def draw_bboxes(image, results, box_thickness=2, font_scale=0.8, alpha=0.6):
+from helpers import load_class_info
+from image_buffer import RGB, styles_for, writable_image
+from metrics import record_counts, span
+from serializers import serialize
+from spatial_index import SwitchHierarchy
+
+
+@functools.lru_cache(maxsize=None)
+def get_class_info(yaml_path="data.yaml"):
     """
-    Piirtää bounding boxit ja luo JSON-tulosteen tunnistetuille objekteille.
+    Lukee luokkien nimet ja luokkien määrän tiedostosta kerran ja pitää ne muistissa.
+
+    Returns:
+        tuple: (class_names, nc)
+    """
+    return load_class_info(yaml_path)
+
+
+def __getattr__(name):
+    # Aiemmat moduulitason nimet (class_names, nc, class_colors) ladataan vasta käytettäessä
+    if name == "class_names":
+        return get_class_info()[0]
+    if name == "nc":
+        return get_class_info()[1]
+    if name == "class_colors":
+        from renderer import class_colors
+        return class_colors
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def extract_boxes(results):
+    """
+    Jakaa tunnistustulokset portteihin, LAN-porttipinoihin ja kytkimiin.
+
+    Jälkikäsittely käyttää suoraan Detections-säiliötä; tämä funktio säilyy
+    monikkolistoja käyttäville kutsujille.
 
     Args:
-        image (PIL.Image): Syötekuva.
         results (list): Lista tunnistustuloksista.
-        box_thickness (int, optional): Bounding boxien viivan paksuus. Oletus 2.
-        font_scale (float, optional): Tekstin fontin skaalauskerroin. Oletus 0.8.
-        alpha (float, optional): Läpinäkyvyyden aste. Oletus 0.6.
 
     Returns:
-        tuple: Kuva bounding boxien kanssa ja JSON-merkkijono tuloksista.
+        tuple: (port_boxes, lan_port_stack_boxes, switch_boxes)
+            - port_boxes (list): Portit muodossa (box, conf, 'Cable'|'empty').
+            - lan_port_stack_boxes (list): Porttipinot muodossa (box, conf).
+            - switch_boxes (list): Kytkimet muodossa (box, conf).
     """
-    # Muunna PIL-kuva numpy-taulukoksi (OpenCV-muoto)
-    img = np.array(image)
-
-    # Alusta listat eri objektien bounding boxeille
-    port_boxes = []             # Kaikki porttibounding boxit ja niiden tilat
-    lan_port_stack_boxes = []   # LAN-porttipinojen bounding boxit
-    switch_boxes = []           # Kytkimen bounding boxit
-
-    # Käy läpi kaikki tunnistustulokset
-    for result in results:
-        # Hae bounding boxit, luottamusarvot ja luokkien ID:t
-        boxes = result.boxes.xyxy.cpu().numpy()   # Bounding boxien koordinaatit
-        confs = result.boxes.conf.cpu().numpy()   # Luottamusarvot
-        classes = result.boxes.cls.cpu().numpy()  # Luokkien ID:t
-
-        # Käy läpi tunnistetut objektit ja tallenna ne vastaaviin listoihin
-        for i, box in enumerate(boxes):
-            class_id = int(classes[i])  # Objektiluokan ID
-            conf = confs[i]             # Luottamusarvo
-
-            if class_id == 0:  # Kaapeli (portti, jossa kaapeli)
-                port_boxes.append((box, conf, 'Cable'))
-            elif class_id == 1:  # LAN-portti (tyhjä portti)
-                port_boxes.append((box, conf, 'empty'))
-            elif class_id == 2:  # LAN-porttipino
-                lan_port_stack_boxes.append((box, conf))
-            elif class_id == 3:  # Kytkin
-                switch_boxes.append((box, conf))
-
-    # Luo JSON-tuloste tunnistetuista kytkimistä ja porteista
-    json_output_dict = generate_switch_json(lan_port_stack_boxes, port_boxes)
-
-    # Muunna NumPy-tyypit Python-tyypeiksi, jotta ne voidaan serialisoida JSON-muotoon
-    json_output_dict = convert_numpy_types(json_output_dict)
-
-    # Serealisoidaan JSON-merkkijonoksi
-    json_output = json.dumps(json_output_dict, indent=4)
+    # Jaa sarakemuotoiset tunnistukset luokittain ja palauta ne monikkolistoina
+    detections = Detections.from_results(results)
+    port_boxes = detections.ports.to_port_boxes()
+    lan_port_stack_boxes = detections.stacks.to_boxes()
+    switch_boxes = detections.switches.to_boxes()
 
-    # Jälkikäsittely: Säilytä vain portit, joiden keskipiste on jonkin LAN-porttipinon sisällä
-    valid_port_boxes = []
-    for port_box, conf, status in port_boxes:
-        # Tarkista, onko portin keskipiste minkä tahansa LAN-porttipinon sisällä
-        is_inside_any_stack = any(
-            is_inside(port_box, stack_box) for stack_box, _ in lan_port_stack_boxes
-        )
-        if is_inside_any_stack:
-            valid_port_boxes.append((port_box, conf, status))
-
-    # Piirrä bounding boxit kelvollisille porteille
-    for port_box, conf, status in valid_port_boxes:
-        # Hae bounding boxin koordinaatit ja muunna kokonaisluvuiksi
-        x1, y1, x2, y2 = map(int, port_box)
-        if status == 'Cable':
-            color = class_colors.get(0, (0, 255, 255))  # Väri kaapelille
-            label = f"Kaapeliportti: {conf:.2f}"        # Etiketti kaapeliportille
-        else:
-            color = class_colors.get(1, (255, 255, 255))  # Väri LAN-portille
-            label = f"LAN-portti: {conf:.2f}"             # Etiketti LAN-portille
-
-        # Piirrä suorakulmio (bounding box) portin ympärille
-        cv2.rectangle(
-            img, (x1, y1), (x2, y2), color=color, thickness=box_thickness
-        )
+    return port_boxes, lan_port_stack_boxes, switch_boxes
 
-        # Valmistele etiketti luokan nimellä ja luottamusarvolla
-        label_size, _ = cv2.getTextSize(
-            label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 2
-        )
-        # Määritä etiketin yläreunan sijainti
-        y_label_top = (
-            y1 - label_size[1] - 10
-            if y1 - label_size[1] - 10 > 0
-            else y1 + 10
-        )
-        # Piirrä läpinäkyvä laatikko etiketin taakse
-        draw_transparent_box(
-            img, x1, y_label_top, x1 + label_size[0], y1,
-            color=color, alpha=alpha
-        )
-        # Kirjoita etiketti kuvaan
-        cv2.putText(
-            img, label, (x1, y1 - 5),
-            cv2.FONT_HERSHEY_SIMPLEX, font_scale,
-            (0, 0, 0), 2
-        )
 
-    # Piirrä kytkimen bounding boxit (piirretään aina)
-    for switch_box, conf in switch_boxes:
-        # Hae bounding boxin koordinaatit ja muunna kokonaisluvuiksi
-        x1, y1, x2, y2 = map(int, switch_box)
-        color = class_colors.get(3, (255, 255, 0))  # Väri kytkimelle
-        label = f"Kytkin: {conf:.2f}"               # Etiketti kytkimelle
+def _attach_trace(json_output_dict, trace):
+    """Liittää päätösjäljen JSON-rakenteeseen, jos sitä on pyydetty."""
+    if trace is not None and trace.attach:
+        json_output_dict["trace"] = trace.to_dict()
+    return json_output_dict
 
-        # Piirrä suorakulmio kytkimen ympärille
-        cv2.rectangle(
-            img, (x1, y1), (x2, y2), color=color, thickness=box_thickness
-        )
 
-        # Valmistele etiketti
-        label_size, _ = cv2.getTextSize(
-            label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 2
-        )
-        # Määritä etiketin yläreunan sijainti
-        y_label_top = (
-            y1 - label_size[1] - 10
-            if y1 - label_size[1] - 10 > 0
-            else y1 + 10
-        )
-        # Piirrä läpinäkyvä laatikko etiketin taakse
-        draw_transparent_box(
-            img, x1, y_label_top, x1 + label_size[0], y1,
-            color=color, alpha=alpha
-        )
-        # Kirjoita etiketti kuvaan
-        cv2.putText(
-            img, label, (x1, y1 - 5),
-            cv2.FONT_HERSHEY_SIMPLEX, font_scale,
-            (0, 0, 0), 2
-        )
+def results_to_json(results, trace=None, output_format="json"):
+    """
+    Luo JSON-tulosteen tunnistustuloksista piirtämättä mitään.
 
-    # Piirrä LAN-porttipinojen bounding boxit (piirretään aina)
-    for stack_box, conf in lan_port_stack_boxes:
-        # Hae bounding boxin koordinaatit ja muunna kokonaisluvuiksi
-        x1, y1, x2, y2 = map(int, stack_box)
-        color = class_colors.get(2, (0, 255, 0))  # Väri LAN-porttipinolle
-        label = f"LAN-porttipino: {conf:.2f}"     # Etiketti LAN-porttipinolle
+    Args:
+        results (list): Lista tunnistustuloksista.
+        trace (decision_trace.DecisionTrace, optional): Porttinumeroinnin
+            päätösjäljen tallennin. Oletus None.
+        output_format (str, optional): Tulosteen muoto (serializers.FORMATS)
+            tai None, jolloin palautetaan sanakirja. Oletus 'json'.
 
-        # Piirrä suorakulmio porttipinon ympärille
-        cv2.rectangle(
-            img, (x1, y1), (x2, y2), color=color, thickness=box_thickness
-        )
+    Returns:
+        str: JSON-merkkijono tuloksista (msgpack-muodossa tavut, None-muodossa sanakirja).
+    """
+    with span("extract_boxes"):
+        detections = Detections.from_results(results)
+        ports, stacks, switches = detections.ports, detections.stacks, detections.switches
+    record_counts(
+        ports=len(ports), stacks=len(stacks), switches=len(switches),
+        image_shape=getattr(results[0], 'orig_shape', None) if results else None,
+    )
+    with span("generate_switch_json"):
+        json_output_dict = generate_switch_json(stacks, ports, switches, trace=trace)
+    with span("serialize"):
+        # generate_switch_json tuottaa valmiiksi Pythonin perustyyppejä
+        return serialize(_attach_trace(json_output_dict, trace), output_format)
+
+
+def draw_hierarchy(img, hierarchy, box_thickness=2, font_scale=0.8, alpha=0.6, styles=None):
+    """
+    Piirtää hierarkian portit, kytkimet ja LAN-porttipinot kuvaan paikan päällä.
 
-        # Valmistele etiketti
-        label_size, _ = cv2.getTextSize(
-            label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 2
-        )
-        # Määritä etiketin yläreunan sijainti
-        y_label_top = (
-            y1 - label_size[1] - 10
-            if y1 - label_size[1] - 10 > 0
-            else y1 + 10
-        )
-        # Piirrä läpinäkyvä laatikko etiketin taakse
-        draw_transparent_box(
-            img, x1, y_label_top, x1 + label_size[0], y1,
-            color=color, alpha=alpha
-        )
-        # Kirjoita etiketti kuvaan
-        cv2.putText(
-            img, label, (x1, y1 - 5),
-            cv2.FONT_HERSHEY_SIMPLEX, font_scale,
-            (0, 0, 0), 2
+    Args:
+        img (numpy.ndarray): Kuva (H, W, 3), johon piirretään.
+        hierarchy (spatial_index.SwitchHierarchy): Kuvan hierarkia.
+        box_thickness (int, optional): Bounding boxien viivan paksuus. Oletus 2.
+        font_scale (float, optional): Tekstin fontin skaalauskerroin. Oletus 0.8.
+        alpha (float, optional): Läpinäkyvyyden aste. Oletus 0.6.
+        styles (dict, optional): Tyylitaulukko (esim. renderer.CLASS_STYLES_BGR
+            BGR-kuville). Oletus renderer.CLASS_STYLES.
+
+    Returns:
+        numpy.ndarray: Sama kuva, johon tunnistukset on piirretty.
+    """
+    from renderer import render_detections
+
+    # Jälkikäsittely: Säilytä vain portit, joiden keskipiste on jonkin LAN-porttipinon sisällä
+    valid_ports = hierarchy.ports.select(hierarchy.assigned_ports())
+
+    # Piirrä kelvolliset portit, kytkimet ja LAN-porttipinot (kytkimet ja pinot piirretään aina)
+    drawn = [valid_ports, hierarchy.switches, hierarchy.stacks]
+    return render_detections(
+        img,
+        zip(
+            np.concatenate([d.xyxy for d in drawn]).tolist(),
+            np.concatenate([d.conf for d in drawn]).tolist(),
+            np.concatenate([d.class_id for d in drawn]).tolist(),
+        ),
+        box_thickness=box_thickness, font_scale=font_scale, alpha=alpha, styles=styles,
+    )
+
+
+def draw_bboxes(image, results, box_thickness=2, font_scale=0.8, alpha=0.6, with_json=True,
+                trace=None, color_order=RGB, inplace=False, output_format="json"):
+    """
+    Piirtää bounding boxit ja luo JSON-tulosteen tunnistetuille objekteille.
+
+    Args:
+        image (numpy.ndarray | PIL.Image): Syötekuva (H, W, 3).
+        results (list): Lista tunnistustuloksista.
+        box_thickness (int, optional): Bounding boxien viivan paksuus. Oletus 2.
+        font_scale (float, optional): Tekstin fontin skaalauskerroin. Oletus 0.8.
+        alpha (float, optional): Läpinäkyvyyden aste. Oletus 0.6.
+        with_json (bool, optional): Luodaanko JSON-tuloste. Jos False (esim.
+            välimuistiosuma), palautetaan JSON-tulosteen tilalla None. Oletus True.
+        trace (decision_trace.DecisionTrace, optional): Porttinumeroinnin
+            päätösjäljen tallennin. Jos sen attach on True, jälki liitetään
+            JSON-tulosteeseen avaimella "trace". Oletus None.
+        color_order (str, optional): Kuvan värijärjestys (image_buffer.RGB tai
+            image_buffer.BGR); piirtovärit valitaan sen mukaan. Oletus RGB.
+        inplace (bool, optional): Piirretäänkö suoraan syötetaulukkoon. Jos
+            False, piirretään kopioon eikä syöte muutu. Oletus False.
+        output_format (str, optional): Tulosteen muoto (serializers.FORMATS)
+            tai None, jolloin palautetaan sanakirja. Oletus 'json'.
+
+    Returns:
+        tuple: Kuva bounding boxien kanssa ja JSON-merkkijono tuloksista.
+    """
+    # Piirrettävä taulukko: syöte itse (inplace) tai sen kopio
+    img = writable_image(image, color_order, inplace)
+
+    # Jaa tunnistukset portteihin, porttipinoihin ja kytkimiin
+    with span("extract_boxes"):
+        detections = Detections.from_results(results)
+        ports, stacks, switches = detections.ports, detections.stacks, detections.switches
+    record_counts(
+        ports=len(ports), stacks=len(stacks), switches=len(switches), image_shape=img.shape,
+    )
+
+    # Rakenna kytkin–stack–portti-hierarkia kerran; JSON ja piirto käyttävät samaa
+    with span("hierarchy"):
+        hierarchy = SwitchHierarchy.build(stacks, ports, switches)
+
+    json_output = None
+    if with_json:
+        # Luo JSON-tuloste tunnistetuista kytkimistä ja porteista
+        with span("generate_switch_json"):
+            json_output_dict = generate_switch_json(stacks, ports, trace=trace, hierarchy=hierarchy)
+
+        with span("serialize"):
+            # Serialisoidaan pyydettyyn muotoon (arvot ovat jo Pythonin perustyyppejä)
+            json_output = serialize(_attach_trace(json_output_dict, trace), output_format)
+
+    with span("render"):
+        draw_hierarchy(
+            img, hierarchy, box_thickness=box_thickness, font_scale=font_scale, alpha=alpha,
+            styles=styles_for(color_order),
         )
 
     # Palauta kuva bounding boxien kanssa ja JSON-tuloste
@@ -0,0 +1,308 @@
+"""Tämä moduuli sisältää kaksivaiheisen (coarse-to-fine) kaskadi-inferenssin.
+
+Portit ovat aina kytkinten ja porttipinojen sisällä, jotka kattavat usein vain
+pienen osan laitekaappikuvasta. Kaskadissa koko kuva ajetaan ensin pienellä
+syötekoolla (cascade_imgsz), josta otetaan kytkimet ja porttipinot. Pinojen
+alueet (marginaalilla laajennettuina ja päällekkäiset yhdistettyinä) leikataan
+alkuperäisestä kuvasta täydellä resoluutiolla ja jaetaan tarvittaessa
+tile_size-kokoisiin soluihin. Solut pakataan hyllyalgoritmilla yhteisille
+tile_size × tile_size -kankaille, jotta matalat kytkinrivit eivät tuhlaa
+mallin neliömäistä syötettä reunustukseen, ja kankaat ajetaan mallin läpi
+erissä. Porttien koordinaatit projisoidaan takaisin koko kuvan
+koordinaatteihin, joten draw_bboxes ja generate_switch_json toimivat
+sellaisenaan. Myös tarkan ajon pinot otetaan mukaan ja yhdistetään karkean
+ajon pinoihin, koska pienellä syötekoolla pinot voivat jäädä löytymättä
+(jolloin alueina käytetään kytkimiä).
+
+Jos karkea ajo ei löydä yhtään pinoa tai kytkintä, palataan tavalliseen
+yhden ajon inferenssiin.
+
+Sisältää:
+- crop_regions: Laskee tarkan ajon alueet karkean ajon pinoista ja kytkimistä.
+- pack_cells: Pakkaa solut kankaille.
+- predict_regions: Ajaa tarkan ajon annetuille alueille.
+- cascade_predict: Ajaa kaskadi-inferenssin ja palauttaa yhdistetyn tuloksen.
+"""
+
+import numpy as np
+
+from backends import BackendResult
+from image_buffer import RGB, as_array
+from tiling import _touches_inner_edge, make_tiles, merge_detections
+
+# Karkeasta ajosta otettavat luokat: LAN-porttipino ja kytkin
+REGION_CLASSES = (2, 3)
+# Tarkasta ajosta otettavat luokat: Cable, LAN-portti ja LAN-porttipino (pinot
+# yhdistetään karkean ajon pinoihin; pienellä syötekoolla pinot voivat jäädä löytymättä)
+FINE_CLASSES = (0, 1, 2)
+# Kankaan reunustus ja solujen väli (sama harmaa kuin letterboxissa)
+PAD_VALUE = 114
+CELL_GAP = 8
+
+
+def _merge_overlapping(regions):
+    """Yhdistää päällekkäiset suorakulmiot niiden ympäröiväksi suorakulmioksi."""
+    regions = [list(region) for region in regions]
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        while regions:
+            current = regions.pop()
+            i = 0
+            while i < len(regions):
+                other = regions[i]
+                if (current[0] < other[2] and other[0] < current[2]
+                        and current[1] < other[3] and other[1] < current[3]):
+                    current = [
+                        min(current[0], other[0]), min(current[1], other[1]),
+                        max(current[2], other[2]), max(current[3], other[3]),
+                    ]
+                    regions.pop(i)
+                    merged = True
+                else:
+                    i += 1
+            result.append(current)
+        regions = result
+    return sorted(tuple(region) for region in regions)
+
+
+def crop_regions(boxes, classes, width, height, margin=0.1):
+    """
+    Laskee tarkan ajon alueet karkean ajon tunnistuksista.
+
+    Alueina käytetään porttipinoja; jos pinoja ei löytynyt, käytetään kytkimiä.
+    Laatikkoa laajennetaan joka suuntaan osuudella margin sen korkeudesta, jotta
+    reunimmaiset portit mahtuvat kokonaan, ja päällekkäiset alueet yhdistetään.
+
+    Args:
+        boxes (numpy.ndarray): Karkean ajon laatikot (N, 4) koko kuvan koordinaateissa.
+        classes (numpy.ndarray): Luokat (N,).
+        width (int): Kuvan leveys.
+        height (int): Kuvan korkeus.
+        margin (float, optional): Laajennus osuutena laatikon korkeudesta. Oletus 0.1.
+
+    Returns:
+        list: Alueet kokonaislukuina muodossa (x1, y1, x2, y2).
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    classes = np.asarray(classes).reshape(-1)
+    selected = boxes[classes == 2]
+    if len(selected) == 0:
+        selected = boxes[classes == 3]
+    if len(selected) == 0:
+        return []
+    pad = margin * (selected[:, 3] - selected[:, 1])
+    expanded = np.stack([
+        np.floor(np.clip(selected[:, 0] - pad, 0, width)),
+        np.floor(np.clip(selected[:, 1] - pad, 0, height)),
+        np.ceil(np.clip(selected[:, 2] + pad, 0, width)),
+        np.ceil(np.clip(selected[:, 3] + pad, 0, height)),
+    ], axis=1).astype(int)
+    valid = (expanded[:, 2] > expanded[:, 0]) & (expanded[:, 3] > expanded[:, 1])
+    return _merge_overlapping(expanded[valid].tolist())
+
+
+def pack_cells(cells, canvas_size, gap=CELL_GAP):
+    """
+    Pakkaa solut kankaille hyllyalgoritmilla (korkeimmat ensin).
+
+    Args:
+        cells (list): Solut muodossa (x1, y1, x2, y2); kunkin sivu on enintään canvas_size.
+        canvas_size (int): Kankaan sivun pituus.
+        gap (int, optional): Solujen väli pikseleinä. Oletus CELL_GAP.
+
+    Returns:
+        list: Kankaat listoina sijoituksista (solu, x, y), jossa (x, y) on
+            solun vasen yläkulma kankaalla.
+    """
+    order = sorted(cells, key=lambda cell: (cell[3] - cell[1], cell[2] - cell[0]), reverse=True)
+    canvases = []
+    shelves = []  # kangas, hyllyn y, hyllyn korkeus, seuraava vapaa x
+    for cell in order:
+        cell_w, cell_h = cell[2] - cell[0], cell[3] - cell[1]
+        for shelf in shelves:
+            canvas, shelf_y, shelf_h, next_x = shelf
+            if cell_h <= shelf_h and next_x + cell_w <= canvas_size:
+                canvases[canvas].append((cell, next_x, shelf_y))
+                shelf[3] = next_x + cell_w + gap
+                break
+        else:
+            # Uusi hylly viimeisimmälle kankaalle, jos tilaa on, muuten uusi kangas
+            last = [shelf for shelf in shelves if shelf[0] == len(canvases) - 1]
+            shelf_y = max((s[1] + s[2] + gap for s in last), default=0)
+            if not canvases or shelf_y + cell_h > canvas_size:
+                canvases.append([])
+                shelf_y = 0
+            canvases[-1].append((cell, 0, shelf_y))
+            shelves.append([len(canvases) - 1, shelf_y, cell_h, cell_w + gap])
+    return canvases
+
+
+def _render_canvas(image, placements):
+    """Kopioi solut kankaalle; kangas rajataan käytettyyn alueeseen."""
+    canvas_w = max(x + cell[2] - cell[0] for cell, x, _ in placements)
+    canvas_h = max(y + cell[3] - cell[1] for cell, _, y in placements)
+    canvas = np.full((canvas_h, canvas_w) + image.shape[2:], PAD_VALUE, dtype=image.dtype)
+    for (x1, y1, x2, y2), x, y in placements:
+        canvas[y:y + y2 - y1, x:x + x2 - x1] = image[y1:y2, x1:x2]
+    return canvas
+
+
+def _project_detections(result, placements, width, height, edge_margin):
+    """Siirtää kankaan porttien ja pinojen tunnistukset koko kuvan koordinaatteihin."""
+    boxes = result.boxes.xyxy.cpu().numpy().astype(np.float32)
+    scores = result.boxes.conf.cpu().numpy()
+    classes = result.boxes.cls.cpu().numpy()
+    fine = np.isin(classes, FINE_CLASSES)
+    boxes, scores, classes = boxes[fine], scores[fine], classes[fine]
+    centers_x = (boxes[:, 0] + boxes[:, 2]) / 2
+    centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+
+    out_boxes, out_scores, out_classes = [], [], []
+    for (x1, y1, x2, y2), x, y in placements:
+        # Tunnistus kuuluu solulle, jonka sisällä sen keskipiste on kankaalla
+        inside = (
+            (centers_x >= x) & (centers_x < x + x2 - x1)
+            & (centers_y >= y) & (centers_y < y + y2 - y1)
+        )
+        if not inside.any():
+            continue
+        cell_boxes = boxes[inside].copy()
+        cell_boxes[:, [0, 2]] = np.clip(cell_boxes[:, [0, 2]] - x, 0, x2 - x1) + x1
+        cell_boxes[:, [1, 3]] = np.clip(cell_boxes[:, [1, 3]] - y, 0, y2 - y1) + y1
+        # Solun reunaan osuvat kohteet ovat leikkautuneita (kuvan reunaa lukuun ottamatta)
+        keep = ~_touches_inner_edge(cell_boxes, (x1, y1, x2, y2), width, height, edge_margin)
+        out_boxes.append(cell_boxes[keep])
+        out_scores.append(scores[inside][keep])
+        out_classes.append(classes[inside][keep])
+    return out_boxes, out_scores, out_classes
+
+
+def predict_regions(
+    backend,
+    image,
+    regions,
+    tile_size=1216,
+    overlap=0.2,
+    batch_size=4,
+    iou=0.4,
+    conf=0.4,
+    edge_margin=2,
+    color_order=RGB,
+):
+    """
+    Ajaa tarkan ajon kuvan alueille täydellä resoluutiolla.
+
+    Alueet jaetaan tile_size-kokoisiin soluihin, solut pakataan kankaille ja
+    kankaat ajetaan mallin läpi erissä. Kaskadin toinen vaihe; myös
+    inkrementaalinen uudelleenkartoitus (resurvey.py) käyttää tätä muuttuneille pinoille.
+
+    Args:
+        backend: Inferenssitausta (ks. cascade_predict).
+        image (numpy.ndarray): Kuva (H, W, 3).
+        regions (list): Alueet muodossa (x1, y1, x2, y2) kokonaislukuina.
+        tile_size (int, optional): Solun ja kankaan sivun pituus. Oletus 1216.
+        overlap (float, optional): Suurten alueiden solujen limitys. Oletus 0.2.
+        batch_size (int, optional): Kerralla mallille annettavien kankaiden määrä. Oletus 4.
+        iou (float, optional): Mallin NMS:n IoU-kynnys. Oletus 0.4.
+        conf (float, optional): Luottamuskynnys. Oletus 0.4.
+        edge_margin (int, optional): Leikkautuneiden porttien reunaetäisyys (px). Oletus 2.
+        color_order (str, optional): Kuvan värijärjestys. Oletus RGB.
+
+    Returns:
+        tuple: (boxes, scores, classes) koko kuvan koordinaateissa; vain
+            FINE_CLASSES-luokat, solujen väliset päällekkäisyydet yhdistämättä.
+    """
+    height, width = image.shape[:2]
+    cells = []
+    for x1, y1, x2, y2 in regions:
+        for cx1, cy1, cx2, cy2 in make_tiles(x2 - x1, y2 - y1, tile_size, overlap):
+            cells.append((x1 + cx1, y1 + cy1, x1 + cx2, y1 + cy2))
+    canvases = pack_cells(cells, tile_size)
+
+    all_boxes = [np.zeros((0, 4), dtype=np.float32)]
+    all_scores = [np.zeros(0, dtype=np.float32)]
+    all_classes = [np.zeros(0, dtype=np.float32)]
+    for start in range(0, len(canvases), batch_size):
+        batch = canvases[start:start + batch_size]
+        results = backend(
+            [_render_canvas(image, placements) for placements in batch],
+            iou=iou, conf=conf, color_order=color_order,
+        )
+        for placements, result in zip(batch, results):
+            boxes, scores, classes = _project_detections(result, placements, width, height, edge_margin)
+            all_boxes.extend(boxes)
+            all_scores.extend(scores)
+            all_classes.extend(classes)
+    return np.concatenate(all_boxes), np.concatenate(all_scores), np.concatenate(all_classes)
+
+
+def cascade_predict(
+    backend,
+    image,
+    coarse_backend=None,
+    tile_size=1216,
+    overlap=0.2,
+    batch_size=4,
+    iou=0.4,
+    conf=0.4,
+    margin=0.1,
+    merge_iou=0.5,
+    merge_mode="nms",
+    edge_margin=2,
+    color_order=RGB,
+):
+    """
+    Ajaa kaksivaiheisen kaskadi-inferenssin yhdelle kuvalle.
+
+    Args:
+        backend: Tarkan ajon inferenssitausta (mallin täysi syötekoko), kutsutaan
+            muodossa backend(images, iou=..., conf=..., color_order=...).
+        image (numpy.ndarray | PIL.Image): Syötekuva (H, W, 3).
+        coarse_backend (optional): Karkean ajon tausta pienellä syötekoolla.
+            Oletus backend.
+        tile_size (int, optional): Solun ja kankaan sivun pituus alkuperäisinä
+            pikseleinä; oletuksena mallin syötekoko 1216, jolloin portit
+            nähdään natiiviresoluutiolla. Oletus 1216.
+        overlap (float, optional): Suurten alueiden solujen limitys. Oletus 0.2.
+        batch_size (int, optional): Kerralla mallille annettavien kankaiden määrä. Oletus 4.
+        iou (float, optional): Mallin NMS:n IoU-kynnys. Oletus 0.4.
+        conf (float, optional): Luottamuskynnys. Oletus 0.4.
+        margin (float, optional): Alueiden laajennus osuutena pinon korkeudesta. Oletus 0.1.
+        merge_iou (float, optional): Solujen välisen yhdistämisen IoU-kynnys. Oletus 0.5.
+        merge_mode (str, optional): 'nms' tai 'fusion'. Oletus 'nms'.
+        edge_margin (int, optional): Etäisyys (px), jolla solun reunaa koskettavat
+            portit hylätään leikkautuneina. Oletus 2.
+        color_order (str, optional): Kuvan värijärjestys. Oletus RGB.
+
+    Returns:
+        BackendResult: Kytkimet karkeasta ajosta, portit tarkasta ajosta ja
+            molempien pinot yhdistettyinä koko kuvan koordinaateissa.
+    """
+    image = as_array(image, color_order)
+    height, width = image.shape[:2]
+    coarse_backend = coarse_backend or backend
+
+    # Vaihe 1: kytkimet ja pinot pieneltä syötekoolta
+    coarse = coarse_backend(image, iou=iou, conf=conf, color_order=color_order)[0]
+    coarse_boxes = coarse.boxes.xyxy.cpu().numpy().astype(np.float32)
+    coarse_scores = coarse.boxes.conf.cpu().numpy()
+    coarse_classes = coarse.boxes.cls.cpu().numpy()
+    regions = crop_regions(coarse_boxes, coarse_classes, width, height, margin)
+    if not regions:
+        # Karkea ajo ei löytänyt kytkimiä: tavallinen yhden ajon inferenssi
+        return backend(image, iou=iou, conf=conf, color_order=color_order)[0]
+
+    # Vaihe 2: alueet soluiksi, solut kankaille ja kankaat mallille erissä
+    fine_boxes, fine_scores, fine_classes = predict_regions(
+        backend, image, regions, tile_size=tile_size, overlap=overlap, batch_size=batch_size,
+        iou=iou, conf=conf, edge_margin=edge_margin, color_order=color_order,
+    )
+
+    large = np.isin(coarse_classes, REGION_CLASSES)
+    boxes = np.concatenate([coarse_boxes[large], fine_boxes])
+    scores = np.concatenate([coarse_scores[large], fine_scores])
+    classes = np.concatenate([coarse_classes[large], fine_classes])
+    boxes, scores, classes = merge_detections(boxes, scores, classes, merge_iou, merge_mode)
+    return BackendResult(boxes, scores, classes, (height, width))
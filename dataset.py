@@ -0,0 +1,155 @@
+"""Tämä moduuli sisältää apufunktiot data.yaml-aineiston käsittelyyn.
+
+data.yaml viittaa jakoihin (train, val, test) polkuina, jotka Roboflow-vienneissä
+ovat muotoa "../train/images". Polut tulkitaan ensin suhteessa data.yaml:n
+hakemistoon (tai sen path-avaimeen) ja sitten suhteessa nykyiseen hakemistoon;
+lisäksi kokeillaan polkua ilman alkuosaa "../", koska Roboflow-viennit
+puretaan usein samaan hakemistoon data.yaml:n kanssa.
+
+Nimiöt ovat YOLO-muodossa: kuvaa images/kuva.jpg vastaa tiedosto
+labels/kuva.txt, jonka riveillä on "luokka cx cy w h" normalisoituina.
+
+Sisältää:
+- IMAGE_EXTENSIONS: Tuetut kuvatiedostojen päätteet.
+- load_data_config: Lukee data.yaml-tiedoston.
+- resolve_split_dir: Selvittää jaon kuvahakemiston.
+- list_split_images: Listaa jaon kuvat (valinnaisesti toistettava otos).
+- label_path: Palauttaa kuvan nimiötiedoston polun.
+- read_yolo_labels: Lukee YOLO-nimiöt pikselikoordinaatteina.
+"""
+
+import os
+
+import numpy as np
+import yaml
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+def load_data_config(path="data.yaml"):
+    """
+    Lukee aineiston asetukset.
+
+    Args:
+        path (str, optional): data.yaml-tiedoston polku. Oletus 'data.yaml'.
+
+    Returns:
+        dict: Asetukset; lisäksi avain '_dir' = data.yaml:n hakemisto.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file) or {}
+    config["_dir"] = os.path.dirname(os.path.abspath(path))
+    return config
+
+
+def resolve_split_dir(config, split):
+    """
+    Selvittää jaon kuvahakemiston.
+
+    Args:
+        config (dict): load_data_config-funktion palauttamat asetukset.
+        split (str): 'train', 'val' tai 'test'.
+
+    Returns:
+        str: Olemassa oleva hakemisto.
+
+    Raises:
+        KeyError: Jos jakoa ei ole määritelty.
+        FileNotFoundError: Jos hakemistoa ei löydy.
+    """
+    if split not in config:
+        raise KeyError(f"Jakoa '{split}' ei ole määritelty data.yaml-tiedostossa.")
+    entry = config[split]
+    base = config.get("path") or config["_dir"]
+    if not os.path.isabs(base):
+        base = os.path.join(config["_dir"], base)
+
+    candidates = [entry] if os.path.isabs(entry) else [
+        os.path.join(base, entry),
+        os.path.join(base, entry.replace("../", "", 1)),
+        os.path.abspath(entry),
+    ]
+    for candidate in candidates:
+        if os.path.isdir(candidate):
+            return os.path.normpath(candidate)
+    raise FileNotFoundError(
+        f"Jaon '{split}' hakemistoa ei löydy (kokeiltu: {', '.join(candidates)})."
+    )
+
+
+def list_split_images(config, split, limit=None, seed=0):
+    """
+    Listaa jaon kuvat aakkosjärjestyksessä.
+
+    Args:
+        config (dict): load_data_config-funktion palauttamat asetukset.
+        split (str): 'train', 'val' tai 'test'.
+        limit (int, optional): Palautettavien kuvien enimmäismäärä. Jos annettu,
+            valitaan toistettava satunnaisotos. Oletus None (kaikki).
+        seed (int, optional): Otoksen satunnaislukusiemen. Oletus 0.
+
+    Returns:
+        list: Kuvien polut.
+    """
+    directory = resolve_split_dir(config, split)
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+    if limit is not None and limit < len(paths):
+        chosen = np.random.default_rng(seed).choice(len(paths), size=limit, replace=False)
+        paths = [paths[i] for i in sorted(chosen)]
+    return paths
+
+
+def label_path(image_path):
+    """
+    Palauttaa kuvan YOLO-nimiötiedoston polun (.../images/x.jpg -> .../labels/x.txt).
+
+    Args:
+        image_path (str): Kuvan polku.
+
+    Returns:
+        str: Nimiötiedoston polku.
+    """
+    directory, name = os.path.split(image_path)
+    parent, leaf = os.path.split(directory)
+    labels_dir = os.path.join(parent, "labels") if leaf == "images" else directory
+    return os.path.join(labels_dir, os.path.splitext(name)[0] + ".txt")
+
+
+def read_yolo_labels(path, width, height):
+    """
+    Lukee YOLO-nimiöt ja muuntaa ne pikselikoordinaateiksi.
+
+    Args:
+        path (str): Nimiötiedoston polku.
+        width (int): Kuvan leveys.
+        height (int): Kuvan korkeus.
+
+    Returns:
+        tuple: (xyxy, cls) NumPy-taulukkoina; tyhjät taulukot, jos tiedostoa ei ole.
+    """
+    boxes, classes = [], []
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    for line in lines:
+        values = [float(value) for value in line.split()]
+        if len(values) < 5:
+            continue
+        coords = values[1:]
+        if len(coords) == 4:
+            cx, cy, w, h = coords
+            x1, y1, x2, y2 = cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2
+        else:
+            # Segmentointinimiö (monikulmio) muunnetaan ympäröiväksi laatikoksi
+            xs, ys = coords[0::2], coords[1::2]
+            x1, y1, x2, y2 = min(xs), min(ys), max(xs), max(ys)
+        boxes.append((x1 * width, y1 * height, x2 * width, y2 * height))
+        classes.append(int(values[0]))
+    if not boxes:
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.int64)
+    return np.asarray(boxes, dtype=np.float32), np.asarray(classes, dtype=np.int64)
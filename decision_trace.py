@@ -0,0 +1,95 @@
+"""Tämä moduuli sisältää porttinumeroinnin päätösjäljen tallentimen.
+
+generate_switch_json kirjaa tallentimeen kytkin–stack-hierarkian (kytkinten
+laatikot ja lähteet sekä stackien kytkimet), porttien sarakeryhmittelyn ja
+porttinumeroiden antamisen. Jälki on tiivis JSON-yhteensopiva rakenne, joka voidaan liittää
+JSON-tulosteeseen avaimella "trace" tai kirjoittaa tiedostoon väärien
+porttinumeroiden selvittämistä varten.
+
+Kun jälkeä ei pyydetä (trace=None), generate_switch_json ei muotoile eikä
+tallenna mitään, joten jäljitys ei maksa mitään.
+
+Portit ja stackit viitataan indekseillä tunnistusjärjestyksessä (extract_boxes),
+ja koordinaatit pyöristetään kahteen desimaaliin.
+
+Sisältää:
+- DecisionTrace: Päätösjäljen tallennin.
+"""
+
+import json
+import time
+
+
+def _rounded(values):
+    """Muuntaa lukujonon pyöristetyiksi Python-liukuluvuiksi."""
+    return [round(float(value), 2) for value in values]
+
+
+class DecisionTrace:
+    """
+    Yhden tunnistuksen päätösjälki.
+
+    Args:
+        attach (bool, optional): Liitetäänkö jälki JSON-tulosteeseen
+            avaimella "trace". Oletus False.
+        label (str, optional): Tunniste, esim. kuvan polku. Oletus None.
+    """
+
+    __slots__ = ("attach", "label", "created", "events")
+
+    def __init__(self, attach=False, label=None):
+        self.attach = attach
+        self.label = label
+        self.created = time.time()
+        self.events = []
+
+    def record(self, event, **fields):
+        """Lisää tapahtuman jälkeen."""
+        self.events.append({"event": event, **fields})
+
+    def hierarchy(self, hierarchy):
+        """Kirjaa kytkinten laatikot ja lähteet sekä stackien kytkimet (spatial_index.SwitchHierarchy)."""
+        self.record(
+            "hierarchy",
+            switches=[
+                {
+                    "switch_id": f"Switch_{index + 1}",
+                    "box": _rounded(box),
+                    "detection": int(detection) if detection >= 0 else None,
+                }
+                for index, (box, detection) in enumerate(
+                    zip(hierarchy.switch_boxes, hierarchy.switch_detection.tolist())
+                )
+            ],
+            stack_switch=[int(switch) for switch in hierarchy.stack_switch],
+            unassigned_ports=int((~hierarchy.assigned_ports()).sum()),
+        )
+
+    def stack(self, stack_id, switch_id, stack_index):
+        """Kirjaa stackin kytkimen ja aloittaa stackin porttipäätökset."""
+        self.record("stack", stack_id=stack_id, switch_id=switch_id, stack_index=int(stack_index))
+
+    def columns(self, port_indices, centers, avg_x_diff, threshold, column_sizes):
+        """Kirjaa x-järjestyksen ja sarakeryhmittelyn."""
+        self.record(
+            "columns",
+            ports=[int(index) for index in port_indices],
+            x=_rounded(center[0] for center in centers),
+            y=_rounded(center[1] for center in centers),
+            avg_x_diff=round(float(avg_x_diff), 2),
+            threshold=round(float(threshold), 2),
+            column_sizes=[int(size) for size in column_sizes],
+        )
+
+    def assignments(self, numbers):
+        """Kirjaa stackin porttinumerot listana [portin indeksi, numero, rivi]."""
+        self.record("assignments", ports=numbers)
+
+    def to_dict(self):
+        """Palauttaa jäljen JSON-yhteensopivana sanakirjana."""
+        return {"label": self.label, "created": self.created, "events": self.events}
+
+    def dump(self, path):
+        """Kirjoittaa jäljen JSON-tiedostoon."""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, separators=(',', ':'))
@@ -1,25 +1,127 @@
-from ultralytics import YOLO
-import torch
-from PIL import Image
-from bounding_boxes import draw_bboxes
+import os
+import uuid
+
+from backends import BackendResult, get_backend, load_inference_config
+from bounding_boxes import draw_bboxes, results_to_json
+from cascade import cascade_predict
+from decision_trace import DecisionTrace
+from image_buffer import RGB, as_array
+from metrics import increment, record_model_speed, span
+from result_cache import get_cache
+from tiling import sliced_predict
+
+
+# inference.yaml settings that change the detections (besides the weights file)
+DETECTION_SETTINGS = (
+    'backend', 'imgsz', 'iou', 'conf', 'sliced', 'tile_size', 'tile_overlap', 'merge_iou', 'merge_mode',
+    'cascade', 'cascade_imgsz', 'cascade_weights', 'cascade_margin',
+)
+
+
+def _cache_key(cache, image, config, color_order):
+    # Everything that changes the detections is part of the key
+    return cache.make_key(
+        image, config['weights'], color_order=color_order,
+        **{name: config[name] for name in DETECTION_SETTINGS},
+    )
+
+
+def run_inference(image, config, color_order=RGB):
+    # Model results for one decoded (H, W, 3) array: cascade, sliced or single pass
+    # as configured. Shared by predict and the evaluation harness (evaluate_pipeline.py).
+    backend = get_backend(config)
+    if config['cascade']:
+        # Low-resolution pass for switches and stacks, full-resolution pass for their ports
+        coarse_backend = get_backend(dict(
+            config, imgsz=config['cascade_imgsz'],
+            weights=config['cascade_weights'] or config['weights'],
+        ))
+        return [cascade_predict(
+            backend, image, coarse_backend=coarse_backend,
+            tile_size=config['tile_size'], overlap=config['tile_overlap'],
+            batch_size=config['tile_batch'], iou=config['iou'], conf=config['conf'],
+            margin=config['cascade_margin'], merge_iou=config['merge_iou'],
+            merge_mode=config['merge_mode'],
+            color_order=color_order,
+        )]
+    if config['sliced']:
+        return [sliced_predict(
+            backend, image,
+            tile_size=config['tile_size'], overlap=config['tile_overlap'],
+            batch_size=config['tile_batch'], iou=config['iou'], conf=config['conf'],
+            merge_iou=config['merge_iou'], merge_mode=config['merge_mode'], color_order=color_order,
+        )]
+    return backend(image, iou=config['iou'], conf=config['conf'], color_order=color_order)
 
 
 # Define the prediction function
-def predict(image):
-    # Set up device
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    print(f"Device: {device}")
+def predict(image, render=True, inplace=False, color_order=RGB):
+    # render=False is the headless JSON-only path: no drawing and no image copy;
+    # OpenCV is only imported when rendering.
+    # The array goes to the backend and the renderer as is (image_buffer contract):
+    # color_order tells whether it is RGB (Gradio) or BGR (cv2.imread), and
+    # inplace=True draws onto the caller's array instead of a copy
+    # Get the configured inference backend (created and warmed up once per process)
+    increment("portvision_images_total", entry="predict")
+    with span("load_backend"):
+        config = load_inference_config()
+        backend = get_backend(config)
+
+    # Record the port numbering decisions when tracing is enabled
+    trace = None
+    if config['trace'] or config['trace_dir']:
+        trace = DecisionTrace(attach=config['trace'])
 
-    # Load the YOLO model
-    model = YOLO(r'best.pt').to(device)
+    # PIL images and grayscale/RGBA arrays are converted once; (H, W, 3) arrays pass through
+    array = as_array(image, color_order)
+    # A converted image is already a private buffer, so it is drawn on without another copy
+    inplace = inplace or array is not image
+    image = array
 
-    # Convert Gradio numpy image to PIL Image
-    image = Image.fromarray(image)
+    # Serve repeated images from the result cache without running inference
+    # (traced requests bypass the cache so that the trace is always produced)
+    cache = get_cache(config) if config['cache'] and trace is None else None
+    if cache is not None:
+        with span("cache_lookup"):
+            key = _cache_key(cache, image, config, color_order)
+            entry = cache.get(key)
+        if entry is not None:
+            if not render:
+                return None, entry['json']
+            cached = BackendResult(entry['xyxy'], entry['conf'], entry['cls'], image.shape[:2])
+            result_img, _ = draw_bboxes(
+                image, [cached], box_thickness=2, font_scale=0.6, alpha=0.6, with_json=False,
+                color_order=color_order, inplace=inplace,
+            )
+            return result_img, entry['json']
 
-    # Perform inference
-    results = model(image, iou=0.4, conf=0.4)  # Adjust thresholds as needed
+    # Perform inference (thresholds, tiling and cascade in inference.yaml)
+    with span("inference"):
+        results = run_inference(image, config, color_order)
+    # Split of the model call into preprocess / inference / NMS
+    record_model_speed(results)
     
-    # Draw custom bounding boxes and return the image
-    result_img, json_output = draw_bboxes(image, results, box_thickness=2, font_scale=0.6, alpha=0.6)
+    # Draw custom bounding boxes and return the image (or only the JSON)
+    if render:
+        result_img, json_output = draw_bboxes(
+            image, results, box_thickness=2, font_scale=0.6, alpha=0.6, trace=trace,
+            color_order=color_order, inplace=inplace,
+        )
+    else:
+        result_img, json_output = None, results_to_json(results, trace=trace)
+
+    if trace is not None and config['trace_dir']:
+        os.makedirs(config['trace_dir'], exist_ok=True)
+        trace.dump(os.path.join(config['trace_dir'], f"{int(trace.created)}-{uuid.uuid4().hex[:8]}.json"))
+
+    if cache is not None:
+        boxes = results[0].boxes
+        with span("cache_store"):
+            cache.put(key, boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy(), json_output)
 
     return result_img, json_output
+
+
+def predict_json(image, color_order=RGB):
+    # Headless fast path: port JSON only, nothing is drawn or re-encoded
+    return predict(image, render=False, color_order=color_order)[1]
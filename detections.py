@@ -0,0 +1,179 @@
+"""Tämä moduuli sisältää sarakemuotoisen tunnistussäiliön jälkikäsittelyä varten.
+
+Detections pitää yhden kuvan tunnistukset rinnakkaisina NumPy-taulukkoina
+(xyxy, conf, class_id) sen sijaan, että jokaisesta objektista luotaisiin oma
+Python-monikko. Keskipisteet lasketaan kerran tarvittaessa, luokkasuodatus
+palauttaa uuden säiliön indeksitaulukon avulla ja järjestykset lasketaan
+vakaalla argsortilla. generate_switch_json ja draw_bboxes käyttävät säiliötä
+suoraan; Python-tyypit tuotetaan vasta JSON-tulosteeseen.
+
+Luokat: 0 = Cable (kaapeloitu portti), 1 = LAN-portti (tyhjä),
+2 = LAN-porttipino, 3 = kytkin.
+
+Sisältää:
+- Detections: Tunnistukset sarakemuotoisena säiliönä.
+"""
+
+import numpy as np
+
+CABLE_CLASS = 0
+EMPTY_CLASS = 1
+STACK_CLASS = 2
+SWITCH_CLASS = 3
+PORT_CLASSES = (CABLE_CLASS, EMPTY_CLASS)
+
+# Porttiluokan tila JSON-tulosteessa
+PORT_STATUS = {CABLE_CLASS: 'Cable', EMPTY_CLASS: 'empty'}
+STATUS_CLASS = {status: class_id for class_id, status in PORT_STATUS.items()}
+
+
+class Detections:
+    """
+    Tunnistukset sarakemuotoisena säiliönä (struct of arrays).
+
+    Args:
+        xyxy (array-like): Laatikot muodossa (N, 4).
+        conf (array-like): Luottamusarvot muodossa (N,).
+        class_id (array-like): Luokkien ID:t muodossa (N,).
+    """
+
+    __slots__ = ("xyxy", "conf", "class_id", "_centers")
+
+    def __init__(self, xyxy, conf, class_id):
+        self.xyxy = np.asarray(xyxy).reshape(-1, 4)
+        self.conf = np.asarray(conf).reshape(-1)
+        self.class_id = np.asarray(class_id).reshape(-1).astype(np.int64, copy=False)
+        self._centers = None
+
+    @classmethod
+    def empty(cls):
+        """Palauttaa tyhjän säiliön."""
+        return cls(np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64))
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        Luo säiliön ultralytics-yhteensopivista tuloksista (result.boxes.xyxy/conf/cls).
+
+        Args:
+            results (list): Lista tunnistustuloksista.
+
+        Returns:
+            Detections: Kaikkien tulosten tunnistukset tunnistusjärjestyksessä.
+        """
+        parts = [
+            (r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy(), r.boxes.cls.cpu().numpy())
+            for r in results
+        ]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return cls(*parts[0])
+        return cls(*(np.concatenate(column) for column in zip(*parts)))
+
+    @classmethod
+    def from_port_boxes(cls, port_boxes):
+        """
+        Luo säiliön porteista muodossa (box, conf, 'Cable'|'empty').
+
+        Returns:
+            Detections: Portit luokilla 0 (Cable) ja 1 (empty).
+        """
+        if isinstance(port_boxes, Detections):
+            return port_boxes
+        if len(port_boxes) == 0:
+            return cls.empty()
+        boxes, confs, statuses = zip(*port_boxes)
+        return cls(np.stack(boxes), np.asarray(confs), [STATUS_CLASS[s] for s in statuses])
+
+    @classmethod
+    def from_boxes(cls, boxes, class_id):
+        """
+        Luo säiliön yhden luokan laatikoista muodossa (box, conf).
+
+        Returns:
+            Detections: Laatikot luokalla class_id.
+        """
+        if isinstance(boxes, Detections):
+            return boxes
+        if len(boxes) == 0:
+            return cls.empty()
+        xyxy, confs = zip(*boxes)
+        return cls(np.stack(xyxy), np.asarray(confs), np.full(len(xyxy), class_id))
+
+    def __len__(self):
+        return len(self.class_id)
+
+    @property
+    def centers(self):
+        """Keskipisteet muodossa (N, 2), sama dtype kuin laatikoilla."""
+        if self._centers is None:
+            self._centers = (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+        return self._centers
+
+    def select(self, indices):
+        """
+        Palauttaa säiliön, jossa on vain annetut rivit.
+
+        Args:
+            indices (numpy.ndarray): Indeksit tai totuusarvomaski.
+
+        Returns:
+            Detections: Valitut tunnistukset.
+        """
+        selected = Detections(self.xyxy[indices], self.conf[indices], self.class_id[indices])
+        if self._centers is not None:
+            selected._centers = self._centers[indices]
+        return selected
+
+    def of_class(self, *class_ids):
+        """Palauttaa annettujen luokkien tunnistukset alkuperäisessä järjestyksessä."""
+        if len(class_ids) == 1:
+            mask = self.class_id == class_ids[0]
+        else:
+            mask = np.isin(self.class_id, class_ids)
+        return self.select(np.flatnonzero(mask))
+
+    @property
+    def ports(self):
+        """Portit (luokat 0 ja 1)."""
+        return self.of_class(*PORT_CLASSES)
+
+    @property
+    def stacks(self):
+        """LAN-porttipinot (luokka 2)."""
+        return self.of_class(STACK_CLASS)
+
+    @property
+    def switches(self):
+        """Kytkimet (luokka 3)."""
+        return self.of_class(SWITCH_CLASS)
+
+    def order_by(self, key):
+        """
+        Palauttaa vakaan järjestyksen annetun sarakkeen mukaan.
+
+        Args:
+            key (str): 'x1', 'y1', 'x2', 'y2', 'cx' tai 'cy'.
+
+        Returns:
+            numpy.ndarray: Indeksit nousevassa järjestyksessä.
+        """
+        columns = {"x1": 0, "y1": 1, "x2": 2, "y2": 3}
+        if key in columns:
+            values = self.xyxy[:, columns[key]]
+        else:
+            values = self.centers[:, {"cx": 0, "cy": 1}[key]]
+        return np.argsort(values, kind='stable')
+
+    def statuses(self):
+        """Palauttaa porttien tilat ('Cable'|'empty') Python-listana."""
+        return [PORT_STATUS[c] for c in self.class_id.tolist()]
+
+    def to_port_boxes(self):
+        """Palauttaa portit vanhassa muodossa [(box, conf, 'Cable'|'empty')]."""
+        return list(zip(self.xyxy, self.conf, self.statuses()))
+
+    def to_boxes(self):
+        """Palauttaa laatikot vanhassa muodossa [(box, conf)]."""
+        return list(zip(self.xyxy, self.conf))
@@ -0,0 +1,351 @@
+"""Tämä skripti arvioi koko tunnistusputken lopullisen JSON-tulosteen data.yaml-jaon nimiöitä vastaan.
+
+port_vision.py:n model.val() pisteyttää vain laatikot. Tämä arviointi ajaa
+jokaisen kuvan saman inferenssin läpi kuin detect.predict (inference.yaml:n
+viipalointi- ja kaskadiasetukset mukaan lukien), rakentaa
+generate_switch_json-tulosteen ja vertaa sitä nimiöistä rakennettuun
+asetteluun (evaluation.compare_port_layouts):
+- porttien tilan tarkkuus: sovitetuista porteista oikean tilan (Cable/empty) saaneet,
+- numerointivirheet: sovitetut portit, joiden (kytkin, pino, porttinumero) poikkeaa nimiöistä,
+- puuttuvat ja ylimääräiset portit sekä avainkohtainen tilojen yhtäpitävyys,
+- läpäisy kuvina sekunnissa.
+
+Kuvat jaetaan työprosessien joukolle; kukin prosessi lataa mallin kerran
+(backends.get_backend). GPU:lla yksi malli riittää yleensä, jolloin
+--workers 0 ajaa arvioinnin pääprosessissa.
+
+Kuvakohtaiset tulokset tallennetaan välimuistiin (JSONL), jonka nimi
+määräytyy painotiedoston tiivisteestä ja tunnistukseen vaikuttavista
+asetuksista. Kuvan tulos on voimassa niin kauan kuin kuvan ja sen
+nimiötiedoston koko ja muokkausaika pysyvät samoina, joten uusintaajo arvioi
+vain uudet tai muuttuneet kuvat. Rivit lisätään tiedostoon sitä mukaa kuin
+kuvat valmistuvat, joten keskeytetty ajo jatkuu siitä mihin se jäi.
+
+Esimerkki:
+    python evaluate_pipeline.py --weights best.pt --split test --workers 4 --report eval.json
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+import cv2
+import numpy as np
+
+from backends import load_inference_config
+from dataset import label_path, list_split_images, load_data_config, read_yolo_labels
+from detect import DETECTION_SETTINGS, run_inference
+from detections import Detections
+from evaluation import compare_port_layouts, port_layout, status_agreement
+from image_buffer import BGR
+from result_cache import weights_digest
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = ".cache/evaluation"
+
+# Summattavat kuvakohtaiset laskurit
+COUNTERS = (
+    "ports", "found", "missed", "extra", "status_correct", "numbering_errors", "correct",
+    "json_matched", "json_ports",
+)
+
+# Työprosessin inferenssiasetukset (_init_worker)
+_CONFIG = None
+
+
+def cache_path(config, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Palauttaa painotiedoston ja tunnistusasetusten välimuistitiedoston polun.
+
+    Args:
+        config (dict): Inferenssiasetukset.
+        cache_dir (str, optional): Välimuistihakemisto.
+
+    Returns:
+        str: JSONL-tiedoston polku.
+    """
+    settings = {name: config[name] for name in DETECTION_SETTINGS}
+    digest = hashlib.sha1(f"v{CACHE_VERSION}:".encode())
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    stem = os.path.splitext(os.path.basename(config["weights"]))[0]
+    return os.path.join(
+        cache_dir, f"{stem}-{weights_digest(config['weights'])[:16]}-{digest.hexdigest()[:8]}.jsonl"
+    )
+
+
+def image_fingerprint(path):
+    """
+    Laskee kuvan ja sen nimiötiedoston sormenjäljen koosta ja muokkausajasta.
+
+    Returns:
+        str: Sormenjälki.
+    """
+    parts = []
+    for source in (path, label_path(path)):
+        try:
+            stat = os.stat(source)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        except FileNotFoundError:
+            parts.append("-")
+    return "|".join(parts)
+
+
+def load_cache(path):
+    """
+    Lukee välimuistin kuvakohtaiset tulokset.
+
+    Returns:
+        dict: Kuvan polku -> viimeisin tulos.
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Keskeytyneen ajon vajaa viimeinen rivi
+                continue
+            records[record["path"]] = record
+    return records
+
+
+def _init_worker(config):
+    global _CONFIG
+    _CONFIG = config
+    # Rinnakkaisuus tulee prosesseista; OpenCV:n omat säikeet vain kilpailisivat niiden kanssa
+    cv2.setNumThreads(1)
+
+
+def evaluate_image(path, config=None):
+    """
+    Arvioi yhden kuvan: inferenssi, JSON-tuloste ja vertailu nimiöihin.
+
+    Args:
+        path (str): Kuvan polku.
+        config (dict, optional): Inferenssiasetukset. Oletus työprosessin asetukset.
+
+    Returns:
+        dict: Kuvan tulos (laskurit, virheelliset portit ja kesto).
+    """
+    config = config or _CONFIG
+    record = {"path": path, "fingerprint": image_fingerprint(path)}
+    start = time.perf_counter()
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        record["error"] = "kuvaa ei voitu lukea"
+        return record
+
+    results = run_inference(image, config, BGR)
+    detections = Detections.from_results(results)
+    predicted = port_layout(detections.xyxy, detections.conf, detections.class_id)
+    record["seconds"] = time.perf_counter() - start
+
+    height, width = image.shape[:2]
+    xyxy, cls = read_yolo_labels(label_path(path), width, height)
+    reference = port_layout(xyxy, np.ones(len(cls), dtype=np.float32), cls)
+    comparison = compare_port_layouts(predicted, reference)
+    agreement = status_agreement(predicted["json"], reference["json"])
+    record.update({name: comparison[name] for name in COUNTERS[:7]})
+    record["json_matched"] = agreement["matched"]
+    record["json_ports"] = agreement["ports"]
+    record["errors"] = comparison["errors"]
+    return record
+
+
+def summarize(records):
+    """
+    Kokoaa kuvakohtaiset tulokset jaon mittareiksi.
+
+    Returns:
+        dict: Summatut laskurit ja niistä lasketut osuudet.
+    """
+    totals = {name: sum(record.get(name, 0) for record in records) for name in COUNTERS}
+
+    def ratio(numerator, denominator):
+        return numerator / denominator if denominator else None
+
+    return {
+        "images": len(records),
+        "failed": sum(1 for record in records if "error" in record),
+        **totals,
+        "port_recall": ratio(totals["found"], totals["ports"]),
+        "port_precision": ratio(totals["found"], totals["found"] + totals["extra"]),
+        "status_accuracy": ratio(totals["status_correct"], totals["found"]),
+        "numbering_error_rate": ratio(totals["numbering_errors"], totals["found"]),
+        "port_accuracy": ratio(totals["correct"], totals["ports"]),
+        "json_status_agreement": ratio(totals["json_matched"], totals["json_ports"]),
+    }
+
+
+def run_evaluation(
+    weights=None,
+    data='data.yaml',
+    split='test',
+    config_path='inference.yaml',
+    workers=None,
+    cache_dir=DEFAULT_CACHE_DIR,
+    limit=None,
+    seed=0,
+    overrides=None,
+):
+    """
+    Arvioi jaon kuvat rinnakkain ja päivittää välimuistin.
+
+    Args:
+        weights (str, optional): Painotiedosto. Oletus inference.yaml:n weights.
+        data (str, optional): data.yaml-tiedoston polku.
+        split (str, optional): Arvioitava jako. Oletus 'test'.
+        config_path (str, optional): Inferenssiasetukset.
+        workers (int, optional): Työprosessien määrä; 0 = pääprosessissa.
+            Oletus prosessoriytimien määrä.
+        cache_dir (str, optional): Välimuistihakemisto.
+        limit (int, optional): Arvioitavien kuvien enimmäismäärä (toistettava otos).
+        seed (int, optional): Otoksen siemen.
+        overrides (dict, optional): Inferenssiasetusten korvaavat arvot (esim. iou, conf).
+
+    Returns:
+        dict: {'summary', 'evaluated', 'cached', 'images_per_second', 'cache', 'images'}
+    """
+    config = load_inference_config(config_path)
+    config.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    if weights:
+        config["weights"] = weights
+    paths = list_split_images(load_data_config(data), split, limit=limit, seed=seed)
+
+    location = cache_path(config, cache_dir)
+    cached = load_cache(location)
+    records = {}
+    pending = []
+    for path in paths:
+        record = cached.get(path)
+        if record is not None and record["fingerprint"] == image_fingerprint(path):
+            records[path] = record
+        else:
+            pending.append(path)
+    reused = len(records)
+    print(f"Jako '{split}': {len(paths)} kuvaa, välimuistista {reused}, arvioitavana {len(pending)}.")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    workers = os.cpu_count() if workers is None else workers
+    start = time.perf_counter()
+    with open(location, 'a', encoding='utf-8') as cache_file:
+        if workers > 0 and len(pending) > 1:
+            with multiprocessing.Pool(min(workers, len(pending)), _init_worker, (config,)) as pool:
+                completed = pool.imap_unordered(evaluate_image, pending, chunksize=1)
+                for record in completed:
+                    records[record["path"]] = record
+                    cache_file.write(json.dumps(record) + "\n")
+                    cache_file.flush()
+        else:
+            _init_worker(config)
+            for path in pending:
+                record = evaluate_image(path)
+                records[path] = record
+                cache_file.write(json.dumps(record) + "\n")
+                cache_file.flush()
+    elapsed = time.perf_counter() - start
+
+    # Tiivistetään välimuisti, jos muuttuneiden kuvien vanhat rivit jäivät tiedostoon
+    if any(path in cached for path in pending):
+        merged = {**cached, **records}
+        temporary = location + ".tmp"
+        with open(temporary, 'w', encoding='utf-8') as file:
+            for record in merged.values():
+                file.write(json.dumps(record) + "\n")
+        os.replace(temporary, location)
+
+    ordered = [records[path] for path in paths]
+    return {
+        "weights": config["weights"],
+        "split": split,
+        "summary": summarize(ordered),
+        "evaluated": len(pending),
+        "cached": reused,
+        "images_per_second": len(pending) / elapsed if pending and elapsed > 0 else None,
+        "workers": workers,
+        "cache": location,
+        "images": ordered,
+    }
+
+
+def print_report(report, show_errors=0):
+    """Tulostaa arvioinnin yhteenvedon ja valinnaisesti kuvat, joissa on eniten virheitä."""
+    def fmt(value, pattern):
+        return pattern.format(value) if value is not None else "-"
+
+    summary = report["summary"]
+    speed = report["images_per_second"]
+    print(f"\nPainot {report['weights']}, jako '{report['split']}'")
+    print(
+        f"  kuvat {summary['images']} (arvioitu {report['evaluated']}, välimuistista {report['cached']}, "
+        f"epäonnistui {summary['failed']}), {fmt(speed, '{:.2f}')} kuvaa/s ({report['workers']} prosessia)"
+    )
+    print(
+        f"  portit {summary['ports']}: löydetty {summary['found']} ({fmt(summary['port_recall'], '{:.1%}')}), "
+        f"puuttuu {summary['missed']}, ylimääräisiä {summary['extra']} "
+        f"(tarkkuus {fmt(summary['port_precision'], '{:.1%}')})"
+    )
+    print(f"  tilan tarkkuus:        {fmt(summary['status_accuracy'], '{:.1%}')}")
+    print(
+        f"  numerointivirheet:     {summary['numbering_errors']} "
+        f"({fmt(summary['numbering_error_rate'], '{:.1%}')} löydetyistä)"
+    )
+    print(f"  täysin oikein:         {fmt(summary['port_accuracy'], '{:.1%}')} nimiöiden porteista")
+    print(f"  JSON-tilojen yhtäpitävyys: {fmt(summary['json_status_agreement'], '{:.1%}')}")
+
+    if show_errors:
+        worst = sorted(
+            (record for record in report["images"] if record.get("errors") or record.get("missed")),
+            key=lambda record: -(len(record["errors"]) + record["missed"] + record["extra"]),
+        )[:show_errors]
+        for record in worst:
+            print(
+                f"\n{record['path']}: {len(record['errors'])} virheellistä, "
+                f"{record['missed']} puuttuu, {record['extra']} ylimääräistä"
+            )
+            for error in record["errors"]:
+                print(f"  nimiöt {error['expected']} -> ennuste {error['predicted']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PortVision-putken JSON-tulosteen arviointi nimiöitä vastaan.")
+    parser.add_argument("--weights", default=None, help="Painotiedosto (oletus inference.yaml)")
+    parser.add_argument("--data", default="data.yaml", help="Aineiston asetukset")
+    parser.add_argument("--split", default="test", help="Arvioitava jako (test, val tai train)")
+    parser.add_argument("--config", default="inference.yaml", help="Inferenssiasetukset")
+    parser.add_argument("--workers", type=int, default=None, help="Työprosessit (0 = pääprosessi)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Tulosten välimuisti")
+    parser.add_argument("--limit", type=int, default=None, help="Kuvien enimmäismäärä")
+    parser.add_argument("--seed", type=int, default=0, help="Kuvaotoksen siemen")
+    parser.add_argument("--backend", default=None, help="Korvaa inference.yaml:n taustan")
+    parser.add_argument("--imgsz", type=int, default=None, help="Korvaa mallin syötekoon")
+    parser.add_argument("--iou", type=float, default=None, help="Korvaa NMS:n IoU-kynnyksen")
+    parser.add_argument("--conf", type=float, default=None, help="Korvaa luottamuskynnyksen")
+    parser.add_argument("--show-errors", type=int, default=0, help="Näytä N eniten virheitä sisältävää kuvaa")
+    parser.add_argument("--report", default=None, help="Tallenna raportti JSON-tiedostoon")
+    args = parser.parse_args()
+
+    report = run_evaluation(
+        weights=args.weights,
+        data=args.data,
+        split=args.split,
+        config_path=args.config,
+        workers=args.workers,
+        cache_dir=args.cache_dir,
+        limit=args.limit,
+        seed=args.seed,
+        overrides={"backend": args.backend, "imgsz": args.imgsz, "iou": args.iou, "conf": args.conf},
+    )
+    print_report(report, args.show_errors)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
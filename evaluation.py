@@ -0,0 +1,304 @@
+"""Tämä moduuli sisältää tunnistuksen ja porttitilojen arviointimittarit.
+
+Tunnistuksen tarkkuus lasketaan COCO-tyyliin: jokaiselle luokalle ja
+IoU-kynnykselle ennusteet järjestetään luottamuksen mukaan, ne sovitetaan
+ahneesti nimiöihin ja keskimääräinen tarkkuus (AP) lasketaan 101 pisteen
+interpoloinnilla. mAP50 on AP IoU-kynnyksellä 0,5 ja mAP50-95 AP:n keskiarvo
+kynnyksillä 0,5–0,95.
+
+Porttitilojen vertailu tehdään lopullisesta generate_switch_json-tulosteesta:
+kukin portti tunnistetaan avaimella (kytkin, pino, porttinumero), ja kahden
+tulosteen yhtäpitävyys on samaa tilaa näyttävien porttien osuus kaikista
+kummassakin tulosteessa esiintyvistä porteista.
+
+Porttiasettelun vertailu (compare_port_layouts) ei luota avaimiin: portit
+sovitetaan nimiöihin laatikoiden IoU:n perusteella, ja kullekin fyysiselle
+portille verrataan erikseen tilaa ja porttinumeroinnin antamaa avainta.
+Näin yksi väärin numeroitu portti näkyy yhtenä numerointivirheenä eikä
+siirrä kaikkien muiden porttien tiloja vääriin avaimiin.
+
+Sisältää:
+- average_precision: AP tarkkuus–saanti-käyrästä.
+- detection_map: mAP50 ja mAP50-95 luokittain.
+- box_recall: Nimiöiden osuus, joille löytyy ennuste.
+- port_statuses: Porttien tilat generate_switch_json-tulosteesta.
+- status_agreement: Kahden tulosteen porttitilojen yhtäpitävyys.
+- ground_truth_json: generate_switch_json-tuloste nimiöistä.
+- port_layout: generate_switch_json-tuloste ja porttien avaimet laatikoittain.
+- compare_port_layouts: Porttien tilojen ja numeroinnin vertailu nimiöihin.
+"""
+
+import numpy as np
+
+from detections import PORT_STATUS, Detections
+from json_generator import generate_switch_json
+from spatial_index import SwitchHierarchy
+from tracking import iou_matrix
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def average_precision(recall, precision):
+    """
+    Laskee AP:n 101 pisteen interpoloinnilla (COCO).
+
+    Args:
+        recall (numpy.ndarray): Saanti kasvavassa järjestyksessä.
+        precision (numpy.ndarray): Vastaava tarkkuus.
+
+    Returns:
+        float: Keskimääräinen tarkkuus.
+    """
+    if len(recall) == 0:
+        return 0.0
+    # Tarkkuuden verhokäyrä: suurin tarkkuus tästä saannista eteenpäin
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    points = np.linspace(0, 1, 101)
+    indices = np.searchsorted(recall, points, side='left')
+    values = np.where(indices < len(envelope), envelope[np.minimum(indices, len(envelope) - 1)], 0.0)
+    return float(values.mean())
+
+
+def _match(pred_boxes, pred_scores, gt_boxes, thresholds):
+    """
+    Sovittaa yhden kuvan ja luokan ennusteet nimiöihin kaikilla kynnyksillä.
+
+    Returns:
+        numpy.ndarray: Totuusarvot muodossa (ennusteet, kynnykset); True = osuma.
+    """
+    hits = np.zeros((len(pred_boxes), len(thresholds)), dtype=bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return hits
+    order = np.argsort(-pred_scores, kind='stable')
+    iou = iou_matrix(pred_boxes[order], gt_boxes)
+    for t, threshold in enumerate(thresholds):
+        taken = np.zeros(len(gt_boxes), dtype=bool)
+        for row, pred_index in enumerate(order):
+            candidates = np.where(taken, -1.0, iou[row])
+            best = int(candidates.argmax())
+            if candidates[best] >= threshold:
+                taken[best] = True
+                hits[pred_index, t] = True
+    return hits
+
+
+def box_recall(pred_boxes, pred_scores, gt_boxes, threshold=0.5):
+    """
+    Laskee saannin: niiden nimiöiden osuus, joihin sovitetaan ennuste.
+
+    Args:
+        pred_boxes (numpy.ndarray): Ennustetut laatikot (N, 4).
+        pred_scores (numpy.ndarray): Ennusteiden luottamusarvot (N,).
+        gt_boxes (numpy.ndarray): Nimiöiden (tai vertailuajon) laatikot (M, 4).
+        threshold (float, optional): IoU-kynnys. Oletus 0.5.
+
+    Returns:
+        float: Saanti väliltä 0–1 (1.0, jos nimiöitä ei ole).
+    """
+    gt_boxes = np.asarray(gt_boxes, dtype=np.float32).reshape(-1, 4)
+    if len(gt_boxes) == 0:
+        return 1.0
+    hits = _match(
+        np.asarray(pred_boxes, dtype=np.float32).reshape(-1, 4),
+        np.asarray(pred_scores).reshape(-1), gt_boxes, [threshold],
+    )
+    return float(hits.sum()) / len(gt_boxes)
+
+
+def detection_map(predictions, ground_truths, num_classes, thresholds=IOU_THRESHOLDS):
+    """
+    Laskee mAP50- ja mAP50-95-arvot.
+
+    Args:
+        predictions (list): Kuvakohtaiset ennusteet (xyxy, conf, cls).
+        ground_truths (list): Kuvakohtaiset nimiöt (xyxy, cls).
+        num_classes (int): Luokkien määrä.
+        thresholds (numpy.ndarray, optional): IoU-kynnykset. Oletus 0,5–0,95.
+
+    Returns:
+        dict: {'map50', 'map50_95', 'per_class': {luokka: {'ap50', 'ap50_95', 'instances'}}}
+    """
+    thresholds = np.asarray(thresholds)
+    per_class = {}
+    for class_id in range(num_classes):
+        scores, hits, instances = [], [], 0
+        for (pred_xyxy, pred_conf, pred_cls), (gt_xyxy, gt_cls) in zip(predictions, ground_truths):
+            pred_mask = np.asarray(pred_cls).astype(np.int64) == class_id
+            gt_mask = np.asarray(gt_cls) == class_id
+            boxes = np.asarray(pred_xyxy).reshape(-1, 4)[pred_mask]
+            confs = np.asarray(pred_conf).reshape(-1)[pred_mask]
+            instances += int(gt_mask.sum())
+            scores.append(confs)
+            hits.append(_match(boxes, confs, np.asarray(gt_xyxy).reshape(-1, 4)[gt_mask], thresholds))
+        if instances == 0:
+            continue
+        scores = np.concatenate(scores) if scores else np.empty(0)
+        hits = np.concatenate(hits) if hits else np.empty((0, len(thresholds)), dtype=bool)
+        order = np.argsort(-scores, kind='stable')
+        hits = hits[order]
+        true_positives = np.cumsum(hits, axis=0)
+        false_positives = np.cumsum(~hits, axis=0)
+        recall = true_positives / instances
+        precision = true_positives / np.maximum(true_positives + false_positives, 1)
+        ap = np.array([
+            average_precision(recall[:, t], precision[:, t]) for t in range(len(thresholds))
+        ])
+        per_class[class_id] = {
+            "ap50": float(ap[0]),
+            "ap50_95": float(ap.mean()),
+            "instances": instances,
+        }
+
+    if not per_class:
+        return {"map50": 0.0, "map50_95": 0.0, "per_class": {}}
+    return {
+        "map50": float(np.mean([c["ap50"] for c in per_class.values()])),
+        "map50_95": float(np.mean([c["ap50_95"] for c in per_class.values()])),
+        "per_class": per_class,
+    }
+
+
+def port_statuses(switch_json):
+    """
+    Kerää porttien tilat generate_switch_json-tulosteesta.
+
+    Args:
+        switch_json (dict): {'switches': [...]}
+
+    Returns:
+        dict: (switch_id, stack_id, port_number) -> 'Cable'|'empty'
+    """
+    statuses = {}
+    for switch in switch_json.get("switches", []):
+        for stack in switch["lan_port_stacks"]:
+            for row in stack["lan_ports"]:
+                for port in row:
+                    key = (switch["switch_id"], stack["stack_id"], port["port_number"])
+                    statuses[key] = port["status"]
+    return statuses
+
+
+def status_agreement(predicted, reference):
+    """
+    Vertaa kahden tulosteen porttitiloja.
+
+    Args:
+        predicted (dict): Arvioitava generate_switch_json-tuloste.
+        reference (dict): Vertailutuloste (esim. nimiöistä tai FP32-mallista).
+
+    Returns:
+        dict: {'agreement', 'matched', 'mismatched', 'missing', 'extra', 'ports'}
+    """
+    a, b = port_statuses(predicted), port_statuses(reference)
+    keys = a.keys() | b.keys()
+    matched = sum(1 for key in keys if key in a and key in b and a[key] == b[key])
+    mismatched = sum(1 for key in keys if key in a and key in b and a[key] != b[key])
+    return {
+        "agreement": matched / len(keys) if keys else 1.0,
+        "matched": matched,
+        "mismatched": mismatched,
+        "missing": len(b.keys() - a.keys()),
+        "extra": len(a.keys() - b.keys()),
+        "ports": len(keys),
+    }
+
+
+def ground_truth_json(xyxy, cls):
+    """
+    Rakentaa generate_switch_json-tulosteen nimiöistä.
+
+    Args:
+        xyxy (numpy.ndarray): Nimiöiden laatikot pikseleinä.
+        cls (numpy.ndarray): Nimiöiden luokat.
+
+    Returns:
+        dict: Tuloste samassa muodossa kuin mallin ennusteista.
+    """
+    detections = Detections(xyxy, np.ones(len(cls), dtype=np.float32), cls)
+    return generate_switch_json(detections.stacks, detections.ports, detections.switches)
+
+
+def port_layout(xyxy, conf, cls):
+    """
+    Rakentaa generate_switch_json-tulosteen ja selvittää, minkä avaimen kukin portti sai.
+
+    Args:
+        xyxy (numpy.ndarray): Laatikot pikseleinä.
+        conf (numpy.ndarray): Luottamusarvot.
+        cls (numpy.ndarray): Luokat.
+
+    Returns:
+        dict: {'json': tuloste, 'boxes': porttien laatikot (P, 4), 'scores': (P,),
+            'status': porttien tilat, 'keys': (switch_id, stack_id, port_number)
+            tai None numeroimattomille porteille}
+    """
+    detections = Detections(xyxy, conf, cls)
+    hierarchy = SwitchHierarchy.build(detections.stacks, detections.ports, detections.switches)
+    keys = []
+    output = generate_switch_json(None, None, hierarchy=hierarchy, port_keys=keys)
+
+    ports = hierarchy.ports
+    return {
+        "json": output,
+        "boxes": ports.xyxy.astype(np.float32, copy=False),
+        "scores": ports.conf,
+        "status": [PORT_STATUS[c] for c in ports.class_id.tolist()],
+        "keys": keys,
+    }
+
+
+def _pairs(pred_boxes, pred_scores, gt_boxes, threshold):
+    """Sovittaa ennusteet nimiöihin ahneesti luottamusjärjestyksessä ja palauttaa parit."""
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return []
+    order = np.argsort(-np.asarray(pred_scores), kind='stable')
+    iou = iou_matrix(pred_boxes[order], gt_boxes)
+    taken = np.zeros(len(gt_boxes), dtype=bool)
+    pairs = []
+    for row, pred_index in enumerate(order.tolist()):
+        candidates = np.where(taken, -1.0, iou[row])
+        best = int(candidates.argmax())
+        if candidates[best] >= threshold:
+            taken[best] = True
+            pairs.append((pred_index, best))
+    return pairs
+
+
+def compare_port_layouts(predicted, reference, threshold=0.5):
+    """
+    Vertaa ennusteen porttiasettelua nimiöiden asetteluun fyysinen portti kerrallaan.
+
+    Args:
+        predicted (dict): port_layout-funktion tulos ennusteista.
+        reference (dict): port_layout-funktion tulos nimiöistä.
+        threshold (float, optional): Sovituksen IoU-kynnys. Oletus 0.5.
+
+    Returns:
+        dict: {'ports', 'found', 'missed', 'extra', 'status_correct',
+            'numbering_errors', 'correct', 'errors'}; errors listaa
+            sovitetut portit, joiden tila tai avain on väärä.
+    """
+    pairs = _pairs(predicted["boxes"], predicted["scores"], reference["boxes"], threshold)
+    status_correct = numbering_errors = correct = 0
+    errors = []
+    for pred_index, gt_index in pairs:
+        status_ok = predicted["status"][pred_index] == reference["status"][gt_index]
+        key_ok = predicted["keys"][pred_index] == reference["keys"][gt_index]
+        status_correct += status_ok
+        numbering_errors += not key_ok
+        correct += status_ok and key_ok
+        if not (status_ok and key_ok):
+            errors.append({
+                "expected": [reference["keys"][gt_index], reference["status"][gt_index]],
+                "predicted": [predicted["keys"][pred_index], predicted["status"][pred_index]],
+            })
+    return {
+        "ports": len(reference["boxes"]),
+        "found": len(pairs),
+        "missed": len(reference["boxes"]) - len(pairs),
+        "extra": len(predicted["boxes"]) - len(pairs),
+        "status_correct": status_correct,
+        "numbering_errors": numbering_errors,
+        "correct": correct,
+        "errors": errors,
+    }
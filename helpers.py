@@ -1,57 +1,19 @@
 """Tämä moduuli sisältää apufunktioita kuvankäsittelyyn ja tietojen muuntamiseen.
 
 Sisältää funktiot:
-- convert_numpy_types: Muuntaa NumPy-tyypit Pythonin perusdatatyypeiksi.
 - load_class_info: Lataa luokkien nimet ja määrän data.yaml-tiedostosta.
 - get_center: Laskee bounding boxin keskipisteen.
 - is_inside: Tarkistaa, onko sisemmän laatikon keskipiste ulomman laatikon sisällä.
+- box_centers: Laskee kaikkien bounding boxien keskipisteet kerralla.
+- containment_matrix: Laskee kaikkien laatikkoparien is_inside-tulokset yhdellä kertaa.
+- non_max_suppression: Luokkakohtainen NMS NumPy-taulukoille.
 - draw_transparent_box: Piirtää puoliksi läpinäkyvän laatikon kuvaan.
 """
 
 import numpy as np
-import cv2
 import yaml
 
 
-def convert_numpy_types(obj):
-    """
-    Muuntaa NumPy-tyypit Pythonin perusdatatyypeiksi.
-
-    Tämä funktio käy rekursiivisesti läpi annetun objektin ja muuntaa kaikki
-    NumPy-tyypit vastaaviksi Pythonin perusdatatyypeiksi, jotta ne voidaan
-    esimerkiksi sarjoittaa JSON-muotoon.
-
-    Args:
-        obj: Muunnettava objekti, joka voi olla sanakirja, lista, NumPy-tyyppi
-            tai mikä tahansa muu objekti.
-
-    Returns:
-        Muunnettu objekti, jossa kaikki NumPy-tyypit on korvattu Pythonin tyypeillä.
-    """
-    if isinstance(obj, dict):
-        # Käy läpi sanakirjan avaimet ja arvot rekursiivisesti
-        return {k: convert_numpy_types(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        # Käy läpi listan alkiot rekursiivisesti
-        return [convert_numpy_types(v) for v in obj]
-    elif isinstance(obj, np.integer):
-        # Muunna NumPy-kokonaisluku Pythonin int-tyypiksi
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        # Muunna NumPy-liukuluku Pythonin float-tyypiksi
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        # Muunna NumPy-taulukko Pythonin listaksi
-        return obj.tolist()
-    elif isinstance(obj, np.bool_):
-        return bool(obj)
-    elif isinstance(obj, np.complexfloating):
-        return complex(obj)
-    else:
-        # Palauta objekti sellaisenaan, jos se ei ole NumPy-tyyppi
-        return obj
-
-
 def load_class_info(yaml_path):
     """
     Lataa luokkien nimet ja luokkien määrän YAML-tiedostosta.
@@ -115,6 +77,88 @@ def is_inside(inner_box, outer_box):
     return result
 
 
+def box_centers(boxes):
+    """
+    Laskee kaikkien bounding boxien keskipisteet yhdellä vektorioperaatiolla.
+
+    Args:
+        boxes (array-like): Laatikot muodossa (N, 4) eli (x_min, y_min, x_max, y_max).
+
+    Returns:
+        numpy.ndarray: Keskipisteet muodossa (N, 2), sama dtype kuin syötteellä.
+    """
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+
+def containment_matrix(inner_boxes, outer_boxes):
+    """
+    Laskee, minkä ulompien laatikoiden sisällä kunkin sisemmän laatikon keskipiste on.
+
+    Vastaa is_inside-kutsua jokaiselle laatikkoparille, mutta tulos lasketaan
+    yhdellä broadcast-vertailulla.
+
+    Args:
+        inner_boxes (array-like): Sisemmät laatikot muodossa (N, 4).
+        outer_boxes (array-like): Ulommat laatikot muodossa (M, 4).
+
+    Returns:
+        numpy.ndarray: Totuusarvomatriisi muodossa (N, M), jossa [i, j] on
+            is_inside(inner_boxes[i], outer_boxes[j]).
+    """
+    centers = box_centers(inner_boxes)
+    outer = np.asarray(outer_boxes).reshape(-1, 4)
+    cx = centers[:, 0:1]
+    cy = centers[:, 1:2]
+    return (
+        (outer[:, 0] <= cx) & (cx <= outer[:, 2])
+        & (outer[:, 1] <= cy) & (cy <= outer[:, 3])
+    )
+
+
+def non_max_suppression(boxes, scores, classes, iou_threshold, max_det=300):
+    """
+    Suorittaa luokkakohtaisen non-maximum suppressionin.
+
+    Eri luokkien laatikot eivät poista toisiaan: jokaisen luokan laatikot
+    siirretään omaan koordinaattialueeseensa ennen IoU-vertailua.
+
+    Args:
+        boxes (numpy.ndarray): Laatikot muodossa (N, 4) eli (x1, y1, x2, y2).
+        scores (numpy.ndarray): Luottamusarvot muodossa (N,).
+        classes (numpy.ndarray): Luokkien ID:t muodossa (N,).
+        iou_threshold (float): IoU-kynnys, jonka ylittävät laatikot poistetaan.
+        max_det (int, optional): Palautettavien laatikoiden enimmäismäärä. Oletus 300.
+
+    Returns:
+        numpy.ndarray: Säilytettyjen laatikoiden indeksit luottamusjärjestyksessä.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Siirrä luokat erilleen toisistaan, jotta NMS toimii luokkakohtaisesti
+    offsets = np.asarray(classes, dtype=np.float32).reshape(-1, 1) * (boxes.max() + 1)
+    shifted = boxes + offsets
+    areas = (shifted[:, 2] - shifted[:, 0]) * (shifted[:, 3] - shifted[:, 1])
+
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while order.size > 0 and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(shifted[i, 0], shifted[rest, 0])
+        yy1 = np.maximum(shifted[i, 1], shifted[rest, 1])
+        xx2 = np.minimum(shifted[i, 2], shifted[rest, 2])
+        yy2 = np.minimum(shifted[i, 3], shifted[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
 def draw_transparent_box(img, x1, y1, x2, y2, color, alpha):
     """
     Piirtää puoliksi läpinäkyvän laatikon kuvaan.
@@ -134,6 +178,8 @@ def draw_transparent_box(img, x1, y1, x2, y2, color, alpha):
     Raises:
         ValueError: Jos koordinaatit eivät muodosta kelvollista suorakulmiota.
     """
+    import cv2
+
     # Varmista, että koordinaatit ovat kelvolliset
     if x1 >= x2 or y1 >= y2:
         raise ValueError("Koordinaattien on täytettävä ehto x1 < x2 ja y1 < y2.")
@@ -144,10 +190,13 @@ def draw_transparent_box(img, x1, y1, x2, y2, color, alpha):
     y1 = max(0, min(y1, height))
     y2 = max(0, min(y2, height))
 
-    # Luo kopio kuvasta piirtoa varten
-    overlay = img.copy()
-    # Piirrä täytetty suorakulmio overlay-kuvaan
-    cv2.rectangle(overlay, (x1, y1), (x2, y2), color, -1)
+    # Käsittele vain laatikon alue (cv2.rectangle piirtää myös loppupisteen)
+    roi = img[y1:y2 + 1, x1:x2 + 1]
+    if roi.size == 0:
+        return
+    # Luo laatikon kokoinen täytetty overlay koko kuvan kopion sijaan
+    overlay = np.empty_like(roi)
+    overlay[:] = color
     # Yhdistä overlay alkuperäiseen kuvaan käyttäen läpinäkyvyyttä
-    cv2.addWeighted(overlay, alpha, img, 1 - alpha, 0, img)
+    cv2.addWeighted(overlay, alpha, roi, 1 - alpha, 0, roi)
 
@@ -0,0 +1,147 @@
+"""Tämä moduuli määrittelee kuvapuskurien sopimuksen syötteestä annotoituun kuvaan.
+
+Sopimus:
+- Kuva on (H, W, 3) uint8 NumPy-taulukko, jonka värijärjestys (RGB tai BGR)
+  kerrotaan eksplisiittisesti color_order-parametrilla. Gradio antaa RGB-
+  kuvia, cv2.imread ja VideoCapture BGR-kuvia.
+- Taulukko annetaan mallille ja piirrolle sellaisenaan. Kokonainen kuva
+  kopioidaan vain, kun se on välttämätöntä: PIL-kuvan tai harmaasävy/RGBA-
+  kuvan muunnos, mallin vaatima värijärjestyksen vaihto (ultralytics tulkitsee
+  taulukot BGR-muotoisiksi) ja piirto, kun kutsuja ei salli syötteen
+  muokkaamista (inplace=False).
+- Piirron värit valitaan värijärjestyksen mukaan (styles_for), joten BGR-kuvaa
+  ei muunneta RGB-muotoon piirtoa varten.
+
+Jokainen kokonaisen kuvan kopio kirjataan laskuriin
+portvision_image_copies_total vaiheen mukaan (metrics.py), joten kopioiden
+määrä kuvaa kohden näkyy samoista mittareista kuin viiveet.
+OpenCV tuodaan vasta käytettäessä.
+
+Sisältää:
+- RGB, BGR: Värijärjestykset.
+- count_copy: Kirjaa kokonaisen kuvan kopion.
+- as_array: Palauttaa kuvan NumPy-taulukkona pyydetyssä värijärjestyksessä.
+- writable_image: Palauttaa taulukon, johon saa piirtää.
+- convert_color_order: Vaihtaa värijärjestyksen, tarvittaessa paikan päällä.
+- styles_for: Palauttaa värijärjestyksen mukaisen piirtotyylitaulukon.
+"""
+
+import numpy as np
+
+from metrics import increment
+
+RGB = "RGB"
+BGR = "BGR"
+COLOR_ORDERS = (RGB, BGR)
+
+COPY_METRIC = "portvision_image_copies_total"
+
+
+def _check_color_order(color_order):
+    if color_order not in COLOR_ORDERS:
+        raise ValueError(f"Tuntematon värijärjestys {color_order!r}, sallitut: {', '.join(COLOR_ORDERS)}")
+
+
+def count_copy(stage):
+    """Kirjaa yhden kokonaisen kuvan kopion vaiheelle stage."""
+    increment(COPY_METRIC, stage=stage)
+
+
+def as_array(image, color_order=RGB):
+    """
+    Palauttaa kuvan (H, W, 3) uint8 -taulukkona pyydetyssä värijärjestyksessä.
+
+    Kolmikanavainen NumPy-taulukko palautetaan sellaisenaan; sen oletetaan jo
+    olevan järjestyksessä color_order. PIL-kuva (aina RGB) sekä harmaasävy- ja
+    RGBA-taulukot muunnetaan uudeksi taulukoksi.
+
+    Args:
+        image (numpy.ndarray | PIL.Image): Syötekuva.
+        color_order (str, optional): Palautettavan taulukon värijärjestys. Oletus RGB.
+
+    Returns:
+        numpy.ndarray: Kuva; sama olio kuin syöte, jos muunnosta ei tarvittu.
+    """
+    _check_color_order(color_order)
+    if not isinstance(image, np.ndarray):
+        # PIL-kuva: pikselit kopioidaan kerran omaan, kirjoitettavaan taulukkoon
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        array = np.array(image)
+        count_copy("convert")
+        if color_order == BGR:
+            import cv2
+
+            # Kanavat vaihdetaan paikallaan, joten toista kopiota ei tehdä
+            cv2.cvtColor(array, cv2.COLOR_RGB2BGR, dst=array)
+        return array
+    if image.ndim == 3 and image.shape[2] == 3:
+        return image
+
+    import cv2
+
+    count_copy("convert")
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    # Neljäs kanava (alfa) pudotetaan; kolme ensimmäistä ovat jo järjestyksessä color_order
+    return cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+
+
+def writable_image(image, color_order=RGB, inplace=False):
+    """
+    Palauttaa taulukon, johon tunnistukset voidaan piirtää.
+
+    Args:
+        image (numpy.ndarray | PIL.Image): Syötekuva.
+        color_order (str, optional): Kuvan värijärjestys. Oletus RGB.
+        inplace (bool, optional): Saako syötetaulukkoon piirtää suoraan. Jos
+            False, piirtoa varten tehdään kopio eikä syöte muutu. Oletus False.
+
+    Returns:
+        numpy.ndarray: Piirrettävä taulukko.
+    """
+    array = as_array(image, color_order)
+    if array is not image:
+        # Muunnos tuotti jo oman puskurin, jota kutsuja ei näe
+        return array
+    if inplace and array.flags.writeable:
+        return array
+    count_copy("render")
+    return array.copy()
+
+
+def convert_color_order(image, source, target, inplace=False):
+    """
+    Vaihtaa kuvan värijärjestyksen.
+
+    Args:
+        image (numpy.ndarray): (H, W, 3) -kuva järjestyksessä source.
+        source (str): Nykyinen värijärjestys.
+        target (str): Haluttu värijärjestys.
+        inplace (bool, optional): Vaihdetaanko kanavat syötteeseen paikan
+            päällä kopion sijaan. Oletus False.
+
+    Returns:
+        numpy.ndarray: Kuva järjestyksessä target (sama olio, jos järjestys
+            oli jo oikea tai inplace on True).
+    """
+    _check_color_order(source)
+    _check_color_order(target)
+    if source == target:
+        return image
+
+    import cv2
+
+    # RGB <-> BGR on sama kanavien vaihto molempiin suuntiin
+    if inplace and image.flags.writeable and image.flags.c_contiguous:
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=image)
+    count_copy("color_convert")
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+
+def styles_for(color_order):
+    """Palauttaa renderer-tyylitaulukon, jonka värit ovat järjestyksessä color_order."""
+    _check_color_order(color_order)
+    from renderer import CLASS_STYLES, CLASS_STYLES_BGR
+
+    return CLASS_STYLES_BGR if color_order == BGR else CLASS_STYLES
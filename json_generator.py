@@ -1,190 +1,161 @@
-from helpers import is_inside, get_center
+from detections import PORT_STATUS
+from spatial_index import SwitchHierarchy
 import numpy as np
 
-def generate_switch_json(lan_port_stack_boxes, port_boxes):
+def generate_switch_json(lan_port_stack_boxes, port_boxes, switch_boxes=None, trace=None,
+                         hierarchy=None, activity=None, port_keys=None):
     """
     Generoi JSON-muotoisen rakenteen kytkimille, LAN-porttistackeille ja porteille.
 
+    Kytkimet, stackit ja portit yhdistetään spatial_index.SwitchHierarchy-
+    hierarkiaksi: stack kuuluu tunnistettuun kytkimeen, jonka sisällä sen
+    keskipiste on, ja ilman kytkintä jäävät stackit ryhmitellään kytkimiksi
+    pystysuuntaisen päällekkäisyyden perusteella.
+
     Parametrit:
-        lan_port_stack_boxes (lista): Lista LAN-porttistackien koordinaattilaatikoista.
-        port_boxes (lista): Lista porttien koordinaattilaatikoista ja niiden statuksista.
+        lan_port_stack_boxes (Detections | lista): LAN-porttistackit
+            Detections-säiliönä tai listana (box, conf).
+        port_boxes (Detections | lista): Portit Detections-säiliönä (luokat 0 ja 1)
+            tai listana (box, conf, 'Cable'|'empty').
+        switch_boxes (Detections | lista, optional): Tunnistetut kytkimet
+            Detections-säiliönä tai listana (box, conf). Oletus None.
+        trace (decision_trace.DecisionTrace, optional): Päätösjäljen tallennin.
+            Jos None, päätöksiä ei kirjata.
+        hierarchy (spatial_index.SwitchHierarchy, optional): Valmiiksi
+            rakennettu hierarkia (esim. piirron kanssa jaettu). Jos annettu,
+            laatikkoparametreja ei käytetä.
+        activity (list, optional): Porttien linkkiaktiivisuus porttien
+            järjestyksessä (link_activity.LinkActivityMonitor). Jos annettu,
+            jokainen portti saa tilan rinnalle kentän "activity".
+        port_keys (list, optional): Jos annettu, lista täytetään porttien
+            järjestyksessä (hierarchy.ports) avaimilla (switch_id, stack_id,
+            port_number); numeroimattomat portit saavat arvon None.
 
     Palauttaa:
         dict: Sanakirja, joka sisältää kytkimien, porttistackien ja porttien tiedot.
+            Kaikki arvot ovat Pythonin perustyyppejä.
     """
     # Alustetaan tulossanakirja, joka sisältää kytkimet
     output = {
         "switches": []
     }
 
+    # Rakennetaan kytkin–stack–portti-hierarkia kerran koko kuvalle
+    if hierarchy is None:
+        hierarchy = SwitchHierarchy.build(lan_port_stack_boxes, port_boxes, switch_boxes)
+    if port_keys is not None:
+        port_keys[:] = [None] * len(hierarchy.ports)
+
     # Tarkistetaan, onko yhtään LAN-porttistackia
-    if len(lan_port_stack_boxes) == 0:
-        print("Ei tunnistettuja LAN-porttistackeja.")
+    if len(hierarchy.stacks) == 0:
+        if trace is not None:
+            trace.record("no_stacks", ports=len(hierarchy.ports))
         return output  # Palautetaan tyhjä sanakirja, jos stackeja ei löydy
 
-    # Järjestetään stackit pystysuoran sijainnin (y1-koordinaatin) mukaan
-    lan_port_stack_boxes = sorted(
-        lan_port_stack_boxes,
-        key=lambda box: box[0][1]  # Järjestä y1-koordinaatin perusteella
-    )
-
-    # Alustetaan muuttujat kytkimien käsittelyä varten
-    current_switch_id = 1  # Nykyisen kytkimen ID
-    current_switch_start = int(lan_port_stack_boxes[0][0][1])  # Nykyisen kytkimen aloituskohta
-    switch_threshold = 500  # Kynnysarvo pystysuoralle etäisyydelle stackien välillä
-
-    # Alustetaan nykyisen kytkimen tiedot
-    switch_data = {
-        "switch_id": f"Switch_{current_switch_id}",
-        "lan_port_stacks": []
-    }
+    if trace is not None:
+        trace.hierarchy(hierarchy)
+
+    # Porttien keskipisteet ja tilat lasketaan kerralla
+    port_centers_all = hierarchy.ports.centers
+    port_class_ids = hierarchy.ports.class_id
 
     stack_counter = 1  # Stackien laskuri
-    base_port_number = 1  # Porttien numerointi alkaa tästä
-
-    # Käydään läpi jokainen LAN-porttistack
-    for stack_box, _ in lan_port_stack_boxes:
-        stack_box_y = int(stack_box[1])  # Stackin y1-koordinaatti
-
-        # Tarkistetaan, tulisiko aloittaa uusi kytkin
-        if stack_box_y > current_switch_start + switch_threshold:
-            # Tallennetaan nykyisen kytkimen tiedot
-            output["switches"].append(switch_data)
-
-            # Aloitetaan uusi kytkin
-            current_switch_id += 1
-            switch_data = {
-                "switch_id": f"Switch_{current_switch_id}",
-                "lan_port_stacks": []
-            }
-            current_switch_start = stack_box_y  # Päivitetään kytkimen aloituskohta
-            base_port_number = 1  # Nollataan porttinumero uudelle kytkimelle
-
-        # Etsitään portit, jotka sijaitsevat tässä stackissa
-        ports_in_stack = [
-            (port_box, status)
-            for port_box, _, status in port_boxes
-            if is_inside(port_box, stack_box)
-        ]
-
-        # Jos portteja ei löydy, siirrytään seuraavaan stackiin
-        if not ports_in_stack:
-            continue
-
-        # Lasketaan kunkin portin keskipisteen koordinaatit
-        port_centers = [
-            (get_center(port_box), status)
-            for port_box, status in ports_in_stack
-        ]
-
-        # Järjestetään portit x-koordinaatin mukaan (vasemmalta oikealle)
-        port_centers = sorted(port_centers, key=lambda x: x[0][0])  # x-koordinaatti
-
-        # Debug: Tulostetaan järjestetyt portit x-koordinaatin mukaan
-        print(f"\nStack {stack_counter}: Portit järjestetty x-koordinaatin mukaan:")
-        for center, status in port_centers:
-            print(f"Portin keskipiste x: {center[0]:.2f}, y: {center[1]:.2f}, status: {status}")
-
-        # Alustetaan listat ylemmille ja alemmille porteille
-        upper_ports = []
-        lower_ports = []
-
-        # Ryhmitellään portit sarakkeisiin x-koordinaatin läheisyyden perusteella
-        x_coords = [center[0][0] for center in port_centers]
-        x_diffs = np.diff(x_coords)
-        avg_x_diff = np.mean(x_diffs) if len(x_diffs) > 0 else 0
-        threshold = avg_x_diff * 0.5 if avg_x_diff > 0 else 10  # Tai kiinteä arvo
-
-        columns = []
-        current_column = [port_centers[0]]
-
-        # Ryhmitellään portit sarakkeisiin
-        for i in range(1, len(port_centers)):
-            if x_coords[i] - x_coords[i-1] <= threshold:
-                # Sama sarake
-                current_column.append(port_centers[i])
-            else:
-                # Uusi sarake
-                columns.append(current_column)
-                current_column = [port_centers[i]]
-        columns.append(current_column)
-
-        # Debug: Tulostetaan sarakkeet
-        print(f"\nStack {stack_counter}: Sarakkeet ryhmittelyn jälkeen:")
-        for idx, column in enumerate(columns):
-            print(f"Sarake {idx + 1}:")
-            for center, status in column:
-                print(f"  Portin keskipiste x: {center[0]:.2f}, y: {center[1]:.2f}, status: {status}")
-
-        # Käsitellään jokainen sarake porttinumeroiden antamiseksi
-        for column in columns:
-            # Järjestetään portit sarakkeessa y-koordinaatin mukaan
-            column = sorted(column, key=lambda x: x[0][1])  # y-koordinaatti
-
-            if len(column) >= 2:
-                # Ylempi portti (pienempi y-koordinaatti)
-                upper_port = column[0]
-                upper_port_data = {
-                    "port_number": base_port_number,  # Pariton numero
-                    "status": upper_port[1]
-                }
-                upper_ports.append(upper_port_data)
-
-                # Alempi portti (suurempi y-koordinaatti)
-                lower_port = column[1]
-                lower_port_data = {
-                    "port_number": base_port_number + 1,  # Parillinen numero
-                    "status": lower_port[1]
-                }
-                lower_ports.append(lower_port_data)
-
-                # Debug: Tulostetaan annetut porttinumerot
-                print(f"\nAnnetut porttinumerot sarakkeelle, joka alkaa x = {column[0][0][0]:.2f}:")
-                print(f"  Ylempi porttinumero: {upper_port_data['port_number']}, status: {upper_port_data['status']}")
-                print(f"  Alempi porttinumero: {lower_port_data['port_number']}, status: {lower_port_data['status']}")
-
-            elif len(column) == 1:
-                # Vain yksi portti sarakkeessa
-                port = column[0]
-                lower_port_data = {
-                    "port_number": base_port_number + 1,  # Parillinen numero
-                    "status": port[1]
-                }
-                lower_ports.append(lower_port_data)
-
-                # Debug: Tulostetaan annettu porttinumero
-                print(f"\nAnnettu porttinumero yksittäiselle portille x = {port[0][0]:.2f}:")
-                print(f"  Porttinumero: {lower_port_data['port_number']}, status: {lower_port_data['status']}")
-
-            # Kasvatetaan perusporttinumeroa seuraavaa saraketta varten
-            base_port_number += 2
-
-        # Järjestetään portit kussakin rivissä porttinumeron mukaan
-        upper_ports = sorted(upper_ports, key=lambda x: x["port_number"])
-        lower_ports = sorted(lower_ports, key=lambda x: x["port_number"])
-
-        # Debug: Tulostetaan ylemmät ja alemmat portit ennen lisäämistä stack_dataan
-        print(f"\nStack {stack_counter}: Ylemmät portit:")
-        for port in upper_ports:
-            print(f"  Porttinumero: {port['port_number']}, status: {port['status']}")
-        print(f"Stack {stack_counter}: Alemmat portit:")
-        for port in lower_ports:
-            print(f"  Porttinumero: {port['port_number']}, status: {port['status']}")
-
-        # Luodaan sanakirja tälle stackille
-        stack_data = {
-            "stack_id": f"Stack_{stack_counter}",
-            "lan_ports": [upper_ports, lower_ports]  # Ylemmät portit ensin
+
+    # Käydään läpi kytkimet lukujärjestyksessä (ylhäältä alas, vasemmalta oikealle)
+    for switch_index in range(len(hierarchy)):
+        switch_data = {
+            "switch_id": f"Switch_{switch_index + 1}",
+            "lan_port_stacks": []
         }
+        base_port_number = 1  # Porttien numerointi alkaa jokaisessa kytkimessä alusta
+
+        # Käydään läpi kytkimen LAN-porttistackit lukujärjestyksessä
+        for stack_index in hierarchy.stacks_of(switch_index).tolist():
+            if trace is not None:
+                trace.stack(f"Stack_{stack_counter}", switch_data["switch_id"], stack_index)
+
+            # Etsitään portit, jotka sijaitsevat tässä stackissa
+            port_indices = hierarchy.ports_of(stack_index)
+
+            # Jos portteja ei löydy, siirrytään seuraavaan stackiin
+            if len(port_indices) == 0:
+                continue
+
+            # Järjestetään portit x-koordinaatin mukaan (vasemmalta oikealle)
+            port_indices = port_indices[np.argsort(port_centers_all[port_indices, 0], kind='stable')]
+            centers = port_centers_all[port_indices]
+            x_coords = centers[:, 0]
+
+            # Ryhmitellään portit sarakkeisiin x-koordinaatin läheisyyden perusteella:
+            # uusi sarake alkaa, kun väli edelliseen porttiin ylittää kynnyksen
+            x_diffs = np.diff(x_coords)
+            avg_x_diff = np.mean(x_diffs) if len(x_diffs) > 0 else 0
+            threshold = avg_x_diff * 0.5 if avg_x_diff > 0 else 10  # Tai kiinteä arvo
+            column_ids = np.concatenate(([0], np.cumsum(x_diffs > threshold)))
+            column_sizes = np.bincount(column_ids)
+
+            # Järjestetään portit sarakkeittain y-koordinaatin mukaan (vakaa järjestys)
+            order = np.lexsort((centers[:, 1], column_ids))
+            column_starts = np.concatenate(([0], np.cumsum(column_sizes)[:-1]))
+
+            if trace is not None:
+                trace.columns(port_indices, centers, avg_x_diff, threshold, column_sizes)
+                assigned = []
+
+            # Käsitellään jokainen sarake porttinumeroiden antamiseksi: kahden portin
+            # sarakkeessa ylempi saa parittoman ja alempi parillisen numeron, yksittäinen
+            # portti saa parillisen numeron
+            statuses = [PORT_STATUS[c] for c in port_class_ids[port_indices[order]].tolist()]
+            upper_ports = []
+            lower_ports = []
+            for start, size in zip(column_starts.tolist(), column_sizes.tolist()):
+                if size >= 2:
+                    upper_ports.append({"port_number": base_port_number, "status": statuses[start]})
+                    lower_ports.append({"port_number": base_port_number + 1, "status": statuses[start + 1]})
+                    if activity is not None:
+                        upper_ports[-1]["activity"] = activity[port_indices[order[start]]]
+                        lower_ports[-1]["activity"] = activity[port_indices[order[start + 1]]]
+                    if port_keys is not None:
+                        stack_key = (switch_data["switch_id"], f"Stack_{stack_counter}")
+                        port_keys[port_indices[order[start]]] = (*stack_key, base_port_number)
+                        port_keys[port_indices[order[start + 1]]] = (*stack_key, base_port_number + 1)
+                    if trace is not None:
+                        column = port_indices[order[start:start + size]].tolist()
+                        assigned.append([column[0], base_port_number, "upper"])
+                        assigned.append([column[1], base_port_number + 1, "lower"])
+                        # Sarakkeen ylimääräiset portit jäävät ilman numeroa
+                        assigned.extend([extra, None, "dropped"] for extra in column[2:])
+                else:
+                    lower_ports.append({"port_number": base_port_number + 1, "status": statuses[start]})
+                    if activity is not None:
+                        lower_ports[-1]["activity"] = activity[port_indices[order[start]]]
+                    if port_keys is not None:
+                        port_keys[port_indices[order[start]]] = (
+                            switch_data["switch_id"], f"Stack_{stack_counter}", base_port_number + 1,
+                        )
+                    if trace is not None:
+                        assigned.append([int(port_indices[order[start]]), base_port_number + 1, "lower"])
+
+                # Kasvatetaan perusporttinumeroa seuraavaa saraketta varten
+                base_port_number += 2
+
+            if trace is not None:
+                trace.assignments(assigned)
+
+            # Luodaan sanakirja tälle stackille
+            stack_data = {
+                "stack_id": f"Stack_{stack_counter}",
+                "lan_ports": [upper_ports, lower_ports]  # Ylemmät portit ensin
+            }
 
-        # Lisätään stackin tiedot nykyiseen kytkimeen
-        switch_data["lan_port_stacks"].append(stack_data)
+            # Lisätään stackin tiedot nykyiseen kytkimeen
+            switch_data["lan_port_stacks"].append(stack_data)
 
-        # Kasvatetaan stackien laskuria
-        stack_counter += 1
+            # Kasvatetaan stackien laskuria
+            stack_counter += 1
 
-    # Lisätään viimeisen kytkimen tiedot tulokseen
-    output["switches"].append(switch_data)
+        # Lisätään kytkimen tiedot tulokseen
+        output["switches"].append(switch_data)
 
     # Palautetaan tulossanakirja
     return output
@@ -0,0 +1,229 @@
+"""Tämä moduuli sisältää porttien linkkivalojen (LED) aktiivisuusanalyysin videosta.
+
+Kunkin portin LED-alue (roi, suhteessa portin laatikkoon) näytteistetään
+jokaisesta ruudusta pieneksi kiinteän kokoiseksi kuvaksi suoraan ruudun
+pikseleistä: alueen ruudukko kerätään yhdellä indeksoinnilla kaikille
+porteille kerralla, ja kunkin solun osanäytteistä otetaan maksimi, jotta
+pieni LED ei jää näytepisteiden väliin. Pikselin arvo on värikylläisyys
+(suurin miinus pienin värikanava): vihreä tai keltainen LED erottuu siitä
+selvästi, kun taas valkoiset tarrat ja harmaa muovi eivät.
+
+Näytteet kirjoitetaan esivarattuun rengaspuskuriin muodossa
+(portit, ikkuna, korkeus, leveys), joten muistinkäyttö on vakio tallenteen
+pituudesta riippumatta. Portit tunnistetaan seurannan jäljen tunnisteella
+(tracking.LayoutTracker); kadonneen portin paikka vapautetaan uudelle.
+
+Analyysi tehdään kaikille porteille yhtenä vektoroituna ajona: LED-pikseleiksi
+valitaan ne, joiden arvo vaihtelee ikkunassa eniten (tasaisesti palavalla tai
+sammuneella LEDillä ne, joiden arvo on suurin), signaali kynnystetään
+ääriarvojen puolivälistä päälle/pois-tiloiksi ja vilkkumistaajuus lasketaan
+ensimmäisen ja viimeisen nousevan reunan aikaleimoista. Taajuus on luotettava vain
+puoleen näytteenottotaajuuteen asti (Nyquist), joten vilkkuvan valon
+erottamiseen kannattaa käsitellä videosta jokainen ruutu.
+
+Tulos porttia kohden:
+    {"state": "blinking" | "on" | "off" | "unknown", "blink_hz": float, "duty": float}
+
+Sisältää:
+- DEFAULT_ROI: LED-alue suhteessa portin laatikkoon.
+- LinkActivityMonitor: Porttikohtaiset rengaspuskurit ja aktiivisuusanalyysi.
+"""
+
+import numpy as np
+
+# LED-alue portin laatikon leveyden ja korkeuden osuuksina (x1, y1, x2, y2):
+# portin yläreuna ja kaista sen yläpuolella
+DEFAULT_ROI = (0.0, -0.3, 1.0, 0.2)
+
+
+class LinkActivityMonitor:
+    """
+    Kerää porttien LED-alueet rengaspuskuriin ja arvioi niiden aktiivisuuden.
+
+    Args:
+        capacity (int, optional): Seurattavien porttien enimmäismäärä. Oletus 512.
+        window (int, optional): Rengaspuskurin pituus ruutuina. Oletus 64.
+        crop_size (tuple, optional): LED-alueen näytteen koko (korkeus, leveys). Oletus (6, 12).
+        subsample (int, optional): Osanäytteet solun sivua kohden. Oletus 3.
+        roi (tuple, optional): LED-alue suhteessa portin laatikkoon. Oletus DEFAULT_ROI.
+        fps (float, optional): Ruutunopeus, jos aikaleimoja ei anneta. Oletus 30.
+        min_samples (int, optional): Näytteet, jotka tarvitaan arvioon. Oletus 16.
+        min_contrast (int, optional): Pienin päälle/pois-ero, jota pidetään
+            tilan vaihtumisena. Oletus 40.
+        on_level (int, optional): Värikylläisyys, josta tasainen valo tulkitaan
+            palavaksi. Oletus 100.
+        interval (int, optional): Analyysin väli ruutuina. Oletus 8.
+    """
+
+    def __init__(self, capacity=512, window=64, crop_size=(6, 12), subsample=3, roi=DEFAULT_ROI,
+                 fps=30.0, min_samples=16, min_contrast=40, on_level=100, interval=8):
+        self.capacity = capacity
+        self.window = window
+        self.crop_size = tuple(crop_size)
+        self.subsample = subsample
+        self.roi = np.asarray(roi, dtype=np.float32)
+        self.fps = fps
+        self.min_samples = min_samples
+        self.min_contrast = min_contrast
+        self.on_level = on_level
+        self.interval = interval
+
+        # Esivaratut puskurit: näytteet, havaintomaski ja ruutujen aikaleimat
+        self.crops = np.zeros((capacity, window) + self.crop_size, dtype=np.uint8)
+        self.observed = np.zeros((capacity, window), dtype=bool)
+        self.times = np.zeros(window, dtype=np.float64)
+        self.frames = 0
+        self._slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self._activity = {}
+
+        # Näytepisteiden suhteelliset paikat LED-alueen sisällä
+        height, width = self.crop_size
+        self._fy = (np.arange(height * subsample, dtype=np.float32) + 0.5) / (height * subsample)
+        self._fx = (np.arange(width * subsample, dtype=np.float32) + 0.5) / (width * subsample)
+
+    @property
+    def nbytes(self):
+        """Puskurien koko tavuina."""
+        return self.crops.nbytes + self.observed.nbytes + self.times.nbytes
+
+    def _sample(self, frame, boxes):
+        """Näytteistää kaikkien porttien LED-alueet kerralla muotoon (P, korkeus, leveys)."""
+        sizes = boxes[:, 2:] - boxes[:, :2]
+        top_left = boxes[:, :2] + self.roi[:2] * sizes
+        extent = (self.roi[2:] - self.roi[:2]) * sizes
+        xs = (top_left[:, 0, None] + extent[:, 0, None] * self._fx).astype(np.intp)
+        ys = (top_left[:, 1, None] + extent[:, 1, None] * self._fy).astype(np.intp)
+        np.clip(xs, 0, frame.shape[1] - 1, out=xs)
+        np.clip(ys, 0, frame.shape[0] - 1, out=ys)
+
+        # Yksi take-kutsu tasoitettuun ruutuun on nopeampi kuin kaksiulotteinen indeksointi
+        flat = frame.reshape(frame.shape[0] * frame.shape[1], -1)
+        pixels = np.take(flat, ys[:, :, None] * frame.shape[1] + xs[:, None, :], axis=0)
+        if pixels.shape[-1] >= 3:
+            # Värikylläisyys: LEDin väri erottuu valkoisesta ja harmaasta
+            r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+            pixels = np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+        else:
+            pixels = pixels[..., 0]
+
+        # Solun osanäytteiden maksimi lomitetuista näkymistä
+        s = self.subsample
+        pooled = pixels[:, ::s, ::s].copy()
+        for dy in range(s):
+            for dx in range(s):
+                if dy or dx:
+                    np.maximum(pooled, pixels[:, dy::s, dx::s], out=pooled)
+        return pooled
+
+    def update(self, frame, boxes, keys, timestamp=None):
+        """
+        Lisää yhden ruudun näytteet porttien rengaspuskureihin.
+
+        Args:
+            frame (numpy.ndarray): Ruutu (H, W, 3) tai harmaasävy (H, W).
+            boxes (array-like): Porttien laatikot (P, 4).
+            keys (list): Porttien pysyvät tunnisteet (esim. jäljen track_id).
+            timestamp (float, optional): Ruudun aika sekunteina. Oletus ruutulaskurista ja fps:stä.
+        """
+        position = self.frames % self.window
+        self.times[position] = timestamp if timestamp is not None else self.frames / self.fps
+        self.frames += 1
+        self.observed[:, position] = False
+
+        # Kadonneiden porttien paikat vapautetaan
+        present = set(keys)
+        for key in [key for key in self._slots if key not in present]:
+            self._free.append(self._slots.pop(key))
+            self._activity.pop(key, None)
+
+        slots, rows = [], []
+        for row, key in enumerate(keys):
+            slot = self._slots.get(key)
+            if slot is None:
+                if not self._free:
+                    continue
+                slot = self._free.pop()
+                self._slots[key] = slot
+                self.observed[slot] = False
+            slots.append(slot)
+            rows.append(row)
+        if slots:
+            boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)[rows]
+            self.crops[slots, position] = self._sample(frame, boxes)
+            self.observed[slots, position] = True
+
+        if self.frames % self.interval == 0:
+            self.analyze()
+
+    def analyze(self):
+        """
+        Arvioi kaikkien seurattujen porttien aktiivisuuden ikkunan näytteistä.
+
+        Returns:
+            dict: Portin tunniste -> {'state', 'blink_hz', 'duty'}
+        """
+        keys = list(self._slots)
+        if not keys:
+            self._activity = {}
+            return self._activity
+        slots = np.fromiter((self._slots[key] for key in keys), dtype=np.intp, count=len(keys))
+        count = min(self.frames, self.window)
+        # Ikkunan paikat aikajärjestyksessä vanhimmasta uusimpaan
+        order = np.arange(self.frames - count, self.frames) % self.window
+        samples = self.crops[slots[:, None], order].reshape(len(keys), count, -1)
+        observed = self.observed[slots[:, None], order]
+        times = self.times[order]
+
+        # LED-pikselit: suurin vaihtelu ikkunassa, tai tasaisella valolla suurin arvo
+        seen = observed[:, :, None]
+        high = samples.max(axis=1, where=seen, initial=0).astype(np.int16)
+        low = samples.min(axis=1, where=seen, initial=255).astype(np.int16)
+        spread = high - low
+        varying = spread.max(axis=1) >= self.min_contrast
+        score = np.where(varying[:, None], spread, high)
+        k = max(1, samples.shape[2] // 32)
+        led = np.argpartition(score, -k, axis=1)[:, -k:]
+        signal = np.take_along_axis(samples, led[:, None, :], axis=2).mean(axis=2)
+
+        # Päälle/pois-tilat ääriarvojen puolivälistä; puuttuvat näytteet täytetään edellisellä
+        valid = observed.sum(axis=1)
+        signal_high = np.where(observed, signal, -np.inf).max(axis=1)
+        signal_low = np.where(observed, signal, np.inf).min(axis=1)
+        contrast = signal_high - signal_low
+        on = signal > ((signal_high + signal_low) / 2)[:, None]
+        last_seen = np.where(observed, np.arange(count), 0)
+        np.maximum.accumulate(last_seen, axis=1, out=last_seen)
+        on = np.take_along_axis(on, last_seen, axis=1)
+        started = np.logical_or.accumulate(observed, axis=1)
+
+        switching = contrast >= self.min_contrast
+        rising = on[:, 1:] & ~on[:, :-1] & started[:, :-1] & switching[:, None]
+        rises = rising.sum(axis=1)
+        # Taajuus ensimmäisen ja viimeisen nousevan reunan välistä: rises - 1 jaksoa
+        first_rise = rising.argmax(axis=1) + 1
+        last_rise = count - 1 - rising[:, ::-1].argmax(axis=1)
+        period_time = times[last_rise] - times[first_rise]
+        blink_hz = np.where(
+            (rises >= 2) & (period_time > 0), (rises - 1) / np.maximum(period_time, 1e-9), 0.0
+        )
+        duty = np.where(
+            switching, (on & observed).sum(axis=1), np.where(signal_high >= self.on_level, valid, 0)
+        ) / np.maximum(valid, 1)
+
+        steady_on = np.where(switching, on[:, -1], signal_high >= self.on_level)
+        state = np.where(rises >= 2, "blinking", np.where(steady_on, "on", "off"))
+        state = np.where(valid >= self.min_samples, state, "unknown")
+        self._activity = {
+            key: {"state": str(s), "blink_hz": round(float(hz), 2), "duty": round(float(d), 2)}
+            for key, s, hz, d in zip(keys, state.tolist(), blink_hz.tolist(), duty.tolist())
+        }
+        return self._activity
+
+    def activity(self, key):
+        """Palauttaa portin viimeisimmän arvion tai None, jos porttia ei ole arvioitu."""
+        return self._activity.get(key)
+
+    def signature(self):
+        """Palauttaa porttien tilat; muuttuu vain, kun jonkin portin tila vaihtuu."""
+        return frozenset((key, value["state"]) for key, value in self._activity.items())
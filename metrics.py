@@ -0,0 +1,361 @@
+"""Tämä moduuli sisältää kevyen vaiheittaisen viiveinstrumentoinnin.
+
+Jokainen tunnistuspolun vaihe (mallin haku, PIL-muunnos, mallin esikäsittely,
+inferenssi ja NMS, generate_switch_json, serialisointi ja piirto) kirjataan
+aikaväliksi (span), ja kuvakohtaiset määrät (portit, pinot, kytkimet, kuvan
+koko) kirjataan omiksi jakaumikseen. Kaikki arvot tallennetaan kiinteän
+kokoisiin histogrammeihin, joten muistinkäyttö ei kasva ajon pituuden mukana.
+
+Mittarit voidaan lukea Prometheus-tekstimuodossa (to_prometheus) tai
+JSON-tilannekuvana (snapshot). Gradio-sovellus voi tarjota ne omalla
+HTTP-portillaan (start_http_server), eräajo kirjoittaa ne tiedostoon ja
+server.py palauttaa ne polusta /metrics.
+
+Instrumentointi kytketään pois ympäristömuuttujalla PORTVISION_METRICS=0,
+jolloin span palauttaa valmiin tyhjän kontekstin eikä mitään kirjata.
+
+Sisältää:
+- Histogram: Kiinteäkokoinen histogrammi kvantiiliarvioineen.
+- MetricsRegistry: Histogrammit ja laskurit nimillä ja tunnisteilla.
+- metrics: Prosessinlaajuinen rekisteri.
+- span, observe, increment, record_counts, record_model_speed: Rekisterin pikakutsut.
+- start_http_server: Käynnistää /metrics-palvelimen taustasäikeeseen.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+# Vaiheiden kestot sekunteina (0,5 ms ... 10 s)
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Objektimäärät kuvaa kohden
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+# Kuvan koko megapikseleinä
+MEGAPIXEL_BUCKETS = (0.1, 0.5, 1.0, 2.0, 4.0, 8.0, 12.0, 16.0, 24.0, 50.0)
+
+STAGE_METRIC = "portvision_stage_seconds"
+
+
+class Histogram:
+    """
+    Kiinteäkokoinen histogrammi (Prometheus-tyylinen kumulatiivinen).
+
+    Args:
+        buckets (tuple): Lokeroiden ylärajat nousevassa järjestyksessä.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # viimeinen = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        Arvioi kvantiilin interpoloimalla lineaarisesti lokeron sisällä.
+
+        Args:
+            q (float): Kvantiili väliltä 0–1.
+
+        Returns:
+            float | None: Arvio tai None, jos havaintoja ei ole.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else min(self.min, 0.0)
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                fraction = (rank - cumulative) / bucket_count
+                estimate = lower + (upper - lower) * fraction
+                return min(max(estimate, self.min), self.max)
+            cumulative += bucket_count
+        return self.max
+
+    def snapshot(self):
+        """Palauttaa histogrammin tilan sanakirjana."""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+
+class _Span:
+    """Aikaväli, joka kirjaa kestonsa histogrammiin poistuttaessa."""
+
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullSpan:
+    """Tyhjä aikaväli, kun instrumentointi on pois päältä."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + parts + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Säieturvallinen histogrammien ja laskureiden rekisteri.
+
+    Args:
+        enabled (bool, optional): Kirjataanko mittauksia. Oletus True.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._buckets = {}
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text, buckets=None):
+        """Asettaa mittarin kuvauksen ja histogrammin lokerot."""
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = tuple(buckets)
+
+    def observe(self, name, value, **labels):
+        """Lisää havainnon histogrammiin name, tunnisteina labels."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(self._buckets.get(name, LATENCY_BUCKETS))
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    def increment(self, name, value=1, **labels):
+        """Kasvattaa laskuria name."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def span(self, stage, **labels):
+        """
+        Palauttaa kontekstinhallinnan, joka kirjaa vaiheen keston.
+
+        Esimerkki:
+            with metrics.span("generate_switch_json"):
+                ...
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, STAGE_METRIC, {"stage": stage, **labels})
+
+    def record_counts(self, ports=None, stacks=None, switches=None, image_shape=None):
+        """Kirjaa kuvan objektimäärät ja koon."""
+        if not self.enabled:
+            return
+        for kind, value in (("ports", ports), ("stacks", stacks), ("switches", switches)):
+            if value is not None:
+                self.observe("portvision_objects_per_image", value, kind=kind)
+        if image_shape is not None:
+            height, width = image_shape[:2]
+            self.observe("portvision_image_megapixels", height * width / 1e6)
+
+    def record_model_speed(self, results):
+        """
+        Kirjaa mallin esikäsittelyn, inferenssin ja NMS:n keston.
+
+        Ultralyticsin tulosolioiden speed-sanakirja sisältää kuvakohtaiset ajat
+        millisekunteina; sama muoto on myös backends.BackendResultilla.
+        """
+        if not self.enabled:
+            return
+        for result in results:
+            speed = getattr(result, "speed", None) or {}
+            for stage, milliseconds in speed.items():
+                if milliseconds is not None:
+                    self.observe(STAGE_METRIC, milliseconds / 1000.0, stage=f"model_{stage}")
+
+    def snapshot(self):
+        """
+        Palauttaa kaikki mittarit JSON-yhteensopivana sanakirjana.
+
+        Returns:
+            dict: {'histograms': {nimi: [{'labels', ...}]}, 'counters': {...}}
+        """
+        with self._lock:
+            histograms = {}
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                histograms.setdefault(name, []).append(
+                    {"labels": dict(labels), **histogram.snapshot()}
+                )
+            counters = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {"histograms": histograms, "counters": counters}
+
+    def to_prometheus(self):
+        """
+        Palauttaa mittarit Prometheus-tekstimuodossa (versio 0.0.4).
+
+        Returns:
+            str: Mittarit tekstinä.
+        """
+        lines = []
+        with self._lock:
+            by_name = {}
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                by_name.setdefault(name, []).append((labels, histogram))
+            for name, series in by_name.items():
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, bucket_count in zip([*histogram.buckets, math.inf], histogram.counts):
+                        cumulative += bucket_count
+                        bucket_labels = _format_labels((*labels, ("le", _format_value(bound))))
+                        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum!r}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+            by_name = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            for name, series in by_name.items():
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in series:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Kirjoittaa tilannekuvan JSON-tiedostoon tai .prom-päätteisenä tekstimuodossa."""
+        with open(path, 'w', encoding='utf-8') as file:
+            if path.endswith(".prom"):
+                file.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), file, indent=2)
+
+    def reset(self):
+        """Tyhjentää kaikki mittarit."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+metrics = MetricsRegistry(enabled=os.environ.get("PORTVISION_METRICS", "1") != "0")
+metrics.describe(STAGE_METRIC, "Tunnistuspolun vaiheiden kesto sekunteina.", LATENCY_BUCKETS)
+metrics.describe("portvision_objects_per_image", "Tunnistetut objektit kuvaa kohden.", COUNT_BUCKETS)
+metrics.describe("portvision_image_megapixels", "Syötekuvien koko megapikseleinä.", MEGAPIXEL_BUCKETS)
+metrics.describe("portvision_images_total", "Käsitellyt kuvat sisääntulon mukaan.")
+
+span = metrics.span
+observe = metrics.observe
+increment = metrics.increment
+record_counts = metrics.record_counts
+record_model_speed = metrics.record_model_speed
+
+
+def start_http_server(port, host="127.0.0.1", registry=metrics):
+    """
+    Käynnistää taustasäikeeseen HTTP-palvelimen, joka tarjoaa polut
+    /metrics (Prometheus) ja /metrics.json (tilannekuva).
+
+    Args:
+        port (int): Portti.
+        host (str, optional): Osoite. Oletus 127.0.0.1.
+        registry (MetricsRegistry, optional): Rekisteri. Oletus prosessin rekisteri.
+
+    Returns:
+        http.server.ThreadingHTTPServer: Käynnistetty palvelin.
+    """
+    # http.server tuodaan vasta tarvittaessa, koska sen tuonti hidastaa käynnistystä
+    import http.server
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body = json.dumps(registry.snapshot()).encode('utf-8')
+                content_type = "application/json"
+            elif self.path.startswith("/metrics"):
+                body = registry.to_prometheus().encode('utf-8')
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
@@ -0,0 +1,232 @@
+"""Tämä moduuli sisältää prosessinlaajuisen rekisterin ladatuille YOLO-malleille.
+
+Malli ladataan kerran, lämmitetään yhdellä tyhjällä ennusteella ja pidetään
+muistissa avaimella (painotiedoston polku, laite). Jos painotiedosto vaihtuu
+levyllä (esim. port_vision.py-koulutuksen jälkeen), uusi malli ladataan
+taustasäikeessä ja vaihdetaan käyttöön vasta, kun se on valmis. Käynnissä olevat
+pyynnöt käyttävät siihen asti vanhaa mallia.
+
+Sisältää:
+- select_device: Valitsee laitteen (cuda/cpu) kerran prosessia kohden.
+- LoadedModel: Ladatun mallin tiedot ja lataus-/lämmitysajat.
+- ModelRegistry: Mallirekisteri, joka huolehtii latauksesta ja vaihdosta.
+- get_model: Hakee mallin oletusrekisteristä.
+
+torch ja ultralytics tuodaan vasta ensimmäisen mallin latauksessa, joten
+moduulin tuonti on nopea myös prosesseissa, jotka eivät aja mallia.
+"""
+
+import functools
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+DEFAULT_WEIGHTS = "best.pt"
+WARMUP_IMGSZ = 1216
+
+
+@functools.lru_cache(maxsize=None)
+def select_device():
+    """
+    Valitsee laitteen, jolla malli ajetaan.
+
+    Returns:
+        torch.device: 'cuda', jos saatavilla, muuten 'cpu'.
+    """
+    import torch
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Device: {device}")
+    return device
+
+
+def _weights_mtime(weights):
+    """Palauttaa painotiedoston muokkausajan tai None, jos tiedostoa ei ole."""
+    try:
+        return os.stat(weights).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@dataclass
+class LoadedModel:
+    """
+    Rekisteriin ladattu malli.
+
+    Attributes:
+        model: Ladattu YOLO-malli.
+        weights (str): Painotiedoston absoluuttinen polku.
+        device (str): Laite, jolle malli on siirretty.
+        mtime (int): Painotiedoston muokkausaika latushetkellä.
+        load_seconds (float): Painojen latausaika sekunteina.
+        warmup_seconds (float): Lämmitysennusteen kesto sekunteina.
+        loaded_at (float): Latauksen valmistumishetki (time.time()).
+    """
+    model: object
+    weights: str
+    device: str
+    mtime: int
+    load_seconds: float
+    warmup_seconds: float
+    loaded_at: float = field(default_factory=time.time)
+
+    def timings(self):
+        """Palauttaa lataus- ja lämmitysajat sanakirjana."""
+        return {
+            "weights": self.weights,
+            "device": self.device,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """
+    Prosessinlaajuinen mallirekisteri.
+
+    Args:
+        warmup_imgsz (int, optional): Lämmitysennusteen kuvakoko. Oletus 1216.
+        check_interval (float, optional): Kuinka usein (sekunteina) painotiedoston
+            muutokset tarkistetaan. Oletus 2.0.
+    """
+
+    def __init__(self, warmup_imgsz=WARMUP_IMGSZ, check_interval=2.0):
+        self.warmup_imgsz = warmup_imgsz
+        self.check_interval = check_interval
+        self._models = {}          # (weights, device) -> LoadedModel
+        self._last_check = {}      # (weights, device) -> viimeisin tarkistushetki
+        self._reloading = set()    # Avaimet, joiden uudelleenlataus on käynnissä
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(weights, device):
+        return os.path.abspath(weights), str(device)
+
+    def _load(self, weights, device, warmup=True):
+        """Lataa mallin, siirtää sen laitteelle ja ajaa lämmitysennusteen."""
+        from ultralytics import YOLO
+
+        mtime = _weights_mtime(weights)
+        start = time.perf_counter()
+        model = YOLO(weights).to(device)
+        load_seconds = time.perf_counter() - start
+
+        warmup_seconds = 0.0
+        if warmup:
+            dummy = np.zeros((self.warmup_imgsz, self.warmup_imgsz, 3), dtype=np.uint8)
+            start = time.perf_counter()
+            model(dummy, verbose=False)
+            warmup_seconds = time.perf_counter() - start
+
+        entry = LoadedModel(
+            model=model,
+            weights=weights,
+            device=device,
+            mtime=mtime,
+            load_seconds=load_seconds,
+            warmup_seconds=warmup_seconds,
+        )
+        print(
+            f"Malli {weights} ladattu laitteelle {device}: "
+            f"lataus {load_seconds:.2f} s, lämmitys {warmup_seconds:.2f} s"
+        )
+        return entry
+
+    def get_entry(self, weights=DEFAULT_WEIGHTS, device=None, warmup=True):
+        """
+        Palauttaa ladatun mallin tiedot ja lataa mallin tarvittaessa.
+
+        Ensimmäinen kutsu lataa mallin synkronisesti. Jos painotiedosto on
+        myöhemmin muuttunut, uusi malli ladataan taustalla ja nykyinen palautetaan.
+
+        Args:
+            weights (str, optional): Painotiedoston polku. Oletus 'best.pt'.
+            device (str | torch.device, optional): Laite. Oletus select_device().
+            warmup (bool, optional): Ajetaanko lämmitysennuste. Oletus True.
+
+        Returns:
+            LoadedModel: Käytössä oleva malli.
+        """
+        if device is None:
+            device = select_device()
+        weights, device = self._key(weights, device)
+        key = (weights, device)
+
+        entry = self._models.get(key)
+        if entry is None:
+            with self._lock:
+                # Toinen säie on voinut ladata mallin odottaessamme lukkoa
+                entry = self._models.get(key)
+                if entry is None:
+                    entry = self._load(weights, device, warmup)
+                    self._models[key] = entry
+                    self._last_check[key] = time.monotonic()
+            return entry
+
+        now = time.monotonic()
+        if now - self._last_check.get(key, 0.0) >= self.check_interval:
+            self._last_check[key] = now
+            mtime = _weights_mtime(weights)
+            if mtime is not None and mtime != entry.mtime:
+                self._start_reload(key, warmup)
+        return entry
+
+    def get(self, weights=DEFAULT_WEIGHTS, device=None, warmup=True):
+        """Palauttaa käytössä olevan YOLO-mallin (ks. get_entry)."""
+        return self.get_entry(weights, device, warmup).model
+
+    def _start_reload(self, key, warmup):
+        """Käynnistää taustalatauksen, ellei se ole jo käynnissä."""
+        with self._lock:
+            if key in self._reloading:
+                return
+            self._reloading.add(key)
+        thread = threading.Thread(
+            target=self._reload_worker, args=(key, warmup), daemon=True
+        )
+        thread.start()
+
+    def _reload_worker(self, key, warmup):
+        weights, device = key
+        try:
+            entry = self._load(weights, device, warmup)
+        except Exception as e:
+            # Esim. koulutus kirjoittaa tiedostoa vielä: pidetään vanha malli
+            print(f"Mallin {weights} uudelleenlataus epäonnistui: {e}")
+        else:
+            # Sijoitus on atominen: käynnissä olevat pyynnöt pitävät vanhan viitteen
+            self._models[key] = entry
+        finally:
+            with self._lock:
+                self._reloading.discard(key)
+
+    def reload(self, weights=DEFAULT_WEIGHTS, device=None, warmup=True):
+        """
+        Lataa mallin uudelleen synkronisesti ja vaihtaa sen käyttöön.
+
+        Returns:
+            LoadedModel: Uusi malli.
+        """
+        if device is None:
+            device = select_device()
+        key = self._key(weights, device)
+        entry = self._load(*key, warmup)
+        self._models[key] = entry
+        return entry
+
+    def stats(self):
+        """Palauttaa lataus- ja lämmitysajat kaikille ladatuille malleille."""
+        return [entry.timings() for entry in list(self._models.values())]
+
+
+# Oletusrekisteri, jota detect.predict ja app.py käyttävät
+registry = ModelRegistry()
+
+
+def get_model(weights=DEFAULT_WEIGHTS, device=None):
+    """Hakee mallin oletusrekisteristä."""
+    return registry.get(weights, device)
@@ -0,0 +1,419 @@
+"""Tämä moduuli sisältää liukuhihnoitetun eräajon: purku, inferenssi ja jälkikäsittely limittäin.
+
+batch_predict.run_batch ajaa jälkikäsittelyn (generate_switch_json, piirto,
+kuvan pakkaus ja JSON-serialisointi) samassa säikeessä kuin inferenssin,
+joten malli odottaa jälkikäsittelyä ja päinvastoin. Liukuhihnassa vaiheet
+ovat erillään:
+
+    purkusäikeet --(rajattu jono)--> inferenssi (pääsäie)
+        --(rajattu jono + jaettu muisti)--> jälkikäsittelyprosessit
+        --(tulosjono)--> kirjoitussäie (serializers.RecordWriter)
+
+Inferenssivaihe kirjoittaa kuvan ja sen tunnistukset (xyxy, conf, cls)
+valmiiksi varattuun jaetun muistin paikkaan ja lähettää prosessille vain
+paikan numeron ja taulukoiden sijainnit, joten kuvia ei picklata. Paikka
+vapautuu, kun kirjoitussäie on saanut kuvan tuloksen; vapaiden paikkojen
+määrä rajaa samalla keskeneräisten kuvien määrän ja siten muistinkäytön.
+
+Jälkikäsittelyprosessit piirtävät BGR-kuvaan suoraan jaetussa muistissa
+BGR-väreillä (image_buffer.styles_for), joten kuvaa ei kopioida eikä
+muunneta RGB-muotoon.
+Prosessit myös koodaavat tietueet valittuun muotoon, joten kirjoitussäie
+vain kirjoittaa valmiit tavut. Tietueet kirjoitetaan valmistumisjärjestyksessä, eli järjestys voi
+poiketa syötteen järjestyksestä. Jälkikäsittelyprosessien metriikat
+(metrics.py) jäävät prosessien omiin rekistereihin; vaiheiden kokonaisajat
+palautetaan pääprosessille tulosten mukana.
+
+Jos yhden kuvan jälkikäsittely epäonnistuu, kuvasta kirjoitetaan
+{"image", "error"}-tietue ja prosessi jatkaa. Jos prosessi päättyy kesken
+ajon, pääsäie huomaa sen odottaessaan vapaata paikkaa tai jonoa ja keskeyttää
+ajon RuntimeErrorilla jumiutumisen sijaan.
+
+Sisältää:
+- SharedSlots: Jaetun muistin paikat kuville ja tunnistuksille.
+- run_pipeline: Ajaa eräajon liukuhihnana.
+"""
+
+import functools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+from batch_predict import (
+    StageTimer,
+    _decode_worker,
+    _feed_paths,
+    _iter_batches,
+    iter_pending,
+    load_done_paths,
+    output_file,
+)
+from bounding_boxes import draw_hierarchy
+from decision_trace import DecisionTrace
+from detections import Detections
+from image_buffer import BGR, styles_for
+from json_generator import generate_switch_json
+from metrics import increment, record_model_speed
+from model_registry import get_model
+from serializers import RecordWriter, get_serializer
+from spatial_index import SwitchHierarchy
+
+# Taulukoiden tasaus jaetun muistin paikassa
+_ALIGN = 64
+
+
+def _aligned(size):
+    return (size + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class SharedSlots:
+    """
+    Kiinteä joukko jaetun muistin paikkoja.
+
+    Paikka varataan acquire-kutsulla (odottaa, jos kaikki ovat käytössä) ja
+    vapautetaan release-kutsulla. Jos kuva ei mahdu paikkaan, paikka luodaan
+    uudelleen suurempana uudella nimellä; prosessit liittyvät paikkaan nimen
+    perusteella.
+
+    Args:
+        count (int): Paikkojen määrä.
+    """
+
+    def __init__(self, count):
+        self.blocks = [None] * count
+        self.free = queue.Queue()
+        for slot in range(count):
+            self.free.put(slot)
+
+    def acquire(self, size, check=None):
+        """
+        Varaa vapaan paikan, johon mahtuu size tavua.
+
+        Args:
+            size (int): Tarvittava tila tavuina.
+            check (callable, optional): Kutsutaan odotuksen aikana sekunnin
+                välein; voi keskeyttää odotuksen poikkeuksella. Oletus None.
+
+        Returns:
+            tuple: (paikan numero, jaetun muistin nimi)
+        """
+        while True:
+            try:
+                slot = self.free.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if check is not None:
+                    check()
+        block = self.blocks[slot]
+        if block is None or block.size < size:
+            if block is not None:
+                block.close()
+                block.unlink()
+            block = self.blocks[slot] = shared_memory.SharedMemory(create=True, size=size)
+        return slot, block.name
+
+    def write(self, slot, arrays):
+        """
+        Kopioi taulukot paikkaan peräkkäin.
+
+        Returns:
+            list: Taulukoiden sijainnit (offset, muoto, dtype).
+        """
+        block = self.blocks[slot]
+        layout, offset = [], 0
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            target = np.ndarray(array.shape, array.dtype, buffer=block.buf, offset=offset)
+            target[...] = array
+            layout.append((offset, array.shape, array.dtype.str))
+            offset += _aligned(array.nbytes)
+        return layout
+
+    @staticmethod
+    def size_of(arrays):
+        """Palauttaa taulukoiden tarvitseman tilan tasauksineen."""
+        return sum(_aligned(np.asarray(array).nbytes) for array in arrays)
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def close(self):
+        """Vapauttaa kaikki paikat."""
+        for block in self.blocks:
+            if block is not None:
+                block.close()
+                block.unlink()
+        self.blocks = [None] * len(self.blocks)
+
+
+def _postprocess(block, path, layout, serializer, source, save_images, trace_dir):
+    """Jälkikäsittelee yhden kuvan jaetusta muistista ja palauttaa koodatun tietueen."""
+    image, xyxy, conf, cls = (
+        np.ndarray(shape, np.dtype(dtype), buffer=block.buf, offset=offset)
+        for offset, shape, dtype in layout
+    )
+    detections = Detections(xyxy, conf, cls)
+    hierarchy = SwitchHierarchy.build(detections.stacks, detections.ports, detections.switches)
+    trace = DecisionTrace(label=path) if trace_dir else None
+    output = generate_switch_json(None, None, trace=trace, hierarchy=hierarchy)
+    if trace is not None:
+        trace.dump(output_file(trace_dir, path, source, ".trace.json"))
+    if save_images:
+        # Piirretään suoraan jaetun muistin BGR-kuvaan
+        draw_hierarchy(image, hierarchy, font_scale=0.8, styles=styles_for(BGR))
+        cv2.imwrite(output_file(save_images, path, source, ".jpg"), image)
+    height, width = image.shape[:2]
+    # Näkymät jaettuun muistiin vapautuvat funktiosta palattaessa, myös poikkeuksessa
+    return serializer.encode_record({"image": path, "width": width, "height": height, **output})
+
+
+def _postprocess_worker(task_queue, result_queue, source, save_images, trace_dir, output_format):
+    """Jälkikäsittelyprosessi: hierarkia, JSON, piirto ja serialisointi jaetusta muistista."""
+    serializer = get_serializer(output_format)
+    attached = {}
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                return
+            slot, name, path, layout = task
+            start = time.perf_counter()
+            try:
+                block = attached.get(slot)
+                if block is None or block.name != name:
+                    if block is not None:
+                        block.close()
+                    block = attached[slot] = shared_memory.SharedMemory(name=name)
+                line = _postprocess(block, path, layout, serializer, source, save_images, trace_dir)
+                failed = False
+            except Exception as e:
+                # Yhden kuvan virhe kirjataan tietueeksi; paikka vapautuu ja prosessi jatkaa
+                line = serializer.encode_record(
+                    {"image": path, "error": f"jälkikäsittely epäonnistui: {e}"}
+                )
+                failed = True
+            result_queue.put((slot, path, line, time.perf_counter() - start, failed))
+    finally:
+        for block in attached.values():
+            block.close()
+        result_queue.put(None)
+
+
+def _write_results(result_queue, out, slots, num_workers, timer, counters, errors):
+    """
+    Kirjoitussäie: kirjoittaa valmiit rivit ja vapauttaa jaetun muistin paikat.
+
+    Virhetietuetta ei kirjoiteta kuvalle, jolla on jo virhetietue (errors).
+    """
+    finished = 0
+    while finished < num_workers:
+        item = result_queue.get()
+        if item is None:
+            finished += 1
+            continue
+        slot, path, line, elapsed, failed = item
+        if not (failed and path in errors):
+            start = time.perf_counter()
+            out.write_encoded(line)
+            timer.add("write", time.perf_counter() - start)
+        if slot is not None:
+            slots.release(slot)
+            timer.add("postprocess", elapsed)
+            if failed:
+                counters["failed"] += 1
+            else:
+                counters["processed"] += 1
+                increment("portvision_images_total", entry="pipeline")
+    out.flush()
+
+
+def _check_workers(processes):
+    """Keskeyttää ajon, jos jokin jälkikäsittelyprosessi on päättynyt kesken ajon."""
+    for process in processes:
+        if not process.is_alive():
+            raise RuntimeError(
+                f"Jälkikäsittelyprosessi {process.pid} päättyi odottamatta (exitcode {process.exitcode})"
+            )
+
+
+def _put_task(task_queue, task, processes):
+    """Lisää tehtävän jonoon; odottaessa tarkistetaan, että prosessit ovat käynnissä."""
+    while True:
+        try:
+            task_queue.put(task, timeout=1.0)
+            return
+        except queue.Full:
+            _check_workers(processes)
+
+
+def run_pipeline(
+    source,
+    output_path,
+    weights='best.pt',
+    device=None,
+    batch_size=8,
+    workers=4,
+    postprocess_workers=None,
+    iou=0.4,
+    conf=0.4,
+    imgsz=None,
+    save_images=None,
+    resume=False,
+    recursive=False,
+    trace_dir=None,
+    in_flight=None,
+    model=None,
+    output_format="compact",
+):
+    """
+    Ajaa tunnistuksen liukuhihnana ja kirjoittaa tulokset tietue kerrallaan.
+
+    Args:
+        source (str): Hakemisto, glob-hahmo tai manifestitiedosto.
+        output_path (str): Tulostetiedosto.
+        weights (str, optional): Mallin painotiedosto. Oletus 'best.pt'.
+        device (str, optional): Laite. Oletus valitaan automaattisesti.
+        batch_size (int, optional): Mallille kerralla annettavien kuvien määrä. Oletus 8.
+        workers (int, optional): Purkusäikeiden määrä. Oletus 4.
+        postprocess_workers (int, optional): Jälkikäsittelyprosessien määrä.
+            Oletus prosessoriytimien määrä - 1 (vähintään 1).
+        iou (float, optional): NMS:n IoU-kynnys. Oletus 0.4.
+        conf (float, optional): Luottamuskynnys. Oletus 0.4.
+        imgsz (int, optional): Mallin syötekoko. Oletus mallin oma.
+        save_images (str, optional): Hakemisto annotoiduille kuville. Oletus None.
+        resume (bool, optional): Ohitetaanko tulosteessa jo olevat kuvat. Kuvista,
+            joilla on jo virhetietue, ei kirjoiteta uutta virhetietuetta. Oletus False.
+        recursive (bool, optional): Käydäänkö alihakemistot läpi. Oletus False.
+        trace_dir (str, optional): Hakemisto kuvakohtaisille päätösjäljille. Oletus None.
+        in_flight (int, optional): Jaetun muistin paikkojen eli keskeneräisten
+            kuvien enimmäismäärä. Oletus batch_size + 2 * postprocess_workers.
+        model (callable, optional): Valmis inferenssitausta (esim. mittauksiin).
+            Oletus get_model(weights, device).
+        output_format (str, optional): Tulostiedoston muoto (serializers.py).
+            Oletus 'compact' (JSONL).
+
+    Returns:
+        dict: Ajon tilastot (kuvamäärät, kuvaa/s ja vaiheiden ajat).
+    """
+    if postprocess_workers is None:
+        postprocess_workers = max(1, (os.cpu_count() or 2) - 1)
+    if in_flight is None:
+        in_flight = batch_size + 2 * postprocess_workers
+    model = model or get_model(weights, device)
+    timer = StageTimer()
+
+    errors = set()
+    done = load_done_paths(output_path, output_format, errors) if resume else set()
+    counters = {"processed": 0, "failed": 0, "skipped": 0}
+    paths = iter_pending(source, recursive, done, counters)
+    if save_images:
+        os.makedirs(save_images, exist_ok=True)
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+
+    # Prosessit käynnistetään ennen säikeitä, jotta fork ei kopioi säikeiden tilaa.
+    # Resurssiseuranta käynnistetään ensin, jotta prosessit jakavat sen eivätkä
+    # yritä poistaa pääprosessin jo vapauttamia jaetun muistin paikkoja.
+    resource_tracker.ensure_running()
+    context = multiprocessing.get_context()
+    task_queue = context.Queue(maxsize=in_flight)
+    result_queue = context.Queue()
+    processes = [
+        context.Process(
+            target=_postprocess_worker,
+            args=(task_queue, result_queue, source, save_images, trace_dir, output_format),
+            daemon=True,
+        )
+        for _ in range(postprocess_workers)
+    ]
+    for process in processes:
+        process.start()
+
+    path_queue = queue.Queue(maxsize=batch_size * 4)
+    image_queue = queue.Queue(maxsize=batch_size * 2)
+    decoders = [
+        threading.Thread(target=_decode_worker, args=(path_queue, image_queue, timer), daemon=True)
+        for _ in range(workers)
+    ]
+    feeder = threading.Thread(target=_feed_paths, args=(paths, path_queue, workers), daemon=True)
+    for thread in decoders:
+        thread.start()
+    feeder.start()
+
+    predict_kwargs = {"iou": iou, "conf": conf, "verbose": False}
+    if imgsz:
+        predict_kwargs["imgsz"] = imgsz
+
+    slots = SharedSlots(in_flight)
+    run_start = time.perf_counter()
+
+    with RecordWriter(output_path, output_format, append=resume) as out:
+        writer = threading.Thread(
+            target=_write_results,
+            args=(result_queue, out, slots, postprocess_workers, timer, counters, errors),
+            daemon=True,
+        )
+        writer.start()
+
+        check = functools.partial(_check_workers, processes)
+        aborted = True
+        try:
+            for batch in _iter_batches(image_queue, batch_size, workers):
+                for path, image in batch:
+                    if image is None:
+                        counters["failed"] += 1
+                        line = out.encode({"image": path, "error": "kuvan lukeminen epäonnistui"})
+                        result_queue.put((None, path, line, 0.0, True))
+                valid = [(path, image) for path, image in batch if image is not None]
+                if not valid:
+                    continue
+
+                start = time.perf_counter()
+                results = model([image for _, image in valid], **predict_kwargs)
+                timer.add("inference", time.perf_counter() - start, len(valid))
+                record_model_speed(results)
+
+                # Kuva ja tunnistukset jaettuun muistiin; prosessille vain sijainnit
+                for (path, image), result in zip(valid, results):
+                    start = time.perf_counter()
+                    arrays = (
+                        image,
+                        result.boxes.xyxy.cpu().numpy(),
+                        result.boxes.conf.cpu().numpy(),
+                        result.boxes.cls.cpu().numpy(),
+                    )
+                    slot, name = slots.acquire(SharedSlots.size_of(arrays), check=check)
+                    layout = slots.write(slot, arrays)
+                    timer.add("handoff", time.perf_counter() - start)
+                    _put_task(task_queue, (slot, name, path, layout), processes)
+            for _ in processes:
+                _put_task(task_queue, None, processes)
+            aborted = False
+        finally:
+            if aborted:
+                for process in processes:
+                    process.terminate()
+            for process in processes:
+                process.join()
+            # Lopetusmerkit myös kaatuneiden prosessien puolesta: prosessien tulokset
+            # ovat jonossa ennen niitä, ja ylimääräiset merkit jäävät lukematta
+            for _ in processes:
+                result_queue.put(None)
+            writer.join()
+            slots.close()
+
+    elapsed = time.perf_counter() - run_start
+    return {
+        "processed": counters["processed"],
+        "failed": counters["failed"],
+        "skipped": counters["skipped"],
+        "elapsed_seconds": elapsed,
+        "images_per_second": counters["processed"] / elapsed if elapsed > 0 else 0.0,
+        "stages": timer.summary(),
+    }
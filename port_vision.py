@@ -2,13 +2,17 @@ from ultralytics import YOLO
 import torch
 import wandb
 
+from shard_cache import shard_trainer
+
 def train_model(epochs):
     # Load a model
     model = YOLO(r'runs\train\port_vision33\weights\best.pt').to(device)
     # model = YOLO(r'yolo11s.pt').to(device)
 
     # Train the model
+    # Images are read from the pre-decoded shard cache (shard_cache.py), built on first use
     train_results = model.train(
+        trainer=shard_trainer(workers=8),
         batch=16,            # batch size
         data="data.yaml",    # path to dataset YAML
         epochs=epochs,           # number of training epochs
@@ -67,6 +71,7 @@ if __name__ == '__main__':
 
     # Export the model to ONNX format
     path = model.export(format="onnx")  # return path to exported model
+    # FP16/INT8 versions and their accuracy/latency comparison: python quantize.py
 
 
 
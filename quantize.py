@@ -0,0 +1,390 @@
+"""Tämä skripti vie mallin FP32-, FP16- ja INT8-muotoisiksi ONNX-malleiksi ja vertailee niitä.
+
+Vaiheet:
+1. FP32: ultralyticsin ONNX-vienti (sama kuin port_vision.py:n lopussa).
+2. FP16: FP32-mallin painot muunnetaan puolitarkkuuteen (onnxconverter-common);
+   syöte ja tuloste pysyvät float32-muodossa, joten backends.py toimii sellaisenaan.
+3. INT8: staattinen QDQ-kvantisointi ONNX Runtimella. Kalibrointiin käytetään
+   annettu määrä data.yaml-tiedoston jaon kuvia samalla letterbox-esikäsittelyllä
+   kuin inferenssissä. Tunnistuspää (viimeinen moduuli) jätetään oletuksena
+   FP32-muotoon, koska laatikoiden dekoodaus on herkkä kvantisoinnille.
+
+Jokainen versio arvioidaan validointi- tai testijaolla: tunnistuksen mAP50 ja
+mAP50-95 nimiöitä vastaan, lopullisen generate_switch_json-tulosteen
+porttitilojen yhtäpitävyys nimiöistä rakennettuun tulosteeseen ja FP32-malliin,
+kuvakohtainen viive (p50/p95, erä 1) sekä mallitiedoston koko. Tulokset
+tulostetaan taulukkona ja tallennetaan JSON-raporttiin.
+
+Riippuvuudet: ultralytics (vienti), onnx, onnxruntime ja onnxconverter-common.
+
+Esimerkki:
+    python quantize.py --weights best.pt --calib-images 200 --eval-split val --report quant.json
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+from backends import OnnxRuntimeBackend, _ExportedModelBackend
+from dataset import label_path, list_split_images, load_data_config, read_yolo_labels
+from detections import Detections
+from evaluation import detection_map, ground_truth_json, status_agreement
+from json_generator import generate_switch_json
+
+VARIANTS = ("fp32", "fp16", "int8")
+
+
+def _require(module, package):
+    """Tuo valinnaisen riippuvuuden ja antaa asennusohjeen, jos sitä ei ole."""
+    try:
+        return __import__(module, fromlist=["_"])
+    except ImportError as e:
+        raise ImportError(f"Kvantisointi vaatii paketin: pip install {package}") from e
+
+
+def read_rgb(path):
+    """Lukee kuvan RGB-muotoon (kuten Gradio antaa)."""
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Kuvan {path} lukeminen epäonnistui.")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def export_fp32(weights, output_path, imgsz):
+    """
+    Vie .pt-mallin FP32-muotoiseksi ONNX-malliksi kiinteällä syötekoolla.
+
+    Returns:
+        str: Viedyn mallin polku.
+    """
+    from ultralytics import YOLO
+
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True)
+    shutil.move(str(exported), output_path)
+    return output_path
+
+
+def export_fp16(fp32_path, output_path):
+    """
+    Muuntaa FP32-mallin painot FP16-muotoon (syöte ja tuloste säilyvät float32-muotoisina).
+
+    Returns:
+        str: Muunnetun mallin polku.
+    """
+    onnx = _require("onnx", "onnx")
+    float16 = _require("onnxconverter_common.float16", "onnxconverter-common")
+    model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True)
+    onnx.save(model, output_path)
+    return output_path
+
+
+def head_nodes(model_path):
+    """
+    Palauttaa tunnistuspään (suurin /model.N/-indeksi) solmujen nimet.
+
+    Returns:
+        list: Solmujen nimet.
+    """
+    onnx = _require("onnx", "onnx")
+    graph = onnx.load(model_path).graph
+    pattern = re.compile(r"/model\.(\d+)/")
+    indices = [int(m.group(1)) for node in graph.node if (m := pattern.search(node.name))]
+    if not indices:
+        return []
+    head = f"/model.{max(indices)}/"
+    return [node.name for node in graph.node if head in node.name]
+
+
+def export_int8(fp32_path, output_path, calibration_paths, imgsz, per_channel=True,
+                method="minmax", quantize_head=False):
+    """
+    Kvantisoi FP32-mallin staattisesti INT8-muotoon (QDQ).
+
+    Args:
+        fp32_path (str): FP32-malli.
+        output_path (str): INT8-mallin polku.
+        calibration_paths (list): Kalibrointikuvat.
+        imgsz (int): Mallin syötekoko.
+        per_channel (bool, optional): Kanavakohtainen painojen kvantisointi. Oletus True.
+        method (str, optional): Kalibrointimenetelmä: minmax, entropy tai percentile.
+        quantize_head (bool, optional): Kvantisoidaanko myös tunnistuspää. Oletus False.
+
+    Returns:
+        str: INT8-mallin polku.
+    """
+    _require("onnxruntime", "onnxruntime")
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        CalibrationMethod,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+
+    preprocessor = _ExportedModelBackend(imgsz)
+
+    class ImageCalibrationReader(CalibrationDataReader):
+        """Syöttää kalibrointikuvat yksi kerrallaan inferenssin esikäsittelyllä."""
+
+        def __init__(self, paths, input_name):
+            self.paths = iter(paths)
+            self.input_name = input_name
+
+        def get_next(self):
+            path = next(self.paths, None)
+            if path is None:
+                return None
+            tensor, _, _, _ = preprocessor.preprocess(read_rgb(path))
+            return {self.input_name: tensor[None]}
+
+    # Kvantisoinnin esikäsittely (muotojen päättely) parantaa tulosta, jos se on saatavilla
+    source_path = fp32_path
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        source_path = output_path + ".pre.onnx"
+        quant_pre_process(fp32_path, source_path, skip_symbolic_shape=True)
+    except Exception:
+        source_path = fp32_path
+
+    onnx = _require("onnx", "onnx")
+    input_name = onnx.load(source_path).graph.input[0].name
+    methods = {
+        "minmax": CalibrationMethod.MinMax,
+        "entropy": CalibrationMethod.Entropy,
+        "percentile": CalibrationMethod.Percentile,
+    }
+    quantize_static(
+        source_path,
+        output_path,
+        ImageCalibrationReader(calibration_paths, input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=methods[method],
+        nodes_to_exclude=[] if quantize_head else head_nodes(source_path),
+    )
+    if source_path != fp32_path and os.path.exists(source_path):
+        os.remove(source_path)
+    return output_path
+
+
+def load_evaluation_set(config, split, limit, seed):
+    """
+    Lukee arviointikuvien polut ja nimiöt sekä nimiöistä rakennetut JSON-tulosteet.
+
+    Returns:
+        list: (polku, (xyxy, cls), nimiöiden generate_switch_json-tuloste)
+    """
+    samples = []
+    for path in list_split_images(config, split, limit=limit, seed=seed):
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        xyxy, cls = read_yolo_labels(label_path(path), width, height)
+        samples.append((path, (xyxy, cls), ground_truth_json(xyxy, cls)))
+    return samples
+
+
+def evaluate_variant(backend, samples, num_classes, iou, conf, reference=None):
+    """
+    Arvioi yhden mallin tarkkuuden, porttitilojen yhtäpitävyyden ja viiveen.
+
+    Args:
+        backend: Inferenssitausta (backends.py).
+        samples (list): load_evaluation_set-funktion tulos.
+        num_classes (int): Luokkien määrä.
+        iou (float): NMS:n IoU-kynnys.
+        conf (float): Luottamuskynnys.
+        reference (list, optional): Vertailumallin JSON-tulosteet kuvittain.
+
+    Returns:
+        tuple: (tulokset sanakirjana, kuvakohtaiset JSON-tulosteet)
+    """
+    backend.warmup()
+    predictions, ground_truths, outputs, latencies = [], [], [], []
+    label_agreement = {"matched": 0, "ports": 0}
+    reference_agreement = {"matched": 0, "ports": 0}
+    for index, (path, truth, truth_json) in enumerate(samples):
+        image = read_rgb(path)
+        start = time.perf_counter()
+        result = backend(image, iou=iou, conf=conf)[0]
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+        detections = Detections.from_results([result])
+        predictions.append((detections.xyxy, detections.conf, detections.class_id))
+        ground_truths.append(truth)
+        output = generate_switch_json(detections.stacks, detections.ports, detections.switches)
+        outputs.append(output)
+
+        for totals, expected in (
+            (label_agreement, truth_json),
+            (reference_agreement, reference[index] if reference else None),
+        ):
+            if expected is not None:
+                agreement = status_agreement(output, expected)
+                totals["matched"] += agreement["matched"]
+                totals["ports"] += agreement["ports"]
+
+    scores = detection_map(predictions, ground_truths, num_classes)
+    latencies = np.asarray(latencies)
+    return {
+        "images": len(samples),
+        "map50": scores["map50"],
+        "map50_95": scores["map50_95"],
+        "per_class": scores["per_class"],
+        "status_agreement_labels": (
+            label_agreement["matched"] / label_agreement["ports"] if label_agreement["ports"] else None
+        ),
+        "status_agreement_fp32": (
+            reference_agreement["matched"] / reference_agreement["ports"]
+            if reference and reference_agreement["ports"] else None
+        ),
+        "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "latency_p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None,
+    }, outputs
+
+
+def run_pipeline(
+    weights='best.pt',
+    data='data.yaml',
+    imgsz=1216,
+    output_dir='export',
+    variants=VARIANTS,
+    calib_split='train',
+    calib_images=100,
+    eval_split='val',
+    eval_images=None,
+    iou=0.4,
+    conf=0.4,
+    threads=0,
+    per_channel=True,
+    calib_method='minmax',
+    quantize_head=False,
+    seed=0,
+):
+    """
+    Vie pyydetyt versiot ja arvioi ne.
+
+    Returns:
+        dict: Versio -> {'path', 'size_mb', mittarit}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    config = load_data_config(data)
+    num_classes = int(config.get("nc", 4))
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    paths = {variant: os.path.join(output_dir, f"{stem}_{variant}.onnx") for variant in VARIANTS}
+
+    # Kaikki versiot johdetaan FP32-mallista
+    if weights.endswith(".onnx"):
+        if os.path.abspath(weights) != os.path.abspath(paths["fp32"]):
+            shutil.copy(weights, paths["fp32"])
+    else:
+        print(f"Viedään FP32-malli: {paths['fp32']}")
+        export_fp32(weights, paths["fp32"], imgsz)
+    if "fp16" in variants:
+        print(f"Muunnetaan FP16-malli: {paths['fp16']}")
+        export_fp16(paths["fp32"], paths["fp16"])
+    if "int8" in variants:
+        calibration = list_split_images(config, calib_split, limit=calib_images, seed=seed)
+        print(f"Kvantisoidaan INT8-malli {len(calibration)} kalibrointikuvalla: {paths['int8']}")
+        export_int8(paths["fp32"], paths["int8"], calibration, imgsz,
+                    per_channel=per_channel, method=calib_method, quantize_head=quantize_head)
+
+    samples = load_evaluation_set(config, eval_split, eval_images, seed)
+    print(f"Arvioidaan {len(samples)} kuvalla jaosta '{eval_split}'.")
+
+    report = {}
+    reference = None
+    # FP32 arvioidaan ensin, jotta muita versioita voidaan verrata siihen
+    for variant in ["fp32"] + [v for v in variants if v != "fp32"]:
+        backend = OnnxRuntimeBackend(paths[variant], imgsz=imgsz, intra_op_threads=threads)
+        results, outputs = evaluate_variant(
+            backend, samples, num_classes, iou, conf,
+            reference=None if variant == "fp32" else reference,
+        )
+        if variant == "fp32":
+            reference = outputs
+            results["status_agreement_fp32"] = 1.0
+        results["path"] = paths[variant]
+        results["size_mb"] = os.path.getsize(paths[variant]) / 2**20
+        if variant in variants:
+            report[variant] = results
+    return report
+
+
+def print_report(report):
+    """Tulostaa versioiden vertailutaulukon."""
+    def fmt(value, pattern):
+        return pattern.format(value) if value is not None else "-"
+
+    print(
+        f"\n{'versio':<7} {'koko MB':>8} {'mAP50':>7} {'mAP50-95':>9} "
+        f"{'tila/nimiöt':>12} {'tila/FP32':>10} {'p50 ms':>8} {'p95 ms':>8}"
+    )
+    for variant, r in report.items():
+        print(
+            f"{variant:<7} {r['size_mb']:>8.1f} {r['map50']:>7.3f} {r['map50_95']:>9.3f} "
+            f"{fmt(r['status_agreement_labels'], '{:.1%}'):>12} "
+            f"{fmt(r['status_agreement_fp32'], '{:.1%}'):>10} "
+            f"{fmt(r['latency_p50_ms'], '{:.1f}'):>8} {fmt(r['latency_p95_ms'], '{:.1f}'):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PortVision-mallin kvantisointi ja vertailu.")
+    parser.add_argument("--weights", default="best.pt", help="Painotiedosto (.pt tai FP32 .onnx)")
+    parser.add_argument("--data", default="data.yaml", help="Aineiston asetukset")
+    parser.add_argument("--imgsz", type=int, default=1216, help="Mallin syötekoko")
+    parser.add_argument("--output-dir", default="export", help="Viedyt mallit")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--calib-split", default="train", help="Kalibrointikuvien jako")
+    parser.add_argument("--calib-images", type=int, default=100, help="Kalibrointikuvien määrä")
+    parser.add_argument(
+        "--calib-method", default="minmax", choices=["minmax", "entropy", "percentile"]
+    )
+    parser.add_argument("--no-per-channel", action="store_true", help="Tensorikohtainen kvantisointi")
+    parser.add_argument("--quantize-head", action="store_true", help="Kvantisoi myös tunnistuspää")
+    parser.add_argument("--eval-split", default="val", help="Arviointijako (val tai test)")
+    parser.add_argument("--eval-images", type=int, default=None, help="Arviointikuvien enimmäismäärä")
+    parser.add_argument("--iou", type=float, default=0.4, help="NMS:n IoU-kynnys")
+    parser.add_argument("--conf", type=float, default=0.4, help="Luottamuskynnys")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtimen säikeet (0 = oletus)")
+    parser.add_argument("--seed", type=int, default=0, help="Kuvaotosten siemen")
+    parser.add_argument("--report", default=None, help="Tallenna raportti JSON-tiedostoon")
+    args = parser.parse_args()
+
+    report = run_pipeline(
+        weights=args.weights,
+        data=args.data,
+        imgsz=args.imgsz,
+        output_dir=args.output_dir,
+        variants=args.variants,
+        calib_split=args.calib_split,
+        calib_images=args.calib_images,
+        eval_split=args.eval_split,
+        eval_images=args.eval_images,
+        iou=args.iou,
+        conf=args.conf,
+        threads=args.threads,
+        per_channel=not args.no_per_channel,
+        calib_method=args.calib_method,
+        quantize_head=args.quantize_head,
+        seed=args.seed,
+    )
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
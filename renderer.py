@@ -0,0 +1,135 @@
+"""Tämä moduuli piirtää tunnistukset kuvaan yhdellä piirtokierroksella.
+
+Jokaisen luokan väri ja etiketti haetaan tyylitaulukosta CLASS_STYLES.
+Kaikki luokat piirretään samalla silmukalla. Etikettien läpinäkyvät taustat
+sekoitetaan vain etiketin alueelta yhteisen overlay-puskurin avulla, joten
+koko kuvaa ei kopioida kertaakaan, eikä piirtoaika kasva kuvakoon ja
+etikettien määrän tulona. Piirtojärjestys on sama kuin aiemmin, joten
+päällekkäisetkin etiketit näyttävät samalta.
+
+Sisältää:
+- class_colors: Luokkien kiinteät värit indeksin perusteella.
+- CLASS_STYLES: Luokkakohtainen tyylitaulukko (väri ja etiketin nimi).
+- CLASS_STYLES_BGR: Sama tyylitaulukko BGR-kuville.
+- label_rect: Laskee etiketin taustan sijainnin.
+- render_detections: Piirtää tunnistukset kuvaan.
+"""
+
+import cv2
+import numpy as np
+
+# Määritä kiinteä värikartta jokaiselle luokalle sen indeksin perusteella
+class_colors = {
+    0: (255, 0, 0),       # Kaapeli (Punainen)
+    1: (255, 255, 0),     # LAN-portti (Keltainen)
+    2: (255, 255, 255),   # LAN-porttipino (Valkoinen)
+    3: (0, 0, 255)        # Kytkin (Sininen)
+}
+
+# Luokkakohtaiset piirtotyylit: väri ja etiketin nimi
+CLASS_STYLES = {
+    0: {"color": class_colors[0], "label": "Kaapeliportti"},
+    1: {"color": class_colors[1], "label": "LAN-portti"},
+    2: {"color": class_colors[2], "label": "LAN-porttipino"},
+    3: {"color": class_colors[3], "label": "Kytkin"},
+}
+
+# Sama tyylitaulukko BGR-järjestyksessä oleville kuville (esim. cv2.imread, VideoCapture)
+CLASS_STYLES_BGR = {
+    class_id: {**style, "color": tuple(reversed(style["color"]))}
+    for class_id, style in CLASS_STYLES.items()
+}
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+TEXT_COLOR = (0, 0, 0)
+TEXT_THICKNESS = 2
+
+
+def label_rect(x1, y1, label_size, width, height):
+    """
+    Laskee etiketin taustalaatikon koordinaatit kuvan rajoihin rajattuna.
+
+    Etiketti sijoitetaan laatikon yläpuolelle, tai jos se ei mahdu, laatikon
+    yläreunan alapuolelle.
+
+    Args:
+        x1 (int): Laatikon vasemman yläkulman x-koordinaatti.
+        y1 (int): Laatikon vasemman yläkulman y-koordinaatti.
+        label_size (tuple): Etiketin koko (leveys, korkeus) cv2.getTextSize-muodossa.
+        width (int): Kuvan leveys.
+        height (int): Kuvan korkeus.
+
+    Returns:
+        tuple: (x_start, y_start, x_end, y_end) puoliavoimena alueena, jota
+            voidaan käyttää suoraan NumPy-viipaleena.
+    """
+    # Määritä etiketin yläreunan sijainti
+    y_label_top = (
+        y1 - label_size[1] - 10
+        if y1 - label_size[1] - 10 > 0
+        else y1 + 10
+    )
+    xa, xb = sorted((x1, x1 + label_size[0]))
+    ya, yb = sorted((y_label_top, y1))
+    # Rajaa kuvan sisälle; cv2.rectangle piirtää myös loppupisteen, joten +1
+    xa = max(0, min(xa, width))
+    xb = max(0, min(xb, width)) + 1
+    ya = max(0, min(ya, height))
+    yb = max(0, min(yb, height)) + 1
+    return xa, ya, xb, yb
+
+
+def render_detections(img, detections, box_thickness=2, font_scale=0.8, alpha=0.6, styles=None):
+    """
+    Piirtää tunnistukset kuvaan paikan päällä.
+
+    Args:
+        img (numpy.ndarray): Kuva (H, W, 3), johon piirretään.
+        detections (iterable): Piirrettävät tunnistukset muodossa
+            (box, conf, class_id) piirtojärjestyksessä.
+        box_thickness (int, optional): Bounding boxien viivan paksuus. Oletus 2.
+        font_scale (float, optional): Tekstin fontin skaalauskerroin. Oletus 0.8.
+        alpha (float, optional): Etiketin taustan läpinäkyvyyden aste. Oletus 0.6.
+        styles (dict, optional): Tyylitaulukko. Oletus CLASS_STYLES.
+
+    Returns:
+        numpy.ndarray: Sama kuva, johon tunnistukset on piirretty.
+    """
+    if styles is None:
+        styles = CLASS_STYLES
+    height, width = img.shape[:2]
+
+    # Etikettien taustat sekoitetaan yhteisen overlay-puskurin kautta, joka
+    # kasvatetaan tarvittaessa suurimman etiketin kokoiseksi
+    overlay = np.empty((0, 0) + img.shape[2:], dtype=img.dtype)
+
+    for box, conf, class_id in detections:
+        style = styles[int(class_id)]
+        color = style["color"]
+        x1, y1, x2, y2 = map(int, box)
+
+        # Piirrä suorakulmio (bounding box) kohteen ympärille
+        cv2.rectangle(img, (x1, y1), (x2, y2), color=color, thickness=box_thickness)
+
+        # Valmistele etiketti luokan nimellä ja luottamusarvolla
+        label = f"{style['label']}: {conf:.2f}"
+        label_size, _ = cv2.getTextSize(label, FONT, font_scale, TEXT_THICKNESS)
+        xa, ya, xb, yb = label_rect(x1, y1, label_size, width, height)
+
+        # Sekoita läpinäkyvä tausta vain etiketin alueelle
+        roi = img[ya:yb, xa:xb]
+        if roi.size > 0:
+            if overlay.shape[0] < roi.shape[0] or overlay.shape[1] < roi.shape[1]:
+                overlay = np.empty(
+                    (max(overlay.shape[0], roi.shape[0]), max(overlay.shape[1], roi.shape[1]))
+                    + img.shape[2:],
+                    dtype=img.dtype,
+                )
+            patch = overlay[:roi.shape[0], :roi.shape[1]]
+            patch[:] = color
+            cv2.addWeighted(patch, alpha, roi, 1 - alpha, 0, roi)
+
+        # Kirjoita etiketti kuvaan
+        cv2.putText(img, label, (x1, y1 - 5), FONT, font_scale, TEXT_COLOR, TEXT_THICKNESS)
+
+    return img
@@ -0,0 +1,280 @@
+"""Tämä moduuli sisältää sisältöosoitteisen välimuistin tunnistustuloksille.
+
+Avain muodostetaan puretun kuvan pikselidatan tiivisteestä, mallin
+painotiedoston tiivisteestä ja tunnistuksen asetuksista (iou, conf, tausta,
+viipalointi). Välimuistiin tallennetaan raakatunnistukset (xyxy, conf, cls) ja
+valmis JSON-tuloste. Muistissa pidetään LRU-joukko viimeisimpiä tuloksia, ja
+niiden takana on levyvarasto, jonka kokoa rajoitetaan poistamalla vanhimmat
+tiedostot. Osumat ja ohitukset kirjataan myös metriikkaan
+portvision_result_cache_total (metrics.py), joten ne näkyvät /metrics-päätepisteessä.
+
+Sisältää:
+- image_digest: Laskee kuvan pikselidatan tiivisteen.
+- weights_digest: Laskee painotiedoston tiivisteen (välimuistissa muokkausajan mukaan).
+- ResultCache: Muisti- ja levyvälimuisti osumalaskureineen.
+- get_cache: Palauttaa asetusten mukaisen prosessinlaajuisen välimuistin.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import increment, metrics
+
+CACHE_METRIC = "portvision_result_cache_total"
+metrics.describe(CACHE_METRIC, "Tulosvälimuistin haut tuloksen mukaan (memory_hit, disk_hit, miss).")
+
+
+def image_digest(image):
+    """
+    Laskee kuvan pikselidatan tiivisteen.
+
+    Sama kuva tuottaa saman tiivisteen riippumatta tiedostomuodosta tai
+    tiedostonimestä, koska tiiviste lasketaan puretuista pikseleistä.
+
+    Args:
+        image (numpy.ndarray | PIL.Image): Kuva.
+
+    Returns:
+        str: Heksadesimaalinen tiiviste.
+    """
+    array = np.ascontiguousarray(np.asarray(image))
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{array.shape}|{array.dtype.str}|".encode())
+    digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=32)
+def _file_digest(path, mtime_ns, size):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def weights_digest(path):
+    """
+    Laskee painotiedoston tiivisteen.
+
+    Tiiviste lasketaan uudelleen vain, jos tiedoston muokkausaika tai koko muuttuu.
+
+    Args:
+        path (str): Painotiedoston polku.
+
+    Returns:
+        str: Heksadesimaalinen tiiviste.
+    """
+    stat = os.stat(path)
+    return _file_digest(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+class ResultCache:
+    """
+    Tunnistustulosten välimuisti: LRU muistissa ja kokorajoitettu levyvarasto.
+
+    Args:
+        directory (str, optional): Levyvaraston hakemisto. None = vain muisti.
+        max_entries (int, optional): Muistissa pidettävien tulosten määrä. Oletus 256.
+        max_disk_bytes (int, optional): Levyvaraston enimmäiskoko tavuina. Oletus 512 MB.
+    """
+
+    def __init__(self, directory=".cache/results", max_entries=256, max_disk_bytes=512 * 2**20):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(
+                entry.stat().st_size for entry in os.scandir(directory)
+                if entry.name.endswith(".npz")
+            )
+
+    @staticmethod
+    def make_key(image, weights, **settings):
+        """
+        Muodostaa välimuistin avaimen.
+
+        Args:
+            image (numpy.ndarray | PIL.Image): Puretut kuvan pikselit.
+            weights (str): Mallin painotiedosto.
+            **settings: Tulokseen vaikuttavat asetukset (esim. iou, conf, tausta).
+
+        Returns:
+            str: Avain.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(image_digest(image).encode())
+        digest.update(weights_digest(weights).encode())
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Hakee tuloksen välimuistista.
+
+        Returns:
+            dict | None: {'xyxy', 'conf', 'cls', 'json'} tai None, jos tulosta ei löydy.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                increment(CACHE_METRIC, result="memory_hit")
+                return entry
+
+        if self.directory:
+            path = self._path(key)
+            try:
+                with np.load(path) as data:
+                    entry = {
+                        "xyxy": data["xyxy"],
+                        "conf": data["conf"],
+                        "cls": data["cls"],
+                        "json": data["json"].tobytes().decode('utf-8'),
+                    }
+                # Päivitä käyttöaika, jotta poisto kohdistuu vanhimpiin käytettyihin
+                os.utime(path)
+            except (FileNotFoundError, OSError, KeyError, ValueError):
+                entry = None
+            if entry is not None:
+                with self._lock:
+                    self.counters["disk_hits"] += 1
+                    self._remember(key, entry)
+                increment(CACHE_METRIC, result="disk_hit")
+                return entry
+
+        with self._lock:
+            self.counters["misses"] += 1
+        increment(CACHE_METRIC, result="miss")
+        return None
+
+    def put(self, key, xyxy, conf, cls, json_output):
+        """
+        Tallentaa tuloksen muistiin ja levylle.
+
+        Args:
+            key (str): Avain (make_key).
+            xyxy (numpy.ndarray): Laatikot muodossa (N, 4).
+            conf (numpy.ndarray): Luottamusarvot muodossa (N,).
+            cls (numpy.ndarray): Luokkien ID:t muodossa (N,).
+            json_output (str): Valmis JSON-tuloste.
+        """
+        entry = {
+            "xyxy": np.asarray(xyxy, dtype=np.float32).reshape(-1, 4),
+            "conf": np.asarray(conf, dtype=np.float32).reshape(-1),
+            "cls": np.asarray(cls, dtype=np.float32).reshape(-1),
+            "json": json_output,
+        }
+        with self._lock:
+            self._remember(key, entry)
+            self.counters["stores"] += 1
+
+        if self.directory:
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as file:
+                np.savez(file, xyxy=entry["xyxy"], conf=entry["conf"], cls=entry["cls"],
+                         json=np.frombuffer(json_output.encode('utf-8'), dtype=np.uint8))
+            size = os.path.getsize(tmp_path)
+            existed = os.path.exists(path)
+            old_size = os.path.getsize(path) if existed else 0
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += size - old_size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _remember(self, key, entry):
+        """Lisää tuloksen muistin LRU-joukkoon (lukko on jo otettu)."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Poistaa vanhimmat levytiedostot, kunnes varasto mahtuu kokorajaan."""
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".npz")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        total = sum(entry.stat().st_size for entry in entries)
+        # Poistetaan 10 % rajan alle, ettei poistoa tarvita jokaisella tallennuksella
+        target = int(self.max_disk_bytes * 0.9)
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.counters["evictions"] += 1
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        """
+        Palauttaa osuma- ja hutilaskurit sekä välimuistin koon seurantaa varten.
+
+        Returns:
+            dict: Laskurit, osumaprosentti, muistissa olevien tulosten määrä ja levyn koko.
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+            counters["hit_ratio"] = (
+                (counters["memory_hits"] + counters["disk_hits"]) / lookups if lookups else 0.0
+            )
+            counters["memory_entries"] = len(self._memory)
+            counters["disk_bytes"] = self._disk_bytes
+        return counters
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(config):
+    """
+    Palauttaa asetusten mukaisen välimuistin. Sama välimuisti luodaan vain kerran.
+
+    Args:
+        config (dict): Inferenssiasetukset (backends.load_inference_config).
+
+    Returns:
+        ResultCache: Välimuisti.
+    """
+    key = (config["cache_dir"], config["cache_max_entries"], config["cache_max_disk_mb"])
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ResultCache(
+                directory=config["cache_dir"] or None,
+                max_entries=config["cache_max_entries"],
+                max_disk_bytes=int(config["cache_max_disk_mb"] * 2**20),
+            )
+            _caches[key] = cache
+    return cache
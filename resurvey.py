@@ -0,0 +1,515 @@
+"""Tämä moduuli sisältää inkrementaalisen uudelleenkartoituksen edellisen kartoituksen pohjalta.
+
+Kun laitekaappi kuvataan uudelleen muutaman kaapelin kytkemisen jälkeen,
+suurin osa kytkimistä on ennallaan. Uudelleenkartoitus käyttää edellisen
+kartoituksen kuvaa ja tunnistuksia (Survey) eikä aja mallia koko kuvalle:
+
+1. Rekisteröinti: uusi kuva kohdistetaan edelliseen ORB-piirteillä ja
+   RANSAC-homografialla pienennetyssä koossa, ja edelliset tunnistukset
+   projisoidaan uuden kuvan koordinaatteihin.
+2. Muutosten tunnistus: edellinen kuva vääristetään uuden kuvan
+   koordinaatteihin, ja kunkin porttipinon alueella kirkkaus normalisoidaan
+   (keskiarvo ja hajonta), jotta valotuksen muutos ei näy muutoksena.
+   Pinon muutos on sen porttien suurin muuttuneiden pikselien osuus
+   (pinon oma osuus, jos pinossa ei ole portteja).
+3. Malli ajetaan vain pinoille, joiden muutos ylittää kynnyksen
+   (cascade.predict_regions); muualla edelliset portit käytetään sellaisinaan.
+4. Tuloste rakennetaan yhdistetyistä tunnistuksista, ja portteja verrataan
+   edelliseen kartoitukseen sijainnin perusteella (IoU): kytketyt,
+   irrotetut, uudet ja kadonneet portit avaimilla (switch_id, stack_id, port_number).
+
+Jos rekisteröinti epäonnistuu (liian vähän yhteneviä piirteitä), ajetaan
+täysi inferenssi ja portteja verrataan avainten perusteella. Kuvasta pois
+jääneitä portteja ei raportoida kadonneiksi. Alueita, joilla
+ei edellisessä kartoituksessa ollut pinoja (esim. uusi kytkin), ei ajeta
+mallin läpi; laitteiston muuttuessa kannattaa tehdä täysi kartoitus.
+
+Esimerkki:
+    python resurvey.py kaappi.jpg --save kaappi.survey.npz -o kaappi.json
+    python resurvey.py kaappi_uusi.jpg --previous kaappi.survey.npz \\
+        --save kaappi_uusi.survey.npz -o kaappi_uusi.json --diff muutokset.json
+
+Sisältää:
+- Survey: Kartoituksen kuva ja tunnistukset (tallennus ja lataus).
+- register_images: Laskee homografian edellisestä kuvasta uuteen.
+- transform_boxes: Projisoi laatikot homografialla.
+- stack_changes: Laskee pinojen muutosasteet.
+- port_diff: Vertaa kahden kartoituksen portteja.
+- resurvey: Ajaa inkrementaalisen uudelleenkartoituksen.
+"""
+
+import argparse
+import sys
+
+import cv2
+import numpy as np
+
+from cascade import crop_regions, predict_regions
+from detections import Detections
+from evaluation import port_layout
+from image_buffer import BGR, as_array
+from metrics import span
+from tiling import merge_detections
+from tracking import greedy_match, iou_matrix
+
+# Luokat: portit (0 = Cable, 1 = empty), porttipino ja kytkin
+PORT_CLASSES = (0, 1)
+STACK_CLASS = 2
+
+
+class Survey:
+    """
+    Kartoituksen kuva ja tunnistukset, joihin seuraava kartoitus verrataan.
+
+    Args:
+        image (numpy.ndarray): Kuva (H, W, 3).
+        xyxy (numpy.ndarray): Laatikot (N, 4).
+        conf (numpy.ndarray): Luottamusarvot (N,).
+        cls (numpy.ndarray): Luokat (N,).
+        color_order (str, optional): Kuvan värijärjestys. Oletus BGR.
+    """
+
+    def __init__(self, image, xyxy, conf, cls, color_order=BGR):
+        self.image = image
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls).reshape(-1)
+        self.color_order = color_order
+
+    @classmethod
+    def from_result(cls, image, result, color_order=BGR):
+        """Luo kartoituksen kuvasta ja mallin tuloksesta (BackendResult tai ultralytics)."""
+        boxes = result.boxes
+        return cls(
+            image, boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy(),
+            color_order,
+        )
+
+    def gray(self):
+        """Palauttaa kuvan harmaasävyisenä."""
+        code = cv2.COLOR_BGR2GRAY if self.color_order == BGR else cv2.COLOR_RGB2GRAY
+        return cv2.cvtColor(self.image, code)
+
+    def save(self, path, quality=95):
+        """
+        Tallentaa kartoituksen .npz-tiedostoon; kuva JPEG-pakattuna.
+
+        Args:
+            path (str): Tiedoston polku.
+            quality (int, optional): JPEG-laatu. Oletus 95.
+        """
+        image = self.image if self.color_order == BGR else self.image[..., ::-1]
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("Kuvan pakkaaminen epäonnistui")
+        with open(path, 'wb') as file:
+            np.savez(file, image=encoded, xyxy=self.xyxy, conf=self.conf, cls=self.cls)
+
+    @classmethod
+    def load(cls, path):
+        """Lataa save-metodilla tallennetun kartoituksen (kuva BGR-järjestyksessä)."""
+        with np.load(path) as data:
+            image = cv2.imdecode(data["image"], cv2.IMREAD_COLOR)
+            return cls(image, data["xyxy"], data["conf"], data["cls"], BGR)
+
+
+def _resize_to(gray, max_side):
+    scale = min(1.0, max_side / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+
+def register_images(previous, current, max_side=1600, max_features=2000, min_inliers=20,
+                    reprojection_px=3.0):
+    """
+    Laskee homografian, joka vie edellisen kuvan pisteet uuden kuvan pisteiksi.
+
+    Piirteet haetaan pienennetyistä harmaasävykuvista (pidempi sivu enintään
+    max_side), ja homografia skaalataan alkuperäisiin koordinaatteihin.
+
+    Args:
+        previous (numpy.ndarray): Edellinen kuva harmaasävynä (H, W).
+        current (numpy.ndarray): Uusi kuva harmaasävynä (H, W).
+        max_side (int, optional): Piirrehaun kuvakoko. Oletus 1600.
+        max_features (int, optional): ORB-piirteiden enimmäismäärä; vertailun
+            kesto kasvaa sen neliönä. Oletus 2000.
+        min_inliers (int, optional): Hyväksyttävän homografian vähimmäistuki. Oletus 20.
+        reprojection_px (float, optional): RANSACin kynnys pienennetyssä koossa. Oletus 3.0.
+
+    Returns:
+        tuple: (homografia 3 × 3 tai None, yhtenevien piirteiden määrä)
+    """
+    small_prev, scale_prev = _resize_to(previous, max_side)
+    small_cur, scale_cur = _resize_to(current, max_side)
+    orb = cv2.ORB_create(max_features)
+    keypoints_prev, descriptors_prev = orb.detectAndCompute(small_prev, None)
+    keypoints_cur, descriptors_cur = orb.detectAndCompute(small_cur, None)
+    if descriptors_prev is None or descriptors_cur is None:
+        return None, 0
+    matches = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True).match(descriptors_prev, descriptors_cur)
+    if len(matches) < min_inliers:
+        return None, 0
+    source = np.float32([keypoints_prev[m.queryIdx].pt for m in matches])
+    target = np.float32([keypoints_cur[m.trainIdx].pt for m in matches])
+    homography, mask = cv2.findHomography(source, target, cv2.RANSAC, reprojection_px)
+    inliers = int(mask.sum()) if mask is not None else 0
+    if homography is None or inliers < min_inliers:
+        return None, inliers
+    to_small = np.diag([scale_prev, scale_prev, 1.0])
+    from_small = np.diag([1.0 / scale_cur, 1.0 / scale_cur, 1.0])
+    return from_small @ homography @ to_small, inliers
+
+
+def transform_boxes(boxes, homography):
+    """
+    Projisoi laatikot homografialla; tulos on kulmien ympäröivä laatikko.
+
+    Args:
+        boxes (numpy.ndarray): Laatikot (N, 4).
+        homography (numpy.ndarray): Homografia 3 × 3.
+
+    Returns:
+        numpy.ndarray: Projisoidut laatikot (N, 4), float32.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return boxes
+    corners = boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 1, 2)
+    projected = cv2.perspectiveTransform(corners, homography).reshape(-1, 4, 2)
+    return np.concatenate([projected.min(axis=1), projected.max(axis=1)], axis=1).astype(np.float32)
+
+
+def _box_fractions(integral, boxes):
+    """Muuttuneiden pikselien osuus laatikoissa summataulukosta (cv2.integral)."""
+    height, width = integral.shape[0] - 1, integral.shape[1] - 1
+    x1 = np.clip(np.floor(boxes[:, 0]), 0, width).astype(np.intp)
+    y1 = np.clip(np.floor(boxes[:, 1]), 0, height).astype(np.intp)
+    x2 = np.clip(np.ceil(boxes[:, 2]), 0, width).astype(np.intp)
+    y2 = np.clip(np.ceil(boxes[:, 3]), 0, height).astype(np.intp)
+    total = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+    area = (x2 - x1) * (y2 - y1)
+    # Kuvan ulkopuolelle projisoitunut laatikko lasketaan muuttuneeksi
+    return np.where(area > 0, total / np.maximum(area, 1), 1.0)
+
+
+def stack_changes(previous, current, homography, stack_boxes, port_boxes, pixel_threshold=40, blur=5):
+    """
+    Laskee kunkin porttipinon muutosasteen edellisen ja uuden kuvan välillä.
+
+    Args:
+        previous (numpy.ndarray): Edellinen kuva harmaasävynä.
+        current (numpy.ndarray): Uusi kuva harmaasävynä.
+        homography (numpy.ndarray): Homografia edellisestä kuvasta uuteen.
+        stack_boxes (numpy.ndarray): Pinot uuden kuvan koordinaateissa (S, 4).
+        port_boxes (numpy.ndarray): Portit uuden kuvan koordinaateissa (P, 4).
+        pixel_threshold (int, optional): Normalisoitu harmaasävyero, josta
+            pikseli tulkitaan muuttuneeksi. Oletus 40.
+        blur (int, optional): Gaussin sumennuksen koko, joka sietää pienen
+            kohdistusvirheen. Oletus 5.
+
+    Returns:
+        numpy.ndarray: Pinojen muutosasteet (S,) välillä 0–1.
+    """
+    height, width = current.shape[:2]
+    changed = np.zeros((height, width), dtype=np.uint8)
+    regions = crop_regions(stack_boxes, np.full(len(stack_boxes), STACK_CLASS), width, height, margin=0.0)
+    if regions:
+        # Edellinen kuva vääristetään vain pinojen ympäröivälle alueelle
+        x0, y0 = min(r[0] for r in regions), min(r[1] for r in regions)
+        x_end, y_end = max(r[2] for r in regions), max(r[3] for r in regions)
+        shifted = np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]], dtype=np.float64) @ homography
+        size = (x_end - x0, y_end - y0)
+        warped = cv2.warpPerspective(previous, shifted, size, flags=cv2.INTER_LINEAR)
+        # Edellisen kuvan ulkopuolelta tulevat pikselit ovat aina muuttuneita
+        coverage = cv2.warpPerspective(
+            np.full(previous.shape[:2], 255, np.uint8), shifted, size, flags=cv2.INTER_NEAREST,
+        )
+    for x1, y1, x2, y2 in regions:
+        a = cv2.GaussianBlur(current[y1:y2, x1:x2], (blur, blur), 0).astype(np.float32)
+        b = cv2.GaussianBlur(warped[y1 - y0:y2 - y0, x1 - x0:x2 - x0], (blur, blur), 0).astype(np.float32)
+        valid = coverage[y1 - y0:y2 - y0, x1 - x0:x2 - x0] > 0
+        if valid.any():
+            # Kirkkauden ja kontrastin normalisointi edellisestä kuvasta uuteen
+            mean_a, std_a = a[valid].mean(), a[valid].std()
+            mean_b, std_b = b[valid].mean(), b[valid].std()
+            b = (b - mean_b) * (std_a / max(std_b, 1.0)) + mean_a
+        changed[y1:y2, x1:x2] = (np.abs(a - b) > pixel_threshold) | ~valid
+
+    integral = cv2.integral(changed)
+    stack_boxes = np.asarray(stack_boxes, dtype=np.float32).reshape(-1, 4)
+    port_boxes = np.asarray(port_boxes, dtype=np.float32).reshape(-1, 4)
+    scores = _box_fractions(integral, stack_boxes)
+    if len(port_boxes) and len(stack_boxes):
+        port_scores = _box_fractions(integral, port_boxes)
+        # Portti kuuluu pinoon, jonka sisällä sen keskipiste on
+        cx = (port_boxes[:, 0] + port_boxes[:, 2]) / 2
+        cy = (port_boxes[:, 1] + port_boxes[:, 3]) / 2
+        inside = (
+            (cx >= stack_boxes[:, None, 0]) & (cx < stack_boxes[:, None, 2])
+            & (cy >= stack_boxes[:, None, 1]) & (cy < stack_boxes[:, None, 3])
+        )
+        has_ports = inside.any(axis=1)
+        port_max = np.where(inside, port_scores, 0.0).max(axis=1)
+        scores = np.where(has_ports, port_max, scores)
+    return scores
+
+
+def _port_entry(key):
+    switch_id, stack_id, port_number = key
+    return {"switch_id": switch_id, "stack_id": stack_id, "port_number": port_number}
+
+
+def port_diff(previous, current, iou_threshold=0.3, by_key=False):
+    """
+    Vertaa kahden kartoituksen portteja.
+
+    Args:
+        previous (dict): Edellisen kartoituksen evaluation.port_layout, laatikot
+            uuden kuvan koordinaateissa.
+        current (dict): Uuden kartoituksen evaluation.port_layout.
+        iou_threshold (float, optional): Pienin IoU, jolla portit ovat samat. Oletus 0.3.
+        by_key (bool, optional): Yhdistetäänkö portit avaimilla sijainnin
+            sijaan (kun kuvia ei saatu kohdistettua). Oletus False.
+
+    Returns:
+        dict: {'connected', 'disconnected', 'added', 'removed'}, kukin lista
+            porteista {'switch_id', 'stack_id', 'port_number'} (kadonneilla
+            edellisen kartoituksen avain, muilla uuden). Numeroimattomat portit ohitetaan.
+    """
+    if by_key:
+        previous_index = {key: i for i, key in enumerate(previous["keys"]) if key is not None}
+        pairs = [
+            (previous_index[key], j) for j, key in enumerate(current["keys"]) if key in previous_index
+        ]
+    else:
+        pairs = greedy_match(iou_matrix(previous["boxes"], current["boxes"]), iou_threshold)
+
+    diff = {"connected": [], "disconnected": [], "added": [], "removed": []}
+    for i, j in sorted(pairs, key=lambda pair: pair[1]):
+        key = current["keys"][j]
+        if key is None or previous["status"][i] == current["status"][j]:
+            continue
+        change = "connected" if current["status"][j] == "Cable" else "disconnected"
+        diff[change].append(_port_entry(key))
+    matched_previous = {i for i, _ in pairs}
+    matched_current = {j for _, j in pairs}
+    diff["added"] = [
+        _port_entry(key) for j, key in enumerate(current["keys"])
+        if j not in matched_current and key is not None
+    ]
+    diff["removed"] = [
+        _port_entry(key) for i, key in enumerate(previous["keys"])
+        if i not in matched_previous and key is not None
+    ]
+    return diff
+
+
+def resurvey(
+    backend,
+    previous,
+    image,
+    color_order=BGR,
+    full_predict=None,
+    change_threshold=0.2,
+    pixel_threshold=40,
+    tile_size=1216,
+    overlap=0.2,
+    batch_size=4,
+    iou=0.4,
+    conf=0.4,
+    margin=0.1,
+    merge_iou=0.5,
+    merge_mode="nms",
+    match_iou=0.3,
+    min_inliers=20,
+    min_visible=0.5,
+):
+    """
+    Kartoittaa kuvan uudelleen edellisen kartoituksen pohjalta.
+
+    Args:
+        backend: Inferenssitausta muuttuneiden pinojen alueille (ks. cascade.predict_regions).
+        previous (Survey): Edellinen kartoitus.
+        image (numpy.ndarray | PIL.Image): Uusi kuva (H, W, 3).
+        color_order (str, optional): Uuden kuvan värijärjestys. Oletus BGR.
+        full_predict (callable, optional): Täysi inferenssi kohdistuksen
+            epäonnistuessa; kutsutaan muodossa full_predict(image) ja palauttaa
+            yhden tuloksen. Oletus backend(image, ...)[0].
+        change_threshold (float, optional): Pinon muutosaste, josta se
+            tunnistetaan uudelleen. Oletus 0.2.
+        pixel_threshold (int, optional): Pikselin muutoksen kynnys (ks. stack_changes). Oletus 40.
+        tile_size (int, optional): Tarkan ajon solun sivu. Oletus 1216.
+        overlap (float, optional): Solujen limitys. Oletus 0.2.
+        batch_size (int, optional): Kerralla mallille annettavien kankaiden määrä. Oletus 4.
+        iou (float, optional): Mallin NMS:n IoU-kynnys. Oletus 0.4.
+        conf (float, optional): Luottamuskynnys. Oletus 0.4.
+        margin (float, optional): Alueiden laajennus osuutena pinon korkeudesta. Oletus 0.1.
+        merge_iou (float, optional): Vanhojen ja uusien tunnistusten yhdistämisen IoU. Oletus 0.5.
+        merge_mode (str, optional): 'nms' tai 'fusion'. Oletus 'nms'.
+        match_iou (float, optional): Porttien vertailun IoU-kynnys. Oletus 0.3.
+        min_inliers (int, optional): Kohdistuksen vähimmäistuki. Oletus 20.
+        min_visible (float, optional): Edellisen tunnistuksen pienin uuteen
+            kuvaan osuva osuus, jolla se säilytetään. Oletus 0.5.
+
+    Returns:
+        dict: {'json': päivitetty generate_switch_json-tuloste, 'diff': port_diff,
+            'survey': uusi Survey, 'registered': bool, 'inliers': int,
+            'stacks': pinojen määrä, 'changed_stacks': uudelleen tunnistetut pinot,
+            'regions': mallille ajetut alueet}
+    """
+    image = as_array(image, color_order)
+    height, width = image.shape[:2]
+    current = Survey(image, np.zeros((0, 4)), np.zeros(0), np.zeros(0), color_order)
+    previous_gray, current_gray = previous.gray(), current.gray()
+
+    with span("resurvey_register"):
+        homography, inliers = register_images(previous_gray, current_gray, min_inliers=min_inliers)
+
+    if homography is None:
+        # Kohdistus epäonnistui: täysi inferenssi ja vertailu avaimilla
+        with span("inference"):
+            if full_predict is not None:
+                result = full_predict(image)
+            else:
+                result = backend(image, iou=iou, conf=conf, color_order=color_order)[0]
+        survey = Survey.from_result(image, result, color_order)
+        layout = port_layout(survey.xyxy, survey.conf, survey.cls)
+        before = port_layout(previous.xyxy, previous.conf, previous.cls)
+        stacks = int((survey.cls == STACK_CLASS).sum())
+        return {
+            "json": layout["json"], "diff": port_diff(before, layout, by_key=True), "survey": survey,
+            "registered": False, "inliers": inliers, "stacks": stacks, "changed_stacks": stacks,
+            "regions": [(0, 0, width, height)],
+        }
+
+    # Edelliset tunnistukset uuden kuvan koordinaatteihin; kuvasta enimmäkseen
+    # pois jääneet kohteet (alle min_visible näkyvissä) hylätään
+    boxes = transform_boxes(previous.xyxy, homography)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+    clipped = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    visible = clipped >= min_visible * np.maximum(area, 1e-6)
+    projected = Detections(boxes[visible], previous.conf[visible], previous.cls[visible])
+    stacks, ports = projected.stacks, projected.ports
+
+    with span("resurvey_changes"):
+        scores = stack_changes(
+            previous_gray, current_gray, homography, stacks.xyxy, ports.xyxy, pixel_threshold,
+        )
+    changed = stacks.xyxy[scores > change_threshold]
+    regions = crop_regions(changed, np.full(len(changed), STACK_CLASS), width, height, margin)
+
+    # Muuttuneiden alueiden sisällä olevat vanhat portit korvataan uusilla tunnistuksilla
+    centers = projected.centers
+    local = np.zeros(len(projected), dtype=bool)
+    for x1, y1, x2, y2 in regions:
+        local |= (
+            (centers[:, 0] >= x1) & (centers[:, 0] < x2)
+            & (centers[:, 1] >= y1) & (centers[:, 1] < y2)
+        )
+    stale = local & np.isin(projected.class_id, PORT_CLASSES)
+
+    with span("inference"):
+        new_boxes, new_scores, new_classes = predict_regions(
+            backend, image, regions, tile_size=tile_size, overlap=overlap, batch_size=batch_size,
+            iou=iou, conf=conf, color_order=color_order,
+        )
+    # Vain alueiden vanhat pinot yhdistetään uusiin; muut tunnistukset säilyvät sellaisinaan
+    kept = local & ~stale
+    merged = merge_detections(
+        np.concatenate([projected.xyxy[kept], new_boxes]),
+        np.concatenate([projected.conf[kept], new_scores]),
+        np.concatenate([projected.class_id[kept], new_classes]),
+        merge_iou, merge_mode,
+    )
+    survey = Survey(
+        image,
+        np.concatenate([projected.xyxy[~local], merged[0]]),
+        np.concatenate([projected.conf[~local], merged[1]]),
+        np.concatenate([projected.class_id[~local], merged[2]]),
+        color_order,
+    )
+
+    layout = port_layout(survey.xyxy, survey.conf, survey.cls)
+    before = port_layout(projected.xyxy, projected.conf, projected.class_id)
+    return {
+        "json": layout["json"],
+        "diff": port_diff(before, layout, match_iou),
+        "survey": survey,
+        "registered": True,
+        "inliers": inliers,
+        "stacks": len(stacks),
+        "changed_stacks": len(changed),
+        "regions": regions,
+    }
+
+
+def main():
+    from backends import get_backend, load_inference_config
+    from detect import run_inference
+    from serializers import serialize
+
+    parser = argparse.ArgumentParser(
+        description="Inkrementaalinen uudelleenkartoitus edellisen kartoituksen pohjalta."
+    )
+    parser.add_argument("image", help="Uusi kuva")
+    parser.add_argument(
+        "--previous", default=None, help="Edellinen kartoitus (.npz); ilman tätä täysi kartoitus",
+    )
+    parser.add_argument("--save", default=None, help="Tallenna kartoitus seuraavaa kertaa varten (.npz)")
+    parser.add_argument("-o", "--output", default=None, help="JSON-tuloste (oletus stdout)")
+    parser.add_argument("--diff", default=None, help="Porttien muutokset JSON-tiedostoon")
+    parser.add_argument("--config", default="inference.yaml")
+    parser.add_argument("--change-threshold", type=float, default=0.2)
+    parser.add_argument("--pixel-threshold", type=int, default=40)
+    args = parser.parse_args()
+
+    config = load_inference_config(args.config)
+    image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if image is None:
+        raise SystemExit(f"Kuvaa ei voitu lukea: {args.image}")
+
+    def full_predict(array):
+        return run_inference(array, config, BGR)[0]
+
+    # Tilarivit kirjoitetaan stderriin, jotta stdoutin JSON voidaan putkittaa
+    if args.previous is None:
+        survey = Survey.from_result(image, full_predict(image), BGR)
+        output, diff = port_layout(survey.xyxy, survey.conf, survey.cls)["json"], None
+        print("Täysi kartoitus.", file=sys.stderr)
+    else:
+        result = resurvey(
+            get_backend(config), Survey.load(args.previous), image, color_order=BGR,
+            full_predict=full_predict, change_threshold=args.change_threshold,
+            pixel_threshold=args.pixel_threshold, tile_size=config['tile_size'],
+            overlap=config['tile_overlap'], batch_size=config['tile_batch'],
+            iou=config['iou'], conf=config['conf'], margin=config['cascade_margin'],
+            merge_iou=config['merge_iou'], merge_mode=config['merge_mode'],
+        )
+        survey, output, diff = result["survey"], result["json"], result["diff"]
+        if result["registered"]:
+            print(
+                f"Kohdistettu ({result['inliers']} piirrettä); tunnistettu uudelleen "
+                f"{result['changed_stacks']}/{result['stacks']} pinoa.",
+                file=sys.stderr,
+            )
+        else:
+            print("Kohdistus epäonnistui; täysi kartoitus.", file=sys.stderr)
+        print(", ".join(f"{name}: {len(ports)}" for name, ports in diff.items()), file=sys.stderr)
+
+    if args.save:
+        survey.save(args.save)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(serialize(output))
+    else:
+        print(serialize(output))
+    if args.diff and diff is not None:
+        with open(args.diff, 'w', encoding='utf-8') as file:
+            file.write(serialize(diff))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+"""Tämä moduuli sisältää tunnistustulosteiden serialisoijat ja inkrementaalisen tulostekirjoittimen.
+
+generate_switch_json tuottaa valmiiksi Pythonin perustyyppejä (arvot otetaan
+NumPy-taulukoista tolist-kutsuilla), joten serialisoijat kirjoittavat sen
+sellaisenaan ilman rekursiivista tyyppimuunnosta. Muodot:
+- json: Sisennetty JSON (indent=4), kuten ennen; luettavin mutta suurin.
+- compact: JSON ilman välilyöntejä.
+- orjson: Sama tiivis JSON orjson-kirjastolla (pip install orjson).
+- msgpack: MessagePack (pip install msgpack).
+- table: Sarakemuotoinen porttitaulukko (port_table) tiiviinä JSONina: sisäkkäisten
+  kytkin–pino–portti-listojen sijaan kullakin kentällä on yksi lista porttia
+  kohden, joten avaimet eivät toistu jokaisessa portissa. from_port_table
+  palauttaa alkuperäisen rakenteen.
+
+Eräajoissa RecordWriter kirjoittaa yhden tietueen kerrallaan avoimeen
+tiedostoon: JSON-muodot rivi kerrallaan (JSONL) ja MessagePack peräkkäisinä
+objekteina. Liitettäessä keskeytyneen ajon vajaa viimeinen tietue poistetaan
+ensin, ja iter_records lukee tiedoston takaisin tietue kerrallaan.
+
+Sisältää:
+- get_serializer: Palauttaa muodon serialisoijan.
+- serialize: Serialisoi tulosteen (teksti tai tavut muodon mukaan).
+- port_table: Muuntaa tulosteen sarakemuotoiseksi porttitaulukoksi.
+- from_port_table: Palauttaa porttitaulukosta sisäkkäisen rakenteen.
+- RecordWriter: Inkrementaalinen tulostekirjoitin.
+- iter_records: Lukee RecordWriterin kirjoittamat tietueet.
+"""
+
+import json
+import os
+
+from detections import PORT_STATUS, STATUS_CLASS
+
+TABLE_VERSION = 1
+ROWS = ("upper", "lower")
+STATUS_NAMES = [PORT_STATUS[class_id] for class_id in sorted(PORT_STATUS)]
+
+
+def port_table(output):
+    """
+    Muuntaa generate_switch_json-tulosteen sarakemuotoiseksi porttitaulukoksi.
+
+    Muut avaimet (esim. eräajon image, width ja height) säilyvät ennallaan;
+    avaimen "switches" tilalle tulee avain "table".
+
+    Args:
+        output (dict): generate_switch_json-tuloste tai eräajon tietue.
+
+    Returns:
+        dict: Tuloste, jossa porttitaulukko on muodossa
+            {'version', 'switches', 'stacks', 'stack_switch', 'port_stack',
+            'port_number', 'port_row', 'port_status', 'status_names'}
+            sekä 'port_activity', jos porteilla on aktiivisuus.
+    """
+    switches, stacks, stack_switch = [], [], []
+    port_stack, port_number, port_row, port_status, port_activity = [], [], [], [], []
+    for switch_index, switch in enumerate(output.get("switches", [])):
+        switches.append(switch["switch_id"])
+        for stack in switch["lan_port_stacks"]:
+            stack_index = len(stacks)
+            stacks.append(stack["stack_id"])
+            stack_switch.append(switch_index)
+            for row, ports in enumerate(stack["lan_ports"]):
+                for port in ports:
+                    port_stack.append(stack_index)
+                    port_number.append(port["port_number"])
+                    port_row.append(row)
+                    port_status.append(STATUS_CLASS[port["status"]])
+                    if "activity" in port:
+                        port_activity.append(port["activity"])
+
+    table = {
+        "version": TABLE_VERSION,
+        "switches": switches,
+        "stacks": stacks,
+        "stack_switch": stack_switch,
+        "port_stack": port_stack,
+        "port_number": port_number,
+        "port_row": port_row,
+        "port_status": port_status,
+        "status_names": STATUS_NAMES,
+    }
+    if port_activity:
+        table["port_activity"] = port_activity
+    converted = {key: value for key, value in output.items() if key != "switches"}
+    converted["table"] = table
+    return converted
+
+
+def from_port_table(converted):
+    """
+    Palauttaa port_table-muunnoksen sisäkkäiseksi generate_switch_json-rakenteeksi.
+
+    Args:
+        converted (dict): port_table-funktion tulos.
+
+    Returns:
+        dict: Tuloste avaimella "switches".
+    """
+    table = converted["table"]
+    activity = table.get("port_activity")
+    switches = [{"switch_id": switch_id, "lan_port_stacks": []} for switch_id in table["switches"]]
+    stacks = []
+    for stack_id, switch_index in zip(table["stacks"], table["stack_switch"]):
+        stack = {"stack_id": stack_id, "lan_ports": [[], []]}
+        switches[switch_index]["lan_port_stacks"].append(stack)
+        stacks.append(stack)
+    for index, (stack_index, number, row, status) in enumerate(zip(
+        table["port_stack"], table["port_number"], table["port_row"], table["port_status"],
+    )):
+        port = {"port_number": number, "status": table["status_names"][status]}
+        if activity is not None:
+            port["activity"] = activity[index]
+        stacks[stack_index]["lan_ports"][row].append(port)
+    output = {key: value for key, value in converted.items() if key != "table"}
+    output["switches"] = switches
+    return output
+
+
+class Serializer:
+    """
+    Tulostemuodon serialisoija.
+
+    Attributes:
+        name (str): Muodon nimi.
+        media_type (str): HTTP:n Content-Type.
+        binary (bool): Onko muoto binäärinen (dumps_text ei käytettävissä).
+        streamable (bool): Voiko muotoa kirjoittaa tietue kerrallaan (RecordWriter).
+    """
+
+    name = None
+    media_type = "application/json"
+    binary = False
+    streamable = True
+
+    def transform(self, output):
+        """Muuntaa tulosteen muodon rakenteeksi ennen koodausta."""
+        return output
+
+    def dumps(self, output):
+        """Serialisoi tulosteen tavuiksi."""
+        return self.dumps_text(output).encode('utf-8')
+
+    def dumps_text(self, output):
+        """Serialisoi tulosteen merkkijonoksi (vain tekstimuodot)."""
+        raise TypeError(f"Muoto {self.name} on binäärinen")
+
+    def loads(self, data):
+        """Purkaa serialisoidun tulosteen (muodon omaan rakenteeseen)."""
+        return json.loads(data)
+
+    def encode_record(self, record):
+        """Koodaa eräajon tietueen kirjoitettavaksi tavujonoksi erottimineen."""
+        return self.dumps(record) + b"\n"
+
+
+class JsonSerializer(Serializer):
+    """JSON standardikirjaston json-moduulilla (sisennetty tai tiivis)."""
+
+    def __init__(self, name, indent=None):
+        self.name = name
+        self.indent = indent
+        self.separators = None if indent else (',', ':')
+        # Sisennetty JSON jakautuu usealle riville, joten sitä ei voi kirjoittaa JSONL-muodossa
+        self.streamable = indent is None
+
+    def dumps_text(self, output):
+        return json.dumps(self.transform(output), indent=self.indent, separators=self.separators)
+
+
+class OrjsonSerializer(Serializer):
+    """Tiivis JSON orjson-kirjastolla; tuottaa suoraan tavuja."""
+
+    name = "orjson"
+
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError as e:
+            raise ImportError("orjson-muoto vaatii paketin: pip install orjson") from e
+        self._orjson = orjson
+        # NumPy-taulukot ja -skalaarit kirjoitetaan suoraan ilman muunnosta
+        self._options = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, output):
+        return self._orjson.dumps(self.transform(output), option=self._options)
+
+    def dumps_text(self, output):
+        return self.dumps(output).decode('utf-8')
+
+    def encode_record(self, record):
+        return self._orjson.dumps(
+            self.transform(record), option=self._options | self._orjson.OPT_APPEND_NEWLINE
+        )
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """MessagePack; tietueet kirjoitetaan peräkkäin ilman erotinta."""
+
+    name = "msgpack"
+    media_type = "application/msgpack"
+    binary = True
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError("msgpack-muoto vaatii paketin: pip install msgpack") from e
+        self._msgpack = msgpack
+        self._packer = msgpack.Packer(use_bin_type=True)
+
+    def dumps(self, output):
+        return self._packer.pack(self.transform(output))
+
+    def encode_record(self, record):
+        return self.dumps(record)
+
+    def loads(self, data):
+        return self._msgpack.unpackb(data, raw=False)
+
+
+class TableSerializer(Serializer):
+    """Sarakemuotoinen porttitaulukko tiiviinä JSONina (orjson, jos asennettu)."""
+
+    name = "table"
+
+    def __init__(self):
+        try:
+            self._encoder = OrjsonSerializer()
+        except ImportError:
+            self._encoder = JsonSerializer("compact")
+
+    def transform(self, output):
+        return port_table(output)
+
+    def dumps(self, output):
+        return self._encoder.dumps(self.transform(output))
+
+    def dumps_text(self, output):
+        return self._encoder.dumps_text(self.transform(output))
+
+    def encode_record(self, record):
+        return self._encoder.encode_record(self.transform(record))
+
+    def loads(self, data):
+        return self._encoder.loads(data)
+
+
+FORMATS = {
+    "json": lambda: JsonSerializer("json", indent=4),
+    "compact": lambda: JsonSerializer("compact"),
+    "orjson": OrjsonSerializer,
+    "msgpack": MsgpackSerializer,
+    "table": TableSerializer,
+}
+
+_serializers = {}
+
+
+def get_serializer(output_format):
+    """
+    Palauttaa muodon serialisoijan (luodaan kerran prosessia kohden).
+
+    Args:
+        output_format (str): Muodon nimi (ks. FORMATS).
+
+    Returns:
+        Serializer: Serialisoija.
+
+    Raises:
+        ValueError: Jos muoto on tuntematon.
+        ImportError: Jos muodon valinnainen riippuvuus puuttuu.
+    """
+    serializer = _serializers.get(output_format)
+    if serializer is None:
+        if output_format not in FORMATS:
+            raise ValueError(
+                f"Tuntematon tulostemuoto '{output_format}'. Vaihtoehdot: {', '.join(FORMATS)}"
+            )
+        serializer = _serializers[output_format] = FORMATS[output_format]()
+    return serializer
+
+
+def serialize(output, output_format="json"):
+    """
+    Serialisoi tulosteen.
+
+    Args:
+        output (dict): generate_switch_json-tuloste.
+        output_format (str, optional): Muoto; None palauttaa sanakirjan
+            sellaisenaan. Oletus 'json'.
+
+    Returns:
+        str | bytes | dict: Tekstimuodoista merkkijono, msgpackista tavut.
+    """
+    if output_format is None:
+        return output
+    serializer = get_serializer(output_format)
+    return serializer.dumps(output) if serializer.binary else serializer.dumps_text(output)
+
+
+def _complete_length(path, serializer):
+    """Palauttaa tiedoston ehjien tietueiden pituuden tavuina."""
+    if serializer.binary:
+        with open(path, 'rb') as file:
+            unpacker = serializer._msgpack.Unpacker(file, raw=False)
+            end = 0
+            try:
+                for _ in unpacker:
+                    end = unpacker.tell()
+            except ValueError:
+                pass
+            return end
+    # Rivimuodot: viimeiseen rivinvaihtoon asti
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            file.seek(position - step)
+            chunk = file.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                return position - step + newline + 1
+            position -= step
+    return 0
+
+
+class RecordWriter:
+    """
+    Kirjoittaa eräajon tietueet tiedostoon yksi kerrallaan.
+
+    Args:
+        path (str): Tulostetiedosto.
+        output_format (str, optional): Muoto (compact, orjson, table tai msgpack).
+            Oletus 'compact'.
+        append (bool, optional): Jatketaanko olemassa olevaa tiedostoa. Vajaa
+            viimeinen tietue poistetaan ensin. Oletus False.
+
+    Raises:
+        ValueError: Jos muotoa ei voi kirjoittaa tietue kerrallaan.
+    """
+
+    def __init__(self, path, output_format="compact", append=False):
+        self.serializer = get_serializer(output_format)
+        if not self.serializer.streamable:
+            raise ValueError(f"Muotoa {output_format} ei voi kirjoittaa tietue kerrallaan")
+        if append and os.path.exists(path):
+            length = _complete_length(path, self.serializer)
+            if length < os.path.getsize(path):
+                os.truncate(path, length)
+        self.path = path
+        self.file = open(path, 'ab' if append else 'wb')
+        self.records = 0
+        self.bytes = 0
+
+    def encode(self, record):
+        """Koodaa tietueen (esim. toisessa prosessissa) write_encoded-kutsua varten."""
+        return self.serializer.encode_record(record)
+
+    def write(self, record):
+        """Kirjoittaa yhden tietueen."""
+        self.write_encoded(self.serializer.encode_record(record))
+
+    def write_encoded(self, data):
+        """Kirjoittaa valmiiksi koodatun tietueen (encode tai Serializer.encode_record)."""
+        self.file.write(data)
+        self.records += 1
+        self.bytes += len(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_records(path, output_format="compact"):
+    """
+    Lukee RecordWriterin kirjoittamat tietueet.
+
+    Virheelliset rivit ja keskeytyksessä katkennut viimeinen tietue ohitetaan.
+
+    Args:
+        path (str): Tiedoston polku.
+        output_format (str, optional): Tiedoston muoto. Oletus 'compact'.
+
+    Yields:
+        dict: Tietue muodon omassa rakenteessa (table-muodossa porttitaulukkona).
+    """
+    serializer = get_serializer(output_format)
+    if serializer.binary:
+        with open(path, 'rb') as file:
+            unpacker = serializer._msgpack.Unpacker(file, raw=False)
+            try:
+                yield from unpacker
+            except ValueError:
+                return
+        return
+    with open(path, 'rb') as file:
+        for line in file:
+            try:
+                yield serializer.loads(line)
+            except ValueError:
+                continue
@@ -0,0 +1,436 @@
+"""Tämä skripti käynnistää itsenäisen HTTP-inferenssipalvelun dynaamisella eräytyksellä.
+
+Palvelu on toteutettu asyncio-virroilla ilman ulkoisia riippuvuuksia.
+Saapuvat kuvat asetetaan jonoon, josta kootaan mikroeriä: erä ajetaan
+mallille, kun siinä on max_batch kuvaa tai kun ensimmäinen kuva on odottanut
+max_wait_ms millisekuntia. Kuvien purku, jälkikäsittely ja JSON-tulosteen
+rakentaminen ajetaan säievarannossa, jotta tapahtumasilmukka ei tukkeudu.
+Jos jono on täynnä, pyyntö hylätään heti tilakoodilla 503 (backpressure), ja
+liian kauan kestänyt pyyntö saa vastauksen 504.
+
+Rajapinta:
+    GET  /health   Palvelun tila, jonon pituus ja eräytystilastot.
+    GET  /metrics  Vaiheiden viivejakaumat Prometheus-tekstimuodossa
+                   (?format=json palauttaa JSON-tilannekuvan).
+    POST /predict  Kuva multipart/form-data-kenttänä "image", raakana
+                   image/*-runkona tai JSON-muodossa {"image": "<base64>"}.
+                   Kyselyparametri ?render=1 palauttaa myös annotoidun kuvan
+                   base64-koodattuna JPEG-kuvana ja ?trace=1 liittää
+                   porttinumeroinnin päätösjäljen avaimella "trace".
+                   Vastauksen muoto valitaan parametrilla ?output=<muoto>
+                   (compact, orjson, table tai msgpack; serializers.py) tai
+                   otsakkeella Accept: application/msgpack. Oletus on tiivis JSON.
+
+Esimerkki:
+    python server.py --port 8000 --max-batch 8 --max-wait-ms 10
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from backends import get_backend, load_inference_config
+from bounding_boxes import draw_bboxes, results_to_json
+from decision_trace import DecisionTrace
+from image_buffer import BGR
+from metrics import STAGE_METRIC, increment, metrics, observe, record_model_speed
+from serializers import get_serializer
+
+MAX_BODY_BYTES = 50 * 2**20
+RESPONSE_FORMATS = ("compact", "orjson", "table", "msgpack")
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class HTTPError(Exception):
+    """HTTP-virhe, joka palautetaan asiakkaalle annetulla tilakoodilla."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def decode_image(data):
+    """
+    Purkaa kuvatiedoston tavut BGR-muotoiseksi NumPy-taulukoksi (cv2.imdecode).
+
+    Raises:
+        HTTPError: Jos tavut eivät ole kelvollinen kuva.
+    """
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise HTTPError(400, "kuvan purku epäonnistui")
+    # Kuva jää BGR-järjestykseen: malli ja piirto saavat color_order=BGR, eikä kanavia vaihdeta
+    return image
+
+
+def extract_image_bytes(content_type, body):
+    """
+    Hakee kuvan tavut pyynnön rungosta sisältötyypin mukaan.
+
+    Raises:
+        HTTPError: Jos kuvaa ei löydy.
+    """
+    content_type = content_type or ""
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "image":
+                return part.get_payload(decode=True)
+        raise HTTPError(400, "multipart-kenttä 'image' puuttuu")
+    if content_type.startswith("application/json"):
+        try:
+            payload = json.loads(body)
+            return base64.b64decode(payload["image"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, "JSON-rungossa on oltava base64-koodattu kenttä 'image'")
+    if body:
+        return body
+    raise HTTPError(400, "pyynnön runko on tyhjä")
+
+
+class _Request:
+    """Yksi jonossa odottava kuva."""
+
+    __slots__ = ("image", "future", "enqueued")
+
+    def __init__(self, image, future):
+        self.image = image
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class InferenceServer:
+    """
+    Dynaamisesti eräyttävä inferenssipalvelu.
+
+    Args:
+        backend: Inferenssitausta (backends.get_backend).
+        iou (float): NMS:n IoU-kynnys.
+        conf (float): Luottamuskynnys.
+        max_batch (int, optional): Mikroerän enimmäiskoko. Oletus 8.
+        max_wait_ms (float, optional): Ensimmäisen kuvan enimmäisodotus ennen erän ajoa. Oletus 10.
+        max_queue (int, optional): Jonon enimmäispituus ennen pyyntöjen hylkäämistä. Oletus 64.
+        timeout (float, optional): Koko pyynnön (purku, jono, inferenssi ja
+            jälkikäsittely) aikaraja sekunteina. Oletus 30.
+        workers (int, optional): Purku- ja jälkikäsittelysäikeiden määrä. Oletus 4.
+    """
+
+    def __init__(self, backend, iou, conf, max_batch=8, max_wait_ms=10.0, max_queue=64,
+                 timeout=30.0, workers=4):
+        self.backend = backend
+        self.iou = iou
+        self.conf = conf
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # Malli ajetaan yhdessä säikeessä, jälkikäsittely säievarannossa
+        self.inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.worker_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="postprocess")
+        self.stats = {
+            "requests": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "batches": 0,
+            "batched_images": 0,
+        }
+        self.started = time.time()
+
+    async def run_in_pool(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.worker_pool, function, *args)
+
+    async def batch_loop(self):
+        """Kokoaa jonosta mikroeriä ja ajaa ne mallille."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Ohita pyynnöt, joiden asiakas on jo saanut aikakatkaisun
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["batched_images"] += len(batch)
+            try:
+                results = await loop.run_in_executor(
+                    self.inference_executor,
+                    lambda: self.backend(
+                        [r.image for r in batch], iou=self.iou, conf=self.conf, color_order=BGR,
+                    ),
+                )
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            record_model_speed(results)
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+
+    @staticmethod
+    def postprocess(image, result, render, trace=False):
+        """Rakentaa JSON-tulosteen ja tarvittaessa annotoidun JPEG-kuvan."""
+        recorder = DecisionTrace(attach=True) if trace else None
+        if not render:
+            return results_to_json([result], trace=recorder, output_format=None), None
+        # Pyynnön kuvaa ei käytetä enää, joten piirto ja JPEG-muunnos tehdään siihen suoraan
+        annotated, output = draw_bboxes(
+            image, [result], font_scale=0.6, trace=recorder, inplace=True, output_format=None,
+            color_order=BGR,
+        )
+        ok, encoded = cv2.imencode(".jpg", annotated)
+        return output, base64.b64encode(encoded.tobytes()).decode('ascii')
+
+    @staticmethod
+    def decode_request(content_type, body):
+        """Hakee kuvan rungosta ja purkaa sen (ajetaan säievarannossa)."""
+        return decode_image(extract_image_bytes(content_type, body))
+
+    async def within_deadline(self, awaitable, deadline):
+        """Odottaa tulosta pyynnön aikarajaan asti; ylitys palautetaan tilakoodilla 504."""
+        try:
+            return await asyncio.wait_for(awaitable, max(0.0, deadline - time.perf_counter()))
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise HTTPError(504, "pyynnön aikaraja ylittyi")
+
+    async def predict(self, content_type, body, render, trace=False):
+        """Käsittelee yhden /predict-pyynnön ja palauttaa vastauksen sanakirjana."""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        # Monipartin jäsennys ja base64-purku voivat kestää suurilla rungoilla,
+        # joten nekin ajetaan säievarannossa eikä tapahtumasilmukassa
+        image = await self.within_deadline(
+            self.run_in_pool(self.decode_request, content_type, body), deadline,
+        )
+        observe(STAGE_METRIC, time.perf_counter() - start, stage="decode")
+
+        future = asyncio.get_running_loop().create_future()
+        request = _Request(image, future)
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise HTTPError(503, "palvelu on ylikuormitettu, yritä myöhemmin uudelleen")
+
+        try:
+            result = await self.within_deadline(asyncio.shield(future), deadline)
+        except HTTPError:
+            future.cancel()
+            raise
+        inference_done = time.perf_counter()
+        observe(STAGE_METRIC, inference_done - request.enqueued, stage="queue_and_inference")
+
+        output, encoded = await self.within_deadline(
+            self.run_in_pool(self.postprocess, image, result, render, trace), deadline,
+        )
+        response = dict(output)
+        if encoded is not None:
+            response["image"] = encoded
+        increment("portvision_images_total", entry="server")
+        response["timing_ms"] = {
+            "queue_and_inference": 1000.0 * (inference_done - request.enqueued),
+            "total": 1000.0 * (time.perf_counter() - start),
+        }
+        return response
+
+    def health(self):
+        """Palauttaa palvelun tilan."""
+        batches = self.stats["batches"]
+        return {
+            "status": "ok",
+            "uptime_seconds": time.time() - self.started,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "mean_batch_size": self.stats["batched_images"] / batches if batches else 0.0,
+            **self.stats,
+        }
+
+    async def handle_connection(self, reader, writer):
+        """Käsittelee yhden TCP-yhteyden pyynnöt (HTTP/1.1 keep-alive)."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(" ", 2)
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "virheellinen pyyntörivi"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                length = int(headers.get("content-length", 0) or 0)
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "pyyntö on liian suuri"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload, output_format = await self.dispatch(method, target, headers, body)
+                await self.respond(writer, status, payload, keep_alive, output_format)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def response_format(query, headers):
+        """Valitsee /predict-vastauksen muodon kyselyparametrista tai Accept-otsakkeesta."""
+        output_format = query.get("output", [None])[0]
+        if output_format is None:
+            # Accept-otsake on toive: ilman msgpack-pakettia vastataan JSONina
+            if "application/msgpack" not in headers.get("accept", ""):
+                return "compact"
+            try:
+                get_serializer("msgpack")
+            except ImportError:
+                return "compact"
+            return "msgpack"
+        if output_format not in RESPONSE_FORMATS:
+            raise HTTPError(
+                400, f"tuntematon muoto {output_format}, vaihtoehdot: {', '.join(RESPONSE_FORMATS)}"
+            )
+        try:
+            get_serializer(output_format)
+        except ImportError as e:
+            raise HTTPError(400, str(e))
+        return output_format
+
+    async def dispatch(self, method, target, headers, body):
+        """Ohjaa pyynnön oikealle käsittelijälle ja palauttaa (tilakoodi, runko, muoto)."""
+        url = urlsplit(target)
+        try:
+            if url.path == "/health":
+                if method != "GET":
+                    raise HTTPError(405, "käytä GET-metodia")
+                return 200, self.health(), "compact"
+            if url.path == "/metrics":
+                if method != "GET":
+                    raise HTTPError(405, "käytä GET-metodia")
+                if parse_qs(url.query).get("format", [""])[0] == "json":
+                    return 200, metrics.snapshot(), "compact"
+                return 200, metrics.to_prometheus(), "compact"
+            if url.path == "/predict":
+                if method != "POST":
+                    raise HTTPError(405, "käytä POST-metodia")
+                self.stats["requests"] += 1
+                query = parse_qs(url.query)
+                output_format = self.response_format(query, headers)
+                render = query.get("render", ["0"])[0] in ("1", "true", "yes")
+                trace = query.get("trace", ["0"])[0] in ("1", "true", "yes")
+                response = await self.predict(headers.get("content-type"), body, render, trace)
+                return 200, response, output_format
+            raise HTTPError(404, f"tuntematon polku {url.path}")
+        except HTTPError as e:
+            return e.status, {"error": e.message}, "compact"
+        except Exception as e:
+            self.stats["errors"] += 1
+            return 500, {"error": str(e)}, "compact"
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive, output_format="compact"):
+        # Merkkijono lähetetään tekstinä (Prometheus), muut valitussa muodossa
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            serializer = get_serializer(output_format)
+            body = serializer.dumps(payload)
+            content_type = serializer.media_type
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(server, host, port):
+    """Käynnistää eräytyssilmukan ja HTTP-palvelimen."""
+    batcher = asyncio.create_task(server.batch_loop())
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port)
+    print(f"PortVision-palvelu kuuntelee osoitteessa http://{host}:{port}")
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PortVision HTTP-inferenssipalvelu.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--config", default="inference.yaml", help="Inferenssiasetukset")
+    parser.add_argument("--max-batch", type=int, default=8, help="Mikroerän enimmäiskoko")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="Erän enimmäisodotus (ms)")
+    parser.add_argument("--max-queue", type=int, default=64, help="Jonon enimmäispituus")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Pyynnön aikaraja (s)")
+    parser.add_argument("--workers", type=int, default=4, help="Jälkikäsittelysäikeet")
+    args = parser.parse_args()
+
+    config = load_inference_config(args.config)
+    backend = get_backend(config)
+
+    async def start():
+        server = InferenceServer(
+            backend, config["iou"], config["conf"],
+            max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, max_queue=args.max_queue,
+            timeout=args.timeout, workers=args.workers,
+        )
+        await serve(server, args.host, args.port)
+
+    try:
+        asyncio.run(start())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
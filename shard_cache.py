@@ -0,0 +1,455 @@
+"""Tämä moduuli sisältää esidekoodattujen kuvien muistikartoitetun välimuistin koulutukseen ja arviointiin.
+
+config.yaml:n asetuksilla (cache: false, imgsz: 1216) jokainen koulutuskierros
+purkaa ja skaalaa samat JPEG-kuvat uudelleen. Välimuisti tekee työn kerran:
+jaon kuvat puretaan, skaalataan ja reunustetaan (letterbox) mallin
+syötekokoon ja kirjoitetaan kiinteäkokoisina paikkoina .npy-sirpaleisiin.
+Sirpaleet avataan muistikartoitettuina (np.load, mmap_mode='r'), joten kuvan
+lukeminen on näkymä (view) sirpaleeseen ilman purkua tai kopiointia, ja
+käyttöjärjestelmän sivuvälimuisti jaetaan dataloaderin työprosessien kesken.
+
+Hakemistorakenne:
+    <cache_dir>/<jaon nimi>-<polun tiiviste>-<imgsz>/
+        index.json        Sormenjälki ja kuvakohtaiset tiedot
+        images-000.npy    (n, imgsz, imgsz, 3) uint8, BGR (kuten cv2.imread)
+        labels.npy        (m, 5) float32: luokka cx cy w h (YOLO-normalisoitu)
+
+Välimuisti mitätöidään, kun imgsz tai mikä tahansa lähdekuva tai nimiö
+muuttuu (nimi, koko tai muokkausaika), tai kun kuvia lisätään tai poistetaan.
+Kuvat, joita ei voi lukea, jätetään pois indeksistä; ne luetaan koulutuksessa
+alkuperäisellä tavalla, ja ultralytics käsittelee ne kuten ilman välimuistia.
+
+Kuvat ovat BGR-järjestyksessä, koska ultralyticsin koulutussilmukka odottaa
+cv2.imread-muotoa. Kuvat skaalataan kuten ultralyticsin load_image
+(pidempi sivu imgsz:ksi, sivut ylöspäin pyöristettyinä), joten välimuistin
+kuva on samankokoinen kuin ilman välimuistia; letterboxed-näkymä voi siksi
+poiketa backends.letterbox-funktion tuloksesta pikselin verran.
+
+Sisältää:
+- SHARD_IMAGES: Kuvien määrä sirpaletta kohden.
+- source_fingerprint: Laskee lähdetiedostojen ja imgsz:n sormenjäljen.
+- ShardCache: Avoin välimuisti (kuvat, nimiöt ja letterbox-tiedot näkyminä).
+- build_cache: Rakentaa välimuistin kuvahakemistosta.
+- open_cache: Avaa ajantasaisen välimuistin tai rakentaa sen.
+- prepare: Rakentaa välimuistit data.yaml-tiedoston jaoille.
+- attach_to_dataset: Ohjaa ultralyticsin aineiston kuvanluvun välimuistiin.
+- shard_trainer: Palauttaa DetectionTrainer-aliluokan, joka käyttää välimuistia.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dataset import (
+    IMAGE_EXTENSIONS,
+    label_path,
+    load_data_config,
+    read_yolo_labels,
+    resolve_split_dir,
+)
+
+CACHE_VERSION = 3
+DEFAULT_CACHE_DIR = ".shard_cache"
+SHARD_IMAGES = 256
+PAD_COLOR = (114, 114, 114)
+
+
+def _image_files(image_dir):
+    """Listaa hakemiston kuvat aakkosjärjestyksessä."""
+    return sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def source_fingerprint(paths, imgsz):
+    """
+    Laskee lähdekuvien, nimiöiden ja syötekoon sormenjäljen.
+
+    Tiedostoja ei lueta, vaan tiivisteeseen otetaan nimi, koko ja
+    muokkausaika, joten tarkistus on nopea suurellakin aineistolla.
+
+    Args:
+        paths (list): Kuvien polut.
+        imgsz (int): Mallin syötekoko.
+
+    Returns:
+        str: Heksadesimaalinen tiiviste.
+    """
+    digest = hashlib.sha1(f"v{CACHE_VERSION}:{imgsz}".encode())
+    for path in paths:
+        for source in (path, label_path(path)):
+            try:
+                stat = os.stat(source)
+                digest.update(f"{os.path.basename(source)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+            except FileNotFoundError:
+                digest.update(f"{os.path.basename(source)}:-\n".encode())
+    return digest.hexdigest()
+
+
+def cache_location(image_dir, imgsz, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Palauttaa kuvahakemiston välimuistin hakemiston.
+
+    Returns:
+        str: Välimuistin hakemisto.
+    """
+    image_dir = os.path.abspath(image_dir)
+    digest = hashlib.sha1(image_dir.encode()).hexdigest()[:10]
+    name = os.path.basename(os.path.dirname(image_dir)) or "split"
+    return os.path.join(cache_dir, f"{name}-{digest}-{imgsz}")
+
+
+class ShardCache:
+    """
+    Avoin sirpalevälimuisti.
+
+    Sirpaleet avataan laiskasti ensimmäisellä käytöllä. Pickle-muodossa
+    (esim. Windowsin spawn-työprosesseihin) välitetään vain hakemisto, ja
+    sirpaleet kartoitetaan uudelleen vastaanottajassa.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "index.json"), 'r', encoding='utf-8') as file:
+            self.index = json.load(file)
+        self.imgsz = self.index["imgsz"]
+        self.fingerprint = self.index["fingerprint"]
+        self.paths = [entry["path"] for entry in self.index["images"]]
+        self._positions = {os.path.abspath(path): i for i, path in enumerate(self.paths)}
+        self._shards = None
+        self._labels = None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getstate__(self):
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    def _open(self):
+        if self._shards is None:
+            self._shards = [
+                np.load(os.path.join(self.directory, name), mmap_mode='r')
+                for name in self.index["shards"]
+            ]
+            self._labels = np.load(os.path.join(self.directory, "labels.npy"), mmap_mode='r')
+        return self._shards
+
+    def position(self, path):
+        """Palauttaa kuvan indeksin välimuistissa tai None."""
+        return self._positions.get(os.path.abspath(path))
+
+    def letterboxed(self, i):
+        """
+        Palauttaa kuvan koko letterbox-paikan (imgsz, imgsz, 3) näkymänä.
+
+        Returns:
+            numpy.ndarray: Vain luku -näkymä muistikartoitettuun sirpaleeseen.
+        """
+        shards = self._open()
+        slot = self.index["images"][i]["slot"]
+        return shards[slot // self.index["shard_images"]][slot % self.index["shard_images"]]
+
+    def image(self, i):
+        """
+        Palauttaa skaalatun kuvan ilman reunuksia näkymänä (sama kuin ultralyticsin load_image).
+
+        Returns:
+            tuple: (kuva, alkuperäinen (h, w), skaalattu (h, w))
+        """
+        entry = self.index["images"][i]
+        (left, top), (height, width) = entry["pad"], entry["shape"]
+        view = self.letterboxed(i)[top:top + height, left:left + width]
+        return view, tuple(entry["orig_shape"]), (height, width)
+
+    def labels(self, i):
+        """
+        Palauttaa kuvan nimiöt näkyminä.
+
+        Returns:
+            tuple: (cls, xywhn) – luokat ja YOLO-normalisoidut laatikot.
+        """
+        self._open()
+        start, end = self.index["images"][i]["labels"]
+        rows = self._labels[start:end]
+        return rows[:, 0], rows[:, 1:]
+
+    def letterbox_boxes(self, i):
+        """
+        Palauttaa nimiöt letterbox-kuvan pikselikoordinaatteina.
+
+        Returns:
+            tuple: (xyxy, cls) NumPy-taulukkoina.
+        """
+        entry = self.index["images"][i]
+        (left, top), (height, width) = entry["pad"], entry["shape"]
+        cls, xywh = self.labels(i)
+        xyxy = np.empty((len(xywh), 4), dtype=np.float32)
+        xyxy[:, 0] = (xywh[:, 0] - xywh[:, 2] / 2) * width + left
+        xyxy[:, 1] = (xywh[:, 1] - xywh[:, 3] / 2) * height + top
+        xyxy[:, 2] = (xywh[:, 0] + xywh[:, 2] / 2) * width + left
+        xyxy[:, 3] = (xywh[:, 1] + xywh[:, 3] / 2) * height + top
+        return xyxy, cls.astype(np.int64)
+
+    def is_current(self):
+        """Tarkistaa, vastaako välimuisti yhä lähdetiedostoja."""
+        image_dir = self.index["source"]
+        if not os.path.isdir(image_dir):
+            return False
+        return source_fingerprint(_image_files(image_dir), self.imgsz) == self.fingerprint
+
+
+def _fill_slot(shards, shard_images, position, path, imgsz):
+    """Purkaa, skaalaa ja reunustaa kuvan suoraan sirpaleen paikkaan; palauttaa None, jos kuvaa ei voi lukea."""
+    import cv2
+
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    # Skaalaus kuten ultralyticsin load_image (rect_mode), jotta koot vastaavat välimuistitonta ajoa
+    height, width = image.shape[:2]
+    gain = imgsz / max(height, width)
+    if gain != 1:
+        resized = (min(math.ceil(width * gain), imgsz), min(math.ceil(height * gain), imgsz))
+        image = cv2.resize(image, resized, interpolation=cv2.INTER_LINEAR)
+    new_height, new_width = image.shape[:2]
+    left = int(round((imgsz - new_width) / 2 - 0.1))
+    top = int(round((imgsz - new_height) / 2 - 0.1))
+    slot = shards[position // shard_images][position % shard_images]
+    slot[:] = PAD_COLOR
+    slot[top:top + new_height, left:left + new_width] = image
+    return {
+        "path": os.path.abspath(path),
+        "slot": position,
+        "orig_shape": [height, width],
+        "shape": [new_height, new_width],
+        "pad": [left, top],
+        "gain": gain,
+    }
+
+
+def build_cache(image_dir, imgsz, cache_dir=DEFAULT_CACHE_DIR, workers=8, shard_images=SHARD_IMAGES):
+    """
+    Rakentaa kuvahakemiston välimuistin.
+
+    Kuvat puretaan rinnakkain säikeissä (OpenCV vapauttaa GIL:n) suoraan
+    muistikartoitettuihin sirpaleisiin. Rakennus tehdään väliaikaiseen
+    hakemistoon, joka vaihdetaan paikalleen vasta valmiina, joten keskeytynyt
+    rakennus ei jätä puolivalmista välimuistia. Lukukelvottomat kuvat
+    ilmoitetaan ja jätetään pois indeksistä; niiden paikat jäävät käyttämättä.
+
+    Args:
+        image_dir (str): Jaon kuvahakemisto (.../images).
+        imgsz (int): Mallin syötekoko.
+        cache_dir (str, optional): Välimuistien juurihakemisto.
+        workers (int, optional): Purkusäikeiden määrä. Oletus 8.
+        shard_images (int, optional): Kuvia sirpaletta kohden.
+
+    Returns:
+        ShardCache: Avattu välimuisti.
+    """
+    paths = _image_files(image_dir)
+    directory = cache_location(image_dir, imgsz, cache_dir)
+    staging = directory + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    shard_names, shards = [], []
+    for number, start in enumerate(range(0, len(paths), shard_images)):
+        name = f"images-{number:03d}.npy"
+        count = min(shard_images, len(paths) - start)
+        shard_names.append(name)
+        shards.append(np.lib.format.open_memmap(
+            os.path.join(staging, name), mode='w+', dtype=np.uint8, shape=(count, imgsz, imgsz, 3)
+        ))
+
+    fingerprint = source_fingerprint(paths, imgsz)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        filled = list(executor.map(
+            lambda item: _fill_slot(shards, shard_images, item[0], item[1], imgsz), enumerate(paths)
+        ))
+    entries = [entry for entry in filled if entry is not None]
+    for path, entry in zip(paths, filled):
+        if entry is None:
+            print(f"Varoitus: kuvan {path} lukeminen epäonnistui, jätetään pois välimuistista.")
+    for shard in shards:
+        shard.flush()
+    del shards
+
+    # Nimiöt tallennetaan YOLO-normalisoituina, jolloin ne kelpaavat sekä
+    # koulutukseen että letterbox-koordinaateiksi muunnettaviksi
+    rows, offset = [], 0
+    for entry in entries:
+        xyxy, cls = read_yolo_labels(label_path(entry["path"]), 1, 1)
+        xywh = np.column_stack(((xyxy[:, :2] + xyxy[:, 2:]) / 2, xyxy[:, 2:] - xyxy[:, :2]))
+        rows.append(np.column_stack((cls.astype(np.float32), xywh)).astype(np.float32))
+        entry["labels"] = [offset, offset + len(cls)]
+        offset += len(cls)
+    labels = np.concatenate(rows) if rows else np.empty((0, 5), dtype=np.float32)
+    np.save(os.path.join(staging, "labels.npy"), labels.reshape(-1, 5))
+
+    with open(os.path.join(staging, "index.json"), 'w', encoding='utf-8') as file:
+        json.dump({
+            "version": CACHE_VERSION,
+            "source": os.path.abspath(image_dir),
+            "imgsz": imgsz,
+            "fingerprint": fingerprint,
+            "shard_images": shard_images,
+            "shards": shard_names,
+            "color": "BGR",
+            "images": entries,
+        }, file)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return ShardCache(directory)
+
+
+def open_cache(image_dir, imgsz, cache_dir=DEFAULT_CACHE_DIR, build=True, workers=8):
+    """
+    Avaa kuvahakemiston ajantasaisen välimuistin.
+
+    Args:
+        image_dir (str): Jaon kuvahakemisto.
+        imgsz (int): Mallin syötekoko.
+        cache_dir (str, optional): Välimuistien juurihakemisto.
+        build (bool, optional): Rakennetaanko puuttuva tai vanhentunut välimuisti. Oletus True.
+        workers (int, optional): Purkusäikeiden määrä rakennettaessa.
+
+    Returns:
+        ShardCache | None: Välimuisti tai None, jos sitä ei ole eikä sitä rakenneta.
+    """
+    directory = cache_location(image_dir, imgsz, cache_dir)
+    if os.path.exists(os.path.join(directory, "index.json")):
+        try:
+            cache = ShardCache(directory)
+            if cache.index.get("version") == CACHE_VERSION and cache.is_current():
+                return cache
+        except (OSError, ValueError, KeyError):
+            pass
+    if not build:
+        return None
+    return build_cache(image_dir, imgsz, cache_dir, workers)
+
+
+def prepare(data="data.yaml", imgsz=1216, splits=("train", "val"), cache_dir=DEFAULT_CACHE_DIR,
+            workers=8, rebuild=False):
+    """
+    Rakentaa (tai tarkistaa) data.yaml-tiedoston jakojen välimuistit.
+
+    Returns:
+        dict: Jako -> ShardCache
+    """
+    config = load_data_config(data)
+    caches = {}
+    for split in splits:
+        image_dir = resolve_split_dir(config, split)
+        if rebuild:
+            caches[split] = build_cache(image_dir, imgsz, cache_dir, workers)
+        else:
+            caches[split] = open_cache(image_dir, imgsz, cache_dir, build=True, workers=workers)
+    return caches
+
+
+class _ShardLoader:
+    """
+    Korvaa aineiston load_image-metodin; välimuistin ulkopuoliset kuvat luetaan alkuperäisellä tavalla.
+
+    Augmentoivassa aineistossa ladattu kuva kirjataan puskuriin kuten
+    ultralyticsin omassa load_imagessa, koska Mosaic valitsee kuvaparit
+    puskurista (dataset.buffer).
+    """
+
+    def __init__(self, dataset, cache):
+        self.dataset = dataset
+        self.cache = cache
+        self.fallback = type(dataset).load_image
+        self.positions = [cache.position(path) for path in dataset.im_files]
+
+    def __call__(self, i, rect_mode=True, **kwargs):
+        dataset = self.dataset
+        position = self.positions[i]
+        # Puskurissa jo olevat kuvat ja välimuistin ulkopuoliset tilat hoitaa alkuperäinen metodi
+        if position is None or not rect_mode or kwargs.get("resize_short") or dataset.ims[i] is not None:
+            return self.fallback(dataset, i, rect_mode, **kwargs)
+        image, original, resized = self.cache.image(position)
+        if dataset.augment and getattr(dataset, "cache", None) != "ram":
+            dataset.ims[i], dataset.im_hw0[i], dataset.im_hw[i] = image, original, resized
+            dataset.buffer.append(i)
+            if 1 < len(dataset.buffer) >= dataset.max_buffer_length:
+                j = dataset.buffer.pop(0)
+                dataset.ims[j], dataset.im_hw0[j], dataset.im_hw[j] = None, None, None
+        return image, original, resized
+
+
+def attach_to_dataset(dataset, cache):
+    """
+    Ohjaa ultralyticsin YOLODataset-olion kuvanluvun välimuistiin.
+
+    Ultralytics rakentaa aineiston sisäisesti, joten olion luokkaa ei
+    vaihdeta; vain sen load_image korvataan. Palautettu kuva on vain luku
+    -näkymä, josta augmentointi tekee omat kopionsa.
+
+    Returns:
+        int: Välimuistista luettavien kuvien määrä.
+    """
+    loader = _ShardLoader(dataset, cache)
+    dataset.load_image = loader
+    return sum(position is not None for position in loader.positions)
+
+
+def shard_trainer(cache_dir=DEFAULT_CACHE_DIR, workers=8):
+    """
+    Palauttaa DetectionTrainer-aliluokan, jonka koulutus- ja validointiaineistot lukevat välimuistista.
+
+    Käyttö: model.train(trainer=shard_trainer(), ...)
+
+    Returns:
+        type: Trainer-luokka.
+    """
+    from ultralytics.models.yolo.detect import DetectionTrainer
+
+    class ShardDetectionTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            dataset = super().build_dataset(img_path, mode, batch)
+            if isinstance(img_path, str) and os.path.isdir(img_path):
+                cache = open_cache(img_path, self.args.imgsz, cache_dir, build=True, workers=workers)
+                cached = attach_to_dataset(dataset, cache)
+                print(f"Sirpalevälimuisti ({mode}): {cached}/{len(dataset.im_files)} kuvaa {cache.directory}")
+            return dataset
+
+    return ShardDetectionTrainer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rakentaa esidekoodattujen kuvien välimuistin.")
+    parser.add_argument("--data", default="data.yaml", help="Aineiston asetukset")
+    parser.add_argument("--imgsz", type=int, default=1216, help="Mallin syötekoko")
+    parser.add_argument("--splits", nargs="+", default=["train", "val"], help="Jaot")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Välimuistien hakemisto")
+    parser.add_argument("--workers", type=int, default=8, help="Purkusäikeiden määrä")
+    parser.add_argument("--rebuild", action="store_true", help="Rakenna uudelleen, vaikka ajantasainen")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    caches = prepare(args.data, args.imgsz, args.splits, args.cache_dir, args.workers, args.rebuild)
+    for split, cache in caches.items():
+        size = sum(
+            os.path.getsize(os.path.join(cache.directory, name)) for name in os.listdir(cache.directory)
+        )
+        print(f"{split}: {len(cache)} kuvaa, {size / 2**20:.0f} MB, {cache.directory}")
+    print(f"Valmis {time.perf_counter() - start:.1f} s.")
+
+
+if __name__ == '__main__':
+    main()
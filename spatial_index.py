@@ -0,0 +1,355 @@
+"""Tämä moduuli sisältää kytkin–stack–portti-hierarkian ja sen ruudukkoindeksin.
+
+Hierarkia rakennetaan kerran kuvaa kohden tunnistetuista kytkin-, stack- ja
+porttilaatikoista:
+
+1. Stack kuuluu kytkimeen, jonka laatikon sisällä sen keskipiste on. Jos
+   keskipiste on useamman kytkimen sisällä, valitaan kytkin, jonka keskipiste
+   on lähimpänä.
+2. Stackit, joille ei löydy kytkintä (kytkintä ei tunnistettu), ryhmitellään
+   virtuaalisiksi kytkimiksi pystysuuntaisen päällekkäisyyden perusteella:
+   uusi kytkin alkaa, kun stack ei ole vähintään puolella korkeudestaan
+   edellisen ryhmän kanssa samalla korkeudella. Sääntö on suhteellinen
+   laatikoiden kokoon, joten se ei riipu kuvan resoluutiosta (toisin kuin
+   aiempi kiinteä 500 pikselin kynnys).
+3. Portti kuuluu stackiin samalla keskipistesäännöllä kuin ennen
+   (containment_matrix), mutta kukin portti kuuluu enintään yhteen stackiin.
+
+Kytkimet ja kunkin kytkimen stackit järjestetään lukujärjestykseen: riveittäin
+ylhäältä alas ja rivin sisällä vasemmalta oikealle.
+
+Pistekyselyt tehdään tasavälisellä ruudukkoindeksillä (GridIndex): laatikot
+tallennetaan niiden peittämiin soluihin lajiteltuna avaintaulukkona, ja
+pisteen solun ehdokkaat haetaan binäärihaulla. Rakentaminen ja kyselyt ovat
+O(n log n), kun laatikot ovat keskenään samaa kokoluokkaa.
+
+Sisältää:
+- GridIndex: Ruudukkoindeksi laatikoille (piste- ja aluekyselyt).
+- row_groups: Ryhmittelee laatikot riveiksi pystysuuntaisen päällekkäisyyden perusteella.
+- reading_order: Järjestää laatikot riveittäin vasemmalta oikealle.
+- SwitchHierarchy: Kuvan kytkimet, stackit ja portit puurakenteena.
+"""
+
+import numpy as np
+
+from detections import STACK_CLASS, SWITCH_CLASS, Detections
+from helpers import box_centers
+
+# Vähimmäispäällekkäisyys (osuus laatikon korkeudesta), jolla laatikko kuuluu samaan riviin
+ROW_OVERLAP = 0.5
+
+
+def _ranges(starts, counts):
+    """Palauttaa peräkkäiset välit [start, start + count) yhtenä indeksitaulukkona."""
+    total = int(counts.sum())
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(total) - offsets
+
+
+class GridIndex:
+    """
+    Tasavälinen ruudukkoindeksi laatikoille.
+
+    Args:
+        boxes (array-like): Laatikot muodossa (N, 4).
+        cell_size (float | tuple, optional): Solun leveys ja korkeus. Oletus
+            laatikoiden leveyden ja korkeuden mediaanit, jolloin litteätkin
+            laatikot (esim. telineen porttistackit) peittävät vain muutaman
+            solun ja solussa on vain muutama laatikko.
+    """
+
+    __slots__ = ("boxes", "cell", "origin", "columns", "rows", "keys", "ids")
+
+    def __init__(self, boxes, cell_size=None):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.cell, self.origin, self.columns, self.rows = np.ones(2), np.zeros(2), 0, 0
+        if len(self.boxes) == 0:
+            return
+
+        if cell_size is None:
+            cell_size = np.median(self.boxes[:, 2:] - self.boxes[:, :2], axis=0)
+        self.cell = np.maximum(np.broadcast_to(np.asarray(cell_size, dtype=np.float64), (2,)), 1e-6)
+        self.origin = self.boxes[:, :2].min(axis=0)
+        low = self._cells(self.boxes[:, :2])
+        high = self._cells(self.boxes[:, 2:])
+        self.columns, self.rows = int(high[:, 0].max()) + 1, int(high[:, 1].max()) + 1
+
+        # Jokainen laatikko lisätään kaikkiin peittämiinsä soluihin
+        spans = high - low + 1
+        counts = spans[:, 0] * spans[:, 1]
+        ids = np.repeat(np.arange(len(self.boxes)), counts)
+        local = _ranges(np.zeros(len(counts), dtype=np.int64), counts)
+        column = low[ids, 0] + local % spans[ids, 0]
+        row = low[ids, 1] + local // spans[ids, 0]
+        keys = row * self.columns + column
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.ids = keys[order], ids[order]
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cells(self, points):
+        return np.floor((points - self.origin) / self.cell).astype(np.int64)
+
+    def query_points(self, points):
+        """
+        Hakee kaikki (piste, laatikko)-parit, joissa piste on laatikon sisällä reunat mukaan lukien.
+
+        Args:
+            points (array-like): Pisteet muodossa (M, 2).
+
+        Returns:
+            tuple: (pisteiden indeksit, laatikoiden indeksit) NumPy-taulukkoina.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0 or len(self.keys) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        cells = self._cells(points)
+        inside = (
+            (cells[:, 0] >= 0) & (cells[:, 0] < self.columns)
+            & (cells[:, 1] >= 0) & (cells[:, 1] < self.rows)
+        )
+        keys = cells[:, 1] * self.columns + cells[:, 0]
+        start = np.searchsorted(self.keys, keys, side='left')
+        end = np.searchsorted(self.keys, keys, side='right')
+        counts = np.where(inside, end - start, 0)
+
+        point_ids = np.repeat(np.arange(len(points)), counts)
+        box_ids = self.ids[_ranges(start, counts)]
+        boxes, centers = self.boxes[box_ids], points[point_ids]
+        hit = (
+            (boxes[:, 0] <= centers[:, 0]) & (centers[:, 0] <= boxes[:, 2])
+            & (boxes[:, 1] <= centers[:, 1]) & (centers[:, 1] <= boxes[:, 3])
+        )
+        return point_ids[hit], box_ids[hit]
+
+    def query_region(self, x1, y1, x2, y2):
+        """
+        Hakee laatikot, jotka leikkaavat annetun alueen.
+
+        Returns:
+            numpy.ndarray: Laatikoiden indeksit kasvavassa järjestyksessä.
+        """
+        if len(self.keys) == 0:
+            return np.empty(0, dtype=np.int64)
+        (c1, r1), (c2, r2) = self._cells(np.array([[x1, y1], [x2, y2]], dtype=np.float64))
+        c1, c2 = max(c1, 0), min(c2, self.columns - 1)
+        r1, r2 = max(r1, 0), min(r2, self.rows - 1)
+        if c1 > c2 or r1 > r2:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(r1, r2 + 1)
+        start = np.searchsorted(self.keys, rows * self.columns + c1, side='left')
+        end = np.searchsorted(self.keys, rows * self.columns + c2, side='right')
+        candidates = np.unique(self.ids[_ranges(start, end - start)])
+        boxes = self.boxes[candidates]
+        hit = (boxes[:, 0] <= x2) & (x1 <= boxes[:, 2]) & (boxes[:, 1] <= y2) & (y1 <= boxes[:, 3])
+        return candidates[hit]
+
+
+def _nearest_parent(child_centers, parents):
+    """
+    Valitsee kullekin pisteelle sen sisältävän laatikon, jonka keskipiste on lähimpänä.
+
+    Returns:
+        numpy.ndarray: Laatikon indeksi pistettä kohden tai -1.
+    """
+    parent = np.full(len(child_centers), -1, dtype=np.int64)
+    child_ids, parent_ids = GridIndex(parents).query_points(child_centers)
+    if len(child_ids):
+        distance = np.square(
+            box_centers(np.asarray(parents, dtype=np.float64))[parent_ids] - child_centers[child_ids]
+        ).sum(axis=1)
+        order = np.lexsort((distance, child_ids))
+        first = np.unique(child_ids[order], return_index=True)[1]
+        parent[child_ids[order][first]] = parent_ids[order][first]
+    return parent
+
+
+def row_groups(boxes):
+    """
+    Ryhmittelee laatikot riveiksi pystysuuntaisen päällekkäisyyden perusteella.
+
+    Laatikot käydään läpi y1:n mukaan; uusi rivi alkaa, kun laatikko ei ole
+    vähintään ROW_OVERLAP-osuudella korkeudestaan nykyisen rivin kanssa
+    päällekkäin.
+
+    Args:
+        boxes (array-like): Laatikot muodossa (N, 4).
+
+    Returns:
+        numpy.ndarray: Rivin numero laatikkoa kohden (0 = ylin).
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    groups = np.zeros(len(boxes), dtype=np.int64)
+    group, bottom = -1, -np.inf
+    for index in np.argsort(boxes[:, 1], kind='stable').tolist():
+        y1, y2 = boxes[index, 1], boxes[index, 3]
+        if min(bottom, y2) - y1 < ROW_OVERLAP * max(y2 - y1, 1e-6):
+            group += 1
+            bottom = y2
+        else:
+            bottom = max(bottom, y2)
+        groups[index] = group
+    return groups
+
+
+def reading_order(boxes):
+    """
+    Järjestää laatikot riveittäin ylhäältä alas ja rivin sisällä vasemmalta oikealle.
+
+    Returns:
+        numpy.ndarray: Laatikoiden indeksit lukujärjestyksessä.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return np.lexsort((boxes[:, 0], row_groups(boxes)))
+
+
+class SwitchHierarchy:
+    """
+    Kuvan kytkimet, stackit ja portit puurakenteena.
+
+    Kytkimet ovat lukujärjestyksessä; kytkin k on JSON-tulosteen "Switch_{k+1}".
+    Mukana ovat vain kytkimet, joissa on vähintään yksi stack.
+
+    Attributes:
+        stacks (Detections): Stackit tunnistusjärjestyksessä.
+        ports (Detections): Portit tunnistusjärjestyksessä.
+        switches (Detections): Tunnistetut kytkimet tunnistusjärjestyksessä.
+        switch_boxes (numpy.ndarray): Hierarkian kytkinten laatikot (K, 4);
+            virtuaalisen kytkimen laatikko on sen stackien yhdiste.
+        switch_detection (numpy.ndarray): Kytkimen indeksi switches-säiliössä
+            tai -1 virtuaaliselle kytkimelle.
+        stack_switch (numpy.ndarray): Kunkin stackin kytkin (0..K-1).
+        port_stack (numpy.ndarray): Kunkin portin stack tai -1.
+    """
+
+    __slots__ = (
+        "stacks", "ports", "switches", "switch_boxes", "switch_detection",
+        "stack_switch", "port_stack", "_switch_stacks", "_stack_ports", "_indexes",
+    )
+
+    def __init__(self, stacks, ports, switches, switch_boxes, switch_detection, stack_switch,
+                 port_stack):
+        self.stacks, self.ports, self.switches = stacks, ports, switches
+        self.switch_boxes = switch_boxes
+        self.switch_detection = switch_detection
+        self.stack_switch = stack_switch
+        self.port_stack = port_stack
+
+        # Lapset ryhmiteltyinä (CSR): kytkimen stackit lukujärjestyksessä ja
+        # stackin portit tunnistusjärjestyksessä
+        stack_rank = np.empty(len(stacks), dtype=np.int64)
+        stack_rank[reading_order(stacks.xyxy)] = np.arange(len(stacks))
+        order = np.lexsort((stack_rank, stack_switch))
+        self._switch_stacks = (
+            order, np.searchsorted(stack_switch[order], np.arange(len(switch_boxes) + 1))
+        )
+        assigned = np.flatnonzero(port_stack >= 0)
+        order = assigned[np.argsort(port_stack[assigned], kind='stable')]
+        self._stack_ports = (order, np.searchsorted(port_stack[order], np.arange(len(stacks) + 1)))
+        self._indexes = {}
+
+    @classmethod
+    def build(cls, stacks, ports, switches=None):
+        """
+        Rakentaa hierarkian tunnistuksista.
+
+        Args:
+            stacks (Detections | lista): Stackit.
+            ports (Detections | lista): Portit (luokat 0 ja 1).
+            switches (Detections | lista, optional): Tunnistetut kytkimet. Jos
+                None tai tyhjä, kaikki kytkimet ovat virtuaalisia.
+
+        Returns:
+            SwitchHierarchy: Hierarkia.
+        """
+        stacks = Detections.from_boxes(stacks, STACK_CLASS)
+        ports = Detections.from_port_boxes(ports)
+        switches = (
+            Detections.from_boxes(switches, SWITCH_CLASS) if switches is not None else Detections.empty()
+        )
+
+        # Stackit kytkimiin; kytkimettömät stackit ryhmitellään virtuaalisiksi kytkimiksi
+        parent = _nearest_parent(stacks.centers, switches.xyxy)
+        used = np.unique(parent[parent >= 0])
+        orphans = np.flatnonzero(parent < 0)
+        virtual_groups = row_groups(stacks.xyxy[orphans])
+        virtual_boxes = np.array([
+            np.concatenate((
+                stacks.xyxy[orphans[virtual_groups == g], :2].min(axis=0),
+                stacks.xyxy[orphans[virtual_groups == g], 2:].max(axis=0),
+            ))
+            for g in range(int(virtual_groups.max()) + 1 if len(orphans) else 0)
+        ], dtype=np.float64).reshape(-1, 4)
+
+        candidate_boxes = np.concatenate((switches.xyxy[used].astype(np.float64), virtual_boxes))
+        candidate_detection = np.concatenate((used, np.full(len(virtual_boxes), -1, dtype=np.int64)))
+        candidate_of_stack = np.empty(len(stacks), dtype=np.int64)
+        candidate_of_stack[parent >= 0] = np.searchsorted(used, parent[parent >= 0])
+        candidate_of_stack[orphans] = len(used) + virtual_groups
+
+        order = reading_order(candidate_boxes)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        port_stack = _nearest_parent(ports.centers, stacks.xyxy)
+        return cls(
+            stacks, ports, switches,
+            candidate_boxes[order], candidate_detection[order],
+            rank[candidate_of_stack], port_stack,
+        )
+
+    def __len__(self):
+        return len(self.switch_boxes)
+
+    def stacks_of(self, switch):
+        """Palauttaa kytkimen stackien indeksit lukujärjestyksessä."""
+        order, offsets = self._switch_stacks
+        return order[offsets[switch]:offsets[switch + 1]]
+
+    def ports_of(self, stack):
+        """Palauttaa stackin porttien indeksit tunnistusjärjestyksessä."""
+        order, offsets = self._stack_ports
+        return order[offsets[stack]:offsets[stack + 1]]
+
+    def assigned_ports(self):
+        """Palauttaa totuusarvomaskin porteista, jotka kuuluvat johonkin stackiin."""
+        return self.port_stack >= 0
+
+    def _index(self, level):
+        if level not in self._indexes:
+            boxes = {"switches": self.switch_boxes, "stacks": self.stacks.xyxy, "ports": self.ports.xyxy}
+            self._indexes[level] = GridIndex(boxes[level])
+        return self._indexes[level]
+
+    def query(self, x1, y1, x2, y2, level="ports"):
+        """
+        Hakee alueen leikkaavat kohteet yhdeltä tasolta.
+
+        Args:
+            x1, y1, x2, y2 (float): Alue kuvan pikseleinä.
+            level (str, optional): 'switches', 'stacks' tai 'ports'. Oletus 'ports'.
+
+        Returns:
+            numpy.ndarray: Kohteiden indeksit.
+        """
+        return self._index(level).query_region(x1, y1, x2, y2)
+
+    def locate(self, x, y):
+        """
+        Hakee pisteen kohdalla olevan kytkimen, stackin ja portin.
+
+        Returns:
+            dict: {'switch', 'stack', 'port'} indekseinä tai None.
+        """
+        point = np.array([[x, y]], dtype=np.float64)
+        found = {}
+        for key, level in (("switch", "switches"), ("stack", "stacks"), ("port", "ports")):
+            hits = self._index(level).query_points(point)[1]
+            found[key] = int(hits.min()) if len(hits) else None
+        if found["port"] is not None and self.port_stack[found["port"]] >= 0:
+            found["stack"] = int(self.port_stack[found["port"]])
+        if found["stack"] is not None:
+            found["switch"] = int(self.stack_switch[found["stack"]])
+        return found
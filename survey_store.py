@@ -0,0 +1,355 @@
+"""Tämä moduuli sisältää SQLite-pohjaisen kartoitusvaraston tunnistustuloksille.
+
+Jokainen predict-kutsu tuottaa kertakäyttöisen JSON-merkkijonon. Kartoituksen
+aikana halutaan kuitenkin kysyä esimerkiksi "kaikki vapaat portit 3. kerroksen
+kytkimissä" tai "Switch_2:n porttien käyttöhistoria" lukematta tuhansia
+JSON-tiedostoja uudelleen. Varasto tallentaa generate_switch_json-tulosteet
+normalisoituihin, indeksoituihin tauluihin:
+
+    images    kuva: polku, kohde (site), sijainti (esim. kerros), kartoitus, aika, koko
+    switches  kytkin kuvassa ('Switch_1', ...)
+    stacks    porttistack kytkimessä ('Stack_1', ...)
+    ports     portti: numero, rivi (0 = ylempi, 1 = alempi) ja tila ('Cable' | 'empty')
+
+Näkymät port_details, switch_usage ja location_usage kokoavat tiedot kyselyitä
+varten. Kytkinkohtaiset porttimäärät tallennetaan switches-tauluun lisäyksen
+yhteydessä, joten koosteet eivät käy läpi ports-taulua. Tulokset lisätään
+erissä yhdessä transaktiossa: rivitunnisteet varataan etukäteen, jolloin
+kaikki taulut voidaan kirjoittaa executemany-kutsuilla.
+
+Sisältää:
+- SCHEMA: Taulut, indeksit ja näkymät.
+- SurveyStore: Varasto (lisäys, kyselyt ja koosteet).
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from serializers import from_port_table, iter_records
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    site TEXT,
+    location TEXT,
+    survey TEXT,
+    captured_at REAL NOT NULL,
+    ingested_at REAL NOT NULL,
+    width INTEGER,
+    height INTEGER
+);
+CREATE TABLE IF NOT EXISTS switches (
+    id INTEGER PRIMARY KEY,
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    ports INTEGER NOT NULL DEFAULT 0,
+    cabled INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS stacks (
+    id INTEGER PRIMARY KEY,
+    switch_id INTEGER NOT NULL REFERENCES switches(id) ON DELETE CASCADE,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ports (
+    id INTEGER PRIMARY KEY,
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    switch_id INTEGER NOT NULL REFERENCES switches(id) ON DELETE CASCADE,
+    stack_id INTEGER NOT NULL REFERENCES stacks(id) ON DELETE CASCADE,
+    port_number INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('Cable', 'empty'))
+);
+
+CREATE INDEX IF NOT EXISTS images_location ON images(site, location, captured_at);
+CREATE INDEX IF NOT EXISTS images_survey ON images(survey);
+CREATE INDEX IF NOT EXISTS images_path ON images(path, captured_at);
+CREATE INDEX IF NOT EXISTS switches_image ON switches(image_id);
+CREATE INDEX IF NOT EXISTS switches_name ON switches(name, image_id);
+CREATE INDEX IF NOT EXISTS stacks_switch ON stacks(switch_id);
+CREATE INDEX IF NOT EXISTS ports_image_status ON ports(image_id, status);
+CREATE INDEX IF NOT EXISTS ports_switch_number ON ports(switch_id, port_number);
+
+CREATE VIEW IF NOT EXISTS port_details AS
+SELECT ports.id AS port_id, images.id AS image_id, images.path, images.site, images.location,
+       images.survey, images.captured_at, switches.name AS switch, stacks.name AS stack,
+       ports.port_number, ports.row, ports.status
+FROM ports
+JOIN images ON images.id = ports.image_id
+JOIN switches ON switches.id = ports.switch_id
+JOIN stacks ON stacks.id = ports.stack_id;
+
+CREATE VIEW IF NOT EXISTS switch_usage AS
+SELECT switches.id AS switch_row, images.id AS image_id, images.path, images.site,
+       images.location, images.survey, images.captured_at, switches.name AS switch,
+       switches.ports, switches.cabled, switches.ports - switches.cabled AS free
+FROM switches
+JOIN images ON images.id = switches.image_id;
+
+CREATE VIEW IF NOT EXISTS location_usage AS
+SELECT images.site, images.location,
+       COUNT(DISTINCT images.id) AS images,
+       COALESCE(SUM(switches.ports), 0) AS ports,
+       COALESCE(SUM(switches.cabled), 0) AS cabled,
+       COALESCE(SUM(switches.ports - switches.cabled), 0) AS free
+FROM images
+LEFT JOIN switches ON switches.image_id = images.id
+GROUP BY images.site, images.location;
+"""
+
+
+def _where(filters):
+    """Muodostaa WHERE-ehdon sarakkeista, joiden arvo ei ole None."""
+    clauses = [f"{column} = ?" for column, value in filters.items() if value is not None]
+    params = [value for value in filters.values() if value is not None]
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class SurveyStore:
+    """
+    Kartoitusvarasto yhdessä SQLite-tiedostossa.
+
+    Käyttö:
+        with SurveyStore("survey.db") as store:
+            store.ingest_many(records, site="HQ", location="floor 3")
+            store.free_ports(location="floor 3")
+    """
+
+    def __init__(self, path="survey.db"):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            # WAL sallii lukijat kirjoituksen aikana; NORMAL riittää WAL-tilassa
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _next_id(self, table):
+        return self.connection.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+    def ingest(self, switch_json, path, **fields):
+        """
+        Lisää yhden kuvan tuloksen.
+
+        Args:
+            switch_json (dict | str): generate_switch_json-tuloste (tai sen JSON-merkkijono).
+            path (str): Kuvan polku tai tunniste.
+            **fields: site, location, survey, captured_at, width, height.
+
+        Returns:
+            int: Kuvan rivitunniste.
+        """
+        if isinstance(switch_json, str):
+            switch_json = json.loads(switch_json)
+        return self.ingest_many([{"image": path, **fields, **switch_json}])[0]
+
+    def ingest_many(self, records, site=None, location=None, survey=None):
+        """
+        Lisää tulokset yhdessä transaktiossa.
+
+        Args:
+            records (iterable): batch_predict-muotoiset tietueet
+                {'image', 'switches', valinnaisesti 'width', 'height', 'site',
+                'location', 'survey', 'captured_at'}. Virhetietueet ohitetaan.
+            site, location, survey (str, optional): Oletusarvot tietueille,
+                joilla ei ole omaa arvoa.
+
+        Returns:
+            list: Lisättyjen kuvien rivitunnisteet.
+        """
+        now = time.time()
+        image_rows, switch_rows, stack_rows, port_rows = [], [], [], []
+        with self.connection:
+            # BEGIN IMMEDIATE varaa kirjoituslukon, joten etukäteen varatut
+            # tunnisteet eivät voi törmätä toisen kirjoittajan kanssa
+            self.connection.execute("BEGIN IMMEDIATE")
+            image_id, switch_id, stack_id = (
+                self._next_id("images"), self._next_id("switches"), self._next_id("stacks")
+            )
+            for record in records:
+                if "error" in record:
+                    continue
+                path = record["image"]
+                captured_at = record.get("captured_at")
+                if captured_at is None:
+                    captured_at = os.path.getmtime(path) if os.path.exists(path) else now
+                image_rows.append((
+                    image_id, path, record.get("site", site), record.get("location", location),
+                    record.get("survey", survey), captured_at, now,
+                    record.get("width"), record.get("height"),
+                ))
+                for switch in record.get("switches", []):
+                    first_port = len(port_rows)
+                    for stack in switch["lan_port_stacks"]:
+                        stack_rows.append((stack_id, switch_id, stack["stack_id"]))
+                        for row, ports in enumerate(stack["lan_ports"]):
+                            port_rows.extend(
+                                (image_id, switch_id, stack_id, port["port_number"], row, port["status"])
+                                for port in ports
+                            )
+                        stack_id += 1
+                    cabled = sum(1 for port in port_rows[first_port:] if port[5] == "Cable")
+                    switch_rows.append(
+                        (switch_id, image_id, switch["switch_id"], len(port_rows) - first_port, cabled)
+                    )
+                    switch_id += 1
+                image_id += 1
+
+            self.connection.executemany(
+                "INSERT INTO images (id, path, site, location, survey, captured_at, ingested_at,"
+                " width, height) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", image_rows,
+            )
+            self.connection.executemany(
+                "INSERT INTO switches (id, image_id, name, ports, cabled) VALUES (?, ?, ?, ?, ?)", switch_rows
+            )
+            self.connection.executemany(
+                "INSERT INTO stacks (id, switch_id, name) VALUES (?, ?, ?)", stack_rows
+            )
+            self.connection.executemany(
+                "INSERT INTO ports (image_id, switch_id, stack_id, port_number, row, status)"
+                " VALUES (?, ?, ?, ?, ?, ?)", port_rows,
+            )
+        return [row[0] for row in image_rows]
+
+    def ingest_jsonl(self, path, batch_size=1000, output_format="compact", **defaults):
+        """
+        Lisää batch_predict.py:n tulostiedoston erissä.
+
+        Args:
+            output_format (str, optional): Tiedoston muoto (batch_predict.py
+                --output-format). Oletus 'compact' (JSONL).
+
+        Returns:
+            int: Lisättyjen kuvien määrä.
+        """
+        count, batch = 0, []
+        for record in iter_records(path, output_format):
+            batch.append(from_port_table(record) if "table" in record else record)
+            if len(batch) >= batch_size:
+                count += len(self.ingest_many(batch, **defaults))
+                batch = []
+        if batch:
+            count += len(self.ingest_many(batch, **defaults))
+        return count
+
+    def query(self, sql, params=()):
+        """Suorittaa mielivaltaisen kyselyn ja palauttaa rivit sanakirjoina."""
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def ports(self, site=None, location=None, survey=None, switch=None, status=None, path=None):
+        """
+        Hakee porttien tiedot suodattimilla (port_details-näkymä).
+
+        Returns:
+            list: Rivit sanakirjoina.
+        """
+        where, params = _where({
+            "site": site, "location": location, "survey": survey,
+            "switch": switch, "status": status, "path": path,
+        })
+        return self.query(
+            f"SELECT * FROM port_details{where} ORDER BY image_id, switch, stack, port_number", params
+        )
+
+    def free_ports(self, **filters):
+        """Hakee vapaat portit; suodattimet kuten ports-metodissa."""
+        return self.ports(status="empty", **filters)
+
+    def port_history(self, switch, port_number=None, site=None, location=None, path=None):
+        """
+        Hakee kytkimen (valinnaisesti yhden portin) tilat kaikista kartoituksista aikajärjestyksessä.
+
+        Returns:
+            list: Rivit sanakirjoina.
+        """
+        where, params = _where({
+            "switch": switch, "port_number": port_number,
+            "site": site, "location": location, "path": path,
+        })
+        return self.query(
+            f"SELECT captured_at, survey, path, site, location, switch, stack, port_number, status"
+            f" FROM port_details{where} ORDER BY captured_at, image_id, port_number", params,
+        )
+
+    def switch_usage(self, site=None, location=None, survey=None, switch=None):
+        """Palauttaa kytkinkohtaiset porttimäärät (switch_usage-näkymä)."""
+        where, params = _where({"site": site, "location": location, "survey": survey, "switch": switch})
+        return self.query(f"SELECT * FROM switch_usage{where} ORDER BY captured_at, image_id, switch", params)
+
+    def location_usage(self, site=None):
+        """Palauttaa kohde- ja sijaintikohtaiset porttimäärät (location_usage-näkymä)."""
+        where, params = _where({"site": site})
+        return self.query(f"SELECT * FROM location_usage{where} ORDER BY site, location", params)
+
+    def delete_image(self, image_id):
+        """Poistaa kuvan ja sen kytkimet, stackit ja portit."""
+        with self.connection:
+            self.connection.execute("DELETE FROM images WHERE id = ?", (image_id,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PortVision-kartoitusvarasto.")
+    parser.add_argument("--db", default="survey.db", help="SQLite-tiedosto")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Lisää batch_predict.py:n JSONL-tuloste")
+    ingest.add_argument("jsonl")
+    ingest.add_argument("--site", default=None)
+    ingest.add_argument("--location", default=None)
+    ingest.add_argument("--survey", default=None)
+    ingest.add_argument(
+        "--format", default="compact", choices=["compact", "orjson", "table", "msgpack"],
+        help="batch_predict.py:n --output-format",
+    )
+
+    for name, help_text in (
+        ("free", "Vapaat portit"),
+        ("usage", "Kytkinkohtaiset porttimäärät"),
+        ("history", "Kytkimen porttien historia"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--site", default=None)
+        command.add_argument("--location", default=None)
+        command.add_argument("--switch", default=None, required=name == "history")
+        if name == "history":
+            command.add_argument("--port", type=int, default=None)
+    commands.add_parser("summary", help="Kohde- ja sijaintikohtaiset koosteet")
+    args = parser.parse_args()
+
+    with SurveyStore(args.db) as store:
+        if args.command == "ingest":
+            start = time.perf_counter()
+            count = store.ingest_jsonl(
+                args.jsonl, output_format=args.format,
+                site=args.site, location=args.location, survey=args.survey,
+            )
+            print(f"Lisätty {count} kuvaa ajassa {time.perf_counter() - start:.2f} s.")
+            return
+        if args.command == "free":
+            rows = store.free_ports(site=args.site, location=args.location, switch=args.switch)
+        elif args.command == "usage":
+            rows = store.switch_usage(site=args.site, location=args.location, switch=args.switch)
+        elif args.command == "history":
+            rows = store.port_history(args.switch, args.port, site=args.site, location=args.location)
+        else:
+            rows = store.location_usage()
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
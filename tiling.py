@@ -0,0 +1,207 @@
+"""Tämä moduuli sisältää viipaloidun (tiled) inferenssin suuriresoluutioisille kuville.
+
+Koko telineen 6000×4000-kuva pienennetään tavallisessa ajossa mallin
+syötekokoon (1216), jolloin yksittäiset RJ45-portit ovat vain muutaman
+pikselin kokoisia. Viipaloidussa ajossa kuva jaetaan limittäisiin, mallin
+syötekoon kokoisiin paloihin, jotka ajetaan mallin läpi erissä. Palojen
+tunnistukset siirretään takaisin koko kuvan koordinaatteihin ja yhdistetään
+luokkakohtaisesti. Suuret kohteet (kytkimet ja porttipinot) leikkautuvat
+palojen rajoilla, joten ne otetaan oletuksena koko kuvan ajosta.
+
+Sisältää:
+- make_tiles: Laskee limittäisten palojen sijainnit.
+- merge_detections: Yhdistää päällekkäiset tunnistukset (NMS tai box fusion).
+- sliced_predict: Ajaa viipaloidun inferenssin ja palauttaa yhdistetyn tuloksen.
+"""
+
+import numpy as np
+
+from backends import BackendResult
+from helpers import non_max_suppression
+from image_buffer import RGB, as_array
+
+# Luokat, jotka otetaan oletuksena koko kuvan ajosta: LAN-porttipino ja kytkin
+FULL_IMAGE_CLASSES = (2, 3)
+
+
+def _tile_starts(length, tile_size, stride):
+    """Palauttaa palojen alkukohdat yhdellä akselilla; viimeinen pala kohdistetaan reunaan."""
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def make_tiles(width, height, tile_size=1216, overlap=0.2):
+    """
+    Laskee limittäisten palojen sijainnit kuvan kattamiseksi.
+
+    Args:
+        width (int): Kuvan leveys.
+        height (int): Kuvan korkeus.
+        tile_size (int, optional): Palan sivun pituus. Oletus 1216.
+        overlap (float, optional): Palojen limitys osuutena palan koosta. Oletus 0.2.
+
+    Returns:
+        list: Palat muodossa (x1, y1, x2, y2).
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    xs = _tile_starts(width, tile_size, stride)
+    ys = _tile_starts(height, tile_size, stride)
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in ys
+        for x in xs
+    ]
+
+
+def _touches_inner_edge(boxes, tile, width, height, margin):
+    """
+    Tarkistaa, koskettaako laatikko palan sisäreunaa (reunaa, joka ei ole kuvan reuna).
+
+    Tällaiset laatikot ovat todennäköisesti leikkautuneita, ja limityksen ansiosta
+    viereinen pala näkee saman kohteen kokonaisena.
+    """
+    x1, y1, x2, y2 = tile
+    touches = np.zeros(len(boxes), dtype=bool)
+    if x1 > 0:
+        touches |= boxes[:, 0] <= x1 + margin
+    if y1 > 0:
+        touches |= boxes[:, 1] <= y1 + margin
+    if x2 < width:
+        touches |= boxes[:, 2] >= x2 - margin
+    if y2 < height:
+        touches |= boxes[:, 3] >= y2 - margin
+    return touches
+
+
+def merge_detections(boxes, scores, classes, iou_threshold=0.5, mode="nms"):
+    """
+    Yhdistää palojen päällekkäiset tunnistukset luokkakohtaisesti.
+
+    Args:
+        boxes (numpy.ndarray): Laatikot muodossa (N, 4).
+        scores (numpy.ndarray): Luottamusarvot muodossa (N,).
+        classes (numpy.ndarray): Luokkien ID:t muodossa (N,).
+        iou_threshold (float, optional): Yhdistämisen IoU-kynnys. Oletus 0.5.
+        mode (str, optional): 'nms' säilyttää parhaan laatikon, 'fusion' laskee
+            ryhmän luottamuksella painotetun keskiarvolaatikon. Oletus 'nms'.
+
+    Returns:
+        tuple: (boxes, scores, classes) yhdistettyinä.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    classes = np.asarray(classes).reshape(-1)
+    if mode == "nms":
+        keep = non_max_suppression(boxes, scores, classes, iou_threshold, max_det=len(boxes))
+        return boxes[keep], scores[keep], classes[keep]
+    if mode != "fusion":
+        raise ValueError(f"Tuntematon yhdistämistapa '{mode}'. Vaihtoehdot: nms, fusion")
+
+    # Box fusion: jokainen säilytetty laatikko korvataan ryhmänsä painotetulla keskiarvolla
+    order = np.argsort(-scores, kind='stable')
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    fused_boxes, fused_scores, fused_classes = [], [], []
+    while order.size > 0:
+        i = order[0]
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        in_group = (iou > iou_threshold) & (classes[rest] == classes[i])
+        group = np.concatenate(([i], rest[in_group]))
+        weights = scores[group]
+        fused_boxes.append((boxes[group] * weights[:, None]).sum(axis=0) / weights.sum())
+        fused_scores.append(weights.max())
+        fused_classes.append(classes[i])
+        order = rest[~in_group]
+    return (
+        np.asarray(fused_boxes, dtype=np.float32).reshape(-1, 4),
+        np.asarray(fused_scores, dtype=np.float32),
+        np.asarray(fused_classes),
+    )
+
+
+def sliced_predict(
+    backend,
+    image,
+    tile_size=1216,
+    overlap=0.2,
+    batch_size=4,
+    iou=0.4,
+    conf=0.4,
+    merge_iou=0.5,
+    merge_mode="nms",
+    full_image_classes=FULL_IMAGE_CLASSES,
+    edge_margin=2,
+    color_order=RGB,
+):
+    """
+    Ajaa viipaloidun inferenssin yhdelle kuvalle.
+
+    Args:
+        backend: Inferenssitausta (backends.get_backend), kutsutaan muodossa
+            backend(images, iou=..., conf=..., color_order=...).
+        image (numpy.ndarray | PIL.Image): Syötekuva (H, W, 3).
+        tile_size (int, optional): Palan koko; oletuksena mallin syötekoko 1216.
+        overlap (float, optional): Palojen limitys osuutena. Oletus 0.2.
+        batch_size (int, optional): Kerralla mallille annettavien palojen määrä. Oletus 4.
+        iou (float, optional): Mallin NMS:n IoU-kynnys. Oletus 0.4.
+        conf (float, optional): Luottamuskynnys. Oletus 0.4.
+        merge_iou (float, optional): Palojen välisen yhdistämisen IoU-kynnys. Oletus 0.5.
+        merge_mode (str, optional): 'nms' tai 'fusion'. Oletus 'nms'.
+        full_image_classes (tuple, optional): Luokat, jotka otetaan koko kuvan
+            ajosta palojen sijaan. Tyhjä = ei koko kuvan ajoa. Oletus (2, 3).
+        edge_margin (int, optional): Etäisyys (px), jolla palan sisäreunaa
+            koskettavat laatikot hylätään leikkautuneina. Oletus 2.
+        color_order (str, optional): Kuvan värijärjestys, välitetään taustalle
+            (image_buffer.RGB tai image_buffer.BGR). Oletus RGB.
+
+    Returns:
+        BackendResult: Yhdistetyt tunnistukset koko kuvan koordinaateissa.
+    """
+    image = as_array(image, color_order)
+    height, width = image.shape[:2]
+    tiles = make_tiles(width, height, tile_size, overlap)
+
+    all_boxes, all_scores, all_classes = [], [], []
+
+    # Palat ovat näkymiä alkuperäiseen kuvaan, joten niitä ei kopioida
+    for start in range(0, len(tiles), batch_size):
+        batch_tiles = tiles[start:start + batch_size]
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in batch_tiles]
+        results = backend(crops, iou=iou, conf=conf, color_order=color_order)
+        for tile, result in zip(batch_tiles, results):
+            boxes = result.boxes.xyxy.cpu().numpy().astype(np.float32)
+            scores = result.boxes.conf.cpu().numpy()
+            classes = result.boxes.cls.cpu().numpy()
+            boxes[:, [0, 2]] += tile[0]
+            boxes[:, [1, 3]] += tile[1]
+            keep = ~_touches_inner_edge(boxes, tile, width, height, edge_margin)
+            if full_image_classes and len(tiles) > 1:
+                keep &= ~np.isin(classes, full_image_classes)
+            all_boxes.append(boxes[keep])
+            all_scores.append(scores[keep])
+            all_classes.append(classes[keep])
+
+    # Suuret kohteet koko kuvan ajosta (vain jos kuva jaettiin useaan palaan)
+    if full_image_classes and len(tiles) > 1:
+        result = backend(image, iou=iou, conf=conf, color_order=color_order)[0]
+        classes = result.boxes.cls.cpu().numpy()
+        large = np.isin(classes, full_image_classes)
+        all_boxes.append(result.boxes.xyxy.cpu().numpy()[large])
+        all_scores.append(result.boxes.conf.cpu().numpy()[large])
+        all_classes.append(classes[large])
+
+    boxes = np.concatenate(all_boxes) if all_boxes else np.empty((0, 4), np.float32)
+    scores = np.concatenate(all_scores) if all_scores else np.empty(0, np.float32)
+    classes = np.concatenate(all_classes) if all_classes else np.empty(0, np.float32)
+
+    if len(tiles) > 1:
+        boxes, scores, classes = merge_detections(boxes, scores, classes, merge_iou, merge_mode)
+    return BackendResult(boxes, scores, classes, (height, width))
@@ -0,0 +1,218 @@
+"""Tämä moduuli seuraa kytkimiä, porttipinoja ja portteja videon ruudusta toiseen.
+
+Seuranta perustuu bounding boxien päällekkäisyyteen (IoU). Kunkin ruudun
+tunnistukset yhdistetään olemassa oleviin jälkiin ahneesti suurimmasta
+IoU:sta alkaen. Portit (Cable/empty) seurataan samana ryhmänä, jotta kaapelin
+kytkeminen ei luo uutta jälkeä, ja portin tila valitaan viimeisimpien
+havaintojen enemmistön perusteella, jotta yksittäiset virhetunnistukset eivät
+muuta asettelua.
+
+Sisältää:
+- iou_matrix: Laskee kahden laatikkojoukon IoU-matriisin.
+- Track: Yksittäinen seurattava kohde.
+- LayoutTracker: Seuraa kaikkia luokkia ja tuottaa vakaan asettelun.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Seurantaryhmät: portit (0 = Cable, 1 = empty), porttipinot ja kytkimet
+PORT_CLASSES = (0, 1)
+STACK_CLASS = 2
+SWITCH_CLASS = 3
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Laskee IoU-arvot kaikille laatikkopareille.
+
+    Args:
+        boxes_a (array-like): Laatikot muodossa (N, 4).
+        boxes_b (array-like): Laatikot muodossa (M, 4).
+
+    Returns:
+        numpy.ndarray: IoU-matriisi muodossa (N, M).
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def greedy_match(iou, threshold):
+    """
+    Yhdistää rivit ja sarakkeet ahneesti suurimmasta IoU:sta alkaen.
+
+    Args:
+        iou (numpy.ndarray): IoU-matriisi (jäljet × tunnistukset).
+        threshold (float): Pienin hyväksyttävä IoU.
+
+    Returns:
+        list: Parit (rivi, sarake).
+    """
+    if iou.size == 0:
+        return []
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_rows, used_cols = set(), set()
+    matches = []
+    for k in order:
+        r, c = int(rows[k]), int(cols[k])
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matches.append((r, c))
+    return matches
+
+
+@dataclass
+class Track:
+    """
+    Yksittäinen seurattava kohde.
+
+    Attributes:
+        track_id (int): Jäljen yksilöivä tunniste.
+        group (str): Seurantaryhmä ('port', 'stack' tai 'switch').
+        box (numpy.ndarray): Viimeisin bounding box (x1, y1, x2, y2).
+        conf (float): Viimeisin luottamusarvo.
+        hits (int): Havaintojen määrä.
+        misses (int): Peräkkäiset ruudut ilman havaintoa.
+        classes (deque): Viimeisimmät luokkatunnisteet tilan äänestystä varten.
+    """
+    track_id: int
+    group: str
+    box: np.ndarray
+    conf: float
+    hits: int = 1
+    misses: int = 0
+    classes: deque = field(default_factory=deque)
+
+    @property
+    def class_id(self):
+        """Palauttaa viimeisimpien havaintojen yleisimmän luokan."""
+        if not self.classes:
+            return None
+        values, counts = np.unique(np.fromiter(self.classes, dtype=np.int64), return_counts=True)
+        return int(values[np.argmax(counts)])
+
+
+class LayoutTracker:
+    """
+    Seuraa kytkimiä, porttipinoja ja portteja ruudusta toiseen.
+
+    Args:
+        iou_threshold (float, optional): Pienin IoU jäljen jatkamiseen. Oletus 0.3.
+        min_hits (int, optional): Havainnot, jotka tarvitaan jäljen vahvistamiseen. Oletus 3.
+        max_misses (int, optional): Ruudut ilman havaintoa ennen jäljen poistoa. Oletus 10.
+        status_window (int, optional): Portin tilan äänestysikkunan pituus. Oletus 5.
+    """
+
+    GROUPS = {
+        "port": PORT_CLASSES,
+        "stack": (STACK_CLASS,),
+        "switch": (SWITCH_CLASS,),
+    }
+
+    def __init__(self, iou_threshold=0.3, min_hits=3, max_misses=10, status_window=5):
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.status_window = status_window
+        self.tracks = {group: [] for group in self.GROUPS}
+        self._next_id = 1
+
+    def update(self, boxes, confs, classes):
+        """
+        Päivittää jäljet yhden ruudun tunnistuksilla.
+
+        Args:
+            boxes (numpy.ndarray): Bounding boxit muodossa (N, 4).
+            confs (numpy.ndarray): Luottamusarvot muodossa (N,).
+            classes (numpy.ndarray): Luokkien ID:t muodossa (N,).
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        confs = np.asarray(confs, dtype=np.float32).reshape(-1)
+        classes = np.asarray(classes).reshape(-1).astype(np.int64)
+
+        for group, class_ids in self.GROUPS.items():
+            mask = np.isin(classes, class_ids)
+            self._update_group(group, boxes[mask], confs[mask], classes[mask])
+
+    def _update_group(self, group, boxes, confs, classes):
+        tracks = self.tracks[group]
+        iou = iou_matrix([t.box for t in tracks], boxes)
+        matches = greedy_match(iou, self.iou_threshold)
+
+        matched_tracks = set()
+        matched_dets = set()
+        for t, d in matches:
+            track = tracks[t]
+            track.box = boxes[d]
+            track.conf = float(confs[d])
+            track.hits += 1
+            track.misses = 0
+            track.classes.append(int(classes[d]))
+            matched_tracks.add(t)
+            matched_dets.add(d)
+
+        # Kasvata havaitsematta jääneiden jälkien laskuria ja poista vanhentuneet
+        for t, track in enumerate(tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        tracks[:] = [t for t in tracks if t.misses <= self.max_misses]
+
+        # Luo uudet jäljet yhdistämättömille tunnistuksille
+        for d in range(len(boxes)):
+            if d in matched_dets:
+                continue
+            track = Track(
+                track_id=self._next_id,
+                group=group,
+                box=boxes[d],
+                conf=float(confs[d]),
+                classes=deque([int(classes[d])], maxlen=self.status_window),
+            )
+            self._next_id += 1
+            tracks.append(track)
+
+    def confirmed(self, group):
+        """Palauttaa ryhmän vahvistetut jäljet."""
+        return [t for t in self.tracks[group] if t.hits >= self.min_hits]
+
+    def layout_boxes(self):
+        """
+        Palauttaa vahvistetut jäljet samassa muodossa kuin bounding_boxes.extract_boxes.
+
+        Returns:
+            tuple: (port_boxes, lan_port_stack_boxes, switch_boxes)
+        """
+        port_boxes = [
+            (t.box, t.conf, 'Cable' if t.class_id == 0 else 'empty')
+            for t in self.confirmed("port")
+        ]
+        lan_port_stack_boxes = [(t.box, t.conf) for t in self.confirmed("stack")]
+        switch_boxes = [(t.box, t.conf) for t in self.confirmed("switch")]
+        return port_boxes, lan_port_stack_boxes, switch_boxes
+
+    def signature(self):
+        """
+        Palauttaa asettelun tunnisteen: vahvistetut jäljet ja porttien tilat.
+
+        Tunniste muuttuu vain, kun kohteita ilmestyy, katoaa tai portin tila
+        vaihtuu, joten sen avulla JSON rakennetaan uudelleen vain tarvittaessa.
+        """
+        return (
+            frozenset((t.track_id, t.class_id) for t in self.confirmed("port")),
+            frozenset(t.track_id for t in self.confirmed("stack")),
+            frozenset(t.track_id for t in self.confirmed("switch")),
+        )
@@ -0,0 +1,341 @@
+"""Tämä skripti ajaa tunnistuksen videotiedostolle tai paikalliselle videovirralle.
+
+Ruudut puretaan erillisessä säikeessä. Jos tunnistus ei pysy videon
+ruutunopeuden tahdissa, purkusäie ohittaa ruutuja mukautuvasti: tiedostoista
+ohitetaan ruutuja tunnistuksen keston mukaan ilman purkua (cv2.grab), ja
+suorasta virrasta säilytetään vain uusin ruutu. Kytkimiä, porttipinoja ja
+portteja seurataan ruudusta toiseen (tracking.LayoutTracker), ja
+generate_switch_json ajetaan vain, kun seurattu asettelu muuttuu.
+
+Valinnalla --activity porttien linkkivalot analysoidaan ruuduista
+(link_activity.LinkActivityMonitor), ja jokainen portti saa tilan rinnalle
+kentän "activity". Asettelu rakennetaan uudelleen myös, kun jonkin portin
+aktiivisuustila (vilkkuu, palaa, sammunut) vaihtuu.
+
+Tulosteena syntyy koko tallenteen yhdistetty JSON, jossa on asettelun
+muutokset ruutuväleineen sekä ruutukohtaiset viivetilastot.
+
+Esimerkki:
+    python video_stream.py kierros.mp4 -o kierros.json --output-video kierros_annotoitu.mp4
+    python video_stream.py 0 -o kamera.json  # Paikallinen kamera
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from bounding_boxes import draw_hierarchy
+from json_generator import generate_switch_json
+from link_activity import LinkActivityMonitor
+from model_registry import get_model
+from renderer import CLASS_STYLES_BGR
+from spatial_index import SwitchHierarchy
+from tracking import LayoutTracker
+
+# Jonon lopetusmerkki
+_DONE = object()
+
+
+def open_capture(source):
+    """
+    Avaa videolähteen. Pelkkä numero tulkitaan kameran indeksiksi.
+
+    Returns:
+        tuple: (cv2.VideoCapture, is_live)
+    """
+    if isinstance(source, str) and source.isdigit():
+        return cv2.VideoCapture(int(source)), True
+    is_live = isinstance(source, str) and "://" in source
+    return cv2.VideoCapture(source), is_live
+
+
+class FrameReader(threading.Thread):
+    """
+    Purkaa ruutuja taustasäikeessä ja ohittaa ruutuja, kun tunnistus jää jälkeen.
+
+    Args:
+        capture (cv2.VideoCapture): Avattu videolähde.
+        is_live (bool): Onko lähde suora virta (uusin ruutu korvaa vanhan).
+        queue_size (int, optional): Purettujen ruutujen jonon koko. Oletus 2.
+    """
+
+    def __init__(self, capture, is_live, queue_size=2):
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.is_live = is_live
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stride = 1          # Kuluttaja päivittää: joka stride:s ruutu puretaan
+        self.dropped = 0
+        self.total = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        index = -1
+        while not self._stop_event.is_set():
+            # Ohita ruudut purkamatta niitä, jos tunnistus on jäljessä
+            skipped = False
+            for _ in range(self.stride - 1):
+                if not self.capture.grab():
+                    skipped = True
+                    break
+                index += 1
+                self.total += 1
+                self.dropped += 1
+            if skipped:
+                break
+
+            ok, frame = self.capture.read()
+            if not ok:
+                break
+            index += 1
+            self.total += 1
+            timestamp_ms = self.capture.get(cv2.CAP_PROP_POS_MSEC)
+            item = (index, timestamp_ms, frame)
+
+            if self.is_live:
+                # Suora virta: pudota vanhin ruutu, jos kuluttaja ei ehdi
+                while True:
+                    try:
+                        self.frames.put_nowait(item)
+                        break
+                    except queue.Full:
+                        try:
+                            self.frames.get_nowait()
+                            self.dropped += 1
+                        except queue.Empty:
+                            pass
+            else:
+                self.frames.put(item)
+        self.frames.put(_DONE)
+
+
+def latency_summary(latencies_ms):
+    """Palauttaa viiveiden keskiarvon ja persentiilit millisekunteina."""
+    if not latencies_ms:
+        return {}
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def process_stream(
+    source,
+    weights='best.pt',
+    device=None,
+    iou=0.4,
+    conf=0.4,
+    output_video=None,
+    frame_stats_path=None,
+    tracker_kwargs=None,
+    realtime=True,
+    activity=False,
+    activity_kwargs=None,
+):
+    """
+    Ajaa tunnistuksen ja seurannan koko videolle.
+
+    Args:
+        source (str): Videotiedosto, virran URL tai kameran indeksi.
+        weights (str, optional): Mallin painotiedosto. Oletus 'best.pt'.
+        device (str, optional): Laite. Oletus valitaan automaattisesti.
+        iou (float, optional): NMS:n IoU-kynnys. Oletus 0.4.
+        conf (float, optional): Luottamuskynnys. Oletus 0.4.
+        output_video (str, optional): Annotoidun videon polku. Oletus None.
+        frame_stats_path (str, optional): JSONL-tiedosto ruutukohtaisille tilastoille.
+        tracker_kwargs (dict, optional): LayoutTrackerin parametrit.
+        realtime (bool, optional): Ohitetaanko tiedostosta ruutuja, jotta käsittely
+            pysyy videon ruutunopeuden tahdissa. Oletus True.
+        activity (bool, optional): Analysoidaanko porttien linkkivalot. Oletus False.
+        activity_kwargs (dict, optional): LinkActivityMonitorin parametrit.
+
+    Returns:
+        dict: Tallenteen yhdistetty tulos.
+    """
+    model = get_model(weights, device)
+    capture, is_live = open_capture(source)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Videolähdettä {source} ei voitu avata.")
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_interval_ms = 1000.0 / fps
+    reader = FrameReader(capture, is_live)
+    tracker = LayoutTracker(**(tracker_kwargs or {}))
+    monitor = LinkActivityMonitor(fps=fps, **(activity_kwargs or {})) if activity else None
+
+    writer = None
+    stats_file = open(frame_stats_path, 'w', encoding='utf-8') if frame_stats_path else None
+
+    layouts = []                # Asettelun muutokset ruutuväleineen
+    current = None              # Nykyinen asettelu
+    last_signature = None
+    latencies = []
+    ema_ms = None               # Tunnistuksen liukuva keskiarvoviive
+    rebuilds = 0
+
+    reader.start()
+    try:
+        while True:
+            item = reader.frames.get()
+            if item is _DONE:
+                break
+            index, timestamp_ms, frame = item
+
+            start = time.perf_counter()
+            result = model(frame, iou=iou, conf=conf, verbose=False)[0]
+            boxes = result.boxes.xyxy.cpu().numpy()
+            confs = result.boxes.conf.cpu().numpy()
+            classes = result.boxes.cls.cpu().numpy()
+            tracker.update(boxes, confs, classes)
+
+            port_activity = None
+            if monitor is not None:
+                # Suoran virran aikaleimat eivät ole luotettavia, joten käytetään kelloa
+                ports = tracker.confirmed("port")
+                monitor.update(
+                    frame, [t.box for t in ports], [t.track_id for t in ports],
+                    time.monotonic() if is_live else timestamp_ms / 1000.0,
+                )
+                port_activity = [monitor.activity(t.track_id) for t in ports]
+
+            # Rakenna JSON uudelleen vain, jos seurattu asettelu muuttui
+            signature = tracker.signature()
+            if monitor is not None:
+                signature += (monitor.signature(),)
+            changed = signature != last_signature
+            # JSON ja annotoitu ruutu rakennetaan samasta hierarkiasta, joten
+            # videoon piirretään vain JSONiin päätyvät portit
+            hierarchy = None
+            if changed or output_video:
+                port_boxes, lan_port_stack_boxes, switch_boxes = tracker.layout_boxes()
+                hierarchy = SwitchHierarchy.build(lan_port_stack_boxes, port_boxes, switch_boxes)
+            if changed:
+                last_signature = signature
+                switches = generate_switch_json(
+                    None, None, hierarchy=hierarchy, activity=port_activity
+                )["switches"]
+                rebuilds += 1
+                current = {
+                    "start_frame": index,
+                    "end_frame": index,
+                    "start_ms": timestamp_ms,
+                    "end_ms": timestamp_ms,
+                    "switches": switches,
+                }
+                layouts.append(current)
+            else:
+                current["end_frame"] = index
+                current["end_ms"] = timestamp_ms
+
+            if output_video:
+                draw_hierarchy(frame, hierarchy, font_scale=0.6, styles=CLASS_STYLES_BGR)
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(
+                        output_video, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height)
+                    )
+                writer.write(frame)
+
+            latency_ms = 1000.0 * (time.perf_counter() - start)
+            latencies.append(latency_ms)
+            ema_ms = latency_ms if ema_ms is None else 0.8 * ema_ms + 0.2 * latency_ms
+
+            # Mukautuva ohitus: pura vain niin monta ruutua kuin ehditään käsitellä
+            if realtime and not is_live:
+                reader.stride = max(1, int(round(ema_ms / frame_interval_ms)))
+
+            if stats_file:
+                stats_file.write(json.dumps({
+                    "frame": index,
+                    "timestamp_ms": timestamp_ms,
+                    "latency_ms": latency_ms,
+                    "stride": reader.stride,
+                    "layout_changed": changed,
+                }) + '\n')
+    finally:
+        reader.stop()
+        capture.release()
+        if writer is not None:
+            writer.release()
+        if stats_file:
+            stats_file.close()
+
+    return {
+        "source": str(source),
+        "fps": fps,
+        "frames_total": reader.total,
+        "frames_processed": len(latencies),
+        "frames_dropped": reader.dropped,
+        "activity_buffer_bytes": monitor.nbytes if monitor is not None else 0,
+        "layout_rebuilds": rebuilds,
+        "latency": latency_summary(latencies),
+        "layouts": layouts,
+        "switches": layouts[-1]["switches"] if layouts else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PortVision-tunnistus videolle tai videovirralle.")
+    parser.add_argument("source", help="Videotiedosto, virran URL tai kameran indeksi")
+    parser.add_argument("-o", "--output", default="recording.json", help="Yhdistetty JSON-tuloste")
+    parser.add_argument("--weights", default="best.pt", help="Mallin painotiedosto")
+    parser.add_argument("--device", default=None, help="Laite (esim. cpu tai cuda:0)")
+    parser.add_argument("--iou", type=float, default=0.4, help="NMS:n IoU-kynnys")
+    parser.add_argument("--conf", type=float, default=0.4, help="Luottamuskynnys")
+    parser.add_argument("--output-video", default=None, help="Annotoidun videon polku")
+    parser.add_argument("--frame-stats", default=None, help="Ruutukohtaiset tilastot JSONL-muodossa")
+    parser.add_argument("--min-hits", type=int, default=3, help="Havainnot jäljen vahvistamiseen")
+    parser.add_argument("--max-misses", type=int, default=10, help="Sallitut ohitetut ruudut")
+    parser.add_argument(
+        "--activity", action="store_true",
+        help="Analysoi porttien linkkivalot (käytä --all-frames vilkkumisen tunnistamiseen)"
+    )
+    parser.add_argument("--activity-window", type=int, default=64, help="LED-näytteiden ikkuna ruutuina")
+    parser.add_argument(
+        "--all-frames", action="store_true",
+        help="Käsittele tiedostosta jokainen ruutu (ei reaaliaikaista ohitusta)"
+    )
+    args = parser.parse_args()
+
+    result = process_stream(
+        args.source,
+        weights=args.weights,
+        device=args.device,
+        iou=args.iou,
+        conf=args.conf,
+        output_video=args.output_video,
+        frame_stats_path=args.frame_stats,
+        tracker_kwargs={"min_hits": args.min_hits, "max_misses": args.max_misses},
+        realtime=not args.all_frames,
+        activity=args.activity,
+        activity_kwargs={"window": args.activity_window},
+    )
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(result, file, indent=4)
+
+    latency = result["latency"]
+    print(
+        f"Ruutuja {result['frames_total']}, käsitelty {result['frames_processed']}, "
+        f"ohitettu {result['frames_dropped']}, asettelun muutoksia {result['layout_rebuilds']}"
+    )
+    if latency:
+        print(
+            f"Viive: keskiarvo {latency['mean_ms']:.1f} ms, p50 {latency['p50_ms']:.1f} ms, "
+            f"p95 {latency['p95_ms']:.1f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()